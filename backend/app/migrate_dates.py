@@ -0,0 +1,39 @@
+"""Convert the timestamps stored as strings into dates.
+
+Usage: python migrate_dates.py [--course COURSE] [--batch-size N]
+
+The migration can be stopped at any time, and resumes where it left off when run again.
+"""
+import argparse
+import logging
+
+from pymongo import MongoClient
+
+from server.config import settings
+from server.util.migrations import (
+    DEFAULT_BATCH_SIZE,
+    migrate_course_dates,
+    migrate_dates,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--course", help="Only migrate this course.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Number of documents to convert at once.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings.mongodb_client = MongoClient(settings.MONGODB_ADDRESS)
+    settings.database = settings.mongodb_client[settings.DB_NAME]
+    try:
+        if args.course:
+            migrate_course_dates(args.course, args.batch_size)
+        else:
+            migrate_dates(args.batch_size)
+    finally:
+        settings.mongodb_client.close()
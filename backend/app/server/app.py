@@ -1,4 +1,6 @@
 """FastAPI app for the capstone dashboard backend."""
+import threading
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pymongo import MongoClient
@@ -11,10 +13,19 @@ from server.routes import (
     dataexport,
     forms,
     github,
+    jobs,
     minutes,
     students,
 )
-from server.util.github import get_access_token
+from server.util import db
+from server.util.github import token_manager
+from server.util.google import google_certs
+from server.util.indexes import reconcile_indexes
+from server.util.jobs import worker_pool
+from server.util.jwt import migrate_blacklist
+from server.util.rollups import backfill_commit_rollups
+from server.util.scheduler import sync_scheduler
+from server.util.sprints import backfill_sprint_numbers
 
 app = FastAPI()
 app.include_router(auth.router)
@@ -25,6 +36,7 @@ app.include_router(courses.router)
 app.include_router(minutes.router)
 app.include_router(dataexport.router)
 app.include_router(forms.router)
+app.include_router(jobs.router)
 
 origins = [
     "*",
@@ -42,8 +54,15 @@ app.add_middleware(
 
 @app.on_event("startup")
 def initialize_github_token():
-    """Set the global GitHub token."""
-    settings.github_token, settings.github_expiration = get_access_token()
+    """Get the GitHub token in the background, so that startup doesn't wait on GitHub."""
+    threading.Thread(target=token_manager.prefetch, daemon=True).start()
+
+
+@app.on_event("startup")
+def initialize_google_certs():
+    """Get Google's certificates in the background, so that the first login doesn't wait on them."""
+    if settings.GOOGLE_CLIENT_ID:
+        threading.Thread(target=google_certs.prefetch, daemon=True).start()
 
 
 @app.on_event("startup")
@@ -51,9 +70,59 @@ def startup_db_client():
     """Initialize the MongoDB client."""
     settings.mongodb_client = MongoClient(settings.MONGODB_ADDRESS)
     settings.database = settings.mongodb_client[settings.DB_NAME]
+    db.connect()
+
+
+@app.on_event("startup")
+def create_db_indexes():
+    """Create any database indexes that are missing."""
+    reconcile_indexes()
+
+
+@app.on_event("startup")
+def convert_blacklisted_tokens():
+    """Let the tokens blacklisted before tokens had an id expire from the blacklist."""
+    migrate_blacklist()
+
+
+@app.on_event("startup")
+def stamp_sprint_numbers():
+    """Stamp the commits and meeting minutes stored before sprint numbers were stamped."""
+    backfill_sprint_numbers()
+
+
+@app.on_event("startup")
+def create_commit_rollups():
+    """Build the commit rollups of courses that don't have them yet."""
+    backfill_commit_rollups()
+
+
+@app.on_event("startup")
+def start_job_workers():
+    """Start the threads that run background jobs."""
+    worker_pool.start(settings.JOB_WORKERS)
+
+
+@app.on_event("startup")
+def start_sync_scheduler():
+    """Start the scheduled GitHub syncs."""
+    sync_scheduler.start()
+
+
+@app.on_event("shutdown")
+def stop_sync_scheduler():
+    """Stop the scheduled GitHub syncs, without waiting long for a sync in progress."""
+    sync_scheduler.stop(timeout=10)
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    """Stop the job workers once the jobs they are running finish."""
+    worker_pool.stop()
 
 
 @app.on_event("shutdown")
 def shutdown_db_client():
     """Close the MongoDB client."""
+    db.close()
     settings.mongodb_client.close()
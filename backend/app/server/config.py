@@ -1,6 +1,7 @@
 """Global config settings for the app using Pydantic Settings."""
 import os
 import sys
+from typing import Any
 
 from pydantic import BaseSettings
 from pymongo import MongoClient
@@ -19,14 +20,74 @@ class Settings(BaseSettings):
 
     API_SECRET_KEY: str = None
 
+    # OAuth client ID of the frontend, which Google ID tokens must be issued to. Signing in with
+    # an ID token is disabled when it isn't set.
+    GOOGLE_CLIENT_ID: str = None
+
     HTTP_TIMEOUT: int = 60
 
+    # Default number of repositories to fetch from GitHub at once when syncing a course.
+    GITHUB_SYNC_CONCURRENCY: int = 8
+
+    # Number of GitHub requests to hold back from the rate limit, so that they remain
+    # available for interactive requests.
+    GITHUB_RATE_LIMIT_RESERVE: int = 50
+    # Maximum number of times to retry a GitHub request that was rate limited.
+    GITHUB_MAX_RETRIES: int = 3
+    # Maximum number of seconds to wait for the GitHub rate limit before giving up.
+    GITHUB_MAX_WAIT: int = 60
+
+    # Owner of the team repositories, used by scheduled syncs. Scheduled syncs are disabled
+    # when it isn't set.
+    GITHUB_OWNER: str = None
+    # Number of seconds between scheduled syncs of each course that uses GitHub, 0 to disable.
+    GITHUB_SYNC_INTERVAL: int = 3600
+    # Maximum number of seconds added at random to each interval, so that courses aren't all
+    # synced at once.
+    GITHUB_SYNC_JITTER: int = 600
+    # Scheduled syncs are put off while fewer GitHub requests than this remain.
+    GITHUB_SYNC_MIN_REMAINING: int = 1000
+
+    # How commits are synced, "api" to page through the commits API, or "git" to read them
+    # from bare mirrors of the repositories, which also records the lines each commit changed.
+    GITHUB_SYNC_BACKEND: str = "api"
+    # Directory the mirrors are kept in, required by the git backend.
+    GIT_MIRROR_DIR: str = None
+    # URL the mirrors are fetched from.
+    GIT_CLONE_URL: str = "https://github.com/{owner}/{repo}.git"
+
+    # Secret shared with GitHub to sign webhook deliveries. Webhooks are rejected when it
+    # isn't set.
+    GITHUB_WEBHOOK_SECRET: str = None
+
+    # Number of seconds before the cached list of courses is reloaded from the database.
+    COURSE_CACHE_TTL: int = 30
+    # Number of seconds before a cached user, and the courses assigned to them, is reloaded from
+    # the database.
+    USER_CACHE_TTL: int = 10
+
+    # Maximum number of seconds before a token revoked by another instance of the app is
+    # rejected by this one.
+    TOKEN_REVOCATION_REFRESH: int = 5
+
+    # Number of threads running background jobs.
+    JOB_WORKERS: int = 2
+    # Number of seconds a finished job is kept before it expires.
+    JOB_TTL: int = 86400
+    # Number of seconds a running job is leased to its worker. Leases are renewed while the job
+    # runs, so a job whose lease has expired was interrupted and is run again.
+    JOB_LEASE: int = 300
+
+    # How routes access the database, "pymongo" to run each operation with pymongo on the thread
+    # pool, or "motor" to run them on the event loop with Motor.
+    DB_DRIVER: str = "pymongo"
+
     # Variable.
     database: Database = None
     mongodb_client: MongoClient = None
-
-    github_token: str = None
-    github_expiration: str = None
+    # Motor client and database, only set with the motor driver.
+    motor_client: Any = None
+    motor_database: Any = None
 
     class Config:
         """Load the .env file."""
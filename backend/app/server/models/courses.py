@@ -1,5 +1,7 @@
 """Models related to courses."""
 
+from typing import List
+
 from pydantic import BaseModel, Field
 
 
@@ -23,3 +25,17 @@ class Sprint(BaseModel):
     forms_url: str = Field(
         example="https://docs.google.com/spreadsheets/d/e/2PACX-1vQdIq-kg20x4kWwwfOFsc3xQotiAg_vZI5qfK0PBcHIs0CEv56s-v9Q-_SeiP1xGWcjBKjrNjxo16-B/pub?output=csv"
     )
+
+
+class IndexReport(BaseModel):
+    """Model for the state of the indexes of a course subcollection."""
+
+    collection: str = Field(example="CMPUT 401 W22.github.commits")
+    missing: List[str] = Field(
+        description="Declared indexes that do not exist in the database.",
+        example=["repo_name_timestamp"],
+    )
+    unused: List[str] = Field(
+        description="Indexes that have not been used since the database server started.",
+        example=["repo_name_fetched_at"],
+    )
@@ -1,4 +1,5 @@
 """Models for storing GitHub data."""
+from datetime import datetime
 from typing import List, Optional
 
 from pydantic import BaseModel, Field
@@ -12,6 +13,65 @@ class GithubRequest(BaseModel):
     course_name: str = Field(example="CS241-w22")
 
 
+class CourseSyncRequest(BaseModel):
+    """Model for a request to sync every team repository in a course."""
+
+    owner: str = Field(example="illinois-cs241")
+    concurrency: Optional[int] = Field(
+        description="Maximum number of repositories to fetch at once.",
+        example=8,
+        ge=1,
+    )
+
+
+class RepoSyncResult(BaseModel):
+    """Model for the result of syncing a single repository."""
+
+    repo_name: str = Field(example="coursebook")
+    new_commits: int = Field(description="Number of new commits stored.", example=42)
+    pages_fetched: int = Field(
+        description="Number of pages fetched from GitHub.", example=1
+    )
+    error: Optional[str] = Field(
+        description="Error that stopped the repository from being synced, if any.",
+        example=None,
+    )
+
+
+class WebhookResult(BaseModel):
+    """Model for the outcome of a GitHub webhook delivery."""
+
+    delivery_id: str = Field(example="72d3162e-cc78-11e3-81ab-4c9367dc0958")
+    status: str = Field(
+        description="stored if commits were stored, duplicate if the delivery was already received, or ignored.",
+        example="stored",
+    )
+    courses: List[str] = Field(
+        description="Courses the commits were stored in.", example=["CMPUT 401 W22"]
+    )
+    commits: int = Field(description="Number of commits in the push.", example=3)
+
+
+class RateLimitStatus(BaseModel):
+    """Model for the remaining GitHub API budget."""
+
+    limit: Optional[int] = Field(
+        description="Number of requests allowed per hour. Unknown until a request has been made.",
+        example=5000,
+    )
+    remaining: Optional[int] = Field(
+        description="Number of requests remaining in the current window.", example=4200
+    )
+    reset: Optional[str] = Field(
+        description="Time that the current window resets.",
+        example="2022-01-01T01:00:00+00:00",
+    )
+    retry_at: Optional[str] = Field(
+        description="Time until which requests are paused because of a secondary rate limit.",
+        example="2022-01-01T00:01:00+00:00",
+    )
+
+
 class Commit(BaseModel):
     """Model for storing GitHub commit data."""
 
@@ -19,7 +79,7 @@ class Commit(BaseModel):
     author: str = Field(
         description="GitHub username of the commit author", example="cs241-bot"
     )
-    timestamp: str = Field(
+    timestamp: datetime = Field(
         description="Date of the commit.", example="2021-09-01T00:00:00Z"
     )
     message: str = Field(description="Commit message.", example="Update README.md")
@@ -27,10 +87,27 @@ class Commit(BaseModel):
         description="Name of the repository the commit was made in.",
         example="coursebook",
     )
-    fetched_at: str = Field(
+    fetched_at: datetime = Field(
         description="Date the commit was fetched from GitHub.",
         example="2021-09-01T00:00:00Z",
     )
+    sprint_number: int = Field(
+        0,
+        description="Number of the sprint the commit was made in, or 0 if it is outside every sprint.",
+        example=1,
+    )
+    additions: Optional[int] = Field(
+        description="Number of lines added, only known for commits synced from a git mirror.",
+        example=12,
+    )
+    deletions: Optional[int] = Field(
+        description="Number of lines deleted, only known for commits synced from a git mirror.",
+        example=3,
+    )
+    files_changed: Optional[int] = Field(
+        description="Number of files changed, only known for commits synced from a git mirror.",
+        example=2,
+    )
 
 
 class StudentCommit(BaseModel):
@@ -43,6 +120,26 @@ class TeamCommit(BaseModel):
     number_of_commits: int = Field()
 
 
+class SprintCommit(BaseModel):
+    """Model for the number of commits made in a sprint."""
+
+    sprint_number: int = Field(example=1)
+    number_of_commits: int = Field(example=42)
+
+
+class TeamSprintCommits(BaseModel):
+    """Model for the number of commits a team has made in each sprint."""
+
+    team_name: str = Field(example="coursebook")
+    total_commits: int = Field(
+        description="Total number of commits, including commits made outside of a sprint.",
+        example=84,
+    )
+    sprint_commits: List[SprintCommit] = Field(
+        description="Number of commits for each sprint, ordered by sprint number."
+    )
+
+
 class TeamCommits(BaseModel):
     student_commits: List[StudentCommit] = Field(description="List of student commits.")
     last_fetched_at: Optional[str] = Field(
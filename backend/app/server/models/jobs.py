@@ -0,0 +1,42 @@
+"""Models for background jobs."""
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Job(BaseModel):
+    """Model for the status of a background job."""
+
+    id: str = Field(example="63a1f0c2e4b0a1b2c3d4e5f6")
+    type: str = Field(example="github.sync")
+    course_name: str = Field(
+        description="Course the job works on. Only users assigned to it can see the job.",
+        example="CMPUT 401 W22",
+    )
+    status: str = Field(
+        description="One of queued, running, succeeded or failed.", example="running"
+    )
+    params: dict = Field(
+        description="Parameters the job was submitted with.",
+        example={"course_name": "CMPUT 401 W22", "owner": "illinois-cs241"},
+    )
+    progress: Optional[dict] = Field(
+        description="Latest progress reported by the job, if any.",
+        example={"repos_synced": 3, "repos": 10},
+    )
+    result: Optional[Any] = Field(
+        description="Result of the job, once it has succeeded.", example=None
+    )
+    error: Optional[str] = Field(
+        description="Error that stopped the job, if it failed.", example=None
+    )
+    file_name: Optional[str] = Field(
+        description="Name of the file produced by the job, downloaded from /jobs/{id}/file.",
+        example=None,
+    )
+    attempts: int = Field(
+        description="Number of times the job has been started.", example=1
+    )
+    created_at: str = Field(example="2022-01-01T00:00:00Z")
+    started_at: Optional[str] = Field(example="2022-01-01T00:00:01Z")
+    finished_at: Optional[str] = Field(example=None)
@@ -1,5 +1,7 @@
 """Models related to meeting minutes."""
 
+from datetime import datetime
+
 from pydantic import BaseModel, Field
 
 
@@ -14,4 +16,5 @@ class MinuteRequest(Minute):
     """Model for creating a meeting minute entry."""
 
     team: str = Field(example="team1")
-    timestamp: str = Field(example="2021-09-04T12:00:00Z")
+    timestamp: datetime = Field(example="2021-09-04T12:00:00Z")
+    sprint_number: int = Field(0, example=1)
@@ -1,5 +1,5 @@
 """Models for miscellaneous data."""
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -12,6 +12,11 @@ class User(BaseModel):
 
 class AuthRequest(BaseModel):
     token: str = Field(example="string")
+    token_type: Literal["access_token", "id_token"] = Field(
+        "access_token",
+        description="Whether token is a Google OAuth access token, or a Google ID token, which is verified without calling Google.",
+        example="id_token",
+    )
 
 
 class RefreshRequest(BaseModel):
@@ -48,3 +48,10 @@ class StudentsResponse(BaseModel):
     students: List[Student] = Field(...)
     # sprint level student information will be stored in a separate collection
     sprint_data: List[StudentSprintData] = Field(...)
+
+
+class UploadProgress(BaseModel):
+    # reported after each chunk of a streamed upload is written
+    chunk: int = Field(example=1, description="Number of the chunk written, from 1")
+    documents: int = Field(example=500, description="Documents written by the chunk")
+    total: int = Field(example=500, description="Documents written so far")
@@ -0,0 +1,42 @@
+"""Queries of the TA comments of a course."""
+from typing import List
+
+from bson import ObjectId
+
+from server.models.comments import CommentResponse
+from server.util import db
+
+# The id of a comment is its _id, and the rest of its fields are stored as they are returned.
+COMMENT_FIELDS = {
+    "_id": 1,
+    **{name: 1 for name in CommentResponse.__fields__ if name != "id"},
+}
+
+
+async def find_comments(course_name: str, team: str, sprint: int = 0) -> List[dict]:
+    """Get the comments of a team, for a sprint or for every sprint if sprint is 0."""
+    query = {"team": team}
+    if sprint != 0:
+        query["sprint_number"] = sprint
+    return await db.collection(f"{course_name}.comments").find(query, COMMENT_FIELDS)
+
+
+async def insert_comment(course_name: str, comment: dict):
+    """Store a new comment."""
+    await db.collection(f"{course_name}.comments").insert_one(comment)
+
+
+async def update_comment(course_name: str, comment_id: str, fields: dict) -> bool:
+    """Update the fields of a comment, returning whether it exists."""
+    res = await db.collection(f"{course_name}.comments").update_one(
+        {"_id": ObjectId(comment_id)}, {"$set": fields}
+    )
+    return res.matched_count > 0
+
+
+async def delete_comment(course_name: str, comment_id: str) -> bool:
+    """Delete a comment, returning whether it existed."""
+    res = await db.collection(f"{course_name}.comments").delete_one(
+        {"_id": ObjectId(comment_id)}
+    )
+    return res.deleted_count > 0
@@ -0,0 +1,20 @@
+"""Queries of the GitHub commits of a course."""
+from datetime import datetime
+from typing import Optional
+
+from server.util import db
+
+
+async def get_last_fetched_at(course_name: str, repo: str) -> Optional[datetime]:
+    """Get when the commits of a repository were last fetched, or None if they never were."""
+    sync_state = await db.collection(f"{course_name}.github.sync").find_one(
+        {"repo_name": repo}, {"_id": 0, "fetched_at": 1}
+    )
+    if sync_state is None:
+        # The repository was synced before sync states were recorded.
+        sync_state = await db.collection(f"{course_name}.github.commits").find_one(
+            {"repo_name": repo},
+            {"_id": 0, "fetched_at": 1},
+            sort=[("fetched_at", -1)],
+        )
+    return sync_state["fetched_at"] if sync_state else None
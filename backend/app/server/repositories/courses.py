@@ -0,0 +1,92 @@
+"""Queries of the courses, and of the sprints of each course."""
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from server.models.courses import Course, Sprint
+from server.util import db, sprints
+
+COURSE_FIELDS = db.get_projection(Course)
+SPRINT_FIELDS = db.get_projection(Sprint)
+
+
+async def find_courses(names: Optional[List[str]] = None) -> List[dict]:
+    """Get every course, or only the courses with the given names."""
+    query = {} if names is None else {"name": {"$in": names}}
+    return await db.collection("courses").find(query, COURSE_FIELDS)
+
+
+async def save_course(course: Course):
+    """Create or update a course."""
+    await db.collection("courses").update_one(
+        {"name": course.name}, {"$set": jsonable_encoder(course)}, upsert=True
+    )
+
+
+async def delete_course(course_name: str):
+    """Delete a course, but not its collections."""
+    await db.collection("courses").delete_one({"name": course_name})
+
+
+async def set_roster_file_name(course_name: str, file_name: str):
+    """Record the name of the roster file uploaded to a course."""
+    await db.collection("courses").update_one(
+        {"name": course_name}, {"$set": {"roster_file_name": file_name}}
+    )
+
+
+async def find_sprints(course_name: str) -> List[dict]:
+    """Get every sprint of a course."""
+    return await db.collection(f"{course_name}.sprints").find({}, SPRINT_FIELDS)
+
+
+async def get_sprint_numbers(course_name: str) -> List[int]:
+    """Get the numbers of every sprint of a course, in order."""
+    return sorted(
+        sprint["sprint_number"]
+        for sprint in await db.collection(f"{course_name}.sprints").find(
+            {}, {"_id": 0, "sprint_number": 1}
+        )
+    )
+
+
+async def sprint_exists(course_name: str, sprint_number: int) -> bool:
+    """Check if a sprint of a course exists."""
+    return (
+        await db.collection(f"{course_name}.sprints").find_one(
+            {"sprint_number": sprint_number}, {"_id": 1}
+        )
+        is not None
+    )
+
+
+async def get_forms_url(course_name: str, sprint_number: int) -> Optional[str]:
+    """Get the URL of the review forms of a sprint, or None if the sprint doesn't exist."""
+    sprint = await db.collection(f"{course_name}.sprints").find_one(
+        {"sprint_number": sprint_number}, {"_id": 0, "forms_url": 1}
+    )
+    return sprint["forms_url"] if sprint else None
+
+
+async def save_sprint(course_name: str, sprint: Sprint):
+    """Create or update a sprint of a course."""
+    await db.collection(f"{course_name}.sprints").update_one(
+        {"sprint_number": sprint.sprint_number},
+        {"$set": sprints.get_sprint_document(sprint)},
+        upsert=True,
+    )
+
+
+async def delete_sprint(course_name: str, sprint_number: int) -> bool:
+    """Delete a sprint of a course, returning whether it existed."""
+    res = await db.collection(f"{course_name}.sprints").delete_one(
+        {"sprint_number": sprint_number}
+    )
+    return res.deleted_count > 0
+
+
+async def set_sprint_file_name(course_name: str, sprint: int, file_name: str):
+    """Record the name of the sprint data file uploaded to a sprint."""
+    await db.collection(f"{course_name}.sprints").update_one(
+        {"sprint": sprint}, {"$set": {"sprint_file_name": file_name}}
+    )
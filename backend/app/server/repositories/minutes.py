@@ -0,0 +1,14 @@
+"""Queries of the meeting minutes of a course."""
+from typing import List
+
+from server.models.minutes import Minute
+from server.util import db
+
+MINUTE_FIELDS = db.get_projection(Minute)
+
+
+async def find_minutes(course_name: str, team: str, sprint_match: dict) -> List[dict]:
+    """Get the meeting minutes of a team, in the sprints matched by sprint_match."""
+    return await db.collection(f"{course_name}.minutes").find(
+        {"team": team, **sprint_match}, MINUTE_FIELDS
+    )
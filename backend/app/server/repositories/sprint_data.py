@@ -0,0 +1,49 @@
+"""Queries of the sprint data of the students of a course."""
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pymongo import UpdateOne
+
+from server.models.students import StudentSprintData
+from server.util import db
+
+SPRINT_DATA_FIELDS = db.get_projection(StudentSprintData)
+
+
+async def find_sprint_data(
+    course_name: str, sprint: int = 0, email: Optional[str] = None
+) -> List[dict]:
+    """Get the sprint data of a course, for a sprint and a student if given.
+
+    Sprint 0 gets the data of every sprint.
+
+    """
+    query = {}
+    if sprint != 0:
+        query["sprint"] = sprint
+    if email is not None:
+        query["email"] = email
+    return await db.collection(f"{course_name}.students.sprints").find(
+        query, SPRINT_DATA_FIELDS
+    )
+
+
+async def write_sprint_data(course_name: str, sprint_data: List[StudentSprintData]):
+    """Create or update the sprint data of students, by email and sprint."""
+    await db.collection(f"{course_name}.students.sprints").bulk_write(
+        [
+            UpdateOne(
+                {"email": data.email, "sprint": data.sprint},
+                {"$set": jsonable_encoder(data)},
+                upsert=True,
+            )
+            for data in sprint_data
+        ]
+    )
+
+
+async def delete_sprint_data(course_name: str, sprint: int):
+    """Delete the sprint data of every student for a sprint."""
+    await db.collection(f"{course_name}.students.sprints").delete_many(
+        {"sprint": sprint}
+    )
@@ -0,0 +1,58 @@
+"""Queries of the students on the roster of a course."""
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from server.models.students import Student
+from server.util import db
+
+STUDENT_FIELDS = db.get_projection(Student)
+# The fields needed to map each student to their team.
+TEAM_FIELDS = {"_id": 0, "email": 1, "project": 1}
+
+
+async def find_students(
+    course_name: str, emails: Optional[List[str]] = None
+) -> List[dict]:
+    """Get every student of a course, or only the students with the given emails."""
+    query = {} if emails is None else {"email": {"$in": emails}}
+    return await db.collection(f"{course_name}.students").find(query, STUDENT_FIELDS)
+
+
+async def find_student(course_name: str, email: str) -> Optional[dict]:
+    """Get a student of a course by email, or None if there isn't one."""
+    return await db.collection(f"{course_name}.students").find_one(
+        {"email": email}, STUDENT_FIELDS
+    )
+
+
+async def get_team_map(course_name: str) -> Dict[str, str]:
+    """Get the team of each student of a course, by email."""
+    return {
+        student["email"]: student["project"]
+        for student in await db.collection(f"{course_name}.students").find(
+            {}, TEAM_FIELDS
+        )
+    }
+
+
+async def get_repos(course_name: str) -> List[str]:
+    """Get the repositories of every team of a course."""
+    return await db.collection(f"{course_name}.students").distinct("repo_name")
+
+
+async def get_usernames(course_name: str, repo: str) -> List[str]:
+    """Get the source control usernames of the students of a team."""
+    return await db.collection(f"{course_name}.students").distinct(
+        "source_control_username", {"repo_name": repo}
+    )
+
+
+async def write_roster(course_name: str, students: List[dict]):
+    """Create or update students of a course, by email."""
+    await db.collection(f"{course_name}.students").bulk_write(
+        [
+            UpdateOne({"email": student["email"]}, {"$set": student}, upsert=True)
+            for student in students
+        ]
+    )
@@ -4,46 +4,57 @@ from datetime import datetime
 from fastapi import APIRouter, Body, Depends, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
+from google.auth.exceptions import GoogleAuthError
+from starlette.concurrency import run_in_threadpool
 
 from server.models import models
-from server.util import jwt, requests
+from server.util import google, jwt, requests
 
 router = APIRouter()
 
 
 @router.post(
     "/auth",
-    description="verify auth token and user authorization",
+    description="verify auth token and user authorization. The token is a Google OAuth access token, or a Google ID token if token_type is id_token.",
     status_code=status.HTTP_200_OK,
     responses={
         200: {"description": "User is authorized"},
         401: {"description": "User is not authorized"},
+        503: {"description": "Google's certificates could not be fetched"},
     },
 )
-def submit_auth(authreq: models.AuthRequest = Body(...)):
+async def submit_auth(authreq: models.AuthRequest = Body(...)):
     """Checking User authentication"""
     authreq = jsonable_encoder(authreq)
-    try:
-        user = requests.get(
-            f'https://www.googleapis.com/oauth2/v3/userinfo?access_token={authreq["token"]}'
-        )
+    if authreq["token_type"] == "id_token":
+        # Verified locally, without waiting on Google.
+        try:
+            email = await run_in_threadpool(google.verify_id_token, authreq["token"])
+        except (ValueError, GoogleAuthError) as exc:
+            raise jwt.CREDENTIALS_EXCEPTION from exc
+    else:
+        try:
+            user = await run_in_threadpool(
+                requests.get,
+                f'https://www.googleapis.com/oauth2/v3/userinfo?access_token={authreq["token"]}',
+            )
 
-    except Exception as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
+        except Exception as exc:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            ) from exc
+        email = user.json()["email"]
     # query db for matching user and check authorization
-    user_data = user.json()
-    if jwt.valid_email_from_db(user_data["email"]):
-        access_token = jwt.create_token(user_data["email"])
+    if await jwt.valid_email_from_db(email):
+        access_token = jwt.create_token(email)
         content = JSONResponse(
             {
                 "result": True,
                 "access_token": access_token,
-                "refresh_token": jwt.create_refresh_token(user_data["email"]),
-                "email": user_data["email"],
+                "refresh_token": jwt.create_refresh_token(email),
+                "email": email,
             }
         )
         return content
@@ -51,7 +62,7 @@ def submit_auth(authreq: models.AuthRequest = Body(...)):
 
 
 @router.post("/refresh")
-def refresh(refreq: models.RefreshRequest):
+async def refresh(refreq: models.RefreshRequest):
     """Check the refresh token for creating new JWT token."""
     try:
         if refreq.grant_type == "refresh_token":
@@ -61,7 +72,7 @@ def refresh(refreq: models.RefreshRequest):
             if datetime.utcfromtimestamp(payload.get("exp")) > datetime.utcnow():
                 email = payload.get("sub")
                 # Validate email
-                if jwt.valid_email_from_db(email):
+                if await jwt.valid_email_from_db(email):
                     # Create and return token
                     return JSONResponse(
                         {"result": True, "access_token": jwt.create_token(email)}
@@ -73,14 +84,14 @@ def refresh(refreq: models.RefreshRequest):
 
 
 @router.get("/auth/check", dependencies=[Depends(jwt.get_current_user_email)])
-def check_auth():
+async def check_auth():
     """Check if the provided email is authorized."""
     return "Valid"
 
 
 @router.get("/logout")
-def logout(token: str = Depends(jwt.get_current_user_token)):
+async def logout(token: str = Depends(jwt.get_current_user_token)):
     """finishing user session"""
-    if jwt.add_blacklist_token(token):
+    if await run_in_threadpool(jwt.add_blacklist_token, token):
         return JSONResponse({"result": True})
     raise jwt.CREDENTIALS_EXCEPTION
@@ -7,10 +7,11 @@ from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 
-from server.config import settings
 from server.models.comments import Comment, CommentResponse, UpdateComment
-from server.util import jwt
-from server.util.common import check_course_in_db
+from server.repositories import comments as comment_repo
+from server.repositories import courses as course_repo
+from server.util import dates, jwt
+from server.util.common import check_course_in_db_async
 
 router = APIRouter()
 
@@ -25,15 +26,14 @@ router = APIRouter()
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def add_comment(course_name: str, comment: Comment):
+async def add_comment(course_name: str, comment: Comment):
     """Add a TA comment for a team into the database."""
-    coll = settings.database[course_name].comments
     comment_json = jsonable_encoder(comment)
     # Timestamp the comment.
     comment_json["created_at"] = comment_json["last_modified_at"] = datetime.now(
         timezone.utc
-    ).isoformat()
-    coll.insert_one(comment_json)
+    )
+    await comment_repo.insert_comment(course_name, comment_json)
 
 
 @router.get(
@@ -47,28 +47,19 @@ def add_comment(course_name: str, comment: Comment):
     response_model=List[CommentResponse],
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_comments(course_name: str, sprint: int, team: str):
+async def get_comments(course_name: str, sprint: int, team: str):
     """Get all comments for a team for a specific sprint."""
-    check_course_in_db(course_name, [".comments", ".sprints"])
-
-    if sprint == 0:
-        # Get all comments for a team.
-        comments_cur = settings.database[course_name].comments.find({"team": team})
-    else:
-        # First check if sprint exists.
-        verify_sprint = settings.database[course_name].sprints.find_one(
-            {"sprint_number": sprint}
-        )
-        if verify_sprint is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Sprint {sprint} does not exist",
-            )
-
-        comments_cur = settings.database[course_name].comments.find(
-            {"$and": [{"sprint_number": sprint}, {"team": team}]}
+    await check_course_in_db_async(course_name, [".comments", ".sprints"])
+
+    # First check if sprint exists.
+    if sprint != 0 and not await course_repo.sprint_exists(course_name, sprint):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Sprint {sprint} does not exist",
         )
 
+    comments_cur = await comment_repo.find_comments(course_name, team, sprint)
+
     comments = []
     for comment in comments_cur:
         comment_detail = CommentResponse(
@@ -76,8 +67,9 @@ def get_comments(course_name: str, sprint: int, team: str):
             message=comment["message"],
             team=comment["team"],
             sprint_number=comment["sprint_number"],
-            created_at=comment["created_at"],
-            last_modified_at=comment["last_modified_at"],
+            # The dates are stored as dates, but returned as strings.
+            created_at=dates.to_iso(comment["created_at"]),
+            last_modified_at=dates.to_iso(comment["last_modified_at"]),
         )
         comments.append(comment_detail)
 
@@ -96,19 +88,17 @@ def get_comments(course_name: str, sprint: int, team: str):
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def edit_comment(course_name: str, comment_id: str, comment: UpdateComment):
+async def edit_comment(course_name: str, comment_id: str, comment: UpdateComment):
     """Edit a TA comment for a team in the database."""
     if not ObjectId.is_valid(comment_id):
         raise HTTPException(status_code=400, detail="Invalid comment ID")
-    check_course_in_db(course_name, [".comments"])
+    await check_course_in_db_async(course_name, [".comments"])
 
     comment_json = jsonable_encoder(comment, exclude_none=True)
     # Timestamp the comment update.
-    comment_json["last_modified_at"] = datetime.now(timezone.utc).isoformat()
+    comment_json["last_modified_at"] = datetime.now(timezone.utc)
 
-    coll = settings.database[course_name].comments
-    res = coll.update_one({"_id": ObjectId(comment_id)}, {"$set": comment_json})
-    if res.matched_count == 0:
+    if not await comment_repo.update_comment(course_name, comment_id, comment_json):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found"
         )
@@ -126,15 +116,13 @@ def edit_comment(course_name: str, comment_id: str, comment: UpdateComment):
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def delete_comment(course_name: str, comment_id: str):
+async def delete_comment(course_name: str, comment_id: str):
     """Delete a TA comment for a team in the database."""
     if not ObjectId.is_valid(comment_id):
         raise HTTPException(status_code=400, detail="Invalid comment ID")
-    check_course_in_db(course_name, [".comments"])
+    await check_course_in_db_async(course_name, [".comments"])
 
-    coll = settings.database[course_name].comments
-    res = coll.delete_one({"_id": ObjectId(comment_id)})
-    if res.deleted_count == 0:
+    if not await comment_repo.delete_comment(course_name, comment_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Comment not found",
@@ -3,13 +3,19 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.encoders import jsonable_encoder
-from pymongo.errors import OperationFailure
-
-from server.config import settings
-from server.models.courses import Course, Sprint
-from server.util import jwt
-from server.util.common import check_course_in_db, check_user_assigned_to_course
+from starlette.concurrency import run_in_threadpool
+
+from server.models.courses import Course, IndexReport, Sprint
+from server.repositories import courses as course_repo
+from server.repositories import sprint_data as sprint_data_repo
+from server.util import dates, db, jwt, leases, sprints
+from server.util.common import (
+    check_course_in_db_async,
+    check_user_assigned_to_course,
+    course_registry,
+    user_cache,
+)
+from server.util.indexes import create_course_indexes, get_index_report
 
 router = APIRouter()
 
@@ -22,10 +28,10 @@ router = APIRouter()
     response_model=List[Course],
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_courses():
+async def get_courses():
     """Get all courses."""
     courses = []
-    for course in settings.database.courses.find():
+    for course in await course_repo.find_courses():
         courses.append(Course(**course))
     return courses
 
@@ -38,13 +44,12 @@ def get_courses():
     response_model=List[Course],
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_courses_for_user(user_email: str):
+async def get_courses_for_user(user_email: str):
     """Get all courses for a given user."""
-    user_courses = settings.database.user.find_one({"email": user_email})
+    user_courses = await user_cache.get_async(user_email)
     courses = []
-    for course in settings.database.courses.find():
-        if course["name"] in user_courses["assigned_courses"]:
-            courses.append(Course(**course))
+    for course in await course_repo.find_courses(user_courses["assigned_courses"]):
+        courses.append(Course(**course))
     return courses
 
 
@@ -58,17 +63,12 @@ def get_courses_for_user(user_email: str):
         422: {"description": "Invalid course data"},
     },
 )
-def create_course(
-    course: Course, user_email: str = Depends(jwt.get_current_user_email)
-):
+async def create_course(course: Course, user: dict = Depends(jwt.get_current_user)):
     """Create a new course and add the created course to assigned courses for the owner."""
     # Check if course already exists
-    col_exist_res = True
-    try:
-        settings.database.validate_collection(f"{course.name}.sprints")
-    except OperationFailure:
-        col_exist_res = False
-    if col_exist_res:
+    if await run_in_threadpool(
+        course_registry.exists, course.name, [".sprints"], refresh=True
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Course {course.name} already exists",
@@ -81,20 +81,23 @@ def create_course(
         ".students",
         ".students.sprints",
         ".github.commits",
+        ".github.rollups",
+        ".github.sync",
         ".minutes",
     ]
     for coll in collections_to_be_created:  # create all needed collections
-        settings.database.create_collection(course.name + coll)
+        await db.create_collection(course.name + coll)
+    await run_in_threadpool(create_course_indexes, course.name)
     # insert course into courses collection
-    settings.database.courses.update_one(
-        {"name": course.name}, {"$set": jsonable_encoder(course)}, upsert=True
-    )
+    await course_repo.save_course(course)
     # add course to user's assigned courses
-    settings.database.user.update_one(
-        {"email": user_email},
+    await db.collection("user").update_one(
+        {"email": user["email"]},
         {"$addToSet": {"assigned_courses": course.name}},
         upsert=True,
     )
+    user_cache.invalidate(user["email"])
+    course_registry.invalidate()
 
 
 @router.put(
@@ -110,20 +113,16 @@ def create_course(
         422: {"description": "Invalid course data"},
     },
 )
-def update_course(
-    course: Course, user_email: str = Depends(jwt.get_current_user_email)
-):
+async def update_course(course: Course, user: dict = Depends(jwt.get_current_user)):
     """Update a course."""
     # Check if course exists
-    check_course_in_db(course.name, [".sprints"])
+    await check_course_in_db_async(course.name, [".sprints"])
 
     # Check if user has access to the course
-    check_user_assigned_to_course(user_email, course.name)
+    check_user_assigned_to_course(user, course.name)
 
     # Update course
-    settings.database.courses.update_one(
-        {"name": course.name}, {"$set": jsonable_encoder(course)}, upsert=True
-    )
+    await course_repo.save_course(course)
 
 
 @router.delete(
@@ -139,15 +138,13 @@ def update_course(
         500: {"description": "Internal server error"},
     },
 )
-def delete_course(
-    course_name: str, user_email: str = Depends(jwt.get_current_user_email)
-):
+async def delete_course(course_name: str, user: dict = Depends(jwt.get_current_user)):
     """Delete a course. Keep an eye on this to ensure all loose ends are tied up."""
     # Check if course exists.
-    check_course_in_db(course_name, [".sprints"])
+    await check_course_in_db_async(course_name, [".sprints"])
 
     # Check if user has access to the course
-    check_user_assigned_to_course(user_email, course_name)
+    check_user_assigned_to_course(user, course_name)
 
     # Drop all collections related to the course.
     collections_to_be_deleted = [
@@ -156,16 +153,45 @@ def delete_course(
         ".students",
         ".students.sprints",
         ".github.commits",
+        ".github.rollups",
+        ".github.sync",
         ".minutes",
     ]
     for coll in collections_to_be_deleted:
-        settings.database.drop_collection(course_name + coll)
+        await db.drop_collection(course_name + coll)
     # Now remove course from courses collection.
-    settings.database.courses.delete_one({"name": course_name})
+    await course_repo.delete_course(course_name)
+    course_registry.invalidate()
     # Remove course from all users who have it under their assigned courses.
-    settings.database.user.update_many(
+    await db.collection("user").update_many(
         {"assigned_courses": course_name}, {"$pull": {"assigned_courses": course_name}}
     )
+    user_cache.invalidate()
+
+
+@router.get(
+    "/courses/{course_name}/indexes",
+    description="Get a report of the missing and unused database indexes for a course.",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Index report is returned successfully"},
+        401: {
+            "description": "User is not authorized or does not have permission to access the specified course"
+        },
+        404: {"description": "Course not found"},
+    },
+    response_model=List[IndexReport],
+)
+async def get_course_indexes(
+    course_name: str, user: dict = Depends(jwt.get_current_user)
+):
+    """Get the index report for a course."""
+    await check_course_in_db_async(course_name, [".sprints"])
+
+    # Check if user has access to the course
+    check_user_assigned_to_course(user, course_name)
+
+    return await run_in_threadpool(get_index_report, course_name)
 
 
 @router.get(
@@ -181,21 +207,27 @@ def delete_course(
     },
     response_model=List[Sprint],
 )
-def get_sprints(
-    course_name: str, user_email: str = Depends(jwt.get_current_user_email)
-):
+async def get_sprints(course_name: str, user: dict = Depends(jwt.get_current_user)):
     """Get all sprints for a course."""
-    check_course_in_db(course_name, [".sprints"])
+    await check_course_in_db_async(course_name, [".sprints"])
 
     # Check if user has access to the course
-    check_user_assigned_to_course(user_email, course_name)
-
-    coll = settings.database[course_name].sprints
-    sprints = []
-    for sprint in coll.find():
-        sprints.append(Sprint(**sprint))
+    check_user_assigned_to_course(user, course_name)
+
+    course_sprints = []
+    for sprint in await course_repo.find_sprints(course_name):
+        # The dates are stored as dates, but returned as strings.
+        course_sprints.append(
+            Sprint(
+                **{
+                    **sprint,
+                    "start_date": dates.to_iso(sprint["start_date"]),
+                    "end_date": dates.to_iso(sprint["end_date"]),
+                }
+            )
+        )
 
-    return sprints
+    return course_sprints
 
 
 @router.post(
@@ -209,38 +241,33 @@ def get_sprints(
             "description": "User is not authorized or does not have permission to access the specified course"
         },
         404: {"description": "Course not found"},
+        409: {"description": "The course is being synced"},
         422: {"description": "Invalid sprint data"},
     },
 )
-def create_sprint(
+async def create_sprint(
     course_name: str,
     sprint: Sprint,
-    user_email: str = Depends(jwt.get_current_user_email),
+    user: dict = Depends(jwt.get_current_user),
 ):
     """Create a new sprint."""
     # check if course exists
-    check_course_in_db(course_name, [".sprints"])
+    await check_course_in_db_async(course_name, [".sprints"])
 
     # Check if user has access to the course
-    check_user_assigned_to_course(user_email, course_name)
+    check_user_assigned_to_course(user, course_name)
 
     # check if sprint already exists
-    if (
-        settings.database[course_name].sprints.count_documents(
-            {"sprint_number": sprint.sprint_number}
-        )
-        != 0
-    ):
+    if await course_repo.sprint_exists(course_name, sprint.sprint_number):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Sprint {sprint.sprint_number} already exists",
         )
-    # update or insert (upsert) sprint info
-    settings.database[course_name].sprints.update_one(
-        {"sprint_number": sprint.sprint_number},
-        {"$set": jsonable_encoder(sprint)},
-        upsert=True,
-    )
+    # update or insert (upsert) sprint info, and stamp before any more commits are synced.
+    async with leases.hold_sync_lease_async(course_name):
+        await course_repo.save_sprint(course_name, sprint)
+        # Commits and meeting minutes in the new sprint's dates now belong to it.
+        await run_in_threadpool(sprints.stamp_sprint_numbers, course_name)
 
 
 @router.put(
@@ -253,39 +280,34 @@ def create_sprint(
             "description": "User is not authorized or does not have permission to access the specified course"
         },
         404: {"description": "Course or sprint does not exist"},
+        409: {"description": "The course is being synced"},
         422: {"description": "Invalid sprint data"},
     },
 )
-def update_sprint(
+async def update_sprint(
     sprint: Sprint,
     course_name: str,
-    user_email: str = Depends(jwt.get_current_user_email),
+    user: dict = Depends(jwt.get_current_user),
 ):
     """Update a course."""
     # Check if course exists
-    check_course_in_db(course_name, [".sprints"])
+    await check_course_in_db_async(course_name, [".sprints"])
 
     # Check if user has access to the course
-    check_user_assigned_to_course(user_email, course_name)
+    check_user_assigned_to_course(user, course_name)
 
     # Check if sprint exists
-    if (
-        settings.database[course_name].sprints.count_documents(
-            {"sprint_number": sprint.sprint_number}
-        )
-        == 0
-    ):
+    if not await course_repo.sprint_exists(course_name, sprint.sprint_number):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Sprint {sprint.sprint_number} does not exist",
         )
 
     # Update course
-    settings.database[course_name].sprints.update_one(
-        {"sprint_number": sprint.sprint_number},
-        {"$set": jsonable_encoder(sprint)},
-        upsert=True,
-    )
+    async with leases.hold_sync_lease_async(course_name):
+        await course_repo.save_sprint(course_name, sprint)
+        # The sprint's dates may have changed.
+        await run_in_threadpool(sprints.stamp_sprint_numbers, course_name)
 
 
 @router.delete(
@@ -298,31 +320,31 @@ def update_sprint(
             "description": "User is not authorized or does not have permission to access the specified course"
         },
         404: {"description": "Course not found"},
+        409: {"description": "The course is being synced"},
         500: {"description": "Internal server error"},
     },
 )
-def delete_sprint(
+async def delete_sprint(
     course_name: str,
     sprint_number: int,
-    user_email: str = Depends(jwt.get_current_user_email),
+    user: dict = Depends(jwt.get_current_user),
 ):
     """Delete a sprint and corresponding student data. Keep an eye on this to ensure all loose ends are tied up."""
     # Check if course exists.
-    check_course_in_db(course_name, [".sprints"])
+    await check_course_in_db_async(course_name, [".sprints"])
 
     # Check if user has access to the course
-    check_user_assigned_to_course(user_email, course_name)
+    check_user_assigned_to_course(user, course_name)
 
     # Now remove sprint from sprints collection.
-    res = settings.database[course_name].sprints.delete_one(
-        {"sprint_number": sprint_number}
-    )
-    if res.deleted_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Sprint not found",
-        )
-    # Remove student data for the deleted sprint.
-    settings.database[course_name].students.sprints.delete_many(
-        {"sprint": sprint_number}
-    )
+    async with leases.hold_sync_lease_async(course_name):
+        if not await course_repo.delete_sprint(course_name, sprint_number):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Sprint not found",
+            )
+        # Remove student data for the deleted sprint.
+        await sprint_data_repo.delete_sprint_data(course_name, sprint_number)
+        # Commits and meeting minutes of the deleted sprint go back to sprint 0, or to an
+        # overlapping sprint.
+        await run_in_threadpool(sprints.stamp_sprint_numbers, course_name)
@@ -4,15 +4,21 @@ import io
 import pandas as pd
 from fastapi import APIRouter, Depends, status
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from server.config import settings
+from server.models.jobs import Job
 from server.models.students import Student, StudentSprintData
-from server.util import jwt
-from server.util.common import check_course_in_db, get_sprint_list
+from server.repositories import sprint_data as sprint_data_repo
+from server.repositories import students as student_repo
+from server.util import jobs, jwt
+from server.util.common import check_course_in_db_async, get_sprint_list
 from server.util.dataexport import roster_data_to_df, sprint_data_to_df
 
 router = APIRouter()
 
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
 
 @router.get(
     "/export/all/{course_name}",
@@ -25,24 +31,46 @@ router = APIRouter()
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def export_all_data(course_name: str):
+async def export_all_data(course_name: str):
     """
     Export all data for a course.
     Response will be an xlsx where roster and each sprint are on separate sheets.
     """
-    check_course_in_db(course_name, [".students", ".students.sprints"])
+    await check_course_in_db_async(course_name, [".students", ".students.sprints"])
+
+    # build response, on the thread pool since writing the sheets takes a while
+    content = await run_in_threadpool(get_all_data_xlsx, course_name)
+    response = StreamingResponse(io.BytesIO(content), media_type=XLSX_MEDIA_TYPE)
+    response.headers[
+        "Content-Disposition"
+    ] = f"attachment; filename={course_name}_all.xlsx"
+    response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
+
+    return response
+
+
+def to_csv(data_df: pd.DataFrame) -> str:
+    """Convert a dataframe to csv."""
+    file_stream = io.StringIO()
+    data_df.to_csv(file_stream, index=False)
+    return file_stream.getvalue()
+
+
+def get_all_data_xlsx(course_name: str, report_progress=None) -> bytes:
+    """
+    Get an xlsx of all data for a course, with the roster and each sprint on separate sheets.
+    report_progress is called with the sheets written so far after each sheet.
+    """
     # get data from db
     sprint_list = get_sprint_list(course_name)
-    spr_coll = settings.database[course_name].students.sprints
-    student_docs = list(settings.database[course_name].students.find())
-    # create team map
-    student_team_map = {}
-    for student in student_docs:
-        student_team_map[student["email"]] = student["project"]
     # create Student list
     students = []
-    for student in student_docs:
+    for student in settings.database[course_name].students.find(
+        {}, student_repo.STUDENT_FIELDS
+    ):
         students.append(Student(**student))
+    # create team map from the roster
+    student_team_map = {student.email: student.project for student in students}
 
     # create excel writer
     file_stream = io.BytesIO()
@@ -51,33 +79,57 @@ def export_all_data(course_name: str):
     # create roster sheet
     data_df = roster_data_to_df(students)
     data_df.to_excel(writer, sheet_name="Roster", index=False)
+    if report_progress is not None:
+        report_progress({"sheets": 1, "total": len(sprint_list) + 1})
 
     # create a sheet for each sprint
-    for sprint in sprint_list:
+    for i, sprint in enumerate(sprint_list, start=2):
         # get all student sprint data for a given sprint into a list
-        sprint_docs = spr_coll.find({"sprint": sprint})
         sprints = []
-        for sprint_doc in sprint_docs:
+        for sprint_doc in settings.database[course_name].students.sprints.find(
+            {"sprint": sprint}, sprint_data_repo.SPRINT_DATA_FIELDS
+        ):
             sprints.append(StudentSprintData(**sprint_doc))
 
         # convert to dataframe
         data_df = sprint_data_to_df(sprints, student_team_map)
         data_df.to_excel(writer, sheet_name=f"Sprint {sprint}", index=False)
+        if report_progress is not None:
+            report_progress({"sheets": i, "total": len(sprint_list) + 1})
 
     # save excel file
     writer.close()
+    return file_stream.getvalue()
 
-    # build response
-    response = StreamingResponse(
-        io.BytesIO(file_stream.getvalue()),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+
+@router.post(
+    "/export/all/{course_name}/jobs",
+    description="Export all data for a course in the background. Once the job succeeds, the multi-sheet excel file is downloaded from /jobs/{id}/file.",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=Job,
+    responses={
+        202: {"description": "The export job was queued"},
+        404: {"description": "Course not found"},
+    },
+    dependencies=[Depends(jwt.get_current_user_email)],
+)
+async def submit_export_all_data(course_name: str):
+    """Queue a job that exports all data for a course."""
+    await check_course_in_db_async(course_name, [".students", ".students.sprints"])
+    return await run_in_threadpool(
+        jobs.submit, "export.all", course_name, {"course_name": course_name}
     )
-    response.headers[
-        "Content-Disposition"
-    ] = f"attachment; filename={course_name}_all.xlsx"
-    response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
 
-    return response
+
+@jobs.handler("export.all")
+def run_export_all_data(job: dict, report_progress) -> jobs.JobFile:
+    """Export all data for a course, reporting the sheets written so far."""
+    course_name = job["params"]["course_name"]
+    return jobs.JobFile(
+        name=f"{course_name}_all.xlsx",
+        media_type=XLSX_MEDIA_TYPE,
+        content=get_all_data_xlsx(course_name, report_progress),
+    )
 
 
 @router.get(
@@ -91,23 +143,20 @@ def export_all_data(course_name: str):
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def export_roster_data(course_name: str):
+async def export_roster_data(course_name: str):
     """Export roster data for a course."""
-    check_course_in_db(course_name, [".students"])
+    await check_course_in_db_async(course_name, [".students"])
 
     # get all student data into a list
-    coll = settings.database[course_name].students
     students = []
-    for student in coll.find():
+    for student in await student_repo.find_students(course_name):
         students.append(Student(**student))
 
     # convert to csv
-    csv_df = roster_data_to_df(students)
-    file_stream = io.StringIO()
-    csv_df.to_csv(file_stream, index=False)
+    csv = await run_in_threadpool(lambda: to_csv(roster_data_to_df(students)))
 
     # build response
-    response = StreamingResponse(iter([file_stream.getvalue()]), media_type="text/csv")
+    response = StreamingResponse(iter([csv]), media_type="text/csv")
     response.headers[
         "Content-Disposition"
     ] = f"attachment; filename={course_name}_roster.csv"
@@ -128,33 +177,30 @@ def export_roster_data(course_name: str):
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def export_sprint_data(course_name: str, sprint: int):
+async def export_sprint_data(course_name: str, sprint: int):
     """
     Export sprint data for a course.
     This route does not support sprint=0 since exporting all sprints
     into a single file would be messy.
     """
-    check_course_in_db(course_name, [".students", ".students.sprints"])
+    await check_course_in_db_async(course_name, [".students", ".students.sprints"])
 
     # get all student sprint data for a given sprint into a list
-    spr_coll = settings.database[course_name].students.sprints
-    stu_coll = settings.database[course_name].students
-    sprint_docs = spr_coll.find({"sprint": sprint})
-    student_docs = stu_coll.find()
     sprints = []
-    for sprint_doc in sprint_docs:
-        sprints.append(StudentSprintData(**sprint_doc))
-    student_team_map = {}
-    for student in student_docs:
-        student_team_map[student["email"]] = student["project"]
+    # sprint 0 isn't an existing sprint, rather than every sprint
+    if sprint != 0:
+        for sprint_doc in await sprint_data_repo.find_sprint_data(course_name, sprint):
+            sprints.append(StudentSprintData(**sprint_doc))
+    # only the email and team of each student are needed
+    student_team_map = await student_repo.get_team_map(course_name)
 
     # convert to csv
-    csv_df = sprint_data_to_df(sprints, student_team_map)
-    file_stream = io.StringIO()
-    csv_df.to_csv(file_stream, index=False)
+    csv = await run_in_threadpool(
+        lambda: to_csv(sprint_data_to_df(sprints, student_team_map))
+    )
 
     # build response
-    response = StreamingResponse(iter([file_stream.getvalue()]), media_type="text/csv")
+    response = StreamingResponse(iter([csv]), media_type="text/csv")
     response.headers[
         "Content-Disposition"
     ] = f"attachment; filename={course_name}_sprint_{sprint}.csv"
@@ -2,9 +2,9 @@
 
 from fastapi import APIRouter, Depends, status
 
-from server.config import settings
+from server.repositories import courses as course_repo
 from server.util import jwt
-from server.util.common import check_course_in_db
+from server.util.common import check_course_in_db_async
 
 router = APIRouter()
 
@@ -16,13 +16,10 @@ router = APIRouter()
     responses={200: {"description": "form is returned successfully"}},
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_forms(course_name: str, sprint: int):
+async def get_forms(course_name: str, sprint: int):
     """Get form"""
-    check_course_in_db(course_name, [".sprints"])
+    await check_course_in_db_async(course_name, [".sprints"])
     link = None
     if sprint > 0:
-        coll = settings.database[course_name].sprints.find_one(
-            {"sprint_number": sprint}
-        )
-        link = coll["forms_url"]
+        link = await course_repo.get_forms_url(course_name, sprint)
     return link
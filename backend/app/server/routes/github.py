@@ -1,12 +1,31 @@
 """FastAPI routes for the capstone dashboard backend."""
-from typing import List
+import asyncio
+import json
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
 
 from server.config import settings
-from server.models.github import GithubRequest, StudentCommit, TeamCommit, TeamCommits
-from server.util import github, jwt
-from server.util.common import check_course_in_db
+from server.models.github import (
+    CourseSyncRequest,
+    GithubRequest,
+    RateLimitStatus,
+    RepoSyncResult,
+    SprintCommit,
+    StudentCommit,
+    TeamCommit,
+    TeamCommits,
+    TeamSprintCommits,
+    WebhookResult,
+)
+from server.models.jobs import Job
+from server.repositories import commits as commit_repo
+from server.repositories import courses as course_repo
+from server.repositories import students as student_repo
+from server.util import dates, github, jobs, jwt, leases, rollups, sprints, webhooks
+from server.util.common import check_course_in_db_async
+from server.util.ratelimit import rate_limiter
 
 router = APIRouter()
 
@@ -19,33 +38,15 @@ router = APIRouter()
     response_model=StudentCommit,
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_student_github_commits(course_name: str, sprint: int, username: str):
+async def get_student_github_commits(course_name: str, sprint: int, username: str):
     """Get the commits for a specific repository."""
-    check_course_in_db(course_name, [".sprints", ".github.commits"])
-
-    students_data = settings.database[course_name].github.commits
-    if sprint == 0:
-        # Get all commits for a student.
-        student_commits = students_data.count_documents({"author": username})
-    else:
-        # Get commits for a student for a specific sprint.
-        sprint_dates = settings.database[course_name].sprints.find_one(
-            {"sprint_number": sprint}
-        )
-        if sprint_dates is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Sprint {sprint} does not exist",
-            )
-        student_commits = students_data.count_documents(
-            {
-                "$and": [
-                    {"timestamp": {"$lt": sprint_dates["end_date"]}},
-                    {"timestamp": {"$gt": sprint_dates["start_date"]}},
-                    {"author": username},
-                ]
-            }
-        )
+    await check_course_in_db_async(course_name, [".sprints", ".github.commits"])
+
+    sprint_match = await sprints.get_sprint_match(course_name, sprint)
+    commit_counts = await rollups.count_commits(
+        course_name, "author", {"author": username, **sprint_match}
+    )
+    student_commits = sum(commit_counts.get(username, {}).values())
 
     return StudentCommit(username=username, number_of_commits=student_commits)
 
@@ -61,75 +62,35 @@ def get_student_github_commits(course_name: str, sprint: int, username: str):
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_team_github_commits(course_name: str, repo: str, sprint: int):
+async def get_team_github_commits(course_name: str, repo: str, sprint: int):
     """Get the commits for a specific repository."""
-    check_course_in_db(course_name, [".sprints", ".github.commits", ".students"])
-
-    team_data = settings.database[course_name].github.commits
-    authors = set()
-    authors.update(
-        settings.database[course_name].students.distinct(
-            "source_control_username", {"repo_name": repo}
-        )
-    )
-    # We don't technically need to add the authors from the github.commits collection,
-    # but since we don't have real importable user data associated with GitHub commits, we'll
-    # just add them here to make sure we get all the authors.
-    authors.update(
-        settings.database[course_name].github.commits.distinct(
-            "author", {"repo_name": repo}
-        )
+    await check_course_in_db_async(
+        course_name, [".sprints", ".github.commits", ".students"]
     )
-    student_commits = []
 
-    if sprint == 0:
-        # Get all commits for a team.
-        for author in authors:
-            count = team_data.count_documents(
-                {"$and": [{"author": author}, {"repo_name": repo}]}
-            )
-            student_commits.append(
-                StudentCommit(username=author, number_of_commits=count)
-            )
-    else:
-        # Get commits for a team for a specific sprint.
-        sprint_dates = settings.database[course_name].sprints.find_one(
-            {"sprint_number": sprint}
-        )
-        if sprint_dates is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Sprint {sprint} does not exist",
-            )
-        for author in authors:
-            count = team_data.count_documents(
-                {
-                    "$and": [
-                        {"timestamp": {"$lt": sprint_dates["end_date"]}},
-                        {"timestamp": {"$gt": sprint_dates["start_date"]}},
-                        {"author": author},
-                        {"repo_name": repo},
-                    ]
-                }
-            )
-            student_commits.append(
-                StudentCommit(username=author, number_of_commits=count)
+    # Count every author's commits at once.
+    sprint_match = await sprints.get_sprint_match(course_name, sprint)
+    commit_counts = {
+        author: sum(counts.values())
+        for author, counts in (
+            await rollups.count_commits(
+                course_name, "author", {"repo_name": repo, **sprint_match}
             )
+        ).items()
+    }
+
+    # Students on the roster that have not made any commits still need to be returned.
+    for author in await student_repo.get_usernames(course_name, repo):
+        commit_counts.setdefault(author, 0)
+
+    student_commits = [
+        StudentCommit(username=author, number_of_commits=count)
+        for author, count in sorted(commit_counts.items())
+    ]
 
     # Return the date that the team's commits were last updated. (Sprint is irrelevant here)
-    # Note: aggregate returns a cursor.
-    last_fetched_at_cur = settings.database[course_name].github.commits.aggregate(
-        [
-            {"$match": {"repo_name": repo}},
-            {"$sort": {"fetched_at": -1}},
-            {"$limit": 1},
-        ]
-    )
-    # We are guaranteed to only have one item due to limit being 1.
-    try:
-        last_fetched_at = next(last_fetched_at_cur)["fetched_at"]
-    except StopIteration:
-        last_fetched_at = None
+    fetched_at = await commit_repo.get_last_fetched_at(course_name, repo)
+    last_fetched_at = dates.to_iso(fetched_at) if fetched_at else None
     return TeamCommits(student_commits=student_commits, last_fetched_at=last_fetched_at)
 
 
@@ -144,49 +105,84 @@ def get_team_github_commits(course_name: str, repo: str, sprint: int):
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_teams_github_commits(course_name: str, sprint: int):
+async def get_teams_github_commits(course_name: str, sprint: int):
     """Get each team's number of commits."""
-    check_course_in_db(course_name, [".sprints", ".github.commits", ".students"])
-
-    repos = set()
-    repos.update(settings.database[course_name].students.distinct("repo_name"))
-    # We don't technically need to add the teams from the github.commits collection,
-    # but since we don't have real importable team data associated with GitHub commits, we'll
-    # just add them here to make sure we get all the teams.
-    repos.update(settings.database[course_name].github.commits.distinct("repo_name"))
-    team_commits = []
-
-    if sprint == 0:
-        # Get all commits for a team.
-        for repo in repos:
-            count = settings.database[course_name].github.commits.count_documents(
-                {"$and": [{"repo_name": repo}]}
-            )
-            team_commits.append(TeamCommit(team_name=repo, number_of_commits=count))
-    else:
-        # Get commits for a team for a specific sprint.
-        sprint_dates = settings.database[course_name].sprints.find_one(
-            {"sprint_number": sprint}
+    await check_course_in_db_async(
+        course_name, [".sprints", ".github.commits", ".students"]
+    )
+
+    # Count the commits of every team at once.
+    sprint_match = await sprints.get_sprint_match(course_name, sprint)
+    commit_counts = {
+        repo: sum(counts.values())
+        for repo, counts in (
+            await rollups.count_commits(course_name, "repo_name", sprint_match)
+        ).items()
+    }
+
+    # Teams on the roster that have not made any commits still need to be returned.
+    for repo in await student_repo.get_repos(course_name):
+        commit_counts.setdefault(repo, 0)
+
+    return [
+        TeamCommit(team_name=repo, number_of_commits=count)
+        for repo, count in sorted(commit_counts.items())
+    ]
+
+
+@router.get(
+    "/class/{course_name}/commits",
+    description="Get the number of commits each team has made in every sprint of a course, along with each team's total number of commits.",
+    response_model=List[TeamSprintCommits],
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {"description": "Course not found"},
+        500: {"description": "Internal server error"},
+    },
+    dependencies=[Depends(jwt.get_current_user_email)],
+)
+async def get_teams_sprint_github_commits(course_name: str):
+    """Get each team's number of commits for every sprint."""
+    await check_course_in_db_async(
+        course_name, [".sprints", ".github.commits", ".students"]
+    )
+
+    sprint_numbers = await course_repo.get_sprint_numbers(course_name)
+
+    # Commits that don't fall inside any sprint are counted in sprint 0, so that they are
+    # still included in the team's total.
+    team_counts = await rollups.count_commits(course_name, "repo_name", {})
+    # Teams on the roster that have not made any commits still need to be returned.
+    for repo in await student_repo.get_repos(course_name):
+        team_counts.setdefault(repo, {})
+
+    return [
+        TeamSprintCommits(
+            team_name=repo,
+            total_commits=sum(counts.values()),
+            sprint_commits=[
+                SprintCommit(
+                    sprint_number=sprint_number,
+                    number_of_commits=counts.get(sprint_number, 0),
+                )
+                for sprint_number in sprint_numbers
+            ],
         )
-        if sprint_dates is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Sprint {sprint} does not exist",
-            )
+        for repo, counts in sorted(team_counts.items())
+    ]
 
-        for repo in repos:
-            count = settings.database[course_name].github.commits.count_documents(
-                {
-                    "$and": [
-                        {"timestamp": {"$lt": sprint_dates["end_date"]}},
-                        {"timestamp": {"$gt": sprint_dates["start_date"]}},
-                        {"repo_name": repo},
-                    ]
-                }
-            )
-            team_commits.append(TeamCommit(team_name=repo, number_of_commits=count))
 
-    return team_commits
+@router.get(
+    "/github/rate_limit",
+    description="Get the remaining GitHub API budget. Values are unknown until a request has been made to GitHub.",
+    status_code=status.HTTP_200_OK,
+    response_model=RateLimitStatus,
+    responses={401: {"description": "User is not authorized"}},
+    dependencies=[Depends(jwt.get_current_user_email)],
+)
+async def get_github_rate_limit():
+    """Get the remaining GitHub API budget."""
+    return rate_limiter.get_status()
 
 
 @router.post(
@@ -199,13 +195,134 @@ def get_teams_github_commits(course_name: str, sprint: int):
         401: {"description": "User is not authorized"},
         404: {"description": "Not found"},
         409: {"description": "Conflict error"},
+        429: {"description": "GitHub rate limit exceeded"},
         500: {"description": "Internal server error"},
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def fetch_and_store_github_commits(request: GithubRequest):
+async def fetch_and_store_github_commits(request: GithubRequest):
     """Fetch and store the GitHub commits."""
-    new_commits = github.get_new_commits(
-        request.owner, request.repo, request.course_name
+    async with leases.hold_sync_lease_async(request.course_name):
+        await run_in_threadpool(
+            github.sync_commits, request.owner, request.repo, request.course_name
+        )
+
+
+@router.post(
+    "/github/webhook",
+    description="Receive a webhook delivery from the GitHub App. The commits of pushes to the default branch of a team repository are stored in every course with that repository. Deliveries are signed with GITHUB_WEBHOOK_SECRET, and a redelivered delivery is only processed once.",
+    status_code=status.HTTP_200_OK,
+    response_model=WebhookResult,
+    responses={
+        200: {"description": "The delivery was processed, or ignored"},
+        400: {"description": "The delivery is not valid JSON"},
+        401: {"description": "The signature of the delivery is invalid"},
+        409: {"description": "A course with the repository is being synced"},
+        503: {"description": "GitHub webhooks are not configured"},
+    },
+)
+async def receive_github_webhook(
+    request: Request,
+    x_github_event: str = Header(...),
+    x_github_delivery: str = Header(...),
+    x_hub_signature_256: Optional[str] = Header(None),
+):
+    """Store the commits pushed to a team repository."""
+    body = await request.body()
+    webhooks.verify_signature(body, x_hub_signature_256)
+    try:
+        payload = json.loads(body)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The delivery is not valid JSON",
+        ) from exc
+    return await run_in_threadpool(
+        webhooks.handle_delivery, x_github_delivery, x_github_event, payload
+    )
+
+
+@router.post(
+    "/github/{course_name}/rollups",
+    description="Rebuild the daily commit rollups of a course from its stored commits. Commit counts are summed from the rollups, which are otherwise kept up to date as commits are stored.",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        204: {"description": "The rollups were rebuilt successfully"},
+        401: {"description": "User is not authorized"},
+        404: {"description": "Course not found"},
+        409: {"description": "The course is being synced"},
+    },
+    dependencies=[Depends(jwt.get_current_user_email)],
+)
+async def rebuild_github_commit_rollups(course_name: str):
+    """Rebuild the daily commit rollups of a course."""
+    await check_course_in_db_async(course_name, [".github.commits"])
+    async with leases.hold_sync_lease_async(course_name):
+        await run_in_threadpool(rollups.rebuild_commit_rollups, course_name)
+
+
+@router.post(
+    "/github/{course_name}/sync",
+    description="Fetch and store GitHub commits for every team repository in a course. Repositories are fetched concurrently, and a failure in one repository does not stop the others.",
+    status_code=status.HTTP_200_OK,
+    response_model=List[RepoSyncResult],
+    responses={
+        200: {"description": "The sync results of each repository"},
+        401: {"description": "User is not authorized"},
+        404: {"description": "Course not found"},
+        409: {"description": "The course is already being synced"},
+        500: {"description": "Internal server error"},
+    },
+    dependencies=[Depends(jwt.get_current_user_email)],
+)
+async def sync_course_github_commits(course_name: str, request: CourseSyncRequest):
+    """Fetch and store the GitHub commits for all repositories in a course."""
+    await check_course_in_db_async(course_name, [".students", ".github.commits"])
+    return await github.sync_course(
+        request.owner,
+        course_name,
+        request.concurrency or settings.GITHUB_SYNC_CONCURRENCY,
+    )
+
+
+@router.post(
+    "/github/{course_name}/sync/jobs",
+    description="Sync the GitHub commits of every team repository in a course in the background. The returned job reports the number of repositories synced so far, and its result has the sync results of each repository.",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=Job,
+    responses={
+        202: {"description": "The sync job was queued"},
+        401: {"description": "User is not authorized"},
+        404: {"description": "Course not found"},
+    },
+    dependencies=[Depends(jwt.get_current_user_email)],
+)
+async def submit_course_github_sync(course_name: str, request: CourseSyncRequest):
+    """Queue a job that syncs the GitHub commits of a course."""
+    await check_course_in_db_async(course_name, [".students", ".github.commits"])
+    return await run_in_threadpool(
+        jobs.submit,
+        "github.sync",
+        course_name,
+        {
+            "course_name": course_name,
+            "owner": request.owner,
+            "concurrency": request.concurrency or settings.GITHUB_SYNC_CONCURRENCY,
+        },
+    )
+
+
+@jobs.handler("github.sync")
+def run_course_github_sync(job: dict, report_progress) -> List[RepoSyncResult]:
+    """Sync the GitHub commits of a course, reporting the repositories synced so far."""
+    params = job["params"]
+    return asyncio.run(
+        github.sync_course(
+            params["owner"],
+            params["course_name"],
+            params["concurrency"],
+            lambda synced, repos: report_progress(
+                {"repos_synced": synced, "repos": repos}
+            ),
+        )
     )
-    github.store_commits(new_commits, request.repo, request.course_name)
@@ -0,0 +1,59 @@
+"""FastAPI routes for background jobs."""
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+
+from server.models.jobs import Job
+from server.util import jobs, jwt
+from server.util.common import check_user_assigned_to_course
+
+router = APIRouter()
+
+
+@router.get(
+    "/jobs/{job_id}",
+    description="Get the status, progress and result of a background job. Finished jobs expire after a day.",
+    status_code=status.HTTP_200_OK,
+    response_model=Job,
+    responses={
+        200: {"description": "The job is returned"},
+        401: {
+            "description": "User is not authorized or is not assigned to the course of the job"
+        },
+        404: {"description": "Job not found"},
+    },
+)
+async def get_job(job_id: str, user: dict = Depends(jwt.get_current_user)):
+    """Get a background job."""
+    job = await jobs.get_job(job_id, {"input_file": 0, "file.content": 0})
+    check_user_assigned_to_course(user, job.get("course_name"))
+    return jobs.get_job_response(job)
+
+
+@router.get(
+    "/jobs/{job_id}/file",
+    description="Download the file produced by a background job.",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "The file is returned"},
+        401: {
+            "description": "User is not authorized or is not assigned to the course of the job"
+        },
+        404: {"description": "Job not found, or it has not produced a file"},
+    },
+)
+async def get_job_file(job_id: str, user: dict = Depends(jwt.get_current_user)):
+    """Download the file produced by a background job."""
+    job = await jobs.get_job(job_id, {"file": 1, "course_name": 1})
+    check_user_assigned_to_course(user, job.get("course_name"))
+    if not job.get("file"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} has not produced a file",
+        )
+    return Response(
+        content=bytes(job["file"]["content"]),
+        media_type=job["file"]["media_type"],
+        headers={
+            "Content-Disposition": f"attachment; filename={job['file']['name']}",
+            "Access-Control-Expose-Headers": "Content-Disposition",
+        },
+    )
@@ -5,12 +5,15 @@ from typing import List
 from bs4 import BeautifulSoup
 from dateparser.date import DateDataParser
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
 
 from server.config import settings
+from server.models.jobs import Job
 from server.models.minutes import Minute, MinuteRequest
-from server.util import jwt, requests
-from server.util.common import check_course_in_db
+from server.repositories import minutes as minute_repo
+from server.util import jobs, jwt, requests, sprints
+from server.util.common import check_course_in_db, check_course_in_db_async
+from server.util.dates import to_datetime
 
 router = APIRouter()
 
@@ -27,33 +30,14 @@ router = APIRouter()
     response_model=List[Minute],
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_meeting_minutes(course: str, team: str, sprint: int):
+async def get_meeting_minutes(course: str, team: str, sprint: int):
     """Get all meeting minutes for a team."""
-    check_course_in_db(course, [".minutes"])
+    await check_course_in_db_async(course, [".minutes"])
 
-    if sprint == 0:
-        # Get all meeting minutes for a team.
-        minutes_cur = settings.database[course].minutes.find({"team": team})
-    else:
-        # First check if sprint exists.
-        sprint_dates = settings.database[course].sprints.find_one(
-            {"sprint_number": sprint}
-        )
-        if sprint_dates is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Sprint {sprint} does not exist in course {course}",
-            )
-
-        minutes_cur = settings.database[course].minutes.find(
-            {
-                "$and": [
-                    {"timestamp": {"$lt": sprint_dates["end_date"]}},
-                    {"timestamp": {"$gt": sprint_dates["start_date"]}},
-                    {"team": team},
-                ]
-            }
-        )
+    # Minutes are stamped with their sprint when they are stored.
+    minutes_cur = await minute_repo.find_minutes(
+        course, team, await sprints.get_sprint_match(course, sprint)
+    )
 
     minutes = []
     for minute in minutes_cur:
@@ -76,7 +60,13 @@ def get_meeting_minutes(course: str, team: str, sprint: int):
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def fetch_and_store_meeting_minutes(course: str, owner: str, team: str):
+async def fetch_and_store_meeting_minutes(course: str, owner: str, team: str):
+    """Fetch meeting minutes from the MKDocs page and store them into the database."""
+    # Fetching and parsing the page blocks, so it is run on the thread pool.
+    await run_in_threadpool(store_meeting_minutes, course, owner, team)
+
+
+def store_meeting_minutes(course: str, owner: str, team: str):
     """Fetch meeting minutes from the MKDocs page and store them into the database."""
     minutes_url = f"https://{owner}.github.io/{team}/meeting_minutes/"
 
@@ -115,6 +105,7 @@ def fetch_and_store_meeting_minutes(course: str, owner: str, team: str):
 
     # Fuzzy parse the dates since they may not be in a standard format.
     ddp = DateDataParser(languages=["en"])
+    course_sprints = sprints.get_sprints(course)
     batch_insert = []
     for i, date in enumerate(dates):
         date_data = ddp.get_date_data(date).date_obj
@@ -123,15 +114,15 @@ def fetch_and_store_meeting_minutes(course: str, owner: str, team: str):
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Unable to parse date {date}",
             )
+        timestamp = to_datetime(date_data)
         batch_insert.append(
-            jsonable_encoder(
-                MinuteRequest(
-                    title=date,
-                    body=entries[i],
-                    team=team,
-                    timestamp=date_data.isoformat(),
-                )
-            )
+            MinuteRequest(
+                title=date,
+                body=entries[i],
+                team=team,
+                timestamp=timestamp,
+                sprint_number=sprints.get_sprint_number(course_sprints, timestamp),
+            ).dict()
         )
 
     # Replace all information in case changes were made.
@@ -139,3 +130,31 @@ def fetch_and_store_meeting_minutes(course: str, owner: str, team: str):
 
     # Insert all at once.
     settings.database[course].minutes.insert_many(batch_insert)
+
+
+@router.post(
+    "/minutes/{course}/{owner}/{team}/jobs",
+    description="Fetch and store a team's meeting minutes from MKDocs in the background",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=Job,
+    responses={
+        202: {"description": "The fetch job was queued"},
+        404: {"description": "Not found"},
+    },
+    dependencies=[Depends(jwt.get_current_user_email)],
+)
+async def submit_meeting_minutes_fetch(course: str, owner: str, team: str):
+    """Queue a job that fetches and stores a team's meeting minutes."""
+    await check_course_in_db_async(course, [".minutes"])
+    return await run_in_threadpool(
+        jobs.submit,
+        "minutes.fetch",
+        course,
+        {"course": course, "owner": owner, "team": team},
+    )
+
+
+@jobs.handler("minutes.fetch")
+def run_meeting_minutes_fetch(job: dict, _report_progress):
+    """Fetch and store a team's meeting minutes."""
+    store_meeting_minutes(**job["params"])
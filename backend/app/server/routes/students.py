@@ -1,12 +1,22 @@
 """Fastapi routes for students"""
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
-from fastapi.encoders import jsonable_encoder
-from pymongo import UpdateOne
+import io
 
-from server.config import settings
-from server.models.students import Student, StudentSprintData, StudentsResponse
-from server.util import jwt
-from server.util.common import check_course_in_db
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from server.models.jobs import Job
+from server.models.students import (
+    Student,
+    StudentSprintData,
+    StudentsResponse,
+    UploadProgress,
+)
+from server.repositories import courses as course_repo
+from server.repositories import sprint_data as sprint_data_repo
+from server.repositories import students as student_repo
+from server.util import jobs, jwt, uploads
+from server.util.common import check_course_in_db_async
 from server.util.students import parse_roster_data, parse_sprint_data
 
 router = APIRouter()
@@ -24,36 +34,30 @@ router = APIRouter()
     response_model=StudentsResponse,
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_students_in_course_sprint(course_name: str, sprint: int):
+async def get_students_in_course_sprint(course_name: str, sprint: int):
     """get students from a given course and sprint
 
     course_name and sprint are url parameters
 
     """
 
-    check_course_in_db(course_name, [".students.sprints", ".students"])
+    await check_course_in_db_async(course_name, [".students.sprints", ".students"])
 
     # query collections
-    students_data = settings.database[course_name].students.find({})
+    students_sprint_data = await sprint_data_repo.find_sprint_data(course_name, sprint)
     if sprint == 0:
-        students_sprint_data = settings.database[course_name].students.sprints.find({})
+        students_data = await student_repo.find_students(course_name)
     else:
-        students_sprint_data = settings.database[course_name].students.sprints.find(
-            {"sprint": sprint}
+        # only students with sprint data are returned when sprint is specified
+        students_data = await student_repo.find_students(
+            course_name,
+            list({sprint_data["email"] for sprint_data in students_sprint_data}),
         )
     # create response from doc data
-    student_list = []
-    student_email_collection = set()
-    sprint_data_list = []
-    for sprint_data in students_sprint_data:
-        sprint_data_list.append(StudentSprintData(**sprint_data))
-        student_email_collection.add(sprint_data["email"])
-    for student in students_data:
-        # prevent students with no sprint data from being added to the list when sprint is specified
-        if sprint != 0 and student["email"] in student_email_collection:
-            student_list.append(Student(**student))
-        elif sprint == 0:
-            student_list.append(Student(**student))
+    student_list = [Student(**student) for student in students_data]
+    sprint_data_list = [
+        StudentSprintData(**sprint_data) for sprint_data in students_sprint_data
+    ]
     return StudentsResponse(students=student_list, sprint_data=sprint_data_list)
 
 
@@ -69,31 +73,26 @@ def get_students_in_course_sprint(course_name: str, sprint: int):
     response_model=StudentsResponse,
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def get_student_in_course_sprint(course_name: str, sprint: int, student_email: str):
+async def get_student_in_course_sprint(
+    course_name: str, sprint: int, student_email: str
+):
     """get a student from a given course and sprint and email
 
     course_name, sprint, student_email are url parameters
 
     """
 
-    check_course_in_db(course_name, [".students.sprints", ".students"])
+    await check_course_in_db_async(course_name, [".students.sprints", ".students"])
 
     # query collections
-    student_data = settings.database[course_name].students.find_one(
-        {"email": student_email}
-    )
+    student_data = await student_repo.find_student(course_name, student_email)
     if student_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Student not found"
         )
-    if sprint == 0:
-        student_sprints_data = settings.database[course_name].students.sprints.find(
-            {"email": student_email}
-        )
-    else:
-        student_sprints_data = settings.database[course_name].students.sprints.find(
-            {"sprint": sprint, "email": student_email}
-        )
+    student_sprints_data = await sprint_data_repo.find_sprint_data(
+        course_name, sprint, student_email
+    )
     # create response from doc data
     student_data = Student(**student_data)
     sprint_data_list = []
@@ -104,67 +103,142 @@ def get_student_in_course_sprint(course_name: str, sprint: int, student_email: s
 
 @router.post(
     "/students/{course_name}/{sprint}",
-    description="Post student data to a course, roster data must be sent with sprint 0 whereas sprint data must be sent with a sprint number greater than 0",
+    description="Post student data to a course, roster data must be sent with sprint 0 whereas sprint data must be sent with a sprint number greater than 0. With stream, the file is written in chunks of chunk_size rows and the progress of each chunk is streamed back as it is written",
     status_code=status.HTTP_204_NO_CONTENT,
     responses={
+        200: {
+            "description": "Progress of each chunk written, as a line of JSON, when streamed",
+            "model": UploadProgress,
+        },
         204: {"description": "Student roster data is posted to course"},
-        400: {"description": "Invalid sprint number"},
+        400: {
+            "description": "Invalid sprint number, chunk size or missing roster columns"
+        },
         404: {"description": "Course not found"},
     },
     dependencies=[Depends(jwt.get_current_user_email)],
 )
-def post_student_data(course_name: str, sprint: int, file: UploadFile):
+async def post_student_data(
+    course_name: str,
+    sprint: int,
+    file: UploadFile,
+    stream: bool = False,
+    chunk_size: int = uploads.DEFAULT_CHUNK_SIZE,
+):
     """post student data to a course or sprint
 
     course_name and sprint is url parameter
+    with stream, the file is parsed and written chunk_size rows at a time and the progress
+    of each chunk is streamed back as a line of JSON
 
     """
     if sprint < 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Sprint must be >= 0"
         )
+    if stream and chunk_size < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Chunk size must be >= 1"
+        )
+
+    if stream:
+        # The course and the first chunk are checked before this returns, which blocks.
+        progress = await run_in_threadpool(
+            uploads.write_student_data,
+            course_name,
+            sprint,
+            file.file,
+            file.filename,
+            chunk_size,
+        )
+        return StreamingResponse(
+            (chunk.json() + "\n" for chunk in progress),
+            media_type="application/x-ndjson",
+        )
 
     if sprint == 0:  # if sprint is 0, parse roster data
-        check_course_in_db(course_name, [".students"])
+        await check_course_in_db_async(course_name, [".students"])
 
-        # parse file
-        student_list = parse_roster_data(file.file, course_name)
+        # parse file, on the thread pool since it can take a while
+        student_list = await run_in_threadpool(
+            parse_roster_data, file.file, course_name
+        )
 
         # post to database
-        coll = settings.database[course_name].students
-        # coll = settings.database.temptest.students  # for testing
-        batch_req = [
-            UpdateOne(
-                {"email": student.email},
-                {"$set": jsonable_encoder(student)},
-                upsert=True,
-            )
-            for student in student_list
-        ]
+        await student_repo.write_roster(course_name, student_list)
         # update course metadata
-        settings.database.courses.update_one(
-            {"name": course_name}, {"$set": {"roster_file_name": file.filename}}
-        )
+        await course_repo.set_roster_file_name(course_name, file.filename)
     else:  # if sprint is > 0, parse sprint data
-        check_course_in_db(course_name, [".students.sprints"])
+        await check_course_in_db_async(course_name, [".students.sprints"])
 
-        # parse file
-        sprint_data_list = parse_sprint_data(file.file, sprint)
+        # parse file, on the thread pool since it can take a while
+        sprint_data_list = await run_in_threadpool(parse_sprint_data, file.file, sprint)
 
         # post to database
-        coll = settings.database[course_name].students.sprints
-        # coll = settings.database.temptest.students.sprints  # for testing
-        batch_req = [
-            UpdateOne(
-                {"email": sprint_data.email, "sprint": sprint_data.sprint},
-                {"$set": jsonable_encoder(sprint_data)},
-                upsert=True,
-            )
-            for sprint_data in sprint_data_list
-        ]
+        await sprint_data_repo.write_sprint_data(course_name, sprint_data_list)
         # update course sprint metadata
-        settings.database[course_name].sprints.update_one(
-            {"sprint": sprint}, {"$set": {"sprint_file_name": file.filename}}
+        await course_repo.set_sprint_file_name(course_name, sprint, file.filename)
+
+    return None
+
+
+@router.post(
+    "/students/{course_name}/{sprint}/jobs",
+    description="Post student data to a course in the background, with the same rules as posting it directly. The file is written in chunks of chunk_size rows, and the returned job reports the progress of each chunk.",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=Job,
+    responses={
+        202: {"description": "The upload job was queued"},
+        400: {"description": "Invalid sprint number or chunk size"},
+        404: {"description": "Course not found"},
+        413: {"description": "The file is too large to process in the background"},
+    },
+    dependencies=[Depends(jwt.get_current_user_email)],
+)
+async def submit_student_data(
+    course_name: str,
+    sprint: int,
+    file: UploadFile,
+    chunk_size: int = uploads.DEFAULT_CHUNK_SIZE,
+):
+    """Queue a job that posts student data to a course or sprint."""
+    if sprint < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Sprint must be >= 0"
+        )
+    if chunk_size < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Chunk size must be >= 1"
         )
+    await check_course_in_db_async(
+        course_name, [".students"] if sprint == 0 else [".students.sprints"]
+    )
+    return await run_in_threadpool(
+        jobs.submit,
+        "students.upload",
+        course_name,
+        {
+            "course_name": course_name,
+            "sprint": sprint,
+            "file_name": file.filename,
+            "chunk_size": chunk_size,
+        },
+        input_file=await file.read(),
+    )
+
 
-    coll.bulk_write(batch_req)
+@jobs.handler("students.upload")
+def run_student_data_upload(job: dict, report_progress) -> dict:
+    """Post uploaded student data, reporting the progress of each chunk."""
+    params = job["params"]
+    total = 0
+    for progress in uploads.write_student_data(
+        params["course_name"],
+        params["sprint"],
+        io.BytesIO(job["input_file"]),
+        params["file_name"],
+        params["chunk_size"],
+    ):
+        report_progress(progress.dict())
+        total = progress.total
+    return {"documents": total}
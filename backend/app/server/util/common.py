@@ -1,10 +1,141 @@
 """Common utilities for the backend app."""
 
-from typing import List
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
 
 from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
 
 from server.config import settings
+from server.util import db
+
+
+class CourseRegistry:
+    """In-process cache of the courses in the database and their subcollections.
+
+    The cache is reloaded from the courses collection once it is older than
+    settings.COURSE_CACHE_TTL seconds, and whenever it is invalidated.
+
+    """
+
+    # Don't reload more than once a second when looking up courses that don't exist.
+    MISS_RELOAD_INTERVAL = 1
+
+    def __init__(self):
+        self._courses: Dict[str, Set[str]] = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Load all courses and the subcollections that exist for each of them."""
+        names = set(settings.database.list_collection_names())
+        courses = {}
+        for course in settings.database.courses.find({}, {"name": 1}):
+            prefix = course["name"]
+            courses[prefix] = {
+                name[len(prefix) :] for name in names if name.startswith(prefix + ".")
+            }
+        self._courses = courses
+        self._loaded_at = time.monotonic()
+
+    def _age(self):
+        """Get the number of seconds since the cache was last loaded."""
+        if self._loaded_at is None:
+            return float("inf")
+        return time.monotonic() - self._loaded_at
+
+    def exists(self, course_name: str, colls: List[str], refresh: bool = False):
+        """Check if a course and all of the given subcollections exist."""
+        with self._lock:
+            if refresh or self._age() > settings.COURSE_CACHE_TTL:
+                self._load()
+            elif not self._contains(course_name, colls):
+                # The course may have been created by another instance of the app.
+                if self._age() > self.MISS_RELOAD_INTERVAL:
+                    self._load()
+            return self._contains(course_name, colls)
+
+    def is_cached(self, course_name: str, colls: List[str]) -> bool:
+        """Check if a fresh cache has a course and all of the given subcollections.
+
+        The cache is never reloaded, or waited on while it is being reloaded, so that it can be
+        checked from the event loop.
+
+        """
+        return self._age() <= settings.COURSE_CACHE_TTL and self._contains(
+            course_name, colls
+        )
+
+    def _contains(self, course_name: str, colls: List[str]):
+        """Check the cache for a course and its subcollections."""
+        return course_name in self._courses and all(
+            coll in self._courses[course_name] for coll in colls
+        )
+
+    def invalidate(self):
+        """Force the cache to be reloaded on the next lookup."""
+        with self._lock:
+            self._loaded_at = None
+
+
+course_registry = CourseRegistry()
+
+
+class UserCache:
+    """In-process cache of the user documents, keyed by email.
+
+    A user is reloaded from the user collection once it is older than settings.USER_CACHE_TTL
+    seconds, and whenever it is invalidated. Emails without a user are cached too, so that
+    requests from unauthorized users don't reach the database either.
+
+    """
+
+    def __init__(self):
+        # Time each user was loaded and its document, keyed by email.
+        self._users: Dict[str, Tuple[float, Optional[dict]]] = {}
+        self._lock = threading.Lock()
+
+    def _get_cached(self, email: str) -> Optional[Tuple[float, Optional[dict]]]:
+        """Get the cache entry of a user, or None if it is missing or stale."""
+        with self._lock:
+            entry = self._users.get(email)
+        if entry is not None and time.monotonic() - entry[0] <= settings.USER_CACHE_TTL:
+            return entry
+        return None
+
+    def _set(self, email: str, user: Optional[dict]):
+        with self._lock:
+            self._users[email] = (time.monotonic(), user)
+
+    def get(self, email: str) -> Optional[dict]:
+        """Get the document of a user, or None if there is no user with that email."""
+        entry = self._get_cached(email)
+        if entry is not None:
+            return entry[1]
+        user = settings.database.user.find_one({"email": email})
+        self._set(email, user)
+        return user
+
+    async def get_async(self, email: str) -> Optional[dict]:
+        """Get the document of a user like get, loading it through the async database."""
+        entry = self._get_cached(email)
+        if entry is not None:
+            return entry[1]
+        user = await db.collection("user").find_one({"email": email})
+        self._set(email, user)
+        return user
+
+    def invalidate(self, email: Optional[str] = None):
+        """Force a user, or every user if email isn't given, to be reloaded on the next lookup."""
+        with self._lock:
+            if email is None:
+                self._users = {}
+            else:
+                self._users.pop(email, None)
+
+
+user_cache = UserCache()
 
 
 def check_course_in_db(course_name: str, colls: List[str]):
@@ -16,14 +147,22 @@ def check_course_in_db(course_name: str, colls: List[str]):
     Raises HTTPException if course is not in the database.
 
     """
-    try:
-        for coll in colls:
-            settings.database.validate_collection(course_name + coll)
-    except Exception as exc:
+    if not course_registry.exists(course_name, colls):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Course {course_name} does not exist",
-        ) from exc
+        )
+
+
+async def check_course_in_db_async(course_name: str, colls: List[str]):
+    """Check if a course is in the database like check_course_in_db, from the event loop.
+
+    The course cache is only reloaded, on the thread pool, when it is stale or doesn't have the
+    course.
+
+    """
+    if not course_registry.is_cached(course_name, colls):
+        await run_in_threadpool(check_course_in_db, course_name, colls)
 
 
 def get_sprint_list(course_name: str):
@@ -31,26 +170,21 @@ def get_sprint_list(course_name: str):
     check_course_in_db(course_name, [".sprints"])
     coll = settings.database[course_name].sprints
     sprints = []
-    for sprint in coll.find():
+    for sprint in coll.find({}, {"_id": 0, "sprint_number": 1}):
         sprints.append(sprint["sprint_number"])
     return sorted(list(sprints))
 
 
-def check_user_assigned_to_course(user_email: str, course_name: str):
+def check_user_assigned_to_course(user: dict, course_name: str):
     """Check if a user is assigned to a course.
 
+    Where user is the document of the current user, from jwt.get_current_user.
+
     Raises HTTPException if user is not assigned to the course.
 
     """
-    user_courses = settings.database.user.find_one({"email": user_email})
-    if user_courses is not None:
-        if course_name not in user_courses["assigned_courses"]:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=f"User {user_email} is not authorized to access {course_name}",
-            )
-    else:
+    if course_name not in user.get("assigned_courses", []):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"User {user_email} does not exist",
+            detail=f"User {user['email']} is not authorized to access {course_name}",
         )
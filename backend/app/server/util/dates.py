@@ -0,0 +1,44 @@
+"""Conversion between the ISO 8601 strings used by the API and the dates stored in the database.
+
+Timestamps are stored as BSON dates, so that they are compared as instants rather than as
+strings, which don't compare correctly across timezone offsets (e.g. "Z" and "+00:00").
+The API still sends and receives ISO 8601 strings.
+"""
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+# Timestamp of a stored document as a date, in an aggregation expression. Documents that
+# haven't been migrated yet still have a string timestamp, and one that can't be parsed is null.
+TIMESTAMP_DATE = {
+    "$convert": {"input": "$timestamp", "to": "date", "onError": None, "onNull": None}
+}
+
+
+def to_datetime(value: Union[str, datetime]) -> datetime:
+    """Convert an ISO 8601 string or a datetime into a timezone aware UTC datetime.
+
+    Timestamps without a timezone are assumed to be in UTC, which is also how MongoDB returns
+    stored dates.
+
+    """
+    if isinstance(value, str):
+        # Python 3.8 doesn't parse the "Z" suffix.
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def to_iso(value: Union[str, datetime, None]) -> Optional[str]:
+    """Convert a stored date into an ISO 8601 UTC string.
+
+    Strings are returned unchanged, since documents stored before dates were migrated still
+    have them.
+
+    """
+    if value is None or isinstance(value, str):
+        return value
+    value = to_datetime(value)
+    # BSON dates only have millisecond precision.
+    timespec = "milliseconds" if value.microsecond else "seconds"
+    return value.replace(tzinfo=None).isoformat(timespec=timespec) + "Z"
@@ -0,0 +1,145 @@
+"""Async access to the database for the routes.
+
+Sync routes are each run on one of FastAPI's worker threads, so under load, requests queue for
+a thread behind slow exports and GitHub fetches. The routes are async instead, and access the
+database through the collections of this module.
+
+With DB_DRIVER set to "motor", operations are run on the event loop with Motor, and no thread
+is held while waiting on the database. With "pymongo", the default, each operation is run with
+pymongo on the thread pool, so that the two drivers can be benchmarked side by side on the same
+routes.
+
+Cursors are read to the end, so find and aggregate return lists of documents. Background jobs,
+scheduled syncs and the startup hooks run on their own threads, and keep using
+settings.database.
+"""
+from typing import Any, List, Optional, Type
+
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from server.config import settings
+
+MOTOR = "motor"
+PYMONGO = "pymongo"
+
+
+def connect():
+    """Create the Motor client, if routes access the database with Motor."""
+    if settings.DB_DRIVER == MOTOR:
+        # Motor is only imported when it is used, so that it isn't needed with pymongo.
+        # pylint: disable-next=import-outside-toplevel
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        settings.motor_client = AsyncIOMotorClient(settings.MONGODB_ADDRESS)
+        settings.motor_database = settings.motor_client[settings.DB_NAME]
+
+
+def close():
+    """Close the Motor client, if there is one."""
+    if settings.motor_client is not None:
+        settings.motor_client.close()
+        settings.motor_client = settings.motor_database = None
+
+
+async def _run(target: Any, method: str, *args, **kwargs) -> Any:
+    """Run an operation of a Motor or pymongo database or collection."""
+    if settings.DB_DRIVER == MOTOR:
+        return await getattr(target, method)(*args, **kwargs)
+    return await run_in_threadpool(getattr(target, method), *args, **kwargs)
+
+
+def _get_database():
+    return settings.motor_database if settings.DB_DRIVER == MOTOR else settings.database
+
+
+class AsyncCollection:
+    """Awaitable operations on a collection, run with the driver set by DB_DRIVER.
+
+    The methods take the same arguments as the pymongo methods of the same name.
+
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _get_collection(self):
+        return _get_database()[self.name]
+
+    async def find(self, *args, **kwargs) -> List[dict]:
+        """Find the matching documents."""
+        if settings.DB_DRIVER == MOTOR:
+            return await self._get_collection().find(*args, **kwargs).to_list(None)
+        return await run_in_threadpool(
+            lambda: list(self._get_collection().find(*args, **kwargs))
+        )
+
+    async def aggregate(self, pipeline: List[dict], **kwargs) -> List[dict]:
+        """Run an aggregation pipeline."""
+        if settings.DB_DRIVER == MOTOR:
+            return (
+                await self._get_collection().aggregate(pipeline, **kwargs).to_list(None)
+            )
+        return await run_in_threadpool(
+            lambda: list(self._get_collection().aggregate(pipeline, **kwargs))
+        )
+
+    async def find_one(self, *args, **kwargs) -> Optional[dict]:
+        """Find a matching document, or None if there isn't one."""
+        return await _run(self._get_collection(), "find_one", *args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs) -> int:
+        """Count the matching documents."""
+        return await _run(self._get_collection(), "count_documents", *args, **kwargs)
+
+    async def distinct(self, *args, **kwargs) -> list:
+        """Get the distinct values of a field in the matching documents."""
+        return await _run(self._get_collection(), "distinct", *args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        """Insert a document."""
+        return await _run(self._get_collection(), "insert_one", *args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs):
+        """Insert documents."""
+        return await _run(self._get_collection(), "insert_many", *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        """Update a matching document."""
+        return await _run(self._get_collection(), "update_one", *args, **kwargs)
+
+    async def update_many(self, *args, **kwargs):
+        """Update the matching documents."""
+        return await _run(self._get_collection(), "update_many", *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs):
+        """Delete a matching document."""
+        return await _run(self._get_collection(), "delete_one", *args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs):
+        """Delete the matching documents."""
+        return await _run(self._get_collection(), "delete_many", *args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs):
+        """Run write operations in bulk."""
+        return await _run(self._get_collection(), "bulk_write", *args, **kwargs)
+
+
+def get_projection(model: Type[BaseModel]) -> dict:
+    """Get the projection of the fields of a model, without the _id."""
+    return {"_id": 0, **{field.alias: 1 for field in model.__fields__.values()}}
+
+
+def collection(name: str) -> AsyncCollection:
+    """Get a collection by its full name, e.g. "courses" or "cmput401w22.students"."""
+    return AsyncCollection(name)
+
+
+async def create_collection(name: str):
+    """Create a collection."""
+    await _run(_get_database(), "create_collection", name)
+
+
+async def drop_collection(name: str):
+    """Drop a collection."""
+    await _run(_get_database(), "drop_collection", name)
@@ -1,41 +1,96 @@
 """Helper functions for interacting with the GitHub API."""
+import asyncio
+import base64
+import itertools
+import logging
+import threading
 import time
 from datetime import datetime, timezone
-from typing import List
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple, Union
 
+import httpx
 import jwt
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from fastapi.encoders import jsonable_encoder
+from fastapi import HTTPException, status
 from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, PyMongoError
 from requests.auth import AuthBase
+from starlette.concurrency import run_in_threadpool
 
 from server.config import settings
-from server.models.github import Commit
-from server.util import requests
+from server.models.github import Commit, RepoSyncResult
+from server.util import dates, leases, mirrors, requests, rollups, sprints
 from server.util.common import check_course_in_db
+from server.util.ratelimit import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Number of seconds before the access token expires that it is refreshed.
+TOKEN_REFRESH_MARGIN = 5 * 60
+# Number of commits read from a mirror that are stored at once.
+MIRROR_BATCH_SIZE = 1000
+# Error code of a write that would duplicate a unique index key.
+DUPLICATE_KEY_ERROR = 11000
+
+
+def get_auth_headers():
+    """Get the headers for GitHub token authentication, regenerating the token if expired."""
+    return {
+        "Authorization": f"Bearer {token_manager.get_token()}",
+        "Accept": "application/vnd.github+json",
+    }
 
 
 class GitHubTokenAuth(AuthBase):
-    """Request authentication mechanism for GitHub token authentication."""
+    """Request authentication mechanism for GitHub token authentication.
+
+    If validators of an earlier response to the URL are given, they are also attached so that
+    GitHub can respond with 304 Not Modified, which does not count against the rate limit.
+
+    """
+
+    def __init__(self, validators: Optional[dict] = None):
+        self.validators = validators
 
     def __call__(self, request):
         """Attach the GitHub token to the header or regenerate if expired."""
-        if datetime.now().isoformat() > settings.github_expiration:
-            settings.github_token, settings.github_expiration = get_access_token()
-        request.headers["Authorization"] = f"Bearer {settings.github_token}"
-        request.headers["Accept"] = "application/vnd.github+json"
+        request.headers.update(get_auth_headers())
+        request.headers.update(
+            requests.get_conditional_headers(self.validators, request.url)
+        )
         return request
 
 
-# Adapted from https://docs.github.com/en/developers/apps/building-github-apps/authenticating-with-github-apps#authenticating-as-a-github-app
-def create_jwt():
-    """Create a JSON Web Token for authenticating with the GitHub API."""
-    # Private key contents.
+def github_get(url: str, **kwargs):
+    """Make a GET request to the GitHub API, waiting for and retrying on rate limits."""
+    time.sleep(rate_limiter.acquire())
+    return requests.get(url, retry=rate_limiter.get_retry_delay, **kwargs)
+
+
+async def github_send(client: httpx.AsyncClient, request: httpx.Request):
+    """Asynchronously send a request to the GitHub API, waiting for and retrying on rate limits."""
+    attempt = 0
+    while True:
+        await asyncio.sleep(rate_limiter.acquire())
+        res = await client.send(request)
+        delay = rate_limiter.get_retry_delay(res, attempt)
+        if delay is None:
+            return res
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def load_private_key():
+    """Load the GitHub App's private key."""
     with open(settings.GITHUB_PRIVATE_KEY_PATH, "r", encoding="utf-8") as file:
         private_pem = file.read()
-    private_key = load_pem_private_key(private_pem.encode(), password=None)
+    return load_pem_private_key(private_pem.encode(), password=None)
 
-    # Generate the JWT.
+
+# Adapted from https://docs.github.com/en/developers/apps/building-github-apps/authenticating-with-github-apps#authenticating-as-a-github-app
+def create_jwt(private_key):
+    """Create a JSON Web Token for authenticating with the GitHub API."""
     payload = {
         # Issued at time, 60 seconds in the past to allow for clock drift.
         "iat": int(time.time()) - 60,
@@ -59,10 +114,8 @@ def get_installation(github_jwt: str):
     return res.json()[0]["id"]
 
 
-def get_access_token():
-    """Get an access token for the GitHub App."""
-    github_jwt = create_jwt()
-    installation_id = get_installation(github_jwt)
+def get_access_token(github_jwt: str, installation_id: int):
+    """Get an access token for an installation of the GitHub App."""
     headers = {
         "Authorization": f"Bearer {github_jwt}",
         "Accept": "application/vnd.github+json",
@@ -72,62 +125,595 @@ def get_access_token():
     return res.json()["token"], res.json()["expires_at"]
 
 
-def get_new_commits(owner: str, repo: str, course_name: str):
-    """Get all commits for a repository that are newer than what we have in our database."""
-    coll = settings.database[course_name].github.commits
+class TokenManager:
+    """Keeps a valid access token for the GitHub App.
+
+    The private key and the installation ID are only loaded once. The token is refreshed
+    shortly before it expires, and only one thread refreshes it at a time, while the others
+    wait for the new token.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._private_key = None
+        self._installation_id = None
+        self.token = None
+        # Unix time that the token expires.
+        self.expires_at = 0
+
+    def _is_fresh(self):
+        return (
+            self.token is not None
+            and time.time() < self.expires_at - TOKEN_REFRESH_MARGIN
+        )
+
+    def get_token(self):
+        """Get a valid access token, refreshing it if it is about to expire."""
+        if self._is_fresh():
+            return self.token
+        with self._lock:
+            # Another thread may have refreshed the token while we were waiting.
+            if not self._is_fresh():
+                self._refresh()
+            return self.token
+
+    def _refresh(self):
+        if self._private_key is None:
+            self._private_key = load_private_key()
+        github_jwt = create_jwt(self._private_key)
+        if self._installation_id is None:
+            self._installation_id = get_installation(github_jwt)
+        try:
+            token, expires_at = get_access_token(github_jwt, self._installation_id)
+        except HTTPException as exc:
+            if exc.status_code != status.HTTP_404_NOT_FOUND:
+                raise
+            # The app was reinstalled, so the cached installation no longer exists.
+            self._installation_id = get_installation(github_jwt)
+            token, expires_at = get_access_token(github_jwt, self._installation_id)
+        self.token = token
+        # Python 3.8 doesn't parse the Z suffix.
+        self.expires_at = datetime.fromisoformat(
+            expires_at.replace("Z", "+00:00")
+        ).timestamp()
+
+    def prefetch(self):
+        """Get a token ahead of the first request to GitHub, logging instead of raising errors."""
+        try:
+            self.get_token()
+        except Exception:  # pylint: disable=broad-except
+            # The token will be requested again when it is first needed.
+            logger.exception("Unable to get a GitHub access token")
+
+
+token_manager = TokenManager()
 
+
+def get_sync_state(course_name: str, repo: str):
+    """Get the sync state of a repository, or None if it has never been synced."""
+    return settings.database[course_name].github.sync.find_one({"repo_name": repo})
+
+
+def update_sync_state(  # pylint: disable=too-many-arguments
+    course_name: str,
+    repo: str,
+    newest_commit_at: Optional[datetime] = None,
+    next_url: Optional[str] = None,
+    validators: Optional[dict] = None,
+    pages: int = 0,
+):
+    """Record that a page of commits was fetched and stored for a repository.
+
+    GitHub returns the newest commits first, so the cursor can only be moved once the last page
+    has been stored. Until then, the URL of the next page and the newest commit fetched so far
+    are kept, so that an interrupted sync can resume from the next page. Dates are stored as
+    BSON dates, so that the cursor is only moved forward by comparing instants.
+
+    validators are the validators of the first page, which are only kept once every page has
+    been stored. They are kept in the sync state of the repository in the course, since
+    another course with the same repository may not have stored the same commits. pages is the
+    number of pages fetched by the sync, which is also kept once every page has been stored.
+
+    """
+    update = {
+        "$set": {
+            "repo_name": repo,
+            "fetched_at": datetime.now(timezone.utc),
+        }
+    }
+    if next_url:
+        update["$set"]["next_url"] = next_url
+        if newest_commit_at:
+            update["$max"] = {"pending_commit_at": newest_commit_at}
+    else:
+        update["$set"]["pages"] = pages
+        update["$unset"] = {"next_url": "", "pending_commit_at": ""}
+        if newest_commit_at:
+            # Never move the cursor backwards.
+            update["$max"] = {"last_commit_at": newest_commit_at}
+        if validators:
+            # The commits have been stored, so the first page can now be fetched conditionally.
+            update["$set"]["validators"] = validators
+    settings.database[course_name].github.sync.update_one(
+        {"repo_name": repo}, update, upsert=True
+    )
+
+
+def get_commits_params(course_name: str, repo: str, sync_state: Optional[dict]):
+    """Get the query parameters for fetching commits that are newer than what we have in our database."""
     # We only fetch commits that are newer than what we currently have in our database.
     # This makes the assumption that commits on the main branch of the repository
     # will not be modified.
-    most_recent_commit = coll.find_one(sort=[("timestamp", -1)])
+    since = None
+    if sync_state:
+        since = dates.to_iso(sync_state.get("last_commit_at"))
+    else:
+        # The repository was synced before sync states were recorded.
+        most_recent_commit = settings.database[course_name].github.commits.find_one(
+            {"repo_name": repo}, sort=[("timestamp", -1)]
+        )
+        if most_recent_commit:
+            since = dates.to_iso(most_recent_commit["timestamp"])
 
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits"
+    # Get the max amount of commits per page (100) to save on quota.
     params = {"per_page": 100}
-    if most_recent_commit:
-        params["since"] = most_recent_commit["timestamp"]
-    commits = []
+    if since:
+        params["since"] = since
+    return params
 
-    while True:
-        # Get the max amount of commits per page (100) to save on quota.
-        res = requests.get(url, params=params, auth=GitHubTokenAuth())
-        commits.extend(res.json())
-        # Keep fetching the next page of commits until there are no more.
-        if "next" not in res.links:
-            break
-        url = res.links["next"]["url"]
 
-    return commits
+def get_commits_start(owner: str, repo: str, course_name: str):
+    """Get where to start fetching new commits for a repository.
+
+    Returns the URL and query parameters of the first page to fetch, the newest commit
+    already fetched by an interrupted sync, and the validators of the first page of the last
+    sync. The query parameters are None when resuming, and there are no validators for a
+    repository that was never synced in the course.
 
+    """
+    sync_state = get_sync_state(course_name, repo)
+    if sync_state and sync_state.get("next_url"):
+        # The next page's URL already contains the query parameters.
+        return sync_state["next_url"], None, sync_state.get("pending_commit_at"), None
+    url = f"https://api.github.com/repos/{owner}/{repo}/commits"
+    params = get_commits_params(course_name, repo, sync_state)
+    return url, params, None, (sync_state or {}).get("validators")
 
-def store_commits(commits: List[any], repo: str, course_name: str):
-    """Store commits in the database."""
+
+def get_commit_pages(
+    url: str, params: Optional[dict], last_validators: Optional[dict] = None
+) -> Iterator[Tuple[List[any], Optional[str], Optional[dict]]]:
+    """Yield each page of commits as it is fetched.
+
+    Yields the commits of the page, the URL of the next page and the validators of the first
+    page. Only a new sync (where params is set) has validators, since a resumed sync doesn't
+    start from the first page. With the last_validators of the last sync, a new sync is
+    requested conditionally, and stops without yielding anything if the first page has not
+    been modified since it was last fetched.
+
+    """
+    first_page = params is not None
+    validators = None
+    while url:
+        res = github_get(
+            url,
+            params=params,
+            auth=GitHubTokenAuth(last_validators if first_page else None),
+        )
+        if res.status_code == status.HTTP_304_NOT_MODIFIED:
+            return
+        if first_page:
+            validators = requests.get_validators(res)
+        next_url = res.links.get("next", {}).get("url")
+        yield res.json(), next_url, validators
+        url = next_url
+        params = None
+        first_page = False
+
+
+def write_commits(collection: Collection, batch_update: List[UpdateOne]) -> dict:
+    """Upsert commits all at once, returning the _id of each inserted commit by its index.
+
+    Commits of a repository can be stored by several syncs at once, e.g. a webhook delivery and
+    a scheduled sync. The unique index on repo_name and sha lets only one of them insert a new
+    commit, and the others get a duplicate key error. Their upserts are retried, and then
+    update the commit that was inserted, so that it is only counted as new once.
+
+    """
+    try:
+        # The commits are independent, so the order doesn't matter.
+        return collection.bulk_write(batch_update, ordered=False).upserted_ids
+    except BulkWriteError as exc:
+        errors = exc.details["writeErrors"]
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        upserted_ids = {
+            upsert["index"]: upsert["_id"] for upsert in exc.details["upserted"]
+        }
+    retried = [error["index"] for error in errors]
+    result = collection.bulk_write(
+        [batch_update[index] for index in retried], ordered=False
+    )
+    for index, upserted_id in result.upserted_ids.items():
+        upserted_ids[retried[index]] = upserted_id
+    return upserted_ids
+
+
+def store_commits(commits: List[any], repo: str, course_name: str) -> int:
+    """Store commits in the database, and add the new ones to the daily rollups.
+
+    Returns the number of new commits.
+
+    """
     check_course_in_db(course_name, [".github.commits"])
 
+    course_sprints = sprints.get_sprints(course_name)
+    fetched_at = datetime.now(timezone.utc)
+    documents = []
+    for commit in commits:
+        timestamp = dates.to_datetime(commit["commit"]["author"]["date"])
+        # Only commits read from a mirror have line stats.
+        stats = commit.get("stats", {})
+        documents.append(
+            Commit(
+                sha=commit["sha"],
+                author=commit["author"]["login"],
+                timestamp=timestamp,
+                message=commit["commit"]["message"],
+                repo_name=repo,
+                fetched_at=fetched_at,
+                sprint_number=sprints.get_sprint_number(course_sprints, timestamp),
+                additions=stats.get("additions"),
+                deletions=stats.get("deletions"),
+                files_changed=len(commit["files"]) if "files" in commit else None,
+            ).dict(exclude_none=True)
+        )
     # Use upsert to insert a new commit,
-    # or simply update the information if already present (sha will be a unique identifier).
+    # or simply update the information if already present (the sha is unique in a repository).
+    # Missing stats are left out, so that fetching a commit doesn't clear the stats read from
+    # its mirror.
     batch_update = [
-        (
-            UpdateOne(
-                {
-                    "sha": commit["sha"],
-                },
-                {
-                    "$set": jsonable_encoder(
-                        Commit(
-                            sha=commit["sha"],
-                            author=commit["author"]["login"],
-                            timestamp=commit["commit"]["author"]["date"],
-                            message=commit["commit"]["message"],
-                            repo_name=repo,
-                            fetched_at=datetime.now(timezone.utc).isoformat(),
-                        )
-                    )
-                },
-                upsert=True,
-            )
+        UpdateOne(
+            {"repo_name": repo, "sha": document["sha"]},
+            {"$set": document},
+            upsert=True,
         )
-        for commit in commits
+        for document in documents
     ]
 
-    # Write all at once.
-    settings.database[course_name].github.commits.bulk_write(batch_update)
+    upserted_ids = write_commits(
+        settings.database[course_name].github.commits, batch_update
+    )
+    # Only commits that were inserted are new, the others are already in the rollups.
+    rollups.update_commit_rollups(
+        course_name, [documents[index] for index in sorted(upserted_ids)]
+    )
+    return len(upserted_ids)
+
+
+def get_authored_commits(commits: List[dict]) -> List[dict]:
+    """Leave out the commits fetched from GitHub whose author isn't linked to a GitHub account.
+
+    GitHub returns a null author for them, and commits are counted by username.
+
+    """
+    authored = []
+    for commit in commits:
+        if (commit.get("author") or {}).get("login"):
+            authored.append(commit)
+        else:
+            logger.info("Skipping commit %s without a GitHub author", commit["sha"])
+    return authored
+
+
+def get_newest_commit_at(
+    commits: List[dict], newest_commit_at: Union[str, datetime, None]
+) -> Optional[datetime]:
+    """Get the date of the newest of some commits and of the newest commit fetched before them.
+
+    The dates are compared as instants, since GitHub and git don't always give them in the
+    same timezone. Returns None if there are no commits and none was fetched before them.
+
+    """
+    return max(
+        [dates.to_datetime(commit["commit"]["author"]["date"]) for commit in commits]
+        + ([dates.to_datetime(newest_commit_at)] if newest_commit_at else []),
+        default=None,
+    )
+
+
+def store_commit_page(
+    course_name: str,
+    repo: str,
+    page: Tuple[List[any], Optional[str], Optional[dict]],
+    newest_commit_at: Union[str, datetime, None],
+    pages: int,
+) -> Tuple[int, Optional[datetime]]:
+    """Store a page of commits, as yielded by get_commit_pages, and record the progress of the sync.
+
+    pages is the number of pages fetched by the sync so far, including this one. Returns the
+    number of new commits and the newest commit fetched so far.
+
+    """
+    commits, next_url, validators = page
+    new_commits = 0
+    if commits:
+        authored = get_authored_commits(commits)
+        if authored:
+            new_commits = store_commits(authored, repo, course_name)
+    newest_commit_at = get_newest_commit_at(commits, newest_commit_at)
+    update_sync_state(course_name, repo, newest_commit_at, next_url, validators, pages)
+    return new_commits, newest_commit_at
+
+
+def get_git_config() -> dict:
+    """Get the git config that authenticates fetches from GitHub as the GitHub App."""
+    credentials = base64.b64encode(
+        f"x-access-token:{token_manager.get_token()}".encode()
+    ).decode()
+    return {"http.extraHeader": f"Authorization: Basic {credentials}"}
+
+
+def get_commit_author(owner: str, repo: str, sha: str) -> Optional[str]:
+    """Get the GitHub username of the author of a commit, or None if it has none."""
+    res = github_get(
+        f"https://api.github.com/repos/{owner}/{repo}/commits/{sha}",
+        auth=GitHubTokenAuth(),
+    )
+    return (res.json().get("author") or {}).get("login")
+
+
+def resolve_authors(owner: str, repo: str, commits: List[dict]) -> List[dict]:
+    """Set the GitHub author of commits read from a mirror, leaving out the ones without one.
+
+    git only knows the author's email. Usernames are taken from GitHub noreply emails, or from
+    the emails already linked to a username in the github.authors collection. The first commit
+    of each other email is fetched from the API, which links the email to its account. Emails
+    that aren't linked to an account are looked up again on the next sync, since the author
+    can still add them to their account.
+
+    """
+    emails = {commit["commit"]["author"]["email"] for commit in commits}
+    logins = {}
+    for email in emails:
+        login = mirrors.get_noreply_login(email)
+        if login:
+            logins[email] = login
+    for author in settings.database.github.authors.find(
+        {"_id": {"$in": sorted(emails - logins.keys())}}
+    ):
+        logins[author["_id"]] = author["login"]
+
+    resolved = []
+    looked_up = set()
+    for commit in commits:
+        email = commit["commit"]["author"]["email"]
+        if email not in logins and email not in looked_up:
+            looked_up.add(email)
+            login = get_commit_author(owner, repo, commit["sha"])
+            if login:
+                logins[email] = login
+                settings.database.github.authors.update_one(
+                    {"_id": email}, {"$set": {"login": login}}, upsert=True
+                )
+        if email in logins:
+            resolved.append({**commit, "author": {"login": logins[email]}})
+        else:
+            logger.info("Skipping commit %s without a GitHub author", commit["sha"])
+    return resolved
+
+
+def sync_commits_from_mirror(owner: str, repo: str, course_name: str) -> int:
+    """Update the mirror of a repository and store the commits pushed since the last sync.
+
+    Returns the number of new commits. The commits are stored in batches, and the last commit
+    stored is only recorded once every batch has been stored, so an interrupted sync reads the
+    same commits again. If the default branch was rewritten, it is read again from the start.
+
+    """
+    path = mirrors.get_mirror_path(owner, repo)
+    head = mirrors.update_mirror(
+        path, settings.GIT_CLONE_URL.format(owner=owner, repo=repo), get_git_config()
+    )
+    since_sha = (get_sync_state(course_name, repo) or {}).get("mirror_head")
+    if since_sha == head:
+        update_sync_state(course_name, repo)
+        return 0
+    if since_sha and not mirrors.has_commit(path, since_sha):
+        since_sha = None
+
+    new_commits = 0
+    newest_commit_at = None
+    commits = mirrors.get_commits(path, since_sha)
+    while True:
+        batch = list(itertools.islice(commits, MIRROR_BATCH_SIZE))
+        if not batch:
+            break
+        newest_commit_at = get_newest_commit_at(batch, newest_commit_at)
+        batch = resolve_authors(owner, repo, batch)
+        if batch:
+            new_commits += store_commits(batch, repo, course_name)
+    update_sync_state(course_name, repo, newest_commit_at)
+    settings.database[course_name].github.sync.update_one(
+        {"repo_name": repo}, {"$set": {"mirror_head": head}}
+    )
+    return new_commits
+
+
+def sync_commits(owner: str, repo: str, course_name: str) -> Tuple[int, int]:
+    """Fetch and store the new commits for a repository, one page at a time.
+
+    Returns the number of new commits and the number of pages that were fetched. With the git
+    backend, the commits are read from the repository's mirror instead, and no pages are
+    fetched.
+
+    """
+    if settings.GITHUB_SYNC_BACKEND == "git":
+        return sync_commits_from_mirror(owner, repo, course_name), 0
+    url, params, newest_commit_at, validators = get_commits_start(
+        owner, repo, course_name
+    )
+    new_commits = 0
+    pages = 0
+    for page in get_commit_pages(url, params, validators):
+        pages += 1
+        page_commits, newest_commit_at = store_commit_page(
+            course_name, repo, page, newest_commit_at, pages
+        )
+        new_commits += page_commits
+    if pages == 0:
+        # Nothing has changed, only record that the repository was checked.
+        update_sync_state(course_name, repo)
+    return new_commits, pages
+
+
+async def fetch_commit_pages(
+    client: httpx.AsyncClient,
+    url: str,
+    params: Optional[dict],
+    last_validators: Optional[dict] = None,
+) -> AsyncIterator[Tuple[List[any], Optional[str], Optional[dict]]]:
+    """Asynchronously yield each page of commits as it is fetched.
+
+    Takes and yields the same values as get_commit_pages.
+
+    """
+    first_page = params is not None
+    validators = None
+    while url:
+        headers = await run_in_threadpool(get_auth_headers)
+        request = client.build_request("GET", url, params=params, headers=headers)
+        if first_page:
+            request.headers.update(
+                requests.get_conditional_headers(last_validators, str(request.url))
+            )
+        res = await github_send(client, request)
+        # httpx treats 304 as an error, so it must be checked first.
+        if res.status_code == status.HTTP_304_NOT_MODIFIED:
+            return
+        res.raise_for_status()
+        if first_page:
+            validators = requests.get_validators(res)
+        next_url = res.links.get("next", {}).get("url")
+        yield res.json(), next_url, validators
+        url = next_url
+        params = None
+        first_page = False
+
+
+async def sync_repo(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    owner: str,
+    repo: str,
+    course_name: str,
+) -> RepoSyncResult:
+    """Fetch and store the new commits for a repository, one page at a time.
+
+    Errors are reported in the result instead of being raised, so that a single repository
+    failing does not stop the others from being synced. Pages stored before the error are kept,
+    and the next sync resumes from the page that failed.
+
+    """
+    new_commits = 0
+    pages = 0
+    async with semaphore:
+        try:
+            if settings.GITHUB_SYNC_BACKEND == "git":
+                new_commits = await run_in_threadpool(
+                    sync_commits_from_mirror, owner, repo, course_name
+                )
+                return RepoSyncResult(
+                    repo_name=repo, new_commits=new_commits, pages_fetched=0
+                )
+            url, params, newest_commit_at, validators = await run_in_threadpool(
+                get_commits_start, owner, repo, course_name
+            )
+            async for page in fetch_commit_pages(client, url, params, validators):
+                pages += 1
+                page_commits, newest_commit_at = await run_in_threadpool(
+                    store_commit_page, course_name, repo, page, newest_commit_at, pages
+                )
+                new_commits += page_commits
+            if pages == 0:
+                await run_in_threadpool(update_sync_state, course_name, repo)
+            return RepoSyncResult(
+                repo_name=repo, new_commits=new_commits, pages_fetched=pages
+            )
+        except httpx.HTTPStatusError as exc:
+            error = f"GitHub returned {exc.response.status_code}: {exc.response.text}"
+        except httpx.HTTPError as exc:
+            error = f"Unable to reach GitHub: {exc}"
+        except HTTPException as exc:
+            error = str(exc.detail)
+        except PyMongoError as exc:
+            error = str(exc)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.exception("Sync of %s in %s failed", repo, course_name)
+            error = str(exc) or type(exc).__name__
+        return RepoSyncResult(
+            repo_name=repo, new_commits=new_commits, pages_fetched=pages, error=error
+        )
+
+
+async def sync_course(
+    owner: str,
+    course_name: str,
+    concurrency: int,
+    report_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[RepoSyncResult]:
+    """Concurrently fetch and store the new commits for every team repository in a course.
+
+    The sync lease of the course is held for the whole sync, and renewed each time a repository
+    is synced, so that the rollups aren't rebuilt meanwhile. A 409 is raised if another sync or
+    rebuild of the course doesn't finish in time. report_progress is called as in
+    sync_course_repos.
+
+    """
+    name = leases.get_sync_lease_name(course_name)
+
+    def renew_and_report(synced: int, repos: int):
+        leases.renew(name, leases.SYNC_LEASE)
+        if report_progress is not None:
+            report_progress(synced, repos)
+
+    async with leases.hold_sync_lease_async(course_name):
+        return await sync_course_repos(
+            owner, course_name, concurrency, renew_and_report
+        )
+
+
+async def sync_course_repos(
+    owner: str,
+    course_name: str,
+    concurrency: int,
+    report_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[RepoSyncResult]:
+    """Concurrently fetch and store the new commits for every team repository in a course,
+    without taking its sync lease, which the caller must already hold.
+
+    report_progress is called with the number of repositories synced so far and the total
+    number of repositories, each time a repository is synced.
+
+    """
+    repos = await run_in_threadpool(
+        settings.database[course_name].students.distinct, "repo_name"
+    )
+    # Students without a team will have an empty repository name.
+    repos = sorted(repo for repo in repos if repo)
+    synced = 0
+
+    async def sync_and_report(client, semaphore, repo):
+        nonlocal synced
+        result = await sync_repo(client, semaphore, owner, repo, course_name)
+        synced += 1
+        if report_progress is not None:
+            await run_in_threadpool(report_progress, synced, len(repos))
+        return result
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=settings.HTTP_TIMEOUT) as client:
+        return await asyncio.gather(
+            *[sync_and_report(client, semaphore, repo) for repo in repos]
+        )
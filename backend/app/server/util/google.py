@@ -0,0 +1,136 @@
+"""Verification of Google ID tokens.
+
+Signing in with an access token asks Google for the user's profile on every login. An ID token
+is signed by Google, so it is verified locally against Google's public certificates instead.
+The certificates are shared by every request, and cached for as long as Google's Cache-Control
+header allows. They are only fetched again once they expire, or when a token is signed with a
+key that isn't cached yet, which happens when Google rotates its keys. If Google can't be
+reached, the certificates that are already cached keep being used until it can.
+"""
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+import jwt
+from fastapi import HTTPException, status
+from google.auth import jwt as google_jwt
+from requests.exceptions import RequestException
+
+from server.config import settings
+from server.util import requests
+
+logger = logging.getLogger(__name__)
+
+CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+# Number of seconds the certificates are cached for if the response doesn't say.
+DEFAULT_MAX_AGE = 60 * 60
+# Minimum number of seconds between fetches for keys that aren't cached, so that tokens with
+# made up key ids can't make every login fetch the certificates.
+MIN_REFRESH_INTERVAL = 60
+# Number of seconds of clock skew allowed when checking when the token was issued and expires.
+CLOCK_SKEW = 10
+
+
+def get_max_age(res) -> int:
+    """Get the number of seconds a response can be cached for from its Cache-Control header."""
+    match = re.search(r"max-age=(\d+)", res.headers.get("Cache-Control", ""))
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE
+
+
+class GoogleCerts:
+    """Cache of Google's public certificates, keyed by key id.
+
+    Only one thread fetches the certificates at a time, while the others wait for them.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._certs: Dict[str, str] = {}
+        # Monotonic times that the certificates were fetched and expire.
+        self._fetched_at = None
+        self._expires_at = 0
+
+    def _is_fresh(self, key_id: Optional[str]):
+        return time.monotonic() < self._expires_at and (
+            key_id is None or key_id in self._certs
+        )
+
+    def _can_refresh(self):
+        return (
+            self._fetched_at is None
+            or time.monotonic() >= self._expires_at
+            or time.monotonic() - self._fetched_at >= MIN_REFRESH_INTERVAL
+        )
+
+    def get_certs(self, key_id: Optional[str] = None) -> Dict[str, str]:
+        """Get the certificates, fetching them if they expired or don't have key_id."""
+        if self._is_fresh(key_id):
+            return self._certs
+        with self._lock:
+            # Another thread may have fetched the certificates while we were waiting.
+            if not self._is_fresh(key_id) and self._can_refresh():
+                self._refresh()
+            return self._certs
+
+    def _refresh(self):
+        try:
+            res = requests.get(CERTS_URL)
+            certs = res.json()
+        except (HTTPException, RequestException, ValueError) as exc:
+            if not self._certs:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Unable to get Google's certificates",
+                ) from exc
+            logger.warning("Unable to refresh Google's certificates: %s", exc)
+            # Keep using the stale certificates, and try again after MIN_REFRESH_INTERVAL.
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + MIN_REFRESH_INTERVAL
+            return
+        self._certs = certs
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + get_max_age(res)
+
+    def prefetch(self):
+        """Get the certificates ahead of the first login, logging instead of raising errors."""
+        try:
+            self.get_certs()
+        except Exception:  # pylint: disable=broad-except
+            # The certificates will be requested again when they are first needed.
+            logger.exception("Unable to get Google's certificates")
+
+
+google_certs = GoogleCerts()
+
+
+def verify_id_token(token: str) -> str:
+    """Verify a Google ID token issued to the app, and return the user's email.
+
+    Raises ValueError if the token isn't valid, or doesn't have a verified email, and a 503 if
+    Google's certificates can't be fetched and none are cached.
+
+    """
+    if not settings.GOOGLE_CLIENT_ID:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Google ID tokens are not configured",
+        )
+    try:
+        key_id = jwt.get_unverified_header(token).get("kid")
+    except jwt.PyJWTError as exc:
+        raise ValueError("Malformed ID token") from exc
+    claims = google_jwt.decode(
+        token,
+        certs=google_certs.get_certs(key_id),
+        audience=settings.GOOGLE_CLIENT_ID,
+        clock_skew_in_seconds=CLOCK_SKEW,
+    )
+    if claims.get("iss") not in ISSUERS:
+        raise ValueError(f"ID token was issued by {claims.get('iss')}")
+    if not claims.get("email") or not claims.get("email_verified"):
+        raise ValueError("ID token doesn't have a verified email")
+    return claims["email"]
@@ -0,0 +1,222 @@
+"""Index management for the database.
+
+All indexes used by the app are declared here, next to the queries that need them.
+Per-course indexes are created when a course is created, and all indexes are reconciled
+against the database when the app starts up.
+"""
+import logging
+from typing import Dict, List
+
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from server.config import settings
+from server.models.courses import IndexReport
+from server.util import leases, rollups
+
+logger = logging.getLogger(__name__)
+
+# Name of the index that keeps a commit from being stored twice in a repository.
+UNIQUE_COMMIT_INDEX = "repo_name_sha"
+
+# Indexes for the subcollections of each course, keyed by subcollection name.
+COURSE_INDEXES: Dict[str, List[IndexModel]] = {
+    ".sprints": [
+        IndexModel([("sprint_number", ASCENDING)], name="sprint_number"),
+    ],
+    ".students": [
+        IndexModel([("email", ASCENDING)], name="email"),
+        IndexModel(
+            [("repo_name", ASCENDING), ("source_control_username", ASCENDING)],
+            name="repo_name_source_control_username",
+        ),
+    ],
+    ".students.sprints": [
+        IndexModel([("email", ASCENDING), ("sprint", ASCENDING)], name="email_sprint"),
+        IndexModel([("sprint", ASCENDING)], name="sprint"),
+    ],
+    ".github.commits": [
+        # Commits are upserted by sha, and the index keeps concurrent syncs from inserting
+        # the same commit twice.
+        IndexModel(
+            [("repo_name", ASCENDING), ("sha", ASCENDING)],
+            name=UNIQUE_COMMIT_INDEX,
+            unique=True,
+        ),
+        IndexModel(
+            [("repo_name", ASCENDING), ("timestamp", ASCENDING)],
+            name="repo_name_timestamp",
+        ),
+        IndexModel(
+            [("repo_name", ASCENDING), ("fetched_at", DESCENDING)],
+            name="repo_name_fetched_at",
+        ),
+    ],
+    ".github.rollups": [
+        IndexModel(
+            [
+                ("repo_name", ASCENDING),
+                ("author", ASCENDING),
+                ("day", ASCENDING),
+                ("sprint_number", ASCENDING),
+            ],
+            name="repo_name_author_day_sprint_number",
+            unique=True,
+        ),
+        IndexModel(
+            [("repo_name", ASCENDING), ("sprint_number", ASCENDING)],
+            name="repo_name_sprint_number",
+        ),
+        IndexModel(
+            [("author", ASCENDING), ("sprint_number", ASCENDING)],
+            name="author_sprint_number",
+        ),
+        IndexModel([("sprint_number", ASCENDING)], name="sprint_number"),
+    ],
+    ".github.sync": [
+        IndexModel([("repo_name", ASCENDING)], name="repo_name", unique=True),
+    ],
+    ".comments": [
+        IndexModel(
+            [("team", ASCENDING), ("sprint_number", ASCENDING)],
+            name="team_sprint_number",
+        ),
+    ],
+    ".minutes": [
+        IndexModel(
+            [("team", ASCENDING), ("sprint_number", ASCENDING)],
+            name="team_sprint_number",
+        ),
+    ],
+}
+
+# Indexes for collections shared by all courses, keyed by collection name.
+GLOBAL_INDEXES: Dict[str, List[IndexModel]] = {
+    "courses": [IndexModel([("name", ASCENDING)], name="name")],
+    "user": [IndexModel([("email", ASCENDING)], name="email")],
+    "tokens": [
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at"),
+        # Revoked tokens are forgotten once they expire.
+        IndexModel(
+            [("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0
+        ),
+    ],
+    "github.deliveries": [
+        # Deliveries are only remembered for as long as GitHub may redeliver them.
+        IndexModel(
+            [("received_at", ASCENDING)],
+            name="received_at",
+            expireAfterSeconds=7 * 24 * 60 * 60,
+        ),
+    ],
+    "jobs": [
+        IndexModel(
+            [("status", ASCENDING), ("created_at", ASCENDING)],
+            name="status_created_at",
+        ),
+        # Finished jobs expire once their expiry date has passed.
+        IndexModel(
+            [("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0
+        ),
+    ],
+}
+
+
+def remove_duplicate_commits(course_name: str) -> int:
+    """Delete the extra copies of commits that were stored more than once in a repository.
+
+    Commits used to be upserted without a unique index, so concurrent syncs could store the same
+    commit twice, and the unique index can't be created until the copies are deleted. The first
+    stored copy of each commit is kept. Returns the number of copies deleted.
+
+    """
+    collection = settings.database[course_name].github.commits
+    duplicates = []
+    for commit in collection.aggregate(
+        [
+            {
+                "$group": {
+                    "_id": {"repo_name": "$repo_name", "sha": "$sha"},
+                    "ids": {"$push": "$_id"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$match": {"count": {"$gt": 1}}},
+        ],
+        allowDiskUse=True,
+    ):
+        duplicates.extend(sorted(commit["ids"])[1:])
+    if duplicates:
+        collection.delete_many({"_id": {"$in": duplicates}})
+        logger.info(
+            "Deleted %d duplicate commits in %s", len(duplicates), collection.full_name
+        )
+    return len(duplicates)
+
+
+def create_course_indexes(course_name: str):
+    """Create all indexes for the subcollections of a course.
+
+    Creating an index that already exists is a no-op, so this is safe to call on existing courses.
+    Duplicate commits are deleted before the unique index on commits is created, and since each
+    copy was counted in the rollups, the rollups are then rebuilt. Both are done while holding
+    the sync lease of the course, and a 409 is raised if it is held for too long.
+
+    """
+    commits = settings.database[course_name].github.commits
+    if UNIQUE_COMMIT_INDEX not in commits.index_information():
+        with leases.hold_sync_lease(course_name):
+            if remove_duplicate_commits(course_name):
+                rollups.rebuild_commit_rollups(course_name)
+    for coll, indexes in COURSE_INDEXES.items():
+        settings.database[course_name + coll].create_indexes(indexes)
+
+
+def reconcile_indexes():
+    """Create any missing indexes for the global collections and for every existing course."""
+    for coll, indexes in GLOBAL_INDEXES.items():
+        settings.database[coll].create_indexes(indexes)
+    for course in settings.database.courses.find({}, {"name": 1}):
+        try:
+            create_course_indexes(course["name"])
+        except OperationFailure as exc:
+            # Don't stop the app from starting because of a single course.
+            logger.warning("Unable to create indexes for %s: %s", course["name"], exc)
+        except HTTPException as exc:
+            # The course is being synced, so its indexes are created on the next startup.
+            logger.warning(
+                "Unable to create indexes for %s: %s", course["name"], exc.detail
+            )
+
+
+def get_index_report(course_name: str) -> List[IndexReport]:
+    """Report the declared indexes that are missing and the indexes that have never been used.
+
+    Usage statistics are reset whenever the database server restarts.
+
+    """
+    report = []
+    for coll, indexes in COURSE_INDEXES.items():
+        collection = settings.database[course_name + coll]
+        existing_keys = [
+            list(info["key"]) for info in collection.index_information().values()
+        ]
+        missing = [
+            index.document["name"]
+            for index in indexes
+            if list(index.document["key"].items()) not in existing_keys
+        ]
+        unused = [
+            stats["name"]
+            for stats in collection.aggregate([{"$indexStats": {}}])
+            if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0
+        ]
+        report.append(
+            IndexReport(
+                collection=course_name + coll,
+                missing=sorted(missing),
+                unused=sorted(unused),
+            )
+        )
+    return report
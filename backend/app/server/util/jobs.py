@@ -0,0 +1,297 @@
+"""Background jobs for long running operations.
+
+Operations that can outlast an HTTP request are submitted as jobs instead of being run inline.
+Jobs are stored in the jobs collection and run by a pool of worker threads in the backend
+process. Their status, progress and result are polled from /jobs/{id}, and finished jobs
+expire JOB_TTL seconds after they finish, through a TTL index.
+
+A running job is leased to its worker for JOB_LEASE seconds, and the lease is renewed while
+the job runs. A job whose lease has expired was interrupted, e.g. by a restart, and is picked up
+again by the next free worker, up to MAX_ATTEMPTS times.
+
+Each job type has a handler, registered with the handler decorator, which is called with the
+job document and a function to report progress with. Handlers return the result of the job,
+or a JobFile for jobs that produce a file.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+
+from bson import Binary, ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+
+from server.config import settings
+from server.models.jobs import Job
+from server.util import dates, db
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Number of times a job is started before it is failed for being interrupted too often.
+MAX_ATTEMPTS = 3
+# Number of seconds an idle worker waits before checking for new jobs, unless woken up by a
+# job submitted by this process.
+POLL_INTERVAL = 5
+# Files stored with a job must fit in a single document.
+MAX_FILE_SIZE = 15 * 1024 * 1024
+
+
+class JobFile(NamedTuple):
+    """A file produced by a job."""
+
+    name: str
+    media_type: str
+    content: bytes
+
+
+Handler = Callable[[dict, Callable[[dict], None]], Any]
+_handlers: Dict[str, Handler] = {}
+
+
+def handler(job_type: str):
+    """Register the decorated function as the handler of a job type."""
+
+    def register(func: Handler) -> Handler:
+        _handlers[job_type] = func
+        return func
+
+    return register
+
+
+def get_job_id(job_id: str) -> ObjectId:
+    """Get the id of a job from a path parameter, raising a 404 if it isn't a valid id."""
+    try:
+        return ObjectId(job_id)
+    except (InvalidId, TypeError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found"
+        ) from exc
+
+
+async def get_job(job_id: str, projection: Optional[dict] = None) -> dict:
+    """Get the document of a job, raising a 404 if it doesn't exist."""
+    job = await db.collection("jobs").find_one({"_id": get_job_id(job_id)}, projection)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found"
+        )
+    return job
+
+
+def get_job_response(job: dict) -> Job:
+    """Convert a job document into the response model."""
+    return Job(
+        id=str(job["_id"]),
+        type=job["type"],
+        course_name=job["course_name"],
+        status=job["status"],
+        params=job["params"],
+        progress=job.get("progress"),
+        result=job.get("result"),
+        error=job.get("error"),
+        file_name=job["file"]["name"] if job.get("file") else None,
+        attempts=job["attempts"],
+        created_at=dates.to_iso(job["created_at"]),
+        started_at=dates.to_iso(job.get("started_at")),
+        finished_at=dates.to_iso(job.get("finished_at")),
+    )
+
+
+def submit(
+    job_type: str, course_name: str, params: dict, input_file: Optional[bytes] = None
+) -> Job:
+    """Queue a job that works on a course and wake up a worker to run it.
+
+    input_file is stored with the job, for jobs that process an uploaded file.
+
+    """
+    if input_file is not None and len(input_file) > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Files processed in the background must be at most {MAX_FILE_SIZE} bytes",
+        )
+    job = {
+        "type": job_type,
+        "course_name": course_name,
+        "params": params,
+        "status": QUEUED,
+        "attempts": 0,
+        "created_at": datetime.now(timezone.utc),
+    }
+    if input_file is not None:
+        job["input_file"] = Binary(input_file)
+    job["_id"] = settings.database.jobs.insert_one(job).inserted_id
+    worker_pool.notify()
+    return get_job_response(job)
+
+
+def claim_job() -> Optional[dict]:
+    """Lease the oldest queued job, or a running job whose lease has expired."""
+    now = datetime.now(timezone.utc)
+    return settings.database.jobs.find_one_and_update(
+        {
+            "$or": [
+                {"status": QUEUED},
+                {"status": RUNNING, "lease_expires_at": {"$lt": now}},
+            ]
+        },
+        {
+            "$set": {
+                "status": RUNNING,
+                "started_at": now,
+                "lease_expires_at": now + timedelta(seconds=settings.JOB_LEASE),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def run_job(job: dict):
+    """Run a leased job and store its outcome.
+
+    Updates are matched on the attempt, so that nothing is written by a worker whose lease
+    expired and whose job was picked up again.
+
+    """
+    lease = {"_id": job["_id"], "status": RUNNING, "attempts": job["attempts"]}
+
+    def report_progress(progress: dict):
+        settings.database.jobs.update_one(
+            lease, {"$set": {"progress": jsonable_encoder(progress)}}
+        )
+
+    outcome = {"status": FAILED}
+    if job["attempts"] > MAX_ATTEMPTS:
+        outcome["error"] = f"Job was interrupted {MAX_ATTEMPTS} times"
+    elif job["type"] not in _handlers:
+        outcome["error"] = f"Unknown job type {job['type']}"
+    else:
+        try:
+            result = _handlers[job["type"]](job, report_progress)
+        except HTTPException as exc:
+            outcome["error"] = str(exc.detail)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.exception("Job %s of type %s failed", job["_id"], job["type"])
+            outcome["error"] = str(exc) or type(exc).__name__
+        else:
+            outcome["status"] = SUCCEEDED
+            if isinstance(result, JobFile):
+                outcome["file"] = {
+                    "name": result.name,
+                    "media_type": result.media_type,
+                    "content": Binary(result.content),
+                }
+            else:
+                outcome["result"] = jsonable_encoder(result)
+
+    now = datetime.now(timezone.utc)
+    settings.database.jobs.update_one(
+        lease,
+        {
+            "$set": {
+                **outcome,
+                "finished_at": now,
+                "expires_at": now + timedelta(seconds=settings.JOB_TTL),
+            },
+            "$unset": {"lease_expires_at": "", "input_file": ""},
+        },
+    )
+
+
+class JobWorkers:
+    """Pool of threads that run queued jobs.
+
+    One more thread renews the leases of the jobs being run.
+
+    """
+
+    def __init__(self):
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._running: Set[ObjectId] = set()
+
+    def start(self, workers: int):
+        """Start the worker threads."""
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ] + [
+            threading.Thread(target=self._renew_leases, name="job-leases", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the worker threads once the jobs they are running finish."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake up an idle worker to check for new jobs."""
+        self._wakeup.set()
+
+    def run_next(self) -> bool:
+        """Run the next job, returning whether there was one."""
+        job = claim_job()
+        if job is None:
+            return False
+        with self._lock:
+            self._running.add(job["_id"])
+        try:
+            run_job(job)
+        finally:
+            with self._lock:
+                self._running.discard(job["_id"])
+        return True
+
+    def renew_leases(self):
+        """Extend the leases of the jobs being run."""
+        with self._lock:
+            running = list(self._running)
+        if running:
+            settings.database.jobs.update_many(
+                {"_id": {"$in": running}, "status": RUNNING},
+                {
+                    "$set": {
+                        "lease_expires_at": datetime.now(timezone.utc)
+                        + timedelta(seconds=settings.JOB_LEASE)
+                    }
+                },
+            )
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                if self.run_next():
+                    continue
+            except Exception:  # pylint: disable=broad-except
+                # Keep the worker alive if the database is unavailable for a while.
+                logger.exception("Unable to run the next job")
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+
+    def _renew_leases(self):
+        while not self._stopping.wait(settings.JOB_LEASE / 3):
+            try:
+                self.renew_leases()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Unable to renew the job leases")
+
+
+worker_pool = JobWorkers()
@@ -1,13 +1,31 @@
-"""Backend authentication functions."""
+"""Backend authentication functions.
 
+Each token has a unique jti claim. Logging out revokes the token by storing its jti in the
+tokens collection until the token expires, when a TTL index removes it. Authenticated requests
+check an in-process cache of the revoked tokens instead of the database. The cache only loads
+the tokens revoked since it was last refreshed, at most every TOKEN_REVOCATION_REFRESH
+seconds, and tokens revoked by this process are added to it right away.
+"""
+
+import hashlib
+import logging
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
 
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from pymongo import UpdateOne
+from starlette.concurrency import run_in_threadpool
 
 from server.config import settings
+from server.util.common import user_cache
+
+logger = logging.getLogger(__name__)
 
 
 def cast_to_number(var):
@@ -48,7 +66,7 @@ def create_access_token(*, data: dict, expires_delta: timedelta = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     if settings.API_SECRET_KEY is None:
         raise BaseException("Missing API_SECRET_KEY env var.")
     encoded_jwt = jwt.encode(
@@ -66,9 +84,9 @@ def create_token(email):
     return access_token
 
 
-def valid_email_from_db(email):
+async def valid_email_from_db(email):
     """Check if email is authorized to use the API."""
-    associated_user = settings.database["user"].find_one({"email": email})
+    associated_user = await user_cache.get_async(email)
     if not (associated_user and associated_user["authorized"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -78,10 +96,13 @@ def valid_email_from_db(email):
     return email
 
 
-def get_current_user_email(token: str = Depends(oauth2_scheme)):
-    """Get current user email if it is valid and authorized."""
-    if is_token_blacklisted(token):
-        raise CREDENTIALS_EXCEPTION
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """Get the document of the current user if the token is valid and they are authorized.
+
+    FastAPI only resolves a dependency once per request, so the user is only looked up once
+    per request, however many of the route's dependencies need them.
+
+    """
     try:
         payload = decode_token(token)
         email: str = payload.get("sub")
@@ -89,31 +110,185 @@ def get_current_user_email(token: str = Depends(oauth2_scheme)):
             raise CREDENTIALS_EXCEPTION
     except jwt.PyJWTError as exc:
         raise CREDENTIALS_EXCEPTION from exc
+    if await is_token_blacklisted(token, payload):
+        raise CREDENTIALS_EXCEPTION
 
-    if valid_email_from_db(email):
-        return email
+    user = await user_cache.get_async(email)
+    if not (user and user["authorized"]):
+        raise CREDENTIALS_EXCEPTION
+    return user
 
-    raise CREDENTIALS_EXCEPTION
 
+async def get_current_user_email(user: dict = Depends(get_current_user)):
+    """Get current user email if it is valid and authorized."""
+    return user["email"]
 
-def get_current_user_token(token: str = Depends(oauth2_scheme)):
+
+async def get_current_user_token(
+    token: str = Depends(oauth2_scheme), _user: dict = Depends(get_current_user)
+):
     """Get current user token if the contained email is valid and authorized."""
-    _ = get_current_user_email(token)
     return token
 
 
+def get_token_id(token: str, payload: dict) -> str:
+    """Get the id a token is revoked by.
+
+    Tokens issued before they had a jti are identified by their hash instead.
+
+    """
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+
+class RevokedTokens:
+    """In-process cache of the tokens that were revoked and haven't expired yet.
+
+    Revocations are loaded incrementally by the time they were made. Each refresh reloads the
+    last REFRESH_OVERLAP seconds again, so that revocations stored late or by another process
+    with a slightly different clock aren't missed.
+
+    """
+
+    REFRESH_OVERLAP = 10
+
+    def __init__(self):
+        # Expiry date of each revoked token, keyed by token id.
+        self._expires_at: Dict[str, datetime] = {}
+        self._loaded_at = None
+        self._loaded_until: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Load the tokens revoked since the last refresh, and forget the expired ones."""
+        now = datetime.now(timezone.utc)
+        query = {"expires_at": {"$gt": now}}
+        if self._loaded_until is not None:
+            query["revoked_at"] = {
+                "$gte": self._loaded_until - timedelta(seconds=self.REFRESH_OVERLAP)
+            }
+        for revoked in settings.database["tokens"].find(
+            query, {"expires_at": 1, "revoked_at": 1}
+        ):
+            self._expires_at[revoked["_id"]] = revoked["expires_at"].replace(
+                tzinfo=timezone.utc
+            )
+        self._expires_at = {
+            token_id: expires_at
+            for token_id, expires_at in self._expires_at.items()
+            if expires_at > now
+        }
+        self._loaded_until = now
+        self._loaded_at = time.monotonic()
+
+    def _is_stale(self):
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at > settings.TOKEN_REVOCATION_REFRESH
+        )
+
+    def contains(self, token_id: str) -> bool:
+        """Check if a token was revoked, refreshing the cache if it is stale."""
+        with self._lock:
+            if self._is_stale():
+                self._refresh()
+            return token_id in self._expires_at
+
+    async def contains_async(self, token_id: str) -> bool:
+        """Check if a token was revoked like contains, from the event loop.
+
+        The cache is only refreshed, on the thread pool, when it is stale.
+
+        """
+        if self._is_stale():
+            return await run_in_threadpool(self.contains, token_id)
+        return token_id in self._expires_at
+
+    def add(self, token_id: str, expires_at: datetime):
+        """Add a token revoked by this process."""
+        with self._lock:
+            self._expires_at[token_id] = expires_at
+
+    def invalidate(self):
+        """Force the cache to be reloaded from the start on the next lookup."""
+        with self._lock:
+            self._expires_at = {}
+            self._loaded_at = None
+            self._loaded_until = None
+
+
+revoked_tokens = RevokedTokens()
+
+
 def add_blacklist_token(token):
-    """Add a token to a blacklist, preventing users from reusing it."""
-    settings.database["tokens"].insert_one({"token": token})
+    """Add a token to a blacklist, preventing users from reusing it.
+
+    The token is only kept in the blacklist until it expires.
+
+    """
+    payload = decode_token(token)
+    token_id = get_token_id(token, payload)
+    expires_at = datetime.fromtimestamp(payload["exp"], timezone.utc)
+    # Logging out twice keeps the original revocation.
+    settings.database["tokens"].update_one(
+        {"_id": token_id},
+        {
+            "$setOnInsert": {
+                "revoked_at": datetime.now(timezone.utc),
+                "expires_at": expires_at,
+            }
+        },
+        upsert=True,
+    )
+    revoked_tokens.add(token_id, expires_at)
     return True
 
 
-def is_token_blacklisted(token):
+async def is_token_blacklisted(token, payload):
     """Check if a token is blacklisted."""
-    content = settings.database["tokens"].find_one({"token": token})
-    if content and content["token"] == token:
-        return True
-    return False
+    return await revoked_tokens.contains_async(get_token_id(token, payload))
+
+
+def migrate_blacklist():
+    """Convert the tokens blacklisted before they were kept by id, which never expired.
+
+    Tokens that have already expired are dropped, and the others are kept by id until they
+    expire.
+
+    """
+    legacy = list(
+        settings.database["tokens"].find({"token": {"$exists": True}}, {"token": 1})
+    )
+    if not legacy:
+        return
+    now = datetime.now(timezone.utc)
+    updates = []
+    for revoked in legacy:
+        try:
+            payload = jwt.decode(
+                revoked["token"],
+                options={"verify_signature": False, "verify_exp": False},
+            )
+            expires_at = datetime.fromtimestamp(payload["exp"], timezone.utc)
+        except (jwt.PyJWTError, KeyError, TypeError):
+            continue
+        if expires_at > now:
+            updates.append(
+                UpdateOne(
+                    {"_id": get_token_id(revoked["token"], payload)},
+                    {"$setOnInsert": {"revoked_at": now, "expires_at": expires_at}},
+                    upsert=True,
+                )
+            )
+    if updates:
+        settings.database["tokens"].bulk_write(updates, ordered=False)
+    settings.database["tokens"].delete_many(
+        {"_id": {"$in": [revoked["_id"] for revoked in legacy]}}
+    )
+    logger.info(
+        "Converted %d blacklisted tokens, %d had expired",
+        len(updates),
+        len(legacy) - len(updates),
+    )
 
 
 def create_refresh_token(email):
@@ -0,0 +1,128 @@
+"""Leases that let a single backend replica do a piece of work at a time.
+
+A lease is a document in the leases collection, keyed by the name of the work it covers. It is
+held by one replica until it expires or is released, so work left behind by a replica that
+stopped is picked up by another once its lease expires. Fields set when a lease is released,
+such as when the work is next due, are kept on the document for the next holder.
+"""
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+
+from server.config import settings
+
+# Identifies this process as the holder of its leases.
+HOLDER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# Number of seconds between attempts to take a lease that is held.
+WAIT_INTERVAL = 1
+# Number of seconds the sync lease of a course is taken for, unless it is renewed.
+SYNC_LEASE = 600
+# Number of seconds to wait for the holder of the sync lease of a course to release it.
+SYNC_LEASE_WAIT = 60
+
+
+def get_sync_lease_name(course_name: str) -> str:
+    """Get the name of the lease that covers the GitHub syncs of a course."""
+    return f"github.sync:{course_name}"
+
+
+def acquire(name: str, duration: int, conditions: Optional[dict] = None) -> bool:
+    """Take a lease for duration seconds, if it isn't held and its document matches conditions.
+
+    Returns whether the lease was taken.
+
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        # If the lease is held or doesn't match, the upsert conflicts with the existing document.
+        settings.database.leases.update_one(
+            {"_id": name, "expires_at": {"$not": {"$gt": now}}, **(conditions or {})},
+            {
+                "$set": {
+                    "holder": HOLDER,
+                    "expires_at": now + timedelta(seconds=duration),
+                }
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def wait_for(
+    name: str, duration: int, timeout: float, conditions: Optional[dict] = None
+) -> bool:
+    """Take a lease like acquire, waiting up to timeout seconds for it to be released."""
+    deadline = time.monotonic() + timeout
+    while not acquire(name, duration, conditions):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(WAIT_INTERVAL)
+    return True
+
+
+def renew(name: str, duration: int) -> bool:
+    """Extend a lease held by this process, returning whether it was still held."""
+    result = settings.database.leases.update_one(
+        {"_id": name, "holder": HOLDER},
+        {
+            "$set": {
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=duration)
+            }
+        },
+    )
+    return result.matched_count == 1
+
+
+def release(name: str, fields: Optional[dict] = None):
+    """Release a lease held by this process, storing fields on its document."""
+    settings.database.leases.update_one(
+        {"_id": name, "holder": HOLDER},
+        {"$set": {"expires_at": datetime.now(timezone.utc), **(fields or {})}},
+    )
+
+
+def acquire_sync_lease(course_name: str, wait: float = SYNC_LEASE_WAIT) -> str:
+    """Take the sync lease of a course, so that nothing else stores commits in it or rebuilds
+    its rollups until it is released.
+
+    Waits up to wait seconds for a sync in progress to finish, and raises a 409 if it doesn't.
+    Returns the name of the lease.
+
+    """
+    name = get_sync_lease_name(course_name)
+    if not wait_for(name, SYNC_LEASE, wait):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"The commits of {course_name} are being synced or recounted, try again later",
+        )
+    return name
+
+
+@contextmanager
+def hold_sync_lease(course_name: str, wait: float = SYNC_LEASE_WAIT):
+    """Hold the sync lease of a course while storing its commits or rebuilding its rollups."""
+    name = acquire_sync_lease(course_name, wait)
+    try:
+        yield
+    finally:
+        release(name)
+
+
+@asynccontextmanager
+async def hold_sync_lease_async(course_name: str, wait: float = SYNC_LEASE_WAIT):
+    """Hold the sync lease of a course in a route, without blocking while waiting for it."""
+    name = await run_in_threadpool(acquire_sync_lease, course_name, wait)
+    try:
+        yield
+    finally:
+        await run_in_threadpool(release, name)
@@ -0,0 +1,102 @@
+"""Migrations of the data stored for each course.
+
+Timestamps used to be stored as ISO 8601 strings. They are now stored as BSON dates, and
+existing courses are converted in place with migrate_course_dates. Documents are converted in
+batches, and only documents that still have a string are selected, so an interrupted migration
+can simply be run again to resume.
+"""
+import logging
+from typing import Dict, List
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from server.config import settings
+from server.util import dates, leases, sprints
+
+logger = logging.getLogger(__name__)
+
+# Fields stored as dates, keyed by course subcollection.
+DATE_FIELDS: Dict[str, List[str]] = {
+    ".sprints": ["start_date", "end_date"],
+    ".github.commits": ["timestamp", "fetched_at"],
+    ".github.sync": ["fetched_at", "last_commit_at", "pending_commit_at"],
+    ".minutes": ["timestamp"],
+    ".comments": ["created_at", "last_modified_at"],
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def migrate_collection_dates(
+    collection: Collection, fields: List[str], batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """Convert the string fields of a collection into dates, one batch at a time.
+
+    Returns the number of documents converted. Strings that can't be parsed are logged and
+    left as they are.
+
+    """
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in fields}
+    migrated = 0
+    last_id = None
+    while True:
+        # Walk the collection in _id order, so that unparsable documents are only read once.
+        batch_query = query if last_id is None else {**query, "_id": {"$gt": last_id}}
+        batch = list(
+            collection.find(
+                batch_query, projection, sort=[("_id", 1)], limit=batch_size
+            )
+        )
+        if not batch:
+            return migrated
+
+        updates = []
+        for document in batch:
+            values = {}
+            for field in fields:
+                if not isinstance(document.get(field), str):
+                    continue
+                try:
+                    values[field] = dates.to_datetime(document[field])
+                except ValueError:
+                    logger.warning(
+                        "Unable to parse %s of %s in %s: %r",
+                        field,
+                        document["_id"],
+                        collection.full_name,
+                        document[field],
+                    )
+            if values:
+                updates.append(UpdateOne({"_id": document["_id"]}, {"$set": values}))
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+            migrated += len(updates)
+        last_id = batch[-1]["_id"]
+
+
+def migrate_course_dates(
+    course_name: str, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[str, int]:
+    """Convert the string timestamps of a course into dates.
+
+    Returns the number of documents converted in each subcollection. The sprint numbers are
+    restamped afterwards, from the converted dates.
+
+    """
+    migrated = {}
+    for coll, fields in DATE_FIELDS.items():
+        migrated[coll] = migrate_collection_dates(
+            settings.database[course_name + coll], fields, batch_size
+        )
+        logger.info("Converted %d documents in %s%s", migrated[coll], course_name, coll)
+    with leases.hold_sync_lease(course_name):
+        sprints.stamp_sprint_numbers(course_name)
+    return migrated
+
+
+def migrate_dates(batch_size: int = DEFAULT_BATCH_SIZE):
+    """Convert the string timestamps of every course into dates."""
+    for course in settings.database.courses.find({}, {"name": 1}):
+        migrate_course_dates(course["name"], batch_size)
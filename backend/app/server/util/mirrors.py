@@ -0,0 +1,251 @@
+"""Bare git mirrors of the team repositories.
+
+Paging through the commits API is the slowest part of syncing a long-lived repository, and it
+doesn't include how many lines each commit changed. The git sync backend instead keeps a bare
+mirror of each repository in GIT_MIRROR_DIR. Only the default branch is fetched, into
+MIRROR_REF, so each fetch only transfers the objects pushed since the last one, and the commits
+are read from git log with the lines added and deleted in each file.
+
+Commits are returned in the form of the commits API, with the stats and files of the single
+commit API, so that they are stored the same way as fetched commits. git doesn't know the
+GitHub username of the author, so the author is None and the name and email are kept in the
+commit, as in the API.
+
+A mirror is shared by every course with the repository, so it is only updated by one thread at
+a time.
+"""
+import logging
+import os
+import re
+import subprocess
+import threading
+from typing import Dict, Iterator, List, Optional
+
+from fastapi import HTTPException, status
+
+from server.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Local ref that the default branch of the remote is fetched into.
+MIRROR_REF = "refs/mirror/HEAD"
+# Number of seconds before a git command is given up on.
+GIT_TIMEOUT = 10 * 60
+
+# Each commit starts with a record separator, and its fields are separated by unit separators.
+# The numstat lines follow the last separator.
+RECORD_SEPARATOR = "\x1e"
+FIELD_SEPARATOR = "\x1f"
+LOG_FORMAT = "%x1e" + "%x1f".join(["%H", "%aN", "%aE", "%ad", "%B"]) + "%x1f"
+# Author dates are written in UTC, in the format of the API, so that they can be compared as
+# strings like the dates of fetched commits.
+DATE_FORMAT = "format-local:%Y-%m-%dT%H:%M:%SZ"
+
+# Emails of the form 123+username@users.noreply.github.com, or username@users.noreply.github.com
+# for older accounts.
+NOREPLY_EMAIL = re.compile(r"^(?:\d+\+)?([^@+]+)@users\.noreply\.github\.com$", re.I)
+# Owner and repository names that GitHub allows, which are safe to use in a path.
+PATH_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def get_mirror_path(owner: str, repo: str) -> str:
+    """Get the path of the bare mirror of a repository.
+
+    The names come from the courses and students, so a name that could point outside of
+    GIT_MIRROR_DIR raises a 400.
+
+    """
+    if not settings.GIT_MIRROR_DIR:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="GIT_MIRROR_DIR is not configured",
+        )
+    for name in (owner, repo):
+        if not PATH_NAME.match(name or "") or name in (".", ".."):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid repository name {owner}/{repo}",
+            )
+    root = os.path.realpath(settings.GIT_MIRROR_DIR)
+    path = os.path.realpath(os.path.join(root, owner, f"{repo}.git"))
+    if os.path.commonpath([root, path]) != root:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid repository name {owner}/{repo}",
+        )
+    return path
+
+
+def run_git(path: str, *args: str, config: Optional[Dict[str, str]] = None) -> str:
+    """Run a git command in a repository and return its output.
+
+    config is passed with -c, so that secrets such as the authorization header are never
+    written to the repository's config. A failed command raises a 502 with git's error.
+
+    """
+    command = ["git"]
+    for key, value in (config or {}).items():
+        command += ["-c", f"{key}={value}"]
+    command += ["-C", path, *args]
+    try:
+        return subprocess.run(
+            command,
+            check=True,
+            capture_output=True,
+            text=True,
+            timeout=GIT_TIMEOUT,
+            # Fail instead of waiting for credentials that will never be entered.
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+        ).stdout
+    except subprocess.CalledProcessError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"git {args[0]} failed: {exc.stderr.strip()}",
+        ) from exc
+    except subprocess.TimeoutExpired as exc:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"git {args[0]} timed out after {GIT_TIMEOUT} seconds",
+        ) from exc
+
+
+def get_lock(path: str) -> threading.Lock:
+    """Get the lock of a mirror."""
+    with _locks_lock:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def update_mirror(path: str, url: str, config: Optional[Dict[str, str]] = None) -> str:
+    """Create or update the mirror of a repository, and return the SHA of its default branch.
+
+    The URL is given on each fetch instead of being stored as a remote, so that it can change
+    between fetches.
+
+    """
+    with get_lock(path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+            run_git(path, "init", "--bare", "--quiet")
+            logger.info("Created a mirror in %s", path)
+        run_git(
+            path,
+            "fetch",
+            "--quiet",
+            "--no-tags",
+            url,
+            f"+HEAD:{MIRROR_REF}",
+            config=config,
+        )
+        return run_git(path, "rev-parse", MIRROR_REF).strip()
+
+
+def has_commit(path: str, sha: str) -> bool:
+    """Check whether a commit is in a mirror."""
+    try:
+        run_git(path, "cat-file", "-e", f"{sha}^{{commit}}")
+    except HTTPException:
+        return False
+    return True
+
+
+def get_stats(numstat: str) -> List[dict]:
+    """Get the lines added and deleted in each file from the numstat of a commit.
+
+    Binary files are listed without line counts, and count as no lines.
+
+    """
+    files = []
+    for line in numstat.splitlines():
+        if not line:
+            continue
+        additions, deletions, filename = line.split("\t", 2)
+        additions = int(additions) if additions != "-" else 0
+        deletions = int(deletions) if deletions != "-" else 0
+        files.append(
+            {
+                "filename": filename,
+                "additions": additions,
+                "deletions": deletions,
+                "changes": additions + deletions,
+            }
+        )
+    return files
+
+
+def parse_commit(record: str) -> dict:
+    """Convert a record of the git log output into the form of the single commit API."""
+    sha, name, email, date, message, numstat = record.split(FIELD_SEPARATOR, 5)
+    files = get_stats(numstat)
+    additions = sum(file["additions"] for file in files)
+    deletions = sum(file["deletions"] for file in files)
+    return {
+        "sha": sha,
+        "author": None,
+        "commit": {
+            "author": {"name": name, "email": email, "date": date},
+            "message": message.rstrip("\n"),
+        },
+        "stats": {
+            "additions": additions,
+            "deletions": deletions,
+            "total": additions + deletions,
+        },
+        "files": files,
+    }
+
+
+def get_commits(path: str, since_sha: Optional[str] = None) -> Iterator[dict]:
+    """Yield the commits of the default branch, newest first, as they are read from git log.
+
+    If since_sha is set, only the commits that aren't reachable from it are yielded.
+
+    """
+    revisions = f"{since_sha}..{MIRROR_REF}" if since_sha else MIRROR_REF
+    command = [
+        "git",
+        "-C",
+        path,
+        "log",
+        "--numstat",
+        "--no-renames",
+        f"--format={LOG_FORMAT}",
+        f"--date={DATE_FORMAT}",
+        revisions,
+    ]
+    with subprocess.Popen(
+        command,
+        env={**os.environ, "TZ": "UTC"},
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        errors="replace",
+    ) as process:
+        try:
+            lines = None
+            for line in process.stdout:
+                if line.startswith(RECORD_SEPARATOR):
+                    if lines is not None:
+                        yield parse_commit("".join(lines))
+                    lines = [line[1:]]
+                elif lines is not None:
+                    lines.append(line)
+            if lines is not None:
+                yield parse_commit("".join(lines))
+            if process.wait() != 0:
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=f"git log failed: {process.stderr.read().strip()}",
+                )
+        finally:
+            # Stop git if the commits weren't all read.
+            if process.poll() is None:
+                process.kill()
+
+
+def get_noreply_login(email: str) -> Optional[str]:
+    """Get the GitHub username from a GitHub noreply email, or None for other emails."""
+    match = NOREPLY_EMAIL.match(email)
+    return match.group(1) if match else None
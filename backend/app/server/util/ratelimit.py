@@ -0,0 +1,138 @@
+"""Rate limit accounting for the GitHub API.
+
+GitHub reports the remaining budget of the installation in the X-RateLimit-* headers of every
+response. The budget is tracked here so that requests can be delayed before it runs out,
+instead of failing with 403 once it has.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+from server.config import settings
+from server.models.github import RateLimitStatus
+
+# Upper bound for the exponential backoff of secondary rate limits.
+MAX_BACKOFF = 60
+# Number of seconds in a window of GitHub's primary rate limit.
+WINDOW = 3600
+
+
+def _to_iso(timestamp: Optional[float]):
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class RateLimiter:
+    """Tracks the GitHub API budget of the app's installation.
+
+    Currently we only handle one installation due to private GitHub Apps, so a single
+    instance is shared by every request.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        # Set when GitHub asks us to stop sending requests for a while (secondary rate limits).
+        self.retry_at = None
+
+    def update(self, headers):
+        """Update the budget from the headers of a GitHub response."""
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        with self._lock:
+            # Keep the previous limit and reset if a response leaves them out.
+            if "X-RateLimit-Limit" in headers:
+                self.limit = int(headers["X-RateLimit-Limit"])
+            self.remaining = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Reset" in headers:
+                self.reset = float(headers["X-RateLimit-Reset"])
+
+    def acquire(self):
+        """Reserve a request from the budget.
+
+        Returns the number of seconds to wait before sending the request. Raises 429 if the
+        wait would be longer than GITHUB_MAX_WAIT.
+
+        """
+        with self._lock:
+            now = time.time()
+            delay = 0
+            if self.retry_at is not None and self.retry_at > now:
+                delay = self.retry_at - now
+            if self.reset is not None and now >= self.reset:
+                # A new window has started. Its reset is only known from the next response,
+                # so assume it lasts a full window, so that the budget is only refilled once.
+                self.remaining = self.limit
+                self.reset = now + WINDOW
+            if self.remaining is not None:
+                if self.remaining <= settings.GITHUB_RATE_LIMIT_RESERVE:
+                    delay = max(delay, self.reset - now)
+                else:
+                    # Count the request now, so that concurrent requests don't all see the
+                    # same budget before GitHub has responded to any of them.
+                    self.remaining -= 1
+
+        if delay > settings.GITHUB_MAX_WAIT:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"GitHub rate limit exceeded, try again after {_to_iso(now + delay)}",
+            )
+        return delay
+
+    def get_retry_delay(self, res, attempt: int):
+        """Get the number of seconds to wait before retrying a response, or None if it should not be retried.
+
+        Works with both requests and httpx responses.
+
+        """
+        self.update(res.headers)
+        if attempt >= settings.GITHUB_MAX_RETRIES:
+            return None
+        if res.status_code not in (
+            status.HTTP_403_FORBIDDEN,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        ):
+            return None
+
+        now = time.time()
+        retry_after = res.headers.get("Retry-After")
+        if retry_after is not None:
+            delay = float(retry_after)
+        elif res.headers.get("X-RateLimit-Remaining") == "0":
+            delay = self.reset - now
+        elif (
+            res.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+            or "rate limit" in res.text.lower()
+        ):
+            delay = min(2**attempt, MAX_BACKOFF)
+        else:
+            # Forbidden for some other reason, like missing permissions.
+            return None
+
+        delay = max(delay, 0)
+        if delay > settings.GITHUB_MAX_WAIT:
+            return None
+        with self._lock:
+            # Make every other request wait as well.
+            self.retry_at = max(self.retry_at or 0, now + delay)
+        return delay
+
+    def get_status(self):
+        """Get the current budget."""
+        with self._lock:
+            return RateLimitStatus(
+                limit=self.limit,
+                remaining=self.remaining,
+                reset=_to_iso(self.reset),
+                retry_at=_to_iso(self.retry_at),
+            )
+
+
+rate_limiter = RateLimiter()
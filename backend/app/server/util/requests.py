@@ -1,5 +1,7 @@
 """Wrapper for Python requests that allows us to raise errors automatically."""
 import json
+import time
+from typing import Optional
 
 import requests
 from fastapi import HTTPException
@@ -7,10 +9,50 @@ from fastapi import HTTPException
 from server.config import settings
 
 
-def make_request(method, *args, **kwargs):
-    """Make a request with the given method."""
+def get_conditional_headers(validators: Optional[dict], url) -> dict:
+    """Get the conditional request headers for a URL from the validators of an earlier response.
+
+    Sending the validators (ETag and Last-Modified) back in a conditional request allows the
+    server to respond with 304 Not Modified instead of the full response when nothing has
+    changed. Only store validators once their response has been fully processed, otherwise a
+    later 304 response could hide data that was never stored. Validators of a response to
+    another URL are ignored.
+
+    """
+    headers = {}
+    if validators and validators["url"] == str(url):
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def get_validators(res):
+    """Get the validators of a response, keyed by the URL that was requested."""
+    return {
+        "url": str(res.request.url),
+        "etag": res.headers.get("ETag"),
+        "last_modified": res.headers.get("Last-Modified"),
+    }
+
+
+def make_request(method, *args, retry=None, **kwargs):
+    """Make a request with the given method.
+
+    retry is an optional function that takes the response and the number of previous attempts,
+    and returns the number of seconds to wait before retrying, or None to stop retrying.
+
+    """
     func = getattr(requests, method)
-    res = func(*args, **kwargs, timeout=settings.HTTP_TIMEOUT)
+    attempt = 0
+    while True:
+        res = func(*args, **kwargs, timeout=settings.HTTP_TIMEOUT)
+        delay = retry(res, attempt) if retry else None
+        if delay is None:
+            break
+        time.sleep(delay)
+        attempt += 1
     try:
         # Raises an exception if the response is not 200.
         res.raise_for_status()
@@ -0,0 +1,154 @@
+"""Daily rollups of commit counts.
+
+Each rollup document counts the commits of one author in one repository on one UTC day, in one
+sprint. They are maintained as commits are stored, so that commit counts can be summed from a
+few rollups instead of counting every commit.
+
+A sprint can start or end partway through a day, so the commits of a day are split across
+rollups by their sprint number, which keeps the counts of each sprint exact.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Union
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from server.config import settings
+from server.util import dates, db, leases
+
+logger = logging.getLogger(__name__)
+
+
+def get_day(timestamp: Union[str, datetime]):
+    """Get the UTC day of a timestamp."""
+    return dates.to_datetime(timestamp).date().isoformat()
+
+
+def update_commit_rollups(course_name: str, commits: List[dict]):
+    """Add newly stored commits to the rollups.
+
+    Only pass commits that were not already stored, otherwise they will be counted twice.
+
+    """
+    counts = {}
+    for commit in commits:
+        key = (
+            commit["repo_name"],
+            commit["author"],
+            get_day(commit["timestamp"]),
+            commit["sprint_number"],
+        )
+        counts[key] = counts.get(key, 0) + 1
+    if not counts:
+        return None
+    return settings.database[course_name].github.rollups.bulk_write(
+        [
+            UpdateOne(
+                {
+                    "repo_name": repo_name,
+                    "author": author,
+                    "day": day,
+                    "sprint_number": sprint_number,
+                },
+                {"$inc": {"count": count}},
+                upsert=True,
+            )
+            for (repo_name, author, day, sprint_number), count in counts.items()
+        ],
+        ordered=False,
+    )
+
+
+def rebuild_commit_rollups(course_name: str):
+    """Rebuild the rollups of a course from its stored commits.
+
+    The rollups are replaced all at once when the rebuild is done, but commits stored while it
+    is running may not be counted, so the caller must hold the sync lease of the course.
+    Commits whose timestamp can't be parsed aren't counted, instead of failing the rebuild.
+
+    """
+    settings.database[course_name].github.commits.aggregate(
+        [
+            {"$addFields": {"date": dates.TIMESTAMP_DATE}},
+            {"$match": {"date": {"$ne": None}}},
+            {
+                "$group": {
+                    "_id": {
+                        "repo_name": "$repo_name",
+                        "author": "$author",
+                        "day": {
+                            "$dateToString": {"format": "%Y-%m-%d", "date": "$date"}
+                        },
+                        "sprint_number": "$sprint_number",
+                    },
+                    "count": {"$sum": 1},
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "repo_name": "$_id.repo_name",
+                    "author": "$_id.author",
+                    "day": "$_id.day",
+                    "sprint_number": "$_id.sprint_number",
+                    "count": 1,
+                }
+            },
+            {"$out": f"{course_name}.github.rollups"},
+        ]
+    )
+
+
+def backfill_commit_rollups():
+    """Build the rollups of every course that has commits but no rollups.
+
+    Courses created before rollups were maintained have no rollups, so their commits would
+    otherwise not be counted.
+
+    """
+    for course in settings.database.courses.find({}, {"name": 1}):
+        course_db = settings.database[course["name"]]
+        if (
+            course_db.github.rollups.estimated_document_count() == 0
+            and course_db.github.commits.estimated_document_count() > 0
+        ):
+            logger.info("Building commit rollups for %s", course["name"])
+            try:
+                with leases.hold_sync_lease(course["name"]):
+                    rebuild_commit_rollups(course["name"])
+            except HTTPException as exc:
+                # The rollups are built on the next startup instead.
+                logger.warning(
+                    "Unable to build commit rollups for %s: %s",
+                    course["name"],
+                    exc.detail,
+                )
+
+
+async def count_commits(
+    course_name: str, group: str, match: dict
+) -> Dict[str, Dict[int, int]]:
+    """Count the commits in each sprint, grouped by a commit field (author or repo_name).
+
+    Returns a dict of each group's commit count per sprint number. Commits that don't fall
+    inside any sprint are counted in sprint 0. Pass sprint_number in match to only count the
+    commits of one sprint.
+
+    """
+    counts = {}
+    for bucket in await db.collection(f"{course_name}.github.rollups").aggregate(
+        [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {"group": f"${group}", "sprint": "$sprint_number"},
+                    "count": {"$sum": "$count"},
+                }
+            },
+        ]
+    ):
+        counts.setdefault(bucket["_id"]["group"], {})[bucket["_id"]["sprint"]] = bucket[
+            "count"
+        ]
+    return counts
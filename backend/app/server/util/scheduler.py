@@ -0,0 +1,144 @@
+"""Scheduled syncs of the GitHub commits of every course.
+
+Every course that uses GitHub is synced every GITHUB_SYNC_INTERVAL seconds, plus up to
+GITHUB_SYNC_JITTER seconds at random so that courses are spread out. Each sync fetches the new
+commits of every team repository, one repository at a time.
+
+Backend replicas share the schedule through a lease for each course, which also holds when the
+course is next due. A replica only syncs a course once it holds its lease, so a course is never
+synced by two replicas at once, and a sync left behind by a replica that stopped is retried once
+its lease expires.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from server.config import settings
+from server.util import github, leases
+from server.util.ratelimit import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Number of seconds between checks for courses that are due.
+TICK = 60
+
+
+def has_budget() -> bool:
+    """Check whether enough of the GitHub rate limit remains for a scheduled sync.
+
+    The budget is only known from the last response, so it is assumed to be available again
+    once the rate limit has reset.
+
+    """
+    if rate_limiter.remaining is None or rate_limiter.reset is None:
+        return True
+    return (
+        rate_limiter.remaining >= settings.GITHUB_SYNC_MIN_REMAINING
+        or rate_limiter.reset <= time.time()
+    )
+
+
+def sync_course_if_due(course_name: str) -> bool:
+    """Sync the GitHub commits of a course if it is due and no other replica is syncing it.
+
+    Returns whether the course was synced.
+
+    """
+    now = datetime.now(timezone.utc)
+    name = leases.get_sync_lease_name(course_name)
+    if not leases.acquire(
+        name, leases.SYNC_LEASE, {"next_run_at": {"$not": {"$gt": now}}}
+    ):
+        return False
+    try:
+        results = asyncio.run(
+            github.sync_course_repos(
+                settings.GITHUB_OWNER,
+                course_name,
+                1,
+                lambda synced, repos: leases.renew(name, leases.SYNC_LEASE),
+            )
+        )
+        logger.info(
+            "Synced %d repositories of %s: %d new commits, %d errors",
+            len(results),
+            course_name,
+            sum(result.new_commits for result in results),
+            sum(result.error is not None for result in results),
+        )
+    finally:
+        leases.release(
+            name,
+            {
+                "last_run_at": now,
+                "next_run_at": datetime.now(timezone.utc)
+                + timedelta(
+                    seconds=settings.GITHUB_SYNC_INTERVAL
+                    + random.uniform(0, settings.GITHUB_SYNC_JITTER)
+                ),
+            },
+        )
+    return True
+
+
+class SyncScheduler:
+    """Thread that runs the scheduled syncs of this replica."""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start the scheduler, unless scheduled syncs are disabled."""
+        if not settings.GITHUB_OWNER or settings.GITHUB_SYNC_INTERVAL <= 0:
+            logger.info("Scheduled GitHub syncs are disabled")
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="github-sync-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the scheduler once the sync it is running finishes."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_due_syncs(self) -> List[str]:
+        """Sync every course that uses GitHub and is due, returning the courses synced."""
+        synced = []
+        for course in settings.database.courses.find({"use_github": True}, {"name": 1}):
+            if self._stopping.is_set():
+                break
+            if not has_budget():
+                logger.info(
+                    "Putting off scheduled GitHub syncs until the rate limit resets"
+                )
+                break
+            try:
+                if sync_course_if_due(course["name"]):
+                    synced.append(course["name"])
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Scheduled sync of %s failed", course["name"])
+        return synced
+
+    def _run(self):
+        # Replicas that start together don't all check the schedule at the same time.
+        if self._stopping.wait(random.uniform(0, TICK)):
+            return
+        while True:
+            try:
+                self.run_due_syncs()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Unable to run the scheduled GitHub syncs")
+            if self._stopping.wait(TICK):
+                return
+
+
+sync_scheduler = SyncScheduler()
@@ -0,0 +1,148 @@
+"""Sprint numbers of commits and meeting minutes.
+
+Commits and meeting minutes are stamped with the number of the sprint they fall in when they
+are stored, so that they can be looked up by sprint with an equality match instead of comparing
+timestamps against the sprint dates on every query. Anything outside every sprint is in sprint 0.
+
+A sprint covers timestamps from its start date up to, but not including, its end date, so
+consecutive sprints that share a boundary never count the same timestamp twice. Where sprints
+overlap, the lowest sprint number wins.
+
+The stamps have to be recomputed whenever the sprints of a course change. Restamping rebuilds
+the commit rollups, which would lose the commits stored meanwhile, so it is done while holding
+the sync lease of the course. Everything that stores commits holds the same lease, so commits
+are never stored while the rollups are rebuilt.
+"""
+import logging
+from datetime import datetime
+from typing import List, Union
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pymongo import UpdateMany
+
+from server.config import settings
+from server.models.courses import Sprint
+from server.util import dates, db, leases, rollups
+
+logger = logging.getLogger(__name__)
+
+# Subcollections of a course whose documents are stamped with a sprint number.
+STAMPED_COLLECTIONS = [".github.commits", ".minutes"]
+
+
+def get_sprint_document(sprint: Sprint) -> dict:
+    """Get the document to store for a sprint, with its dates stored as dates."""
+    document = jsonable_encoder(sprint)
+    document["start_date"] = dates.to_datetime(sprint.start_date)
+    document["end_date"] = dates.to_datetime(sprint.end_date)
+    return document
+
+
+def get_sprints(course_name: str) -> List[dict]:
+    """Get the dates of every sprint of a course as datetimes, ordered by sprint number."""
+    return [
+        {
+            "sprint_number": sprint["sprint_number"],
+            "start_date": dates.to_datetime(sprint["start_date"]),
+            "end_date": dates.to_datetime(sprint["end_date"]),
+        }
+        for sprint in settings.database[course_name].sprints.find(
+            {},
+            {"_id": 0, "sprint_number": 1, "start_date": 1, "end_date": 1},
+            sort=[("sprint_number", 1)],
+        )
+    ]
+
+
+def get_sprint_number(sprints: List[dict], timestamp: Union[str, datetime]) -> int:
+    """Get the number of the sprint that a timestamp falls in, or 0 if it isn't in any sprint.
+
+    The sprints must be ordered by sprint number, as returned by get_sprints.
+
+    """
+    timestamp = dates.to_datetime(timestamp)
+    for sprint in sprints:
+        if sprint["start_date"] <= timestamp < sprint["end_date"]:
+            return sprint["sprint_number"]
+    return 0
+
+
+async def get_sprint_match(course_name: str, sprint: int) -> dict:
+    """Get the query that matches the documents stamped with a sprint, or every document if sprint is 0."""
+    if sprint == 0:
+        return {}
+    if (
+        await db.collection(f"{course_name}.sprints").find_one(
+            {"sprint_number": sprint}, {"_id": 1}
+        )
+        is None
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Sprint {sprint} does not exist in course {course_name}",
+        )
+    return {"sprint_number": sprint}
+
+
+def stamp_sprint_numbers(course_name: str):
+    """Recompute the sprint number of every commit and meeting minute of a course.
+
+    The caller must hold the sync lease of the course, with leases.hold_sync_lease.
+
+    Each collection is updated with one ordered bulk write: documents outside every sprint are
+    reset to sprint 0 first, then each sprint is stamped from the highest number to the lowest,
+    so that the lowest sprint number wins where sprints overlap. Timestamps are compared as
+    dates, so that documents are stamped whether or not they have been migrated. The commit
+    rollups are keyed by sprint number, so they are rebuilt afterwards.
+
+    """
+    sprints = get_sprints(course_name)
+    ranges = [
+        {
+            "$expr": {
+                "$and": [
+                    {"$gte": [dates.TIMESTAMP_DATE, sprint["start_date"]]},
+                    {"$lt": [dates.TIMESTAMP_DATE, sprint["end_date"]]},
+                ]
+            }
+        }
+        for sprint in sprints
+    ]
+    updates = [
+        UpdateMany({"$nor": ranges} if ranges else {}, {"$set": {"sprint_number": 0}})
+    ] + [
+        UpdateMany(sprint_range, {"$set": {"sprint_number": sprint["sprint_number"]}})
+        for sprint, sprint_range in reversed(list(zip(sprints, ranges)))
+    ]
+    for coll in STAMPED_COLLECTIONS:
+        settings.database[course_name + coll].bulk_write(updates, ordered=True)
+    rollups.rebuild_commit_rollups(course_name)
+
+
+def backfill_sprint_numbers():
+    """Stamp the commits and meeting minutes of every course that has any without a sprint number.
+
+    Commits and meeting minutes stored before sprint numbers were stamped would otherwise not
+    be found in any sprint.
+
+    """
+    for course in settings.database.courses.find({}, {"name": 1}):
+        if any(
+            settings.database[course["name"] + coll].find_one(
+                {"sprint_number": {"$exists": False}}, {"_id": 1}
+            )
+            is not None
+            for coll in STAMPED_COLLECTIONS
+        ):
+            logger.info("Stamping sprint numbers for %s", course["name"])
+            try:
+                with leases.hold_sync_lease(course["name"]):
+                    stamp_sprint_numbers(course["name"])
+            except HTTPException as exc:
+                # The course is stamped on the next startup instead.
+                logger.warning(
+                    "Unable to stamp sprint numbers for %s: %s",
+                    course["name"],
+                    exc.detail,
+                )
@@ -9,247 +9,289 @@ imported without modification.
 Ideally only this and the dataexport.py module should have to be modified
 to add new data formats or support new file types.
 """
+import itertools
+from typing import Dict, Iterable, Iterator, List, Tuple
+
 import pandas as pd
+from fastapi import HTTPException, status
+
+from server.models.students import StudentSprintData
 
-from server.models.students import Student, StudentSprintData
+# roster columns stored on each student, keyed by the student field they are stored in
+ROSTER_FIELDS = {
+    "email": "Email Address",
+    "full_name": "Full name (preferred)",
+    "source_control_username": "Github Account",
+    "project": "Project",
+    "repo_name": "Github repo",
+    "ta": "TA",
+}
+# roster columns stored in each student's experience survey, keyed by survey field
+EXPERIENCE_SURVEY_FIELDS = {
+    "course_work": "Coursework",
+    "langs": "Please describe your experience with other languages and development tools",
+    "hopes": "What do you hope to get out of your CMPUT 401 experience?",
+    "diffs": "Do you expect CMPUT 401 to be any different than your prior courses? If so, how?",
+    "experience": "Experience",
+}
 
 
-def parse_roster_data(file, coursename):
+def get_roster_documents(roster_df, coursename) -> List[dict]:
     """
-    parse student data from csv file
-    file is a python file-like object
-    returns a list of student data objects
+    get the student documents of a roster dataframe, in the form stored in the database
+    raises a 400 if the roster is missing any column
     """
-    roster_df = pd.read_csv(file)
     # theres a strange issue where using pd.read_csv on some file objects, remove this check if thats not the case from frontend
     if roster_df.columns[0] != "Email Address":
-        roster_df.rename(columns={roster_df.columns[0]: "Email Address"}, inplace=True)
+        roster_df = roster_df.rename(columns={roster_df.columns[0]: "Email Address"})
         print(
             roster_df.columns,
             "pandas misinterpreted the passed file object or your first column is not named 'Email Address'",
         )
-    # fill empty values with empty string
-    roster_df.fillna("", inplace=True)
-    # just grab the data needed for each student object from the dataframe
-    student_list = []
-    for _, row in roster_df.iterrows():
-        student_list.append(
-            Student(
-                email=row["Email Address"],
-                full_name=row["Full name (preferred)"],
-                source_control_username=row["Github Account"],
-                project=row["Project"],
-                repo_name=row["Github repo"],
-                ta=row["TA"],
-                course_name=coursename,
-                form_submitted=False,
-                experience_survey={
-                    "course_work": row["Coursework"],
-                    "langs": row[
-                        "Please describe your experience with other languages and development tools"
-                    ],
-                    "hopes": row[
-                        "What do you hope to get out of your CMPUT 401 experience?"
-                    ],
-                    "diffs": row[
-                        "Do you expect CMPUT 401 to be any different than your prior courses? If so, how?"
-                    ],
-                    "experience": row["Experience"],
-                },
-            )
+    missing = [
+        column
+        for column in [*ROSTER_FIELDS.values(), *EXPERIENCE_SURVEY_FIELDS.values()]
+        if column not in roster_df.columns
+    ]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Roster is missing columns: {', '.join(missing)}",
         )
+    # fill empty values with empty string
+    roster_df = roster_df.fillna("")
 
-    return student_list
+    # validate whole columns at once instead of building a Student per row, the student
+    # fields are all strings, converted the same way the Student model converts each value
+    students_df = roster_df[list(ROSTER_FIELDS.values())].astype(str)
+    students_df.columns = list(ROSTER_FIELDS)
+    students_df["course_name"] = str(coursename)
+    students_df["form_submitted"] = False
+    students_df["experience_survey"] = (
+        roster_df[list(EXPERIENCE_SURVEY_FIELDS.values())]
+        .set_axis(list(EXPERIENCE_SURVEY_FIELDS), axis=1)
+        .to_dict("records")
+    )
+    return students_df.to_dict("records")
 
 
-def parse_sprint_data(file, sprint):
+def parse_roster_data(file, coursename) -> List[dict]:
     """
-    parse sprint data from csv file
+    parse student data from csv file
     file is a python file-like object
-    returns a list of sprint data objects
+    returns a list of student documents, in the form stored in the database
+    """
+    return get_roster_documents(pd.read_csv(file), coursename)
 
-    extremely hardcoded atm, a more flexible solution would be nice
-    otherwise replace this function to support new formats
+
+def parse_roster_chunks(file, coursename, chunk_size) -> Iterator[List[dict]]:
     """
-    sprint_df = pd.read_csv(file)
-    # theres a strange issue where using pd.read_csv on some file objects, remove this check if thats not the case from frontend
-    if sprint_df.columns[1] != "Email Address":
-        sprint_df.rename(columns={sprint_df.columns[1]: "Email Address"}, inplace=True)
-        print(
-            sprint_df.columns,
-            "pandas misinterpreted the passed file object or your second column is not named 'Email Address'",
-        )
-    # get the data not related to other students
-    personal_data = pd.concat([sprint_df.iloc[:, [1]], sprint_df.iloc[:, 3:19]], axis=1)
-    personal_data.fillna("", inplace=True)
-    # get the data related to other students (ie ratings and feedback)
-    peer_ratings = pd.concat([sprint_df.iloc[:, [1]], sprint_df.iloc[:, 19:]], axis=1)
-    # below is mostly adapted from the provided jupyter aggregation script
-    # Renaming columns
-    for i in range(0, 6):
-        peer_ratings.rename(
-            columns={peer_ratings.columns[1 + (i * 3)]: f"student_{i}"}, inplace=True
-        )
-        peer_ratings.rename(
-            columns={peer_ratings.columns[1 + (i * 3) + 2]: f"feedback_{i}"},
-            inplace=True,
-        )
-        peer_ratings.rename(
-            columns={peer_ratings.columns[1 + (i * 3) + 1]: f"score_{i}"}, inplace=True
-        )
-    # convert ratings to numbers
-    mapping = {
-        "most valuable team member": 4,
-        "contributed substantially": 3,
-        "did ok": 2,
-        "did not do enough": 1,
-        "did practically nothing": 0,
-    }
-    peer_ratings[
-        ["score_0", "score_1", "score_2", "score_3", "score_4", "score_5"]
-    ] = peer_ratings[
-        ["score_0", "score_1", "score_2", "score_3", "score_4", "score_5"]
-    ].applymap(
-        lambda s: mapping.get(s) if s in mapping else s
-    )
-    peer_ratings[
-        ["score_0", "score_1", "score_2", "score_3", "score_4", "score_5"]
-    ] = peer_ratings[
-        ["score_0", "score_1", "score_2", "score_3", "score_4", "score_5"]
-    ].apply(
-        pd.to_numeric, errors="coerce"
+    parse student data from csv file, chunk_size rows at a time
+    file is a python file-like object
+    returns an iterator over the student documents of each chunk
+
+    the first chunk is parsed before this returns, so that a roster with
+    missing columns is rejected before anything is written
+    """
+    reader = pd.read_csv(file, chunksize=chunk_size)
+    first_chunk = next(reader, None)
+    if first_chunk is None:
+        return iter([])
+    return itertools.chain(
+        [get_roster_documents(first_chunk, coursename)],
+        (get_roster_documents(chunk, coursename) for chunk in reader),
     )
 
-    # Combine students and scores into their own columns
-    feedback_df = pd.DataFrame(
-        {
-            "Student": pd.concat(
-                [
-                    peer_ratings["student_0"],
-                    peer_ratings["student_1"],
-                    peer_ratings["student_2"],
-                    peer_ratings["student_3"],
-                    peer_ratings["student_4"],
-                    peer_ratings["student_5"],
-                ],
-                axis=0,
-            ),
-            "Score": pd.concat(
-                [
-                    peer_ratings["score_0"],
-                    peer_ratings["score_1"],
-                    peer_ratings["score_2"],
-                    peer_ratings["score_3"],
-                    peer_ratings["score_4"],
-                    peer_ratings["score_5"],
-                ],
-                axis=0,
-            ),
-        }
+
+# number of team members each student can review in a sprint
+PEER_REVIEWS = 6
+# first column of the peer reviews, each review is a (team member, rating, feedback) triple
+PEER_REVIEW_START = 19
+
+# ratings are converted to numbers, anything else that isn't a number is ignored
+RATINGS = {
+    "most valuable team member": 4,
+    "contributed substantially": 3,
+    "did ok": 2,
+    "did not do enough": 1,
+    "did practically nothing": 0,
+}
+
+# the personal peer review questions, in the order of columns 3-18 of the sprint csv
+PERSONAL_PEER_REV_FIELDS = [
+    "meeting_participation",
+    "meeting_content",
+    "missed_meetings",
+    "project_appropriate",
+    "confident_to_learn_sd",
+    "capable_to_learn_sd",
+    "able_to_achieve_learning_goals",
+    "able_to_meet_sd_challenge",
+    "students_care",
+    "connected_with_others",
+    "hard_to_get_help",
+    "uneasy_exposing_gaps",
+    "reluctant_to_speak_openly",
+    "can_rely_on_others",
+    "given_opportunities_to_learn",
+    "confident_others_will_support_me",
+]
+
+PEER_REVIEW_NOT_SUBMITTED = "Peer review was not sumitted."
+
+
+def get_reviewee_emails(reviewees):
+    """
+    get the emails of reviewed team members
+    accepts "email - name" and "name - email" formats
+    """
+    # the first word if it is an email, otherwise the third word
+    parts = reviewees.str.extract(r"^\s*(?:(\S*@\S*)|\S+\s+\S+\s+(\S+))")
+    return parts[0].fillna(parts[1])
+
+
+def get_sprint_reviews(sprint_df):
+    """
+    get the peer reviews of a sprint dataframe, one row per review in the order
+    they were given, with the reviewee's email, the reviewer, the score and the feedback
+    """
+    # reshape the review columns into one row per review, in the order they were given
+    reviews = sprint_df.iloc[
+        :, PEER_REVIEW_START : PEER_REVIEW_START + 3 * PEER_REVIEWS
+    ].to_numpy(dtype=object)
+    reviews = pd.DataFrame(
+        reviews.reshape(-1, 3), columns=["reviewee", "score", "feedback"]
+    )
+    reviews["reviewer"] = (
+        sprint_df.iloc[:, 1].to_numpy(dtype=object).repeat(PEER_REVIEWS)
     )
+    reviews = reviews[reviews["reviewee"].notna() & (reviews["reviewee"] != "")]
+    return reviews.assign(
+        email=get_reviewee_emails(reviews["reviewee"]),
+        # convert ratings to numbers
+        score=pd.to_numeric(reviews["score"].replace(RATINGS), errors="coerce"),
+    )[["email", "reviewer", "score", "feedback"]]
+
 
-    # Grouping, sorting
+def get_received_reviews(reviews) -> Dict[str, dict]:
+    """
+    get the reviews received by each student, keyed by email
+    each has the student's received_peer_revs, avg_rating and stddev_rating
+    """
     # get avg and std deviation of scores per student
-    feedback_df = feedback_df.groupby("Student").agg({"Score": ["mean", "std"]})
-    feedback_df.columns = ["Score_Mean", "Score_Std"]
-    # get all emails of students who received a review
-    # accepts "email - name" and "name - email" formats
-    emails = pd.Series(
-        [
-            email.split()[2] if email.split()[0].find("@") == -1 else email.split()[0]
-            for email in feedback_df.index
-        ]
+    ratings = (
+        reviews.groupby("email")["score"]
+        .agg(["mean", "std"])
+        .fillna(0)
+        .to_dict("index")
     )
-    feedback_df.set_index(emails, inplace=True)
-    feedback_df.fillna(0, inplace=True)
 
-    # Associate student with their feedback
-    for i in range(0, 6):
-        peer_ratings[f"score_{i}"].fillna("", inplace=True)
-        peer_ratings[f"student_{i}"].fillna("", inplace=True)
     # peer ratings are associated with the student receiving the rating and include the student who gave the rating
     received_feedback = {}
-    for _, row in peer_ratings.iterrows():
-        for i in range(0, 6):
-            if row[f"student_{i}"] != "":
-                email_idx = (
-                    row[f"student_{i}"].split()[2]
-                    if row[f"student_{i}"].split()[0].find("@") == -1
-                    else row[f"student_{i}"].split()[0]
-                )
-                try:
-                    received_feedback[email_idx][row.iloc[0]] = {
-                        "rating": row[f"score_{i}"],
-                        "what_did_they_do": row[f"feedback_{i}"],
-                    }
-                except KeyError:
-                    received_feedback[email_idx] = {}
-                    received_feedback[email_idx][row.iloc[0]] = {
-                        "rating": row[f"score_{i}"],
-                        "what_did_they_do": row[f"feedback_{i}"],
-                    }
-
-    # create and return sprint data objects
-    sprint_data = []
+    for email, reviewer, score, feedback in zip(
+        reviews["email"],
+        reviews["reviewer"],
+        reviews["score"].astype(object).where(reviews["score"].notna(), ""),
+        reviews["feedback"],
+    ):
+        received_feedback.setdefault(email, {})[reviewer] = {
+            "rating": score,
+            "what_did_they_do": feedback,
+        }
+    return {
+        email: {
+            "received_peer_revs": received_feedback[email],
+            "avg_rating": rating["mean"],
+            "stddev_rating": rating["std"],
+        }
+        for email, rating in ratings.items()
+    }
+
+
+def get_personal_peer_revs(sprint_df) -> List[Tuple[str, dict]]:
+    """
+    get the answers of each student who submitted a peer review of a sprint dataframe,
+    as (email, personal_peer_rev) pairs
+    """
+    # get the data not related to other students
+    personal_data = pd.concat([sprint_df.iloc[:, [1]], sprint_df.iloc[:, 3:19]], axis=1)
+    personal_data = personal_data.fillna("")
+    return [
+        (email, dict(zip(PERSONAL_PEER_REV_FIELDS, answers)))
+        for email, *answers in personal_data.to_numpy().tolist()
+        if email != ""
+    ]
+
+
+def get_sprint_documents(sprint_dfs: Iterable, sprint) -> Iterator[List[dict]]:
+    """
+    get partial sprint data documents from the dataframes of a sprint csv, read in order
+    documents with the same email are parts of the same student's sprint data
+
+    the personal peer reviews of each dataframe are returned as soon as it is read,
+    the reviews received by each student need every dataframe, so only the
+    reviews themselves are kept until they are returned after the last dataframe
+    """
+    reviews = []
     submitted_emails = set()
-    for _, row in personal_data.iterrows():
-        if row["Email Address"] != "":
-            submitted_emails.add(row["Email Address"])
-            sprint_data.append(
-                StudentSprintData(
-                    email=row["Email Address"],
-                    sprint=sprint,
-                    personal_peer_rev={
-                        "meeting_participation": row.iloc[1],
-                        "meeting_content": row.iloc[2],
-                        "missed_meetings": row.iloc[3],
-                        "project_appropriate": row.iloc[4],
-                        "confident_to_learn_sd": row.iloc[5],
-                        "capable_to_learn_sd": row.iloc[6],
-                        "able_to_achieve_learning_goals": row.iloc[7],
-                        "able_to_meet_sd_challenge": row.iloc[8],
-                        "students_care": row.iloc[9],
-                        "connected_with_others": row.iloc[10],
-                        "hard_to_get_help": row.iloc[11],
-                        "uneasy_exposing_gaps": row.iloc[12],
-                        "reluctant_to_speak_openly": row.iloc[13],
-                        "can_rely_on_others": row.iloc[14],
-                        "given_opportunities_to_learn": row.iloc[15],
-                        "confident_others_will_support_me": row.iloc[16],
-                    },
-                    received_peer_revs=received_feedback[row["Email Address"]],
-                    avg_rating=feedback_df.loc[row["Email Address"]]["Score_Mean"],
-                    stddev_rating=feedback_df.loc[row["Email Address"]]["Score_Std"],
-                )
-            )
-    # add students who did not submit a peer review but were reviewed
-    emails = set(emails).difference(submitted_emails)
-    for email in emails:
-        sprint_data.append(
-            StudentSprintData(
-                email=email,
-                sprint=sprint,
-                personal_peer_rev={
-                    "meeting_participation": "Peer review was not sumitted.",
-                    "meeting_content": "Peer review was not sumitted.",
-                    "missed_meetings": "Peer review was not sumitted.",
-                    "project_appropriate": "Peer review was not sumitted.",
-                    "confident_to_learn_sd": "Peer review was not sumitted.",
-                    "capable_to_learn_sd": "Peer review was not sumitted.",
-                    "able_to_achieve_learning_goals": "Peer review was not sumitted.",
-                    "able_to_meet_sd_challenge": "Peer review was not sumitted.",
-                    "students_care": "Peer review was not sumitted.",
-                    "connected_with_others": "Peer review was not sumitted.",
-                    "hard_to_get_help": "Peer review was not sumitted.",
-                    "uneasy_exposing_gaps": "Peer review was not sumitted.",
-                    "reluctant_to_speak_openly": "Peer review was not sumitted.",
-                    "can_rely_on_others": "Peer review was not sumitted.",
-                    "given_opportunities_to_learn": "Peer review was not sumitted.",
-                    "confident_others_will_support_me": "Peer review was not sumitted.",
-                },
-                received_peer_revs=received_feedback[email],
-                avg_rating=feedback_df.loc[email]["Score_Mean"],
-                stddev_rating=feedback_df.loc[email]["Score_Std"],
-            )
-        )
-    return sprint_data
+    for sprint_df in sprint_dfs:
+        personal_peer_revs = get_personal_peer_revs(sprint_df)
+        reviews.append(get_sprint_reviews(sprint_df))
+        submitted_emails.update(email for email, _ in personal_peer_revs)
+        yield [
+            {"email": email, "sprint": sprint, "personal_peer_rev": personal}
+            for email, personal in personal_peer_revs
+        ]
+
+    received = get_received_reviews(pd.concat(reviews))
+    not_submitted = dict.fromkeys(PERSONAL_PEER_REV_FIELDS, PEER_REVIEW_NOT_SUBMITTED)
+    # students who submitted a peer review but weren't reviewed have no ratings
+    not_reviewed = {"received_peer_revs": {}, "avg_rating": 0, "stddev_rating": 0}
+    yield [
+        {"email": email, "sprint": sprint, **not_reviewed}
+        for email in sorted(submitted_emails - received.keys())
+    ] + [
+        {
+            "email": email,
+            "sprint": sprint,
+            **received[email],
+            **(
+                {}
+                if email in submitted_emails
+                else {"personal_peer_rev": not_submitted}
+            ),
+        }
+        for email in received
+    ]
+
+
+def parse_sprint_data(file, sprint):
+    """
+    parse sprint data from csv file
+    file is a python file-like object
+    returns a list of sprint data objects, those of students who submitted a
+    peer review first, then those of students who were only reviewed
+
+    extremely hardcoded atm, a more flexible solution would be nice
+    otherwise replace this function to support new formats
+    """
+    # columns are read by position, so a misinterpreted email column name doesn't matter
+    sprint_data = {}
+    for documents in get_sprint_documents([pd.read_csv(file)], sprint):
+        for document in documents:
+            sprint_data.setdefault(document["email"], {}).update(document)
+    return [StudentSprintData(**document) for document in sprint_data.values()]
+
+
+def parse_sprint_chunks(file, sprint, chunk_size) -> Iterator[List[dict]]:
+    """
+    parse sprint data from csv file, chunk_size rows at a time
+    file is a python file-like object
+    returns an iterator over partial sprint data documents, which together
+    amount to the sprint data returned by parse_sprint_data
+    """
+    reader = pd.read_csv(file, chunksize=chunk_size)
+    first_chunk = next(reader, None)
+    if first_chunk is None:
+        return iter([])
+    return get_sprint_documents(itertools.chain([first_chunk], reader), sprint)
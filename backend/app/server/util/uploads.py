@@ -0,0 +1,99 @@
+"""Pipelined writes of uploaded student data.
+
+Streamed uploads are parsed one chunk of rows at a time. Each chunk is written in a background
+thread while the next one is parsed, so that parsing and writing overlap, and at most two chunks
+are held in memory at once.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from server.config import settings
+from server.models.students import UploadProgress
+from server.util.common import check_course_in_db
+from server.util.students import parse_roster_chunks, parse_sprint_chunks
+
+# number of rows parsed and written at once when an upload is streamed
+DEFAULT_CHUNK_SIZE = 500
+
+
+def write_chunks(
+    collection: Collection,
+    chunks: Iterable[List[dict]],
+    get_filter: Callable[[dict], dict],
+) -> Iterator[UploadProgress]:
+    """Upsert each chunk of documents while the next one is parsed.
+
+    Documents are matched with the filter returned by get_filter and their fields are set.
+    Yields the progress once each chunk has been written. Chunks are written in order, one at
+    a time.
+
+    """
+    total = 0
+    pending: List[Tuple[UploadProgress, Optional[Future]]] = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for number, documents in enumerate(chunks, start=1):
+            total += len(documents)
+            future = None
+            if documents:
+                future = executor.submit(
+                    collection.bulk_write,
+                    [
+                        UpdateOne(get_filter(document), {"$set": document}, upsert=True)
+                        for document in documents
+                    ],
+                )
+            pending.append(
+                (
+                    UploadProgress(chunk=number, documents=len(documents), total=total),
+                    future,
+                )
+            )
+            # Wait for the previous chunk only once this one is queued behind it.
+            if len(pending) > 1:
+                yield _wait_for_chunk(*pending.pop(0))
+        while pending:
+            yield _wait_for_chunk(*pending.pop(0))
+
+
+def _wait_for_chunk(
+    progress: UploadProgress, future: Optional[Future]
+) -> UploadProgress:
+    if future is not None:
+        future.result()
+    return progress
+
+
+def write_student_data(
+    course_name: str, sprint: int, file, file_name: str, chunk_size: int
+) -> Iterator[UploadProgress]:
+    """Parse and write a roster, or the peer reviews of a sprint, chunk_size rows at a time.
+
+    The course and the first chunk are checked before this returns, so that an invalid upload
+    is rejected before anything is written. Yields the progress once each chunk is written.
+
+    """
+    if sprint == 0:
+        check_course_in_db(course_name, [".students"])
+        chunks = parse_roster_chunks(file, course_name, chunk_size)
+        settings.database.courses.update_one(
+            {"name": course_name}, {"$set": {"roster_file_name": file_name}}
+        )
+        return write_chunks(
+            settings.database[course_name].students,
+            chunks,
+            lambda student: {"email": student["email"]},
+        )
+
+    check_course_in_db(course_name, [".students.sprints"])
+    chunks = parse_sprint_chunks(file, sprint, chunk_size)
+    settings.database[course_name].sprints.update_one(
+        {"sprint": sprint}, {"$set": {"sprint_file_name": file_name}}
+    )
+    return write_chunks(
+        settings.database[course_name].students.sprints,
+        chunks,
+        lambda sprint_data: {"email": sprint_data["email"], "sprint": sprint},
+    )
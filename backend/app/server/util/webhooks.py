@@ -0,0 +1,138 @@
+"""GitHub webhook deliveries.
+
+The GitHub App delivers push events, which already include the pushed commits, so commits are
+stored as soon as they are pushed instead of waiting for the next sync. Deliveries are signed
+with GITHUB_WEBHOOK_SECRET, and recorded by delivery id so that redelivered events are only
+processed once.
+
+Only pushes to the default branch are stored, since syncs only fetch the default branch. The
+commits are stored in each course under its sync lease, like a sync.
+"""
+import hashlib
+import hmac
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+
+from server.config import settings
+from server.models.github import WebhookResult
+from server.util import github, leases
+
+logger = logging.getLogger(__name__)
+
+# Number of seconds to wait for a sync of a course to finish, well within the time GitHub waits
+# for a response to a delivery.
+LEASE_WAIT = 5
+
+
+def verify_signature(body: bytes, signature: Optional[str]):
+    """Check the X-Hub-Signature-256 header of a delivery against its body."""
+    if not settings.GITHUB_WEBHOOK_SECRET:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="GitHub webhooks are not configured",
+        )
+    expected = (
+        "sha256="
+        + hmac.new(
+            settings.GITHUB_WEBHOOK_SECRET.encode(), body, hashlib.sha256
+        ).hexdigest()
+    )
+    if signature is None or not hmac.compare_digest(signature, expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid webhook signature",
+        )
+
+
+def get_push_commits(payload: dict) -> List[dict]:
+    """Convert the commits of a push event into the form returned by the commits API.
+
+    Commits whose author isn't linked to a GitHub account are left out, since commits are
+    counted by GitHub username.
+
+    """
+    commits = []
+    for commit in payload.get("commits", []):
+        username = commit.get("author", {}).get("username")
+        if not username:
+            logger.info("Skipping commit %s without a GitHub author", commit["id"])
+            continue
+        commits.append(
+            {
+                "sha": commit["id"],
+                "author": {"login": username},
+                "commit": {
+                    "author": {"date": commit["timestamp"]},
+                    "message": commit["message"],
+                },
+            }
+        )
+    return commits
+
+
+def get_repo_courses(repo: str) -> List[str]:
+    """Get the courses that use GitHub and have a team with the repository."""
+    return [
+        course["name"]
+        for course in settings.database.courses.find({"use_github": True}, {"name": 1})
+        if settings.database[course["name"]].students.find_one(
+            {"repo_name": repo}, {"_id": 1}
+        )
+        is not None
+    ]
+
+
+def record_delivery(delivery_id: str, event: str) -> bool:
+    """Record a delivery, returning False if it was already received."""
+    try:
+        settings.database.github.deliveries.insert_one(
+            {
+                "_id": delivery_id,
+                "event": event,
+                "received_at": datetime.now(timezone.utc),
+            }
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def handle_delivery(delivery_id: str, event: str, payload: dict) -> WebhookResult:
+    """Store the commits of a push to the default branch of a team repository.
+
+    If a course with the repository is being synced, a 409 is raised and the delivery is
+    forgotten, so that it can be redelivered.
+
+    """
+    result = WebhookResult(
+        delivery_id=delivery_id, status="ignored", courses=[], commits=0
+    )
+    repository = payload.get("repository", {})
+    if (
+        event != "push"
+        or payload.get("ref") != f"refs/heads/{repository.get('default_branch')}"
+    ):
+        return result
+    if not record_delivery(delivery_id, event):
+        result.status = "duplicate"
+        return result
+
+    try:
+        commits = get_push_commits(payload)
+        result.commits = len(commits)
+        if commits:
+            result.courses = get_repo_courses(repository["name"])
+            for course_name in result.courses:
+                with leases.hold_sync_lease(course_name, LEASE_WAIT):
+                    github.store_commits(commits, repository["name"], course_name)
+    except Exception:
+        # Forget the delivery, so that GitHub's redelivery is processed.
+        settings.database.github.deliveries.delete_one({"_id": delivery_id})
+        raise
+    if result.courses:
+        result.status = "stored"
+    return result
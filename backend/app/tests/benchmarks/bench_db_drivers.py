@@ -0,0 +1,75 @@
+"""Benchmark the routes with each database driver, while slow requests hold the thread pool.
+
+Sends concurrent requests for the students of a course to the route, with the pymongo driver
+and then with Motor, while other requests hold threads of the thread pool for a while, as slow
+exports and GitHub fetches do. Reports how long the requests took with each driver.
+
+Needs a MongoDB with a course, and Motor installed.
+
+Usage, from the backend/app directory, with MONGODB_ADDRESS and DB_NAME set:
+    python -m tests.benchmarks.bench_db_drivers --course cmput401 [--requests 200]
+        [--slow 40] [--slow-seconds 2]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from pymongo import MongoClient
+from starlette.concurrency import run_in_threadpool
+
+from server.config import settings
+from server.routes import students
+from server.util import db
+
+
+async def timed_request(course: str) -> float:
+    """Get the students of a course, and return how long it took."""
+    start = time.perf_counter()
+    await students.get_students_in_course_sprint(course, 0)
+    return time.perf_counter() - start
+
+
+async def run(course: str, requests: int, slow: int, slow_seconds: float):
+    """Send the requests while the slow requests hold the thread pool."""
+    slow_requests = [
+        asyncio.ensure_future(run_in_threadpool(time.sleep, slow_seconds))
+        for _ in range(slow)
+    ]
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed_request(course) for _ in range(requests)))
+    total = time.perf_counter() - start
+    await asyncio.gather(*slow_requests)
+    return total, sorted(latencies)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the database drivers.")
+    parser.add_argument("--course", required=True)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--slow", type=int, default=40)
+    parser.add_argument("--slow-seconds", type=float, default=2)
+    args = parser.parse_args()
+
+    settings.mongodb_client = MongoClient(settings.MONGODB_ADDRESS)
+    settings.database = settings.mongodb_client[settings.DB_NAME]
+    for driver in [db.PYMONGO, db.MOTOR]:
+        settings.DB_DRIVER = driver
+        db.connect()
+        # Warm up the caches and connections.
+        asyncio.run(run(args.course, 1, 0, 0))
+        total, latencies = asyncio.run(
+            run(args.course, args.requests, args.slow, args.slow_seconds)
+        )
+        db.close()
+        print(
+            f"{driver}: {total * 1000:.0f} ms for {args.requests} requests, "
+            f"median {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms"
+        )
+    settings.mongodb_client.close()
+
+
+if __name__ == "__main__":
+    main()
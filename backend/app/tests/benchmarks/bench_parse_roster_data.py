@@ -0,0 +1,113 @@
+"""Benchmark roster ingestion against the row by row implementation it replaced.
+
+Generates a synthetic roster CSV, turns it into student documents with both implementations,
+checks that they build the same documents and reports how long each one took. The baseline
+builds a Student per row and encodes it again before it is written, as post_student_data did.
+
+Usage, from the backend/app directory:
+    python -m tests.benchmarks.bench_parse_roster_data [--students 5000] [--repeat 3]
+"""
+# The baseline is a copy of the code it is compared against.
+# pylint: disable=duplicate-code
+import argparse
+import io
+import random
+import timeit
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+from server.models.students import Student
+from server.util.students import (
+    EXPERIENCE_SURVEY_FIELDS,
+    ROSTER_FIELDS,
+    parse_roster_data,
+)
+
+TEAM_SIZE = 6
+
+
+def make_roster_csv(students: int, seed: int = 0) -> str:
+    """Generate a roster CSV in the format of the course roster.
+
+    Some survey answers are left blank, and some GitHub accounts are all digits.
+
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(students):
+        team = i // TEAM_SIZE
+        rows.append(
+            {
+                "Email Address": f"student{i}@ualberta.ca",
+                "Full name (preferred)": f"Student {i}",
+                "First name (preferred)": "Student",
+                "Github Account": str(i) if rng.random() < 0.1 else f"student{i}",
+                "Project": f"Project {team}",
+                "Github repo": f"project-{team}",
+                "TA": f"TA {team % 10}",
+                **{
+                    column: "" if rng.random() < 0.1 else f"Answer to {column} " * 5
+                    for column in EXPERIENCE_SURVEY_FIELDS.values()
+                },
+            }
+        )
+    return pd.DataFrame(rows).to_csv(index=False)
+
+
+def legacy_parse_roster_data(file, coursename):
+    """The iterrows implementation of parse_roster_data, encoded as post_student_data did."""
+    roster_df = pd.read_csv(file)
+    roster_df.fillna("", inplace=True)
+    student_list = []
+    for _, row in roster_df.iterrows():
+        student_list.append(
+            Student(
+                email=row[ROSTER_FIELDS["email"]],
+                full_name=row[ROSTER_FIELDS["full_name"]],
+                source_control_username=row[ROSTER_FIELDS["source_control_username"]],
+                project=row[ROSTER_FIELDS["project"]],
+                repo_name=row[ROSTER_FIELDS["repo_name"]],
+                ta=row[ROSTER_FIELDS["ta"]],
+                course_name=coursename,
+                form_submitted=False,
+                experience_survey={
+                    field: row[column]
+                    for field, column in EXPERIENCE_SURVEY_FIELDS.items()
+                },
+            )
+        )
+    return [jsonable_encoder(student) for student in student_list]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark parse_roster_data.")
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    csv = make_roster_csv(args.students)
+    expected = legacy_parse_roster_data(io.StringIO(csv), "course")
+    actual = parse_roster_data(io.StringIO(csv), "course")
+    assert actual == expected, "The student documents are different"
+    print(f"Identical documents for {len(actual)} students")
+
+    timings = {}
+    for name, parse in [
+        ("iterrows", legacy_parse_roster_data),
+        ("columnar", parse_roster_data),
+    ]:
+        timings[name] = min(
+            timeit.repeat(
+                lambda parse=parse: parse(io.StringIO(csv), "course"),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(f"{name}: {timings[name] * 1000:.1f} ms")
+    print(f"Speedup: {timings['iterrows'] / timings['columnar']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
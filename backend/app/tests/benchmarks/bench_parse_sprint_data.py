@@ -0,0 +1,306 @@
+"""Benchmark parse_sprint_data against the row by row implementation it replaced.
+
+Generates a synthetic sprint CSV, parses it with both implementations, checks that they return
+the same sprint data and reports how long each one took.
+
+Usage, from the backend/app directory:
+    python -m tests.benchmarks.bench_parse_sprint_data [--students 1000] [--repeat 3]
+"""
+# The baseline is a copy of the code it is compared against.
+# pylint: disable=duplicate-code
+import argparse
+import io
+import math
+import random
+import timeit
+
+import pandas as pd
+
+from server.models.students import StudentSprintData
+from server.util.students import PERSONAL_PEER_REV_FIELDS, RATINGS, parse_sprint_data
+
+TEAM_SIZE = 6
+
+
+def make_sprint_csv(students: int, seed: int = 0) -> str:
+    """Generate a sprint CSV in the format of the peer review form.
+
+    Students are split into teams that review each other. Some students don't submit the form,
+    some reviews are left blank, and team members are written as either "email - name" or
+    "name - email".
+
+    """
+    rng = random.Random(seed)
+    columns = ["Timestamp", "Email Address", "Team"] + [
+        f"Question {i}" for i in range(len(PERSONAL_PEER_REV_FIELDS))
+    ]
+    for i in range(TEAM_SIZE):
+        columns += [f"Team member {i}", f"Rating {i}", f"Feedback {i}"]
+
+    emails = [f"student{i}@ualberta.ca" for i in range(students)]
+    # The form offers each team member as a fixed choice, in either format.
+    members = {
+        email: f"{email} - Student {i}" if i % 2 else f"Student{i} - {email}"
+        for i, email in enumerate(emails)
+    }
+    rows = []
+    for i, email in enumerate(emails):
+        # About one in ten students don't submit the form.
+        if rng.random() < 0.1:
+            continue
+        team_start = i - i % TEAM_SIZE
+        team = emails[team_start : team_start + TEAM_SIZE]
+        row = ["2022-10-01 12:00:00", email, f"Team {team_start // TEAM_SIZE}"]
+        row += [
+            rng.choice(["1", "2", "3", "4", "5", "Yes", "No comment"])
+            for _ in PERSONAL_PEER_REV_FIELDS
+        ]
+        for member in team:
+            if rng.random() < 0.05:
+                row += ["", "", ""]
+                continue
+            row.append(members[member])
+            row.append(rng.choice(list(RATINGS) + ["", "3"]))
+            row.append(rng.choice(["", "Wrote the backend", "Reviewed pull requests"]))
+        row += [""] * (len(columns) - len(row))
+        rows.append(row)
+
+    output = io.StringIO()
+    pd.DataFrame(rows, columns=columns).to_csv(output, index=False)
+    return output.getvalue()
+
+
+def normalize(sprint_data):
+    """Get comparable sprint data, ordered by email, with NaN replaced by None."""
+
+    def _normalize(value):
+        if isinstance(value, dict):
+            return {key: _normalize(item) for key, item in value.items()}
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        return value
+
+    return sorted(
+        (_normalize(data.dict()) for data in sprint_data),
+        key=lambda data: data["email"],
+    )
+
+
+def legacy_parse_sprint_data(file, sprint):
+    """The row by row implementation of parse_sprint_data that it replaced, kept as a baseline."""
+    # pylint: disable=too-many-locals,too-many-branches,too-many-statements
+    sprint_df = pd.read_csv(file)
+    # theres a strange issue where using pd.read_csv on some file objects, remove this check if thats not the case from frontend
+    if sprint_df.columns[1] != "Email Address":
+        sprint_df.rename(columns={sprint_df.columns[1]: "Email Address"}, inplace=True)
+        print(
+            sprint_df.columns,
+            "pandas misinterpreted the passed file object or your second column is not named 'Email Address'",
+        )
+    # get the data not related to other students
+    personal_data = pd.concat([sprint_df.iloc[:, [1]], sprint_df.iloc[:, 3:19]], axis=1)
+    personal_data.fillna("", inplace=True)
+    # get the data related to other students (ie ratings and feedback)
+    peer_ratings = pd.concat([sprint_df.iloc[:, [1]], sprint_df.iloc[:, 19:]], axis=1)
+    # below is mostly adapted from the provided jupyter aggregation script
+    # Renaming columns
+    for i in range(0, 6):
+        peer_ratings.rename(
+            columns={peer_ratings.columns[1 + (i * 3)]: f"student_{i}"}, inplace=True
+        )
+        peer_ratings.rename(
+            columns={peer_ratings.columns[1 + (i * 3) + 2]: f"feedback_{i}"},
+            inplace=True,
+        )
+        peer_ratings.rename(
+            columns={peer_ratings.columns[1 + (i * 3) + 1]: f"score_{i}"}, inplace=True
+        )
+    # convert ratings to numbers
+    mapping = {
+        "most valuable team member": 4,
+        "contributed substantially": 3,
+        "did ok": 2,
+        "did not do enough": 1,
+        "did practically nothing": 0,
+    }
+    peer_ratings[
+        ["score_0", "score_1", "score_2", "score_3", "score_4", "score_5"]
+    ] = peer_ratings[
+        ["score_0", "score_1", "score_2", "score_3", "score_4", "score_5"]
+    ].applymap(
+        lambda s: mapping.get(s) if s in mapping else s
+    )
+    peer_ratings[
+        ["score_0", "score_1", "score_2", "score_3", "score_4", "score_5"]
+    ] = peer_ratings[
+        ["score_0", "score_1", "score_2", "score_3", "score_4", "score_5"]
+    ].apply(
+        pd.to_numeric, errors="coerce"
+    )
+
+    # Combine students and scores into their own columns
+    feedback_df = pd.DataFrame(
+        {
+            "Student": pd.concat(
+                [
+                    peer_ratings["student_0"],
+                    peer_ratings["student_1"],
+                    peer_ratings["student_2"],
+                    peer_ratings["student_3"],
+                    peer_ratings["student_4"],
+                    peer_ratings["student_5"],
+                ],
+                axis=0,
+            ),
+            "Score": pd.concat(
+                [
+                    peer_ratings["score_0"],
+                    peer_ratings["score_1"],
+                    peer_ratings["score_2"],
+                    peer_ratings["score_3"],
+                    peer_ratings["score_4"],
+                    peer_ratings["score_5"],
+                ],
+                axis=0,
+            ),
+        }
+    )
+
+    # Grouping, sorting
+    # get avg and std deviation of scores per student
+    feedback_df = feedback_df.groupby("Student").agg({"Score": ["mean", "std"]})
+    feedback_df.columns = ["Score_Mean", "Score_Std"]
+    # get all emails of students who received a review
+    # accepts "email - name" and "name - email" formats
+    emails = pd.Series(
+        [
+            email.split()[2] if email.split()[0].find("@") == -1 else email.split()[0]
+            for email in feedback_df.index
+        ]
+    )
+    feedback_df.set_index(emails, inplace=True)
+    feedback_df.fillna(0, inplace=True)
+
+    # Associate student with their feedback
+    for i in range(0, 6):
+        peer_ratings[f"score_{i}"].fillna("", inplace=True)
+        peer_ratings[f"student_{i}"].fillna("", inplace=True)
+    # peer ratings are associated with the student receiving the rating and include the student who gave the rating
+    received_feedback = {}
+    for _, row in peer_ratings.iterrows():
+        for i in range(0, 6):
+            if row[f"student_{i}"] != "":
+                email_idx = (
+                    row[f"student_{i}"].split()[2]
+                    if row[f"student_{i}"].split()[0].find("@") == -1
+                    else row[f"student_{i}"].split()[0]
+                )
+                try:
+                    received_feedback[email_idx][row.iloc[0]] = {
+                        "rating": row[f"score_{i}"],
+                        "what_did_they_do": row[f"feedback_{i}"],
+                    }
+                except KeyError:
+                    received_feedback[email_idx] = {}
+                    received_feedback[email_idx][row.iloc[0]] = {
+                        "rating": row[f"score_{i}"],
+                        "what_did_they_do": row[f"feedback_{i}"],
+                    }
+
+    # create and return sprint data objects
+    sprint_data = []
+    submitted_emails = set()
+    for _, row in personal_data.iterrows():
+        if row["Email Address"] != "":
+            submitted_emails.add(row["Email Address"])
+            sprint_data.append(
+                StudentSprintData(
+                    email=row["Email Address"],
+                    sprint=sprint,
+                    personal_peer_rev={
+                        "meeting_participation": row.iloc[1],
+                        "meeting_content": row.iloc[2],
+                        "missed_meetings": row.iloc[3],
+                        "project_appropriate": row.iloc[4],
+                        "confident_to_learn_sd": row.iloc[5],
+                        "capable_to_learn_sd": row.iloc[6],
+                        "able_to_achieve_learning_goals": row.iloc[7],
+                        "able_to_meet_sd_challenge": row.iloc[8],
+                        "students_care": row.iloc[9],
+                        "connected_with_others": row.iloc[10],
+                        "hard_to_get_help": row.iloc[11],
+                        "uneasy_exposing_gaps": row.iloc[12],
+                        "reluctant_to_speak_openly": row.iloc[13],
+                        "can_rely_on_others": row.iloc[14],
+                        "given_opportunities_to_learn": row.iloc[15],
+                        "confident_others_will_support_me": row.iloc[16],
+                    },
+                    received_peer_revs=received_feedback[row["Email Address"]],
+                    avg_rating=feedback_df.loc[row["Email Address"]]["Score_Mean"],
+                    stddev_rating=feedback_df.loc[row["Email Address"]]["Score_Std"],
+                )
+            )
+    # add students who did not submit a peer review but were reviewed
+    emails = set(emails).difference(submitted_emails)
+    for email in emails:
+        sprint_data.append(
+            StudentSprintData(
+                email=email,
+                sprint=sprint,
+                personal_peer_rev={
+                    "meeting_participation": "Peer review was not sumitted.",
+                    "meeting_content": "Peer review was not sumitted.",
+                    "missed_meetings": "Peer review was not sumitted.",
+                    "project_appropriate": "Peer review was not sumitted.",
+                    "confident_to_learn_sd": "Peer review was not sumitted.",
+                    "capable_to_learn_sd": "Peer review was not sumitted.",
+                    "able_to_achieve_learning_goals": "Peer review was not sumitted.",
+                    "able_to_meet_sd_challenge": "Peer review was not sumitted.",
+                    "students_care": "Peer review was not sumitted.",
+                    "connected_with_others": "Peer review was not sumitted.",
+                    "hard_to_get_help": "Peer review was not sumitted.",
+                    "uneasy_exposing_gaps": "Peer review was not sumitted.",
+                    "reluctant_to_speak_openly": "Peer review was not sumitted.",
+                    "can_rely_on_others": "Peer review was not sumitted.",
+                    "given_opportunities_to_learn": "Peer review was not sumitted.",
+                    "confident_others_will_support_me": "Peer review was not sumitted.",
+                },
+                received_peer_revs=received_feedback[email],
+                avg_rating=feedback_df.loc[email]["Score_Mean"],
+                stddev_rating=feedback_df.loc[email]["Score_Std"],
+            )
+        )
+    return sprint_data
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark parse_sprint_data.")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    csv = make_sprint_csv(args.students)
+    expected = legacy_parse_sprint_data(io.StringIO(csv), 1)
+    actual = parse_sprint_data(io.StringIO(csv), 1)
+    assert normalize(actual) == normalize(expected), "The sprint data is different"
+    print(f"Identical sprint data for {len(actual)} students")
+
+    timings = {}
+    for name, parse in [
+        ("iterrows", legacy_parse_sprint_data),
+        ("columnar", parse_sprint_data),
+    ]:
+        timings[name] = min(
+            timeit.repeat(
+                lambda parse=parse: parse(io.StringIO(csv), 1),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(f"{name}: {timings[name] * 1000:.1f} ms")
+    print(f"Speedup: {timings['iterrows'] / timings['columnar']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
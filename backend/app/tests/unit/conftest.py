@@ -6,6 +6,8 @@ import pytest
 from requests import Response
 
 from server.config import settings
+from server.util.common import user_cache
+from server.util.github import token_manager
 from tests.unit import mock_data
 
 
@@ -19,8 +21,15 @@ def mock_settings():
     settings.HTTP_TIMEOUT = mock_data.HTTP_TIMEOUT
     settings.API_SECRET_KEY = mock_data.API_SECRET_KEY
     settings.database = mock_data.DATABASE
-    settings.github_token = mock_data.GITHUB_TOKEN
-    settings.github_expiration = mock_data.GITHUB_EXPIRATION
+    token_manager.token = mock_data.GITHUB_TOKEN
+    # Never expires, so that tests don't try to refresh it.
+    token_manager.expires_at = float("inf")
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    """Don't let the users looked up by one test be cached for the next."""
+    user_cache.invalidate()
 
 
 @pytest.fixture()
@@ -1,15 +1,26 @@
 """File for storing (generally large) mock data for unit testing."""
+from datetime import datetime, timezone
+
 import pymongo
 from fastapi.encoders import jsonable_encoder
 
 from server.models.comments import Comment, CommentResponse
-from server.models.courses import Course, Sprint
-from server.models.github import GithubRequest, StudentCommit, TeamCommit, TeamCommits
+from server.models.courses import Course, IndexReport, Sprint
+from server.models.github import (
+    GithubRequest,
+    RepoSyncResult,
+    SprintCommit,
+    StudentCommit,
+    TeamCommit,
+    TeamCommits,
+    TeamSprintCommits,
+)
 from server.models.minutes import Minute
 from server.models.models import AuthRequest, RefreshRequest
 from server.models.students import Student, StudentSprintData, StudentsResponse
 
 GITHUB_UTILS_PATH = "server.util.github"
+MIRRORS_UTILS_PATH = "server.util.mirrors"
 
 DB_ADDRESS = "mongodb://localhost:27017"
 DB_NAME = "test_db"
@@ -18,7 +29,7 @@ GITHUB_PRIVATE_KEY_PATH = "private/key/path.pem"
 HTTP_TIMEOUT = 60
 DATABASE = pymongo.MongoClient().test_database
 GITHUB_TOKEN = "test_github_token"
-GITHUB_EXPIRATION = "1234567890"
+GITHUB_EXPIRATION = "2022-01-01T00:00:00Z"
 GITHUB_INSTALLATION_ID = 123456
 GOOGLE_CLIENT_ID = "test_google_client_id"
 GOOGLE_CLIENT_SECRET = "test_google_client_secret"
@@ -41,6 +52,26 @@ GITHUB_COMMITS_JSON = [
     }
 ]
 
+# A commit read from a git mirror, which only knows the author's email.
+MIRROR_COMMITS_JSON = [
+    {
+        "sha": "a1b2c3d",
+        "author": None,
+        "commit": {
+            "author": {
+                "name": "Test User",
+                "email": "test@ualberta.ca",
+                "date": "2020-01-02T00:00:00Z",
+            },
+            "message": "Test mirror commit",
+        },
+        "stats": {"additions": 3, "deletions": 1, "total": 4},
+        "files": [
+            {"filename": "README.md", "additions": 3, "deletions": 1, "changes": 4}
+        ],
+    }
+]
+
 GITHUB_COMMITS = [
     {
         "sha": "f7c3b0c",
@@ -49,9 +80,24 @@ GITHUB_COMMITS = [
         "message": "Test commit",
         "repo_name": "test_repo",
         "fetched_at": "2020-01-01T00:00:00Z",
+        "sprint_number": 0,
     }
 ]
 
+HTTP_VALIDATORS = {
+    "url": "https://api.github.com/repos/owner/repo/commits?per_page=100",
+    "etag": 'W/"test_etag"',
+    "last_modified": "Wed, 01 Jan 2020 00:00:00 GMT",
+}
+
+GITHUB_SYNC_STATE = {
+    "repo_name": "test_repo",
+    "last_commit_at": datetime(2020, 1, 1, tzinfo=timezone.utc),
+    "validators": HTTP_VALIDATORS,
+    "fetched_at": datetime(2020, 1, 1, tzinfo=timezone.utc),
+    "pages": 1,
+}
+
 GITHUB_TOKEN_JSON = {
     "token": GITHUB_TOKEN,
     "expires_at": GITHUB_EXPIRATION,
@@ -88,10 +134,14 @@ GITHUB_REQUEST = GithubRequest(
     course_name="test_course",
 )
 
+REPO_SYNC_RESULT = RepoSyncResult(repo_name="test_repo", new_commits=1, pages_fetched=1)
+
 AUTH_REQUEST = AuthRequest(
     token="test_token",
 )
 
+ID_TOKEN_AUTH_REQUEST = AuthRequest(token="test_id_token", token_type="id_token")
+
 REFRESH_REQUEST = RefreshRequest(
     grant_type="refresh_token", refresh_token="test_refresh_token"
 )
@@ -135,6 +185,27 @@ TEAM_COMMIT_EMPTY = TeamCommit(
     number_of_commits=0,
 )
 
+TEAM_SPRINT_COMMIT_COUNTS = {"test_team": {1: 40, 0: 2}}
+
+TEAM_SPRINT_COMMITS = [
+    TeamSprintCommits(
+        team_name="empty_team",
+        total_commits=0,
+        sprint_commits=[
+            SprintCommit(sprint_number=1, number_of_commits=0),
+            SprintCommit(sprint_number=2, number_of_commits=0),
+        ],
+    ),
+    TeamSprintCommits(
+        team_name="test_team",
+        total_commits=42,
+        sprint_commits=[
+            SprintCommit(sprint_number=1, number_of_commits=40),
+            SprintCommit(sprint_number=2, number_of_commits=0),
+        ],
+    ),
+]
+
 GOOGLE_USER_JSON = {"email": "test_email"}
 
 STUDENT_UTILS_PATH = "server.util.students"
@@ -546,9 +617,17 @@ CREATED_COLLS = [
     ".students",
     ".students.sprints",
     ".github.commits",
+    ".github.rollups",
+    ".github.sync",
     ".minutes",
 ]
 
+INDEX_REPORT = IndexReport(
+    collection="test_course.github.commits",
+    missing=["repo_name_timestamp"],
+    unused=["repo_name_fetched_at"],
+)
+
 MEETING_MINUTES = Minute(
     title="October 24, 1988",
     body="Today we spent time doing nothing. It was a lot of fun and we will do the same tomorrow.",
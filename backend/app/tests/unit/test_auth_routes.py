@@ -1,4 +1,5 @@
 """Test API functions for handling Google OAuth."""
+import asyncio
 import json
 import time
 
@@ -24,7 +25,7 @@ def test_submit_auth(mocker, response_mock):
         "server.util.jwt.create_refresh_token", return_value="test_refresh_token"
     )
 
-    authentication = auth.submit_auth(mock_data.AUTH_REQUEST)
+    authentication = asyncio.run(auth.submit_auth(mock_data.AUTH_REQUEST))
     mock_get.assert_called_once()
     mock_valid_email_from_db.assert_called_once_with("test_email")
     mock_create_token.assert_called_once_with("test_email")
@@ -44,7 +45,7 @@ def test_submit_auth_invalid_token(mocker, response_mock):
     )
 
     with pytest.raises(HTTPException) as excinfo:
-        auth.submit_auth(mock_data.AUTH_REQUEST)
+        asyncio.run(auth.submit_auth(mock_data.AUTH_REQUEST))
     mock_get.assert_called_once()
     assert excinfo.value.status_code == 401
     assert excinfo.value.detail == "Could not validate credentials"
@@ -61,7 +62,7 @@ def test_submit_auth_invalid_email(mocker, response_mock):
     )
 
     with pytest.raises(HTTPException) as excinfo:
-        auth.submit_auth(mock_data.AUTH_REQUEST)
+        asyncio.run(auth.submit_auth(mock_data.AUTH_REQUEST))
     mock_get.assert_called_once()
     mock_valid_email_from_db.assert_called_once_with("test_email")
     assert excinfo.value.status_code == 401
@@ -69,6 +70,49 @@ def test_submit_auth_invalid_email(mocker, response_mock):
     assert excinfo.value.headers["WWW-Authenticate"] == "Bearer"
 
 
+def test_submit_auth_id_token(mocker):
+    """Test that an ID token is verified locally, without calling Google."""
+    mock_get = mocker.patch("requests.get")
+    mock_verify_id_token = mocker.patch(
+        "server.util.google.verify_id_token", return_value="test_email"
+    )
+    mocker.patch("server.util.jwt.valid_email_from_db", return_value=True)
+    mocker.patch("server.util.jwt.create_token", return_value="test_access_token")
+    mocker.patch(
+        "server.util.jwt.create_refresh_token", return_value="test_refresh_token"
+    )
+
+    authentication = asyncio.run(auth.submit_auth(mock_data.ID_TOKEN_AUTH_REQUEST))
+    mock_verify_id_token.assert_called_once_with("test_id_token")
+    mock_get.assert_not_called()
+    assert json.loads(authentication.body.decode())["email"] == "test_email"
+
+
+def test_submit_auth_invalid_id_token(mocker):
+    """Test that an invalid ID token is not authorized."""
+    mocker.patch(
+        "server.util.google.verify_id_token", side_effect=ValueError("invalid")
+    )
+    mock_valid_email_from_db = mocker.patch("server.util.jwt.valid_email_from_db")
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(auth.submit_auth(mock_data.ID_TOKEN_AUTH_REQUEST))
+    mock_valid_email_from_db.assert_not_called()
+    assert excinfo.value.status_code == 401
+    assert excinfo.value.detail == "Could not validate credentials"
+
+
+def test_submit_auth_certs_unavailable(mocker):
+    """Test 503 error when Google's certificates can't be fetched to verify an ID token."""
+    mocker.patch(
+        "server.util.google.verify_id_token",
+        side_effect=HTTPException(503, "Unable to get Google's certificates"),
+    )
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(auth.submit_auth(mock_data.ID_TOKEN_AUTH_REQUEST))
+    assert excinfo.value.status_code == 503
+
+
 def test_refresh(mocker, response_mock):
     """Test successfully generates a new auth token using refresh token"""
     mock_valid_email_from_db = mocker.patch(
@@ -81,7 +125,7 @@ def test_refresh(mocker, response_mock):
         "server.util.jwt.decode_token",
         return_value={"exp": time.time() + 60, "sub": "test_email"},
     )
-    authentication = auth.refresh(mock_data.REFRESH_REQUEST)
+    authentication = asyncio.run(auth.refresh(mock_data.REFRESH_REQUEST))
     mock_valid_email_from_db.assert_called_once_with("test_email")
     mock_decode_token.assert_called_once_with("test_refresh_token")
     mock_create_token.assert_called_once_with("test_email")
@@ -99,7 +143,7 @@ def test_refresh_invalid_token(mocker, response_mock):
     )
 
     with pytest.raises(HTTPException) as excinfo:
-        auth.refresh(mock_data.REFRESH_REQUEST)
+        asyncio.run(auth.refresh(mock_data.REFRESH_REQUEST))
     mock_decode_token.assert_called_once()
     assert excinfo.value.status_code == 401
     assert excinfo.value.detail == "Could not validate credentials"
@@ -117,7 +161,7 @@ def test_refresh_invalid_email(mocker, response_mock):
     )
 
     with pytest.raises(HTTPException) as excinfo:
-        auth.refresh(mock_data.REFRESH_REQUEST)
+        asyncio.run(auth.refresh(mock_data.REFRESH_REQUEST))
     mock_decode_token.assert_called_once()
     mock_valid_email_from_db.assert_called_once_with("test_email")
     assert excinfo.value.status_code == 401
@@ -127,7 +171,7 @@ def test_refresh_invalid_email(mocker, response_mock):
 
 def test_check_auth():
     """Test that check_auth returns as expected."""
-    response = auth.check_auth()
+    response = asyncio.run(auth.check_auth())
     assert response == "Valid"
 
 
@@ -136,7 +180,7 @@ def test_logout(mocker):
     mock_add_blacklist_token = mocker.patch(
         "server.util.jwt.add_blacklist_token", return_value=True
     )
-    response = auth.logout("test_access_token")
+    response = asyncio.run(auth.logout("test_access_token"))
     mock_add_blacklist_token.assert_called_once_with("test_access_token")
     assert json.loads(response.body.decode()) == {"result": True}
 
@@ -147,7 +191,7 @@ def test_logout_invalid_token(mocker):
         "server.util.jwt.add_blacklist_token", return_value=False
     )
     with pytest.raises(HTTPException) as excinfo:
-        auth.logout("test_access_token")
+        asyncio.run(auth.logout("test_access_token"))
     mock_add_blacklist_token.assert_called_once_with("test_access_token")
     assert excinfo.value.status_code == 401
     assert excinfo.value.detail == "Could not validate credentials"
@@ -1,34 +1,130 @@
 """Test common utilities."""
+import asyncio
 
 import pytest
 from fastapi import HTTPException
 
 from server.util import common
+from tests.unit import mock_data
 
 
 def test_check_course_in_db(mocker):
     """Test successfully checking if a course has the specified subcollection."""
-    validate_collection_mock = mocker.patch(
-        "pymongo.database.Database.validate_collection"
+    exists_mock = mocker.patch(
+        "server.util.common.course_registry.exists", return_value=True
     )
     common.check_course_in_db("test", [".test"])
-    validate_collection_mock.assert_called_once()
+    exists_mock.assert_called_once_with("test", [".test"])
 
 
 def test_check_course_in_db_not_found(mocker):
     """Test failing to find a course in the database."""
-    mocker.patch(
-        "pymongo.database.Database.validate_collection", side_effect=Exception()
-    )
+    mocker.patch("server.util.common.course_registry.exists", return_value=False)
     with pytest.raises(HTTPException) as exc:
         common.check_course_in_db("test", [".test"])
-        assert exc.status_code == 404
-        assert exc.detail == "Course test does not exist"
+    assert exc.value.status_code == 404
+    assert exc.value.detail == "Course test does not exist"
+
+
+def test_check_course_in_db_async_cached(mocker):
+    """Test that a course in a fresh cache is found without reloading the cache."""
+    mocker.patch("server.util.common.course_registry.is_cached", return_value=True)
+    mock_check = mocker.patch("server.util.common.check_course_in_db")
+    asyncio.run(common.check_course_in_db_async("test", [".test"]))
+    mock_check.assert_not_called()
+
+
+def test_check_course_in_db_async_not_cached(mocker):
+    """Test that the course is checked on the thread pool when it isn't in a fresh cache."""
+    mocker.patch("server.util.common.course_registry.is_cached", return_value=False)
+    mock_check = mocker.patch(
+        "server.util.common.check_course_in_db", side_effect=HTTPException(404)
+    )
+    with pytest.raises(HTTPException):
+        asyncio.run(common.check_course_in_db_async("test", [".test"]))
+    mock_check.assert_called_once_with("test", [".test"])
+
+
+class TestCourseRegistry:
+    @pytest.fixture()
+    def list_mock(self, mocker):
+        """Mock the collections in the database."""
+        return mocker.patch(
+            "pymongo.database.Database.list_collection_names",
+            return_value=["test.sprints", "test.students", "test2.sprints", "user"],
+        )
+
+    @pytest.fixture()
+    def find_mock(self, mocker):
+        """Mock the documents in the courses collection."""
+        return mocker.patch(
+            "pymongo.collection.Collection.find",
+            return_value=[{"name": "test"}, {"name": "test2"}, {"name": "test3"}],
+        )
+
+    @pytest.fixture()
+    def registry(self, list_mock, find_mock):
+        """A course registry backed by a mocked database."""
+        return common.CourseRegistry()
+
+    def test_exists(self, registry):
+        """Test that courses and their subcollections are found."""
+        assert registry.exists("test", [".sprints", ".students"])
+        assert registry.exists("test2", [".sprints"])
+        assert registry.exists("test3", [])
+
+    def test_exists_not_found(self, registry):
+        """Test that missing courses and subcollections are not found."""
+        assert not registry.exists("test2", [".students"])
+        assert not registry.exists("test4", [])
+
+    def test_exists_cached(self, registry, list_mock, find_mock):
+        """Test that the database is only queried once while the cache is fresh."""
+        registry.exists("test", [".sprints"])
+        registry.exists("test2", [".sprints"])
+        list_mock.assert_called_once()
+        find_mock.assert_called_once()
+
+    def test_exists_expired(self, registry, list_mock, mocker):
+        """Test that the cache is reloaded once it is older than the TTL."""
+        mocker.patch("server.config.settings.COURSE_CACHE_TTL", -1)
+        registry.exists("test", [".sprints"])
+        registry.exists("test", [".sprints"])
+        assert list_mock.call_count == 2
+
+    def test_exists_miss_reload_limited(self, registry, list_mock):
+        """Test that repeated lookups of a missing course do not reload the cache every time."""
+        registry.exists("test4", [])
+        registry.exists("test4", [])
+        list_mock.assert_called_once()
+
+    def test_invalidate(self, registry, list_mock):
+        """Test that invalidating the cache reloads it on the next lookup."""
+        registry.exists("test", [".sprints"])
+        registry.invalidate()
+        registry.exists("test", [".sprints"])
+        assert list_mock.call_count == 2
+
+    def test_is_cached(self, registry, list_mock, mocker):
+        """Test that the cache is checked without being loaded, and only while it is fresh."""
+        assert not registry.is_cached("test", [".sprints"])
+        list_mock.assert_not_called()
+        registry.exists("test", [".sprints"])
+        assert registry.is_cached("test", [".sprints"])
+        assert not registry.is_cached("test", [".students.sprints"])
+        mocker.patch("server.config.settings.COURSE_CACHE_TTL", -1)
+        assert not registry.is_cached("test", [".sprints"])
+
+    def test_exists_refresh(self, registry, list_mock):
+        """Test that a refresh can be forced."""
+        registry.exists("test", [".sprints"])
+        registry.exists("test", [".sprints"], refresh=True)
+        assert list_mock.call_count == 2
 
 
 def test_get_sprint_list(mocker):
     """Test getting a list of sprints for a course."""
-    mocker.patch("pymongo.database.Database.validate_collection")
+    mocker.patch("server.util.common.check_course_in_db")
     find_mock = mocker.patch(
         "pymongo.collection.Collection.find",
         return_value=[{"sprint_number": 1}, {"sprint_number": 2}],
@@ -38,26 +134,58 @@ def test_get_sprint_list(mocker):
     find_mock.assert_called_once()
 
 
-def test_check_user_assigned_to_course(mocker):
+def test_check_user_assigned_to_course():
     """Test successfully checking if a user is assigned to a course."""
-    find_mock = mocker.patch(
-        "pymongo.collection.Collection.find_one",
-        return_value={"assigned_courses": ["test"]},
-    )
-    common.check_user_assigned_to_course("admin@gmail.com", "test")
-    find_mock.assert_called_once()
+    common.check_user_assigned_to_course(mock_data.USER_JSON, "course_name")
 
 
-def test_check_user_assigned_to_course_not_assigned(mocker):
+def test_check_user_assigned_to_course_not_assigned():
     """Test failing to find a user assigned to a course."""
-    find_mock = mocker.patch(
-        "pymongo.collection.Collection.find_one",
-        return_value={"assigned_courses": ["test"]},
-    )
     with pytest.raises(HTTPException) as exc:
-        common.check_user_assigned_to_course("admin@gmail.com", "course_name")
-        assert exc.status_code == 401
-        assert (
-            exc.detail == "User admin@gmail.com is not authorized to access course_name"
-        )
-    find_mock.assert_called_once()
+        common.check_user_assigned_to_course(mock_data.USER_JSON, "other_course")
+    assert exc.value.status_code == 401
+    assert (
+        exc.value.detail == "User test_email is not authorized to access other_course"
+    )
+
+
+def test_user_cache(mocker):
+    """Test that users are only loaded once until they expire or are invalidated."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value=mock_data.USER_JSON
+    )
+    user_cache = common.UserCache()
+    assert user_cache.get("test_email") == mock_data.USER_JSON
+    assert user_cache.get("test_email") == mock_data.USER_JSON
+    mock_find_one.assert_called_once_with({"email": "test_email"})
+
+    user_cache.invalidate("test_email")
+    user_cache.get("test_email")
+    assert mock_find_one.call_count == 2
+
+    mocker.patch("server.config.settings.USER_CACHE_TTL", -1)
+    user_cache.get("test_email")
+    assert mock_find_one.call_count == 3
+
+
+def test_user_cache_missing_user(mocker):
+    """Test that emails without a user are cached too."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value=None
+    )
+    user_cache = common.UserCache()
+    assert user_cache.get("unknown_email") is None
+    assert user_cache.get("unknown_email") is None
+    mock_find_one.assert_called_once()
+
+
+def test_user_cache_get_async(mocker):
+    """Test that users loaded through the async database share the cache."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value=mock_data.USER_JSON
+    )
+    user_cache = common.UserCache()
+    assert asyncio.run(user_cache.get_async("test_email")) == mock_data.USER_JSON
+    assert user_cache.get("test_email") == mock_data.USER_JSON
+    assert asyncio.run(user_cache.get_async("test_email")) == mock_data.USER_JSON
+    mock_find_one.assert_called_once_with({"email": "test_email"})
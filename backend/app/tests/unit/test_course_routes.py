@@ -1,20 +1,32 @@
 """Unit tests for the course routes."""
+import asyncio
+from datetime import datetime
 
 import pymongo
 import pytest
 from fastapi import HTTPException
-from pymongo.errors import OperationFailure
 
+from server.repositories.courses import COURSE_FIELDS
 from server.routes import courses
+from server.util.dates import to_datetime
 from tests.unit import mock_data
 
 
+@pytest.fixture(name="sync_lease", autouse=True)
+def fixture_sync_lease(mocker):
+    """Mock the sync lease that the sprint routes hold while restamping the course."""
+    return {
+        "wait_for": mocker.patch("server.util.leases.wait_for", return_value=True),
+        "release": mocker.patch("server.util.leases.release"),
+    }
+
+
 def test_get_courses(mocker):
     """Test successfully getting all courses from the database."""
     mock_find = mocker.patch(
         "pymongo.collection.Collection.find", return_value=[mock_data.COURSE_JSON]
     )
-    course_list = courses.get_courses()
+    course_list = asyncio.run(courses.get_courses())
     mock_find.assert_called_once()
     assert course_list == [mock_data.COURSE]
 
@@ -23,7 +35,7 @@ def test_get_courses_empty(mocker):
     """Test a successful empty response when there are no courses in the database."""
     mock_find = mocker.patch("pymongo.collection.Collection.find", return_value=[])
 
-    course_list = courses.get_courses()
+    course_list = asyncio.run(courses.get_courses())
     mock_find.assert_called_once()
     assert not course_list
 
@@ -31,23 +43,41 @@ def test_get_courses_empty(mocker):
 def test_create_course(mocker):
     """Test successfully creating a new course."""
     mock_create_collection = mocker.patch("pymongo.database.Database.create_collection")
-    mock_validate_course = mocker.patch(
-        "pymongo.database.Database.validate_collection",
-        side_effect=OperationFailure(""),
+    mock_course_exists = mocker.patch(
+        "server.routes.courses.course_registry.exists", return_value=False
     )
+    mock_invalidate = mocker.patch("server.routes.courses.course_registry.invalidate")
     mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
-
-    courses.create_course(
-        mock_data.COURSE,
-        "user_email",
+    mock_create_course_indexes = mocker.patch(
+        "server.routes.courses.create_course_indexes"
     )
+
+    mock_invalidate_user = mocker.patch("server.routes.courses.user_cache.invalidate")
+    asyncio.run(courses.create_course(mock_data.COURSE, mock_data.USER_JSON))
     for coll in mock_data.CREATED_COLLS:
         mock_create_collection.assert_any_call("course_name" + coll)
-    mock_validate_course.assert_called_once()
+    mock_course_exists.assert_called_once_with(
+        "course_name", [".sprints"], refresh=True
+    )
+    mock_invalidate.assert_called_once()
+    mock_create_course_indexes.assert_called_once_with("course_name")
+    # The user is reloaded with the course they were assigned to.
+    mock_invalidate_user.assert_called_once_with("test_email")
     assert mock_create_collection.call_count == len(mock_data.CREATED_COLLS)
     assert mock_update_one.call_count == 2
 
 
+def test_create_course_already_exists(mocker):
+    """Test 400 error when creating a course that already exists."""
+    mock_create_collection = mocker.patch("pymongo.database.Database.create_collection")
+    mocker.patch("server.routes.courses.course_registry.exists", return_value=True)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(courses.create_course(mock_data.COURSE, mock_data.USER_JSON))
+    mock_create_collection.assert_not_called()
+    assert exc_info.value.status_code == 400
+
+
 def test_get_courses_for_user(mocker):
     """Test successfully getting all courses for a user from the database."""
     mock_find_one = mocker.patch(
@@ -56,25 +86,34 @@ def test_get_courses_for_user(mocker):
     mock_find = mocker.patch(
         "pymongo.collection.Collection.find", return_value=[mock_data.COURSE_JSON]
     )
-    course_list = courses.get_courses_for_user("test_email")
+    course_list = asyncio.run(courses.get_courses_for_user("test_email"))
     mock_find_one.assert_called_once_with({"email": "test_email"})
-    mock_find.assert_called_once()
+    # Only the user's courses are fetched.
+    mock_find.assert_called_once_with(
+        {"name": {"$in": mock_data.USER_JSON["assigned_courses"]}}, COURSE_FIELDS
+    )
     assert course_list == [mock_data.COURSE]
 
 
 def test_delete_course(mocker):
     """Test successfully deleting a single course from the database."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course"
     )
     mock_drop_collection = mocker.patch("pymongo.database.Database.drop_collection")
     mock_delete_one = mocker.patch("pymongo.collection.Collection.delete_one")
     mock_update_many = mocker.patch("pymongo.collection.Collection.update_many")
+    mock_invalidate = mocker.patch("server.routes.courses.course_registry.invalidate")
+    mock_invalidate_users = mocker.patch("server.routes.courses.user_cache.invalidate")
 
-    courses.delete_course("test_course", "test_email")
+    asyncio.run(courses.delete_course("test_course", mock_data.USER_JSON))
+    mock_invalidate.assert_called_once()
+    mock_invalidate_users.assert_called_once_with()
     mock_check_course_in_db.assert_called_once_with("test_course", [".sprints"])
-    mock_check_user_assigned.assert_called_once_with("test_email", "test_course")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "test_course")
     assert mock_drop_collection.call_count == len(mock_data.CREATED_COLLS)
     mock_delete_one.assert_called_once_with({"name": "test_course"})
     mock_update_many.assert_called_once_with(
@@ -86,71 +125,148 @@ def test_delete_course(mocker):
 def test_delete_course_invalid_course(mocker):
     """Test 404 error when deleting a course that does not exist."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.courses.check_course_in_db", side_effect=HTTPException(404)
+        "server.routes.courses.check_course_in_db_async", side_effect=HTTPException(404)
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.delete_course("test_course")
+        asyncio.run(courses.delete_course("test_course"))
     mock_check_course_in_db.assert_called_once_with("test_course", [".sprints"])
     assert exc_info.value.status_code == 404
 
 
 def test_delete_course_user_unassigned(mocker):
     """Test 401 error when deleting a course that the user is not assigned to."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course",
         side_effect=HTTPException(401),
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.delete_course("test_course", "test_email")
+        asyncio.run(courses.delete_course("test_course", mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "test_course")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "test_course")
+    assert exc_info.value.status_code == 401
+
+
+def test_get_course_indexes(mocker):
+    """Test successfully getting the index report for a course."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
+    mock_check_user_assigned = mocker.patch(
+        "server.routes.courses.check_user_assigned_to_course"
+    )
+    mock_get_index_report = mocker.patch(
+        "server.routes.courses.get_index_report",
+        return_value=[mock_data.INDEX_REPORT],
+    )
+
+    report = asyncio.run(courses.get_course_indexes("test_course", mock_data.USER_JSON))
+    mock_check_course_in_db.assert_called_once_with("test_course", [".sprints"])
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "test_course")
+    mock_get_index_report.assert_called_once_with("test_course")
+    assert report == [mock_data.INDEX_REPORT]
+
+
+def test_get_course_indexes_user_unassigned(mocker):
+    """Test 401 error when getting the index report of a course the user is not assigned to."""
+    mocker.patch("server.routes.courses.check_course_in_db_async")
+    mocker.patch(
+        "server.routes.courses.check_user_assigned_to_course",
+        side_effect=HTTPException(401),
+    )
+    mock_get_index_report = mocker.patch("server.routes.courses.get_index_report")
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(courses.get_course_indexes("test_course", mock_data.USER_JSON))
+    mock_get_index_report.assert_not_called()
     assert exc_info.value.status_code == 401
 
 
 def test_get_sprints(mocker):
     """Test successfully getting all sprints for a course from the database."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course"
     )
     mock_find = mocker.patch(
         "pymongo.collection.Collection.find", return_value=[mock_data.SPRINT_JSON]
     )
-    sprints = courses.get_sprints("course_name", "test_email")
+    sprints = asyncio.run(courses.get_sprints("course_name", mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     mock_find.assert_called_once()
     assert sprints == [mock_data.SPRINT]
 
 
+def test_get_sprints_dates(mocker):
+    """Test that sprint dates stored as dates are returned as strings."""
+    mocker.patch("server.routes.courses.check_course_in_db_async")
+    mocker.patch("server.routes.courses.check_user_assigned_to_course")
+    mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[
+            {
+                **mock_data.SPRINT_JSON,
+                "start_date": datetime(2020, 1, 1),
+                "end_date": datetime(2020, 1, 2),
+            }
+        ],
+    )
+    assert asyncio.run(courses.get_sprints("course_name", mock_data.USER_JSON)) == [
+        mock_data.SPRINT
+    ]
+
+
+def test_create_sprint_dates(mocker):
+    """Test that the dates of a new sprint are stored as dates."""
+    mocker.patch("server.routes.courses.check_course_in_db_async")
+    mocker.patch("server.routes.courses.check_user_assigned_to_course")
+    mocker.patch("pymongo.collection.Collection.find_one", return_value=None)
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    mocker.patch("server.util.sprints.stamp_sprint_numbers")
+    asyncio.run(
+        courses.create_sprint("course_name", mock_data.SPRINT, mock_data.USER_JSON)
+    )
+    document = mock_update_one.call_args.args[1]["$set"]
+    assert document["start_date"] == to_datetime(mock_data.SPRINT.start_date)
+    assert document["end_date"] == to_datetime(mock_data.SPRINT.end_date)
+
+
 def test_get_sprints_user_unassigned(mocker):
     """Test 401 error when getting sprints for a course the user is not assigned to."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course",
         side_effect=HTTPException(401),
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.get_sprints("course_name", "test_email")
+        asyncio.run(courses.get_sprints("course_name", mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     assert exc_info.value.status_code == 401
 
 
 def test_get_sprints_empty(mocker):
     """Test a successful empty response when there are no sprints for the specified course in the database."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course"
     )
     mock_find = mocker.patch("pymongo.collection.Collection.find", return_value=[])
-    sprints = courses.get_sprints("course_name", "test_email")
+    sprints = asyncio.run(courses.get_sprints("course_name", mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     mock_find.assert_called_once()
     assert not sprints
 
@@ -158,44 +274,74 @@ def test_get_sprints_empty(mocker):
 def test_get_sprints_invalid_course(mocker):
     """Test 404 error when getting sprints for a course that has no sprints."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.courses.check_course_in_db", side_effect=HTTPException(404)
+        "server.routes.courses.check_course_in_db_async", side_effect=HTTPException(404)
     )
     mock_find = mocker.patch("pymongo.collection.Collection.find")
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.get_sprints("course_name")
+        asyncio.run(courses.get_sprints("course_name"))
     mock_check_course_in_db.assert_called_once()
     mock_find.assert_not_called()
     assert exc_info.value.status_code == 404
 
 
-def test_create_sprint(mocker):
+def test_create_sprint(mocker, sync_lease):
     """Test successfully creating a new sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course"
     )
     mock_check_exists = mocker.patch(
-        "pymongo.collection.Collection.count_documents", return_value=0
+        "pymongo.collection.Collection.find_one", return_value=None
     )
     mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    mock_stamp_sprint_numbers = mocker.patch("server.util.sprints.stamp_sprint_numbers")
 
-    courses.create_sprint("course_name", mock_data.SPRINT, "test_email")
+    asyncio.run(
+        courses.create_sprint("course_name", mock_data.SPRINT, mock_data.USER_JSON)
+    )
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     mock_check_exists.assert_called_once()
     mock_update_one.assert_called_once()
+    # The commits and meeting minutes in the new sprint are stamped with it.
+    mock_stamp_sprint_numbers.assert_called_once_with("course_name")
+    # While holding the sync lease of the course.
+    sync_lease["wait_for"].assert_called_once()
+    sync_lease["release"].assert_called_once_with("github.sync:course_name")
+
+
+def test_create_sprint_syncing(mocker, sync_lease):
+    """Test 409 error, without saving the sprint, when the course is being synced."""
+    mocker.patch("server.routes.courses.check_course_in_db_async")
+    mocker.patch("server.routes.courses.check_user_assigned_to_course")
+    mocker.patch("pymongo.collection.Collection.find_one", return_value=None)
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    mock_stamp_sprint_numbers = mocker.patch("server.util.sprints.stamp_sprint_numbers")
+    sync_lease["wait_for"].return_value = False
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(
+            courses.create_sprint("course_name", mock_data.SPRINT, mock_data.USER_JSON)
+        )
+    assert exc_info.value.status_code == 409
+    mock_update_one.assert_not_called()
+    mock_stamp_sprint_numbers.assert_not_called()
+    sync_lease["release"].assert_not_called()
 
 
 def test_create_sprint_invalid_coursename(mocker):
     """Test 404 error when passing an invalid course name."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.courses.check_course_in_db", side_effect=HTTPException(404)
+        "server.routes.courses.check_course_in_db_async", side_effect=HTTPException(404)
     )
     mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.create_sprint("course_name", mock_data.SPRINT, "test_email")
+        asyncio.run(
+            courses.create_sprint("course_name", mock_data.SPRINT, mock_data.USER_JSON)
+        )
     mock_check_course_in_db.assert_called_once()
     mock_update_one.assert_not_called()
     assert exc_info.value.status_code == 404
@@ -203,23 +349,29 @@ def test_create_sprint_invalid_coursename(mocker):
 
 def test_create_sprint_user_unassigned(mocker):
     """Test 401 error when user is not assigned to the course."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course",
         side_effect=HTTPException(401),
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.create_sprint("course_name", mock_data.SPRINT, "test_email")
+        asyncio.run(
+            courses.create_sprint("course_name", mock_data.SPRINT, mock_data.USER_JSON)
+        )
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
 
     assert exc_info.value.status_code == 401
 
 
 def test_delete_sprint(mocker):
     """Test successfully deleting a single sprint from the database."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course"
     )
@@ -228,30 +380,34 @@ def test_delete_sprint(mocker):
         return_value=pymongo.results.DeleteResult({"n": 1}, 1),
     )
     mock_delete_many = mocker.patch("pymongo.collection.Collection.delete_many")
+    mock_stamp_sprint_numbers = mocker.patch("server.util.sprints.stamp_sprint_numbers")
 
-    courses.delete_sprint("course_name", 1, "test_email")
+    asyncio.run(courses.delete_sprint("course_name", 1, mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once_with("course_name", [".sprints"])
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     mock_delete_one.assert_called_once_with({"sprint_number": 1})
     assert mock_delete_one.return_value.deleted_count == 1
     mock_delete_many.assert_called_once_with({"sprint": 1})
+    mock_stamp_sprint_numbers.assert_called_once_with("course_name")
 
 
 def test_delete_sprint_invalid_course(mocker):
     """Test 404 error when deleting a sprint from a course that does not exist."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.courses.check_course_in_db", side_effect=HTTPException(404)
+        "server.routes.courses.check_course_in_db_async", side_effect=HTTPException(404)
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.delete_sprint("course_name", 1, "test_email")
+        asyncio.run(courses.delete_sprint("course_name", 1, mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once_with("course_name", [".sprints"])
     assert exc_info.value.status_code == 404
 
 
 def test_delete_sprint_invalid_sprint(mocker):
     """Test 404 error when deleting a sprint that does not exist."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course"
     )
@@ -261,9 +417,9 @@ def test_delete_sprint_invalid_sprint(mocker):
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.delete_sprint("course_name", 1, "test_email")
+        asyncio.run(courses.delete_sprint("course_name", 1, mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once_with("course_name", [".sprints"])
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     mock_delete_one.assert_called_once_with({"sprint_number": 1})
     assert exc_info.value.status_code == 404
     assert mock_delete_one.return_value.deleted_count == 0
@@ -271,48 +427,54 @@ def test_delete_sprint_invalid_sprint(mocker):
 
 def test_delete_sprint_user_unassigned(mocker):
     """Test 401 error when deleting a sprint from a course the user is not assigned to."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course",
         side_effect=HTTPException(401),
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.delete_sprint("course_name", 1, "test_email")
+        asyncio.run(courses.delete_sprint("course_name", 1, mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once_with("course_name", [".sprints"])
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     assert exc_info.value.status_code == 401
 
 
 def test_update_course(mocker):
     """Test successfully updating a course."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course"
     )
     mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
 
-    courses.update_course(mock_data.COURSE, "test_email")
+    asyncio.run(courses.update_course(mock_data.COURSE, mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     mock_update_one.assert_called_once()
 
 
 def test_update_course_invalid_course(mocker):
     """Test 404 error when updating a course that does not exist."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.courses.check_course_in_db", side_effect=HTTPException(404)
+        "server.routes.courses.check_course_in_db_async", side_effect=HTTPException(404)
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.update_course(mock_data.COURSE, "test_email")
+        asyncio.run(courses.update_course(mock_data.COURSE, mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once()
     assert exc_info.value.status_code == 404
 
 
 def test_update_course_unassigned_user(mocker):
     """Test 401 error when user is not assigned to the course."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course",
         side_effect=HTTPException(401),
@@ -320,64 +482,80 @@ def test_update_course_unassigned_user(mocker):
     mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.update_course(mock_data.COURSE, "test_email")
+        asyncio.run(courses.update_course(mock_data.COURSE, mock_data.USER_JSON))
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     mock_update_one.assert_not_called()
     assert exc_info.value.status_code == 401
 
 
 def test_update_sprint(mocker):
     """Test successfully updating a sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course"
     )
-    mock_count_documents = mocker.patch("pymongo.collection.Collection.count_documents")
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value={"_id": 1}
+    )
     mock_update_one = mocker.patch(
         "pymongo.collection.Collection.update_one", return_value=1
     )
+    mock_stamp_sprint_numbers = mocker.patch("server.util.sprints.stamp_sprint_numbers")
 
-    courses.update_sprint(mock_data.SPRINT, "course_name", "test_email")
+    asyncio.run(
+        courses.update_sprint(mock_data.SPRINT, "course_name", mock_data.USER_JSON)
+    )
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
-    mock_count_documents.assert_called_once()
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
+    mock_find_one.assert_called_once_with({"sprint_number": 1}, {"_id": 1})
     mock_update_one.assert_called_once()
+    mock_stamp_sprint_numbers.assert_called_once_with("course_name")
 
 
 def test_update_sprint_invalid_course(mocker):
     """Test 404 error when updating a sprint from a course that does not exist."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.courses.check_course_in_db", side_effect=HTTPException(404)
+        "server.routes.courses.check_course_in_db_async", side_effect=HTTPException(404)
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.update_sprint(mock_data.SPRINT, "course_name", "test_email")
+        asyncio.run(
+            courses.update_sprint(mock_data.SPRINT, "course_name", mock_data.USER_JSON)
+        )
     mock_check_course_in_db.assert_called_once()
     assert exc_info.value.status_code == 404
 
 
 def test_update_sprint_invalid_sprint(mocker):
     """Test 404 error when updating a sprint that does not exist."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course"
     )
-    mock_count_documents = mocker.patch(
-        "pymongo.collection.Collection.count_documents", return_value=0
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value=None
     )
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.update_sprint(mock_data.SPRINT, "course_name", "test_email")
+        asyncio.run(
+            courses.update_sprint(mock_data.SPRINT, "course_name", mock_data.USER_JSON)
+        )
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
-    mock_count_documents.assert_called_once()
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
+    mock_find_one.assert_called_once()
     assert exc_info.value.status_code == 404
 
 
 def test_update_sprint_unassigned_user(mocker):
     """Test 401 error when user is not assigned to the course."""
-    mock_check_course_in_db = mocker.patch("server.routes.courses.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.courses.check_course_in_db_async"
+    )
     mock_check_user_assigned = mocker.patch(
         "server.routes.courses.check_user_assigned_to_course",
         side_effect=HTTPException(401),
@@ -385,8 +563,10 @@ def test_update_sprint_unassigned_user(mocker):
     mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
 
     with pytest.raises(HTTPException) as exc_info:
-        courses.update_sprint(mock_data.SPRINT, "course_name", "test_email")
+        asyncio.run(
+            courses.update_sprint(mock_data.SPRINT, "course_name", mock_data.USER_JSON)
+        )
     mock_check_course_in_db.assert_called_once()
-    mock_check_user_assigned.assert_called_once_with("test_email", "course_name")
+    mock_check_user_assigned.assert_called_once_with(mock_data.USER_JSON, "course_name")
     mock_update_one.assert_not_called()
     assert exc_info.value.status_code == 401
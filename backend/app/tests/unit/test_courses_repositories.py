@@ -0,0 +1,73 @@
+"""Test the queries of the courses and their sprints."""
+import asyncio
+
+import pymongo
+
+from server.repositories import courses
+from tests.unit import mock_data
+
+
+def test_find_courses(mocker):
+    """Test that every course is found with only the fields of a course."""
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find", return_value=[mock_data.COURSE_JSON]
+    )
+    assert asyncio.run(courses.find_courses()) == [mock_data.COURSE_JSON]
+    mock_find.assert_called_once_with({}, courses.COURSE_FIELDS)
+    assert courses.COURSE_FIELDS["_id"] == 0
+    assert courses.COURSE_FIELDS["roster_file_name"] == 1
+
+
+def test_find_courses_by_name(mocker):
+    """Test that only the courses with the given names are found."""
+    mock_find = mocker.patch("pymongo.collection.Collection.find", return_value=[])
+    asyncio.run(courses.find_courses(["course_name"]))
+    mock_find.assert_called_once_with(
+        {"name": {"$in": ["course_name"]}}, courses.COURSE_FIELDS
+    )
+
+
+def test_get_sprint_numbers(mocker):
+    """Test that only the sprint numbers are fetched, and are returned in order."""
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"sprint_number": 2}, {"sprint_number": 1}],
+    )
+    assert asyncio.run(courses.get_sprint_numbers("course_name")) == [1, 2]
+    mock_find.assert_called_once_with({}, {"_id": 0, "sprint_number": 1})
+
+
+def test_sprint_exists(mocker):
+    """Test that a sprint is looked up by its _id alone."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", side_effect=[{"_id": 1}, None]
+    )
+    assert asyncio.run(courses.sprint_exists("course_name", 1))
+    assert not asyncio.run(courses.sprint_exists("course_name", 2))
+    mock_find_one.assert_called_with({"sprint_number": 2}, {"_id": 1})
+
+
+def test_get_forms_url(mocker):
+    """Test that only the forms URL of a sprint is fetched, and None for no sprint."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one",
+        side_effect=[{"forms_url": mock_data.SPRINT.forms_url}, None],
+    )
+    assert asyncio.run(courses.get_forms_url("course_name", 1)) == (
+        mock_data.SPRINT.forms_url
+    )
+    assert asyncio.run(courses.get_forms_url("course_name", 2)) is None
+    mock_find_one.assert_called_with({"sprint_number": 2}, {"_id": 0, "forms_url": 1})
+
+
+def test_delete_sprint(mocker):
+    """Test that whether the sprint existed is returned."""
+    mocker.patch(
+        "pymongo.collection.Collection.delete_one",
+        side_effect=[
+            pymongo.results.DeleteResult({"n": 1}, 1),
+            pymongo.results.DeleteResult({"n": 0}, 1),
+        ],
+    )
+    assert asyncio.run(courses.delete_sprint("course_name", 1))
+    assert not asyncio.run(courses.delete_sprint("course_name", 1))
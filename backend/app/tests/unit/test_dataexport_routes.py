@@ -1,6 +1,10 @@
 """Unit tests for data export routes."""
+import asyncio
+import io
+
 import pandas as pd
 
+from server.repositories.students import STUDENT_FIELDS
 from server.routes import dataexport
 from tests.unit import mock_data
 
@@ -8,7 +12,7 @@ from tests.unit import mock_data
 def test_export_roster_data(mocker):
     """Test exporting roster data."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.dataexport.check_course_in_db"
+        "server.routes.dataexport.check_course_in_db_async"
     )
     mock_roster_data_to_df = mocker.patch(
         "server.routes.dataexport.roster_data_to_df",
@@ -19,7 +23,7 @@ def test_export_roster_data(mocker):
         return_value=[dict(mock_data.STUDENT_ROSTER_RETURN[0])],
     )
 
-    dataexport.export_roster_data("course1")
+    asyncio.run(dataexport.export_roster_data("course1"))
     mock_check_course_in_db.assert_called_once()
     mock_roster_data_to_df.assert_called_once_with(mock_data.STUDENT_ROSTER_RETURN)
     mock_find.assert_called_once()
@@ -28,7 +32,7 @@ def test_export_roster_data(mocker):
 def test_export_sprint_data(mocker):
     """Test exporting sprint data."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.dataexport.check_course_in_db"
+        "server.routes.dataexport.check_course_in_db_async"
     )
     mock_sprint_data_to_df = mocker.patch(
         "server.routes.dataexport.sprint_data_to_df",
@@ -42,18 +46,20 @@ def test_export_sprint_data(mocker):
         ],
     )
 
-    dataexport.export_sprint_data("course1", 1)
+    asyncio.run(dataexport.export_sprint_data("course1", 1))
     mock_check_course_in_db.assert_called_once()
     mock_sprint_data_to_df.assert_called_once_with(
         mock_data.STUDENT_SPRINT_RETURN, mock_data.TEAM_MAP
     )
+    # Only the email and team of each student are fetched for the team map.
+    mock_find.assert_called_with({}, {"_id": 0, "email": 1, "project": 1})
     assert mock_find.call_count == 2
 
 
 def test_export_all_data(mocker):
     """Test exporting all data to an excel workbook."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.dataexport.check_course_in_db"
+        "server.routes.dataexport.check_course_in_db_async"
     )
     mock_get_sprint_list = mocker.patch(
         "server.routes.dataexport.get_sprint_list",
@@ -75,13 +81,15 @@ def test_export_all_data(mocker):
         ],
     )
 
-    dataexport.export_all_data("course1")
+    asyncio.run(dataexport.export_all_data("course1"))
     mock_check_course_in_db.assert_called_once()
     mock_get_sprint_list.assert_called_once()
     mock_roster_data_to_df.assert_called_once_with(mock_data.STUDENT_ROSTER_RETURN)
     mock_sprint_data_to_df.assert_called_once_with(
         mock_data.STUDENT_SPRINT_RETURN, mock_data.TEAM_MAP
     )
+    # The team map is built from the roster, rather than fetching the students again.
+    mock_find.assert_any_call({}, STUDENT_FIELDS)
     assert mock_find.call_count == 2
 
 
@@ -91,7 +99,7 @@ def test_export_all_data_no_sprints(mocker):
     The xslx should only contain a roster sheet.
     """
     mock_check_course_in_db = mocker.patch(
-        "server.routes.dataexport.check_course_in_db"
+        "server.routes.dataexport.check_course_in_db_async"
     )
     mock_get_sprint_list = mocker.patch(
         "server.routes.dataexport.get_sprint_list",
@@ -106,7 +114,7 @@ def test_export_all_data_no_sprints(mocker):
         return_value=[dict(mock_data.STUDENT_ROSTER_RETURN[0])],
     )
 
-    dataexport.export_all_data("course1")
+    asyncio.run(dataexport.export_all_data("course1"))
     mock_check_course_in_db.assert_called_once()
     mock_get_sprint_list.assert_called_once()
     mock_roster_data_to_df.assert_called_once_with(mock_data.STUDENT_ROSTER_RETURN)
@@ -120,7 +128,7 @@ def test_export_all_data_no_roster(mocker):
     "This student does not appear in the roster.".
     """
     mock_check_course_in_db = mocker.patch(
-        "server.routes.dataexport.check_course_in_db"
+        "server.routes.dataexport.check_course_in_db_async"
     )
     mock_get_sprint_list = mocker.patch(
         "server.routes.dataexport.get_sprint_list",
@@ -138,8 +146,55 @@ def test_export_all_data_no_roster(mocker):
         ],
     )
 
-    dataexport.export_all_data("course1")
+    asyncio.run(dataexport.export_all_data("course1"))
     mock_check_course_in_db.assert_called_once()
     mock_get_sprint_list.assert_called_once()
     mock_sprint_data_to_df.assert_called_once_with(mock_data.STUDENT_SPRINT_RETURN, {})
     assert mock_find.call_count == 2
+
+
+def test_submit_export_all_data(mocker):
+    """Test that a job is queued to export all data for a course."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.dataexport.check_course_in_db_async"
+    )
+    mock_submit = mocker.patch("server.util.jobs.submit")
+    asyncio.run(dataexport.submit_export_all_data("course1"))
+    mock_check_course_in_db.assert_called_once()
+    mock_submit.assert_called_once_with(
+        "export.all", "course1", {"course_name": "course1"}
+    )
+
+
+def test_run_export_all_data(mocker):
+    """Test that an export job produces the workbook and reports each sheet written."""
+    mocker.patch("server.routes.dataexport.get_sprint_list", return_value=[1])
+    mocker.patch(
+        "server.routes.dataexport.roster_data_to_df",
+        return_value=pd.DataFrame(mock_data.ROSTER_DF_DICT),
+    )
+    mocker.patch(
+        "server.routes.dataexport.sprint_data_to_df",
+        return_value=pd.DataFrame(mock_data.SPRINT_DF_DICT),
+    )
+    mocker.patch(
+        "pymongo.collection.Collection.find",
+        side_effect=[
+            [dict(mock_data.STUDENT_ROSTER_RETURN[0])],
+            [dict(mock_data.STUDENT_SPRINT_RETURN[0])],
+        ],
+    )
+    report_progress = mocker.Mock()
+    file = dataexport.run_export_all_data(
+        {"params": {"course_name": "course1"}}, report_progress
+    )
+    assert file.name == "course1_all.xlsx"
+    assert file.media_type == dataexport.XLSX_MEDIA_TYPE
+    assert set(pd.read_excel(io.BytesIO(file.content), sheet_name=None)) == {
+        "Roster",
+        "Sprint 1",
+    }
+    assert [call.args[0] for call in report_progress.call_args_list] == [
+        {"sheets": 1, "total": 2},
+        {"sheets": 2, "total": 2},
+    ]
@@ -0,0 +1,48 @@
+"""Test the conversion between ISO 8601 strings and stored dates."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from server.util import dates
+
+UTC_DATE = datetime(2022, 9, 5, 19, 5, 45, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2022-09-05T19:05:45Z",
+        "2022-09-05T19:05:45+00:00",
+        "2022-09-05T13:05:45-06:00",
+        # Timestamps without a timezone are in UTC.
+        "2022-09-05T19:05:45",
+        datetime(2022, 9, 5, 19, 5, 45),
+        datetime(2022, 9, 5, 13, 5, 45, tzinfo=timezone(timedelta(hours=-6))),
+    ],
+)
+def test_to_datetime(value):
+    """Test that every representation of the same instant is converted to the same date."""
+    assert dates.to_datetime(value) == UTC_DATE
+    assert dates.to_datetime(value).tzinfo == timezone.utc
+
+
+def test_to_datetime_invalid():
+    """Test that an error is raised for strings that aren't ISO 8601."""
+    with pytest.raises(ValueError):
+        dates.to_datetime("September 5, 2022")
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        (datetime(2022, 9, 5, 19, 5, 45), "2022-09-05T19:05:45Z"),
+        (UTC_DATE, "2022-09-05T19:05:45Z"),
+        (datetime(2022, 9, 5, 19, 5, 45, 123000), "2022-09-05T19:05:45.123Z"),
+        # Strings that haven't been migrated are returned as they are.
+        ("2022-09-05T19:05:45+00:00", "2022-09-05T19:05:45+00:00"),
+        (None, None),
+    ],
+)
+def test_to_iso(value, expected):
+    """Test that stored dates are returned as ISO 8601 UTC strings."""
+    assert dates.to_iso(value) == expected
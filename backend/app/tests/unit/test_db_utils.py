@@ -0,0 +1,110 @@
+"""Test the async access to the database, with each driver."""
+import asyncio
+
+import pytest
+from pydantic import BaseModel, Field
+
+from server.config import settings
+from server.util import db
+
+
+class MockMotorCursor:
+    """A Motor cursor over a list of documents."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length):
+        """Get the documents."""
+        assert length is None
+        return self.documents
+
+
+@pytest.fixture(name="motor_collection")
+def fixture_motor_collection(mocker, monkeypatch):
+    """A Motor collection, with the motor driver selected."""
+    collection = mocker.MagicMock()
+    collection.find_one = mocker.AsyncMock(return_value={"name": "test_course"})
+    monkeypatch.setattr(settings, "DB_DRIVER", db.MOTOR)
+    monkeypatch.setattr(settings, "motor_database", {"courses": collection})
+    return collection
+
+
+def test_find(mocker):
+    """Test that the cursor is read to the end with pymongo."""
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=iter([{"name": "test_course"}]),
+    )
+    courses = asyncio.run(db.collection("courses").find({}, {"name": 1}))
+    assert courses == [{"name": "test_course"}]
+    mock_find.assert_called_once_with({}, {"name": 1})
+
+
+def test_aggregate(mocker):
+    """Test that the aggregation is read to the end with pymongo."""
+    mock_aggregate = mocker.patch(
+        "pymongo.collection.Collection.aggregate", return_value=iter([{"count": 2}])
+    )
+    pipeline = [{"$count": "count"}]
+    assert asyncio.run(db.collection("courses").aggregate(pipeline)) == [{"count": 2}]
+    mock_aggregate.assert_called_once_with(pipeline)
+
+
+def test_find_one(mocker):
+    """Test that operations are passed on to pymongo."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value={"name": "test_course"}
+    )
+    course = asyncio.run(
+        db.collection("courses").find_one({"name": "test_course"}, {"name": 1})
+    )
+    assert course == {"name": "test_course"}
+    mock_find_one.assert_called_once_with({"name": "test_course"}, {"name": 1})
+
+
+def test_create_and_drop_collection(mocker):
+    """Test that collections are created and dropped with pymongo."""
+    mock_create = mocker.patch("pymongo.database.Database.create_collection")
+    mock_drop = mocker.patch("pymongo.database.Database.drop_collection")
+    asyncio.run(db.create_collection("test_course.sprints"))
+    asyncio.run(db.drop_collection("test_course.sprints"))
+    mock_create.assert_called_once_with("test_course.sprints")
+    mock_drop.assert_called_once_with("test_course.sprints")
+
+
+def test_motor_find(motor_collection):
+    """Test that the Motor cursor is read to the end."""
+    motor_collection.find.return_value = MockMotorCursor([{"name": "test_course"}])
+    courses = asyncio.run(db.collection("courses").find({}, {"name": 1}))
+    assert courses == [{"name": "test_course"}]
+    motor_collection.find.assert_called_once_with({}, {"name": 1})
+
+
+def test_motor_find_one(mocker, motor_collection):
+    """Test that operations are awaited with Motor, without pymongo."""
+    mock_find_one = mocker.patch("pymongo.collection.Collection.find_one")
+    course = asyncio.run(db.collection("courses").find_one({"name": "test_course"}))
+    assert course == {"name": "test_course"}
+    motor_collection.find_one.assert_awaited_once_with({"name": "test_course"})
+    mock_find_one.assert_not_called()
+
+
+def test_get_projection():
+    """Test that the projection has every field of the model, by alias, without the _id."""
+
+    class Model(BaseModel):
+        """A model with an aliased field."""
+
+        name: str
+        file_name: str = Field(alias="fileName")
+
+    assert db.get_projection(Model) == {"_id": 0, "name": 1, "fileName": 1}
+
+
+def test_connect_pymongo(monkeypatch):
+    """Test that no Motor client is created with the pymongo driver."""
+    monkeypatch.setattr(settings, "DB_DRIVER", db.PYMONGO)
+    db.connect()
+    assert settings.motor_client is None
+    db.close()
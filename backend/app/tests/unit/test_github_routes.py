@@ -1,51 +1,91 @@
 """Test API functions for interacting with GitHub."""
+import asyncio
+
 import pytest
-from fastapi import HTTPException
+from fastapi import HTTPException, Request
 
+from server.config import settings
+from server.models.github import CourseSyncRequest, RateLimitStatus, TeamSprintCommits
 from server.routes import github
 from tests.unit import mock_data
 
 
+@pytest.fixture(name="sync_lease", autouse=True)
+def fixture_sync_lease(mocker):
+    """Mock the sync lease that the routes hold while storing commits or rebuilding rollups."""
+    return {
+        "wait_for": mocker.patch("server.util.leases.wait_for", return_value=True),
+        "release": mocker.patch("server.util.leases.release"),
+    }
+
+
+ROLLUPS_PATH = "server.util.rollups"
+
+
 def test_get_student_github_commits(mocker):
     """Test that the correct data is returned for a student's GitHub commits."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
-    mock_count_documents = mocker.patch(
-        "pymongo.collection.Collection.count_documents",
-        return_value=42,
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
+    mock_count_commits = mocker.patch(
+        f"{ROLLUPS_PATH}.count_commits", return_value={"test_student": {0: 42}}
+    )
+    student_commit = asyncio.run(
+        github.get_student_github_commits("test_course", 0, "test_student")
     )
-    student_commit = github.get_student_github_commits("test_course", 0, "test_student")
     mock_check_course_in_db.assert_called_once()
-    mock_count_documents.assert_called_once()
+    # Every sprint is counted when getting all commits.
+    mock_count_commits.assert_called_once_with(
+        "test_course", "author", {"author": "test_student"}
+    )
     assert student_commit == mock_data.STUDENT_COMMIT
 
 
 def test_get_student_sprint_github_commits(mocker):
     """Test that the correct data is returned for a student's GitHub commits for the specified sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one",
         return_value=mock_data.SPRINT_DATES,
     )
-    mock_count_documents = mocker.patch(
-        "pymongo.collection.Collection.count_documents",
-        return_value=42,
+    mock_count_commits = mocker.patch(
+        f"{ROLLUPS_PATH}.count_commits",
+        return_value={"test_student": {1: 42}},
+    )
+    student_commit = asyncio.run(
+        github.get_student_github_commits("test_course", 1, "test_student")
     )
-    student_commit = github.get_student_github_commits("test_course", 1, "test_student")
     mock_check_course_in_db.assert_called_once()
-    mock_find_one.assert_called_once()
-    mock_count_documents.assert_called_once()
+    mock_find_one.assert_called_once_with({"sprint_number": 1}, {"_id": 1})
+    mock_count_commits.assert_called_once_with(
+        "test_course", "author", {"author": "test_student", "sprint_number": 1}
+    )
     assert student_commit == mock_data.STUDENT_COMMIT
 
 
+def test_get_student_github_commits_empty(mocker):
+    """Test that zero is returned for a student without commits."""
+    mocker.patch("server.routes.github.check_course_in_db_async")
+    mocker.patch(f"{ROLLUPS_PATH}.count_commits", return_value={})
+    student_commit = asyncio.run(
+        github.get_student_github_commits("test_course", 0, "test_student")
+    )
+    assert student_commit == mock_data.STUDENT_COMMIT_EMPTY
+
+
 def test_get_student_github_commits_invalid_sprint(mocker):
     """Test 404 error when trying to get a student's commits for a non-existent sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one",
         return_value=None,
     )
     with pytest.raises(HTTPException) as exc_info:
-        github.get_student_github_commits("test_course", 1, "test_student")
+        asyncio.run(github.get_student_github_commits("test_course", 1, "test_student"))
         mock_check_course_in_db.assert_called_once()
         mock_find_one.assert_called_once()
         assert exc_info.value.status_code == 404
@@ -54,96 +94,129 @@ def test_get_student_github_commits_invalid_sprint(mocker):
 def test_get_student_github_commits_invalid_course(mocker):
     """Test 404 error when trying to get a student's commits for a non-existent course."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.github.check_course_in_db",
+        "server.routes.github.check_course_in_db_async",
         side_effect=HTTPException(404),
     )
     with pytest.raises(HTTPException) as exc_info:
-        github.get_student_github_commits("test_course", 1, "test_student")
+        asyncio.run(github.get_student_github_commits("test_course", 1, "test_student"))
         mock_check_course_in_db.assert_called_once()
         assert exc_info.value.status_code == 404
 
 
 def test_get_team_github_commits(mocker):
     """Test that the correct data is returned for a team's GitHub commits."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_distinct = mocker.patch(
         "pymongo.collection.Collection.distinct",
         return_value=["test_student"],
     )
-    mock_count_documents = mocker.patch(
-        "pymongo.collection.Collection.count_documents",
-        return_value=42,
+    mock_count_commits = mocker.patch(
+        f"{ROLLUPS_PATH}.count_commits", return_value={"test_student": {0: 42}}
+    )
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one",
+        return_value=mock_data.GITHUB_SYNC_STATE,
     )
-    mock_aggregate = mocker.patch(
-        "pymongo.collection.Collection.aggregate",
-        return_value=iter(mock_data.GITHUB_COMMITS),
+    team_commits = asyncio.run(
+        github.get_team_github_commits("test_course", "test_repo", 0)
     )
-    team_commits = github.get_team_github_commits("test_course", "test_repo", 0)
     mock_check_course_in_db.assert_called_once()
-    assert mock_distinct.call_count == 2
-    mock_count_documents.assert_called_once()
-    mock_aggregate.assert_called_once()
+    mock_distinct.assert_called_once_with(
+        "source_control_username", {"repo_name": "test_repo"}
+    )
+    mock_count_commits.assert_called_once_with(
+        "test_course", "author", {"repo_name": "test_repo"}
+    )
+    mock_find_one.assert_called_once_with(
+        {"repo_name": "test_repo"}, {"_id": 0, "fetched_at": 1}
+    )
     assert team_commits == mock_data.TEAM_COMMITS
 
 
 def test_get_team_sprint_github_commits(mocker):
     """Test that the correct data is returned for a team's GitHub commits for the specified sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one",
-        return_value=mock_data.SPRINT_DATES,
+        side_effect=[mock_data.SPRINT_DATES, mock_data.GITHUB_SYNC_STATE],
     )
     mock_distinct = mocker.patch(
         "pymongo.collection.Collection.distinct",
         return_value=["test_student"],
     )
-    mock_count_documents = mocker.patch(
-        "pymongo.collection.Collection.count_documents",
-        return_value=42,
+    mock_count_commits = mocker.patch(
+        f"{ROLLUPS_PATH}.count_commits", return_value={"test_student": {1: 42}}
     )
-    mock_aggregate = mocker.patch(
-        "pymongo.collection.Collection.aggregate",
-        return_value=iter(mock_data.GITHUB_COMMITS),
+    team_commits = asyncio.run(
+        github.get_team_github_commits("test_course", "test_repo", 1)
     )
-    team_commits = github.get_team_github_commits("test_course", "test_repo", 1)
     mock_check_course_in_db.assert_called_once()
-    mock_find_one.assert_called_once()
-    assert mock_distinct.call_count == 2
-    mock_count_documents.assert_called_once()
-    mock_aggregate.assert_called_once()
+    assert mock_find_one.call_count == 2
+    mock_distinct.assert_called_once()
+    mock_count_commits.assert_called_once_with(
+        "test_course", "author", {"repo_name": "test_repo", "sprint_number": 1}
+    )
+    assert team_commits == mock_data.TEAM_COMMITS
+
+
+def test_get_team_github_commits_no_sync_state(mocker):
+    """Test that the last fetched date falls back to the commits of repositories synced
+    before sync states were recorded."""
+    mocker.patch("server.routes.github.check_course_in_db_async")
+    mocker.patch(
+        "pymongo.collection.Collection.distinct", return_value=["test_student"]
+    )
+    mocker.patch(
+        f"{ROLLUPS_PATH}.count_commits", return_value={"test_student": {0: 42}}
+    )
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one",
+        side_effect=[None, mock_data.GITHUB_COMMITS[0]],
+    )
+    team_commits = asyncio.run(
+        github.get_team_github_commits("test_course", "test_repo", 0)
+    )
+    mock_find_one.assert_called_with(
+        {"repo_name": "test_repo"},
+        {"_id": 0, "fetched_at": 1},
+        sort=[("fetched_at", -1)],
+    )
     assert team_commits == mock_data.TEAM_COMMITS
 
 
 def test_get_team_github_commits_empty(mocker):
-    """Test that zero counts are returned when a team has no commits."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    """Test that zero counts are returned for roster students when a team has no commits."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one",
-        return_value=mock_data.SPRINT_DATES,
+        side_effect=[mock_data.SPRINT_DATES, None, None],
     )
     mock_distinct = mocker.patch(
         "pymongo.collection.Collection.distinct",
         return_value=["test_student"],
     )
-    mock_count_documents = mocker.patch(
-        "pymongo.collection.Collection.count_documents", return_value=0
-    )
-    mock_aggregate = mocker.patch(
-        "pymongo.collection.Collection.aggregate",
-        return_value=iter([]),
+    mock_count_commits = mocker.patch(f"{ROLLUPS_PATH}.count_commits", return_value={})
+    team_commits = asyncio.run(
+        github.get_team_github_commits("test_course", "test_repo", 1)
     )
-    team_commits = github.get_team_github_commits("test_course", "test_repo", 1)
     mock_check_course_in_db.assert_called_once()
-    mock_find_one.assert_called_once()
-    assert mock_distinct.call_count == 2
-    mock_count_documents.assert_called_once()
-    mock_aggregate.assert_called_once()
+    assert mock_find_one.call_count == 3
+    mock_distinct.assert_called_once()
+    mock_count_commits.assert_called_once()
     assert team_commits == mock_data.TEAM_COMMITS_EMPTY
 
 
 def test_get_team_github_commits_invalid_sprint(mocker):
     """Test 404 error when trying to get a team's commits for a non-existent sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_distinct = mocker.patch(
         "pymongo.collection.Collection.distinct",
         return_value=["test_student"],
@@ -153,7 +226,7 @@ def test_get_team_github_commits_invalid_sprint(mocker):
         return_value=None,
     )
     with pytest.raises(HTTPException) as exc_info:
-        github.get_team_github_commits("test_course", "test_repo", 1)
+        asyncio.run(github.get_team_github_commits("test_course", "test_repo", 1))
         mock_check_course_in_db.assert_called_once()
         mock_distinct.assert_called_once()
         mock_find_one.assert_called_once()
@@ -163,36 +236,39 @@ def test_get_team_github_commits_invalid_sprint(mocker):
 def test_get_team_github_commits_invalid_course(mocker):
     """Test 404 error when trying to get a team's commits for a non-existent course."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.github.check_course_in_db",
+        "server.routes.github.check_course_in_db_async",
         side_effect=HTTPException(404),
     )
     with pytest.raises(HTTPException) as exc_info:
-        github.get_team_github_commits("test_course", "test_repo", 1)
+        asyncio.run(github.get_team_github_commits("test_course", "test_repo", 1))
         mock_check_course_in_db.assert_called_once()
         assert exc_info.value.status_code == 404
 
 
 def test_get_teams_github_commits(mocker):
     """Test that the correct data is returned for all teams' GitHub commits."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_distinct = mocker.patch(
         "pymongo.collection.Collection.distinct",
         return_value=["test_team"],
     )
-    mock_count_documents = mocker.patch(
-        "pymongo.collection.Collection.count_documents",
-        return_value=42,
+    mock_count_commits = mocker.patch(
+        f"{ROLLUPS_PATH}.count_commits", return_value={"test_team": {0: 42}}
     )
-    team_commits = github.get_teams_github_commits("test_course", 0)
+    team_commits = asyncio.run(github.get_teams_github_commits("test_course", 0))
     mock_check_course_in_db.assert_called_once()
-    assert mock_distinct.call_count == 2
-    mock_count_documents.assert_called_once()
+    mock_distinct.assert_called_once_with("repo_name")
+    mock_count_commits.assert_called_once_with("test_course", "repo_name", {})
     assert team_commits == [mock_data.TEAM_COMMIT]
 
 
 def test_get_teams_sprint_github_commits(mocker):
     """Test that the correct data is returned for all teams' GitHub commits for the specified sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one",
         return_value=mock_data.SPRINT_DATES,
@@ -201,21 +277,24 @@ def test_get_teams_sprint_github_commits(mocker):
         "pymongo.collection.Collection.distinct",
         return_value=["test_team"],
     )
-    mock_count_documents = mocker.patch(
-        "pymongo.collection.Collection.count_documents",
-        return_value=42,
+    mock_count_commits = mocker.patch(
+        f"{ROLLUPS_PATH}.count_commits", return_value={"test_team": {1: 42}}
     )
-    team_commits = github.get_teams_github_commits("test_course", 1)
+    team_commits = asyncio.run(github.get_teams_github_commits("test_course", 1))
     mock_check_course_in_db.assert_called_once()
     mock_find_one.assert_called_once()
-    assert mock_distinct.call_count == 2
-    mock_count_documents.assert_called_once()
+    mock_distinct.assert_called_once()
+    mock_count_commits.assert_called_once_with(
+        "test_course", "repo_name", {"sprint_number": 1}
+    )
     assert team_commits == [mock_data.TEAM_COMMIT]
 
 
 def test_get_teams_github_commits_empty(mocker):
     """Test that zero counts are returned when no teams have commits."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one",
         return_value=mock_data.SPRINT_DATES,
@@ -224,21 +303,20 @@ def test_get_teams_github_commits_empty(mocker):
         "pymongo.collection.Collection.distinct",
         return_value=["test_team"],
     )
-    mock_count_documents = mocker.patch(
-        "pymongo.collection.Collection.count_documents",
-        return_value=0,
-    )
-    team_commits = github.get_teams_github_commits("test_course", 1)
+    mock_count_commits = mocker.patch(f"{ROLLUPS_PATH}.count_commits", return_value={})
+    team_commits = asyncio.run(github.get_teams_github_commits("test_course", 1))
     mock_check_course_in_db.assert_called_once()
     mock_find_one.assert_called_once()
-    assert mock_distinct.call_count == 2
-    mock_count_documents.assert_called_once()
+    mock_distinct.assert_called_once()
+    mock_count_commits.assert_called_once()
     assert team_commits == [mock_data.TEAM_COMMIT_EMPTY]
 
 
 def test_get_teams_github_commits_invalid_sprint(mocker):
     """Test 404 error when trying to get all teams' commits for a non-existent sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.github.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
     mock_distinct = mocker.patch(
         "pymongo.collection.Collection.distinct",
         return_value=["test_student"],
@@ -248,7 +326,7 @@ def test_get_teams_github_commits_invalid_sprint(mocker):
         return_value=None,
     )
     with pytest.raises(HTTPException) as exc_info:
-        github.get_teams_github_commits("test_course", 1)
+        asyncio.run(github.get_teams_github_commits("test_course", 1))
         mock_check_course_in_db.assert_called_once()
         mock_distinct.assert_called_once()
         mock_find_one.assert_called_once()
@@ -258,26 +336,255 @@ def test_get_teams_github_commits_invalid_sprint(mocker):
 def test_get_teams_github_commits_invalid_course(mocker):
     """Test 404 error when trying to get all teams' commits for a non-existent course."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.github.check_course_in_db",
+        "server.routes.github.check_course_in_db_async",
         side_effect=HTTPException(404),
     )
     with pytest.raises(HTTPException) as exc_info:
-        github.get_teams_github_commits("test_course", 1)
+        asyncio.run(github.get_teams_github_commits("test_course", 1))
         mock_check_course_in_db.assert_called_once()
         assert exc_info.value.status_code == 404
 
 
+def test_get_teams_sprint_github_commits_matrix(mocker):
+    """Test that each team's commits are returned for every sprint."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
+    sprints = [
+        {"sprint_number": 2, **mock_data.SPRINT_DATES},
+        {"sprint_number": 1, **mock_data.SPRINT_DATES},
+    ]
+    mock_find = mocker.patch("pymongo.collection.Collection.find", return_value=sprints)
+    mock_distinct = mocker.patch(
+        "pymongo.collection.Collection.distinct",
+        return_value=["test_team", "empty_team"],
+    )
+    mock_count_commits = mocker.patch(
+        f"{ROLLUPS_PATH}.count_commits",
+        return_value=mock_data.TEAM_SPRINT_COMMIT_COUNTS,
+    )
+    team_commits = asyncio.run(github.get_teams_sprint_github_commits("test_course"))
+    mock_check_course_in_db.assert_called_once()
+    mock_find.assert_called_once()
+    mock_distinct.assert_called_once_with("repo_name")
+    # Every sprint is counted, so that the totals include commits outside of sprints.
+    mock_count_commits.assert_called_once_with("test_course", "repo_name", {})
+    assert team_commits == mock_data.TEAM_SPRINT_COMMITS
+
+
+def test_get_teams_sprint_github_commits_matrix_no_sprints(mocker):
+    """Test that only totals are returned when a course has no sprints."""
+    mocker.patch("server.routes.github.check_course_in_db_async")
+    mocker.patch("pymongo.collection.Collection.find", return_value=[])
+    mocker.patch("pymongo.collection.Collection.distinct", return_value=[])
+    mocker.patch(f"{ROLLUPS_PATH}.count_commits", return_value={"test_team": {0: 42}})
+    team_commits = asyncio.run(github.get_teams_sprint_github_commits("test_course"))
+    assert team_commits == [
+        TeamSprintCommits(team_name="test_team", total_commits=42, sprint_commits=[])
+    ]
+
+
+def test_get_teams_sprint_github_commits_matrix_invalid_course(mocker):
+    """Test 404 error when trying to get all teams' sprint commits for a non-existent course."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async",
+        side_effect=HTTPException(404),
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(github.get_teams_sprint_github_commits("test_course"))
+    mock_check_course_in_db.assert_called_once()
+    assert exc_info.value.status_code == 404
+
+
+def test_get_github_rate_limit(mocker):
+    """Test that the remaining GitHub API budget is returned."""
+    status = RateLimitStatus(limit=5000, remaining=4200)
+    mock_get_status = mocker.patch(
+        "server.util.ratelimit.RateLimiter.get_status", return_value=status
+    )
+    assert asyncio.run(github.get_github_rate_limit()) == status
+    mock_get_status.assert_called_once()
+
+
 def test_fetch_and_store_github_commits(mocker):
     """Test that GitHub commits can be fetched from GitHub and stored in the database successfully."""
-    mock_get_new_commits = mocker.patch(
-        f"{mock_data.GITHUB_UTILS_PATH}.get_new_commits",
-        return_value=mock_data.GITHUB_COMMITS,
+    mock_sync_commits = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.sync_commits", return_value=(1, 1)
     )
-    mock_store_commits = mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.store_commits")
-    github.fetch_and_store_github_commits(mock_data.GITHUB_REQUEST)
-    mock_get_new_commits.assert_called_once_with(
-        "test_owner", "test_repo", "test_course"
+    asyncio.run(github.fetch_and_store_github_commits(mock_data.GITHUB_REQUEST))
+    mock_sync_commits.assert_called_once_with("test_owner", "test_repo", "test_course")
+
+
+def test_fetch_and_store_github_commits_syncing(mocker, sync_lease):
+    """Test 409 error when trying to fetch the commits of a course being synced."""
+    sync_lease["wait_for"].return_value = False
+    mock_sync_commits = mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.sync_commits")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(github.fetch_and_store_github_commits(mock_data.GITHUB_REQUEST))
+    mock_sync_commits.assert_not_called()
+    assert exc_info.value.status_code == 409
+
+
+def test_rebuild_github_commit_rollups(mocker):
+    """Test that the commit rollups of a course can be rebuilt."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
     )
-    mock_store_commits.assert_called_once_with(
-        mock_data.GITHUB_COMMITS, "test_repo", "test_course"
+    mock_rebuild = mocker.patch(f"{ROLLUPS_PATH}.rebuild_commit_rollups")
+    asyncio.run(github.rebuild_github_commit_rollups("test_course"))
+    mock_check_course_in_db.assert_called_once_with("test_course", [".github.commits"])
+    mock_rebuild.assert_called_once_with("test_course")
+
+
+def test_rebuild_github_commit_rollups_syncing(mocker, sync_lease):
+    """Test 409 error when trying to rebuild the commit rollups of a course being synced."""
+    sync_lease["wait_for"].return_value = False
+    mocker.patch("server.routes.github.check_course_in_db_async")
+    mock_rebuild = mocker.patch(f"{ROLLUPS_PATH}.rebuild_commit_rollups")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(github.rebuild_github_commit_rollups("test_course"))
+    mock_rebuild.assert_not_called()
+    assert exc_info.value.status_code == 409
+
+
+def test_rebuild_github_commit_rollups_invalid_course(mocker):
+    """Test 404 error when trying to rebuild the commit rollups of a non-existent course."""
+    mocker.patch(
+        "server.routes.github.check_course_in_db_async", side_effect=HTTPException(404)
     )
+    mock_rebuild = mocker.patch(f"{ROLLUPS_PATH}.rebuild_commit_rollups")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(github.rebuild_github_commit_rollups("test_course"))
+    mock_rebuild.assert_not_called()
+    assert exc_info.value.status_code == 404
+
+
+def test_sync_course_github_commits(mocker):
+    """Test that every repository in a course is synced with the default concurrency."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
+    mock_sync_course = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.sync_course",
+        return_value=[mock_data.REPO_SYNC_RESULT],
+    )
+    results = asyncio.run(
+        github.sync_course_github_commits(
+            "test_course", CourseSyncRequest(owner="test_owner")
+        )
+    )
+    mock_check_course_in_db.assert_called_once_with(
+        "test_course", [".students", ".github.commits"]
+    )
+    mock_sync_course.assert_called_once_with(
+        "test_owner", "test_course", settings.GITHUB_SYNC_CONCURRENCY
+    )
+    assert results == [mock_data.REPO_SYNC_RESULT]
+
+
+def test_sync_course_github_commits_invalid_course(mocker):
+    """Test 404 error when trying to sync a non-existent course."""
+    mocker.patch(
+        "server.routes.github.check_course_in_db_async",
+        side_effect=HTTPException(404),
+    )
+    mock_sync_course = mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.sync_course")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(
+            github.sync_course_github_commits(
+                "test_course", CourseSyncRequest(owner="test_owner", concurrency=2)
+            )
+        )
+    mock_sync_course.assert_not_called()
+    assert exc_info.value.status_code == 404
+
+
+def test_submit_course_github_sync(mocker):
+    """Test that a sync job is queued with the default concurrency."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.github.check_course_in_db_async"
+    )
+    mock_submit = mocker.patch("server.util.jobs.submit")
+    asyncio.run(
+        github.submit_course_github_sync(
+            "test_course", CourseSyncRequest(owner="test_owner")
+        )
+    )
+    mock_check_course_in_db.assert_called_once_with(
+        "test_course", [".students", ".github.commits"]
+    )
+    mock_submit.assert_called_once_with(
+        "github.sync",
+        "test_course",
+        {
+            "course_name": "test_course",
+            "owner": "test_owner",
+            "concurrency": settings.GITHUB_SYNC_CONCURRENCY,
+        },
+    )
+
+
+def test_run_course_github_sync(mocker):
+    """Test that a sync job reports the repositories synced so far."""
+
+    async def sync_course(owner, course_name, concurrency, report_progress):
+        report_progress(1, 1)
+        return [mock_data.REPO_SYNC_RESULT]
+
+    mock_sync_course = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.sync_course", side_effect=sync_course
+    )
+    report_progress = mocker.Mock()
+    job = {
+        "params": {
+            "course_name": "test_course",
+            "owner": "test_owner",
+            "concurrency": 2,
+        }
+    }
+    assert github.run_course_github_sync(job, report_progress) == [
+        mock_data.REPO_SYNC_RESULT
+    ]
+    assert mock_sync_course.call_args.args[:3] == ("test_owner", "test_course", 2)
+    report_progress.assert_called_once_with({"repos_synced": 1, "repos": 1})
+
+
+def make_request(body: bytes) -> Request:
+    """Make a request with a body, as received from GitHub."""
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+
+def test_receive_github_webhook(mocker):
+    """Test that a signed delivery is handled."""
+    mock_verify_signature = mocker.patch("server.util.webhooks.verify_signature")
+    mock_handle_delivery = mocker.patch(
+        "server.util.webhooks.handle_delivery", return_value="result"
+    )
+    result = asyncio.run(
+        github.receive_github_webhook(
+            make_request(b'{"ref": "refs/heads/main"}'), "push", "delivery1", "sig"
+        )
+    )
+    mock_verify_signature.assert_called_once_with(b'{"ref": "refs/heads/main"}', "sig")
+    mock_handle_delivery.assert_called_once_with(
+        "delivery1", "push", {"ref": "refs/heads/main"}
+    )
+    assert result == "result"
+
+
+def test_receive_github_webhook_invalid_json(mocker):
+    """Test that a delivery that isn't JSON is rejected."""
+    mocker.patch("server.util.webhooks.verify_signature")
+    mock_handle_delivery = mocker.patch("server.util.webhooks.handle_delivery")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(
+            github.receive_github_webhook(
+                make_request(b"not json"), "push", "delivery1", "sig"
+            )
+        )
+    assert exc_info.value.status_code == 400
+    mock_handle_delivery.assert_not_called()
@@ -1,45 +1,151 @@
 """Test helper functions for interacting with the GitHub API."""
-from datetime import datetime, timedelta
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
+import httpx
 import jwt
 import pytest
 from fastapi import HTTPException
 from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult
 from requests import Request
 
-from server.config import settings
+from server.models.github import RepoSyncResult
 from server.util import github
+from server.util.dates import to_datetime
 from tests.unit import mock_data
 
 
 class TestGitHubTokenAuth:
     def test__call__(self):
         """Test that the GitHubTokenAuth class returns a request with the correct headers."""
-        # Use datetime in the future to test a valid token.
-        settings.github_expiration = (datetime.now() + timedelta(days=1)).isoformat()
         request = Request()
         request = github.GitHubTokenAuth()(request)
         assert request.headers["Authorization"] == f"Bearer {mock_data.GITHUB_TOKEN}"
         assert request.headers["Accept"] == "application/vnd.github+json"
-        # Reset expiration back to original mock value.
-        settings.github_expiration = mock_data.GITHUB_EXPIRATION
-
-    def test__call__expired(self, mocker):
-        """Test that the GitHubTokenAuth class generates a new token if the token is expired."""
-        mocker.patch(
-            f"{mock_data.GITHUB_UTILS_PATH}.get_access_token",
-            return_value=(mock_data.GITHUB_TOKEN, mock_data.GITHUB_EXPIRATION),
+
+    def test__call__conditional(self, mocker):
+        """Test that the GitHubTokenAuth class attaches the validators of the URL."""
+        mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.get_auth_headers", return_value={})
+        request = Request(url=mock_data.HTTP_VALIDATORS["url"])
+        request = github.GitHubTokenAuth(mock_data.HTTP_VALIDATORS)(request)
+        assert request.headers["If-None-Match"] == mock_data.HTTP_VALIDATORS["etag"]
+
+
+class TestTokenManager:
+    @pytest.fixture(name="token_mocks")
+    def fixture_token_mocks(self, mocker):
+        """Mock the calls made to get a new access token."""
+        return {
+            "load_private_key": mocker.patch(
+                f"{mock_data.GITHUB_UTILS_PATH}.load_private_key"
+            ),
+            "create_jwt": mocker.patch(
+                f"{mock_data.GITHUB_UTILS_PATH}.create_jwt", return_value="jwt"
+            ),
+            "get_installation": mocker.patch(
+                f"{mock_data.GITHUB_UTILS_PATH}.get_installation",
+                return_value=mock_data.GITHUB_INSTALLATION_ID,
+            ),
+            "get_access_token": mocker.patch(
+                f"{mock_data.GITHUB_UTILS_PATH}.get_access_token",
+                return_value=(mock_data.GITHUB_TOKEN, mock_data.GITHUB_EXPIRATION),
+            ),
+            "time": mocker.patch(
+                f"{mock_data.GITHUB_UTILS_PATH}.time.time", return_value=1640991600
+            ),
+        }
+
+    def test_get_token(self, token_mocks):
+        """Test that a new token is fetched when there is none."""
+        token_manager = github.TokenManager()
+        assert token_manager.get_token() == mock_data.GITHUB_TOKEN
+        token_mocks["get_access_token"].assert_called_once_with(
+            "jwt", mock_data.GITHUB_INSTALLATION_ID
         )
-        request = Request()
-        request = github.GitHubTokenAuth()(request)
-        assert request.headers["Authorization"] == f"Bearer {mock_data.GITHUB_TOKEN}"
-        assert request.headers["Accept"] == "application/vnd.github+json"
+        assert token_manager.expires_at == 1640995200
+
+    def test_get_token_cached(self, token_mocks):
+        """Test that the token is reused until shortly before it expires."""
+        token_manager = github.TokenManager()
+        token_manager.get_token()
+        token_mocks["time"].return_value = 1640995200 - 301
+        token_manager.get_token()
+        token_mocks["get_access_token"].assert_called_once()
+
+    def test_get_token_refresh(self, token_mocks):
+        """Test that the token is refreshed before it expires, reusing the key and installation."""
+        token_manager = github.TokenManager()
+        token_manager.get_token()
+        token_mocks["time"].return_value = 1640995200 - 299
+        token_manager.get_token()
+        assert token_mocks["get_access_token"].call_count == 2
+        token_mocks["load_private_key"].assert_called_once()
+        token_mocks["get_installation"].assert_called_once()
+
+    def test_get_token_reinstalled(self, token_mocks):
+        """Test that the installation is looked up again if it no longer exists."""
+        token_mocks["get_installation"].side_effect = [1, 2]
+        token_mocks["get_access_token"].side_effect = [
+            HTTPException(404),
+            (mock_data.GITHUB_TOKEN, mock_data.GITHUB_EXPIRATION),
+        ]
+        token_manager = github.TokenManager()
+        assert token_manager.get_token() == mock_data.GITHUB_TOKEN
+        token_mocks["get_access_token"].assert_called_with("jwt", 2)
+
+    def test_get_token_single_flight(self, token_mocks):
+        """Test that concurrent requests for an expired token only refresh it once."""
+
+        def slow_get_access_token(github_jwt, installation_id):
+            # pylint: disable=unused-argument
+            # Give the other threads time to ask for the token during the refresh.
+            threading.Event().wait(0.05)
+            return mock_data.GITHUB_TOKEN, mock_data.GITHUB_EXPIRATION
+
+        token_mocks["get_access_token"].side_effect = slow_get_access_token
+        token_manager = github.TokenManager()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            tokens = list(executor.map(lambda _: token_manager.get_token(), range(8)))
+        assert tokens == [mock_data.GITHUB_TOKEN] * 8
+        token_mocks["get_access_token"].assert_called_once()
+
+    def test_prefetch_error(self, token_mocks):
+        """Test that an error while prefetching the token is not raised."""
+        token_mocks["get_installation"].side_effect = HTTPException(500)
+        token_manager = github.TokenManager()
+        token_manager.prefetch()
+        assert token_manager.token is None
+
+
+@pytest.fixture(name="sync_lease", autouse=True)
+def fixture_sync_lease(mocker):
+    """Mock the sync lease that a course sync holds while storing commits."""
+    return {
+        "wait_for": mocker.patch("server.util.leases.wait_for", return_value=True),
+        "renew": mocker.patch("server.util.leases.renew"),
+        "release": mocker.patch("server.util.leases.release"),
+    }
+
+
+def test_load_private_key(mocker):
+    """Test that the private key is loaded from the configured path."""
+    mock_open = mocker.patch(
+        "builtins.open", mocker.mock_open(read_data=mock_data.PRIVATE_KEY)
+    )
+    assert github.load_private_key().key_size == 1024
+    mock_open.assert_called_once_with(
+        mock_data.GITHUB_PRIVATE_KEY_PATH, "r", encoding="utf-8"
+    )
 
 
 def test_create_jwt(mocker):
     """Test that a valid JWT is successfully created from a private key."""
     mocker.patch("builtins.open", mocker.mock_open(read_data=mock_data.PRIVATE_KEY))
-    github_jwt = github.create_jwt()
+    github_jwt = github.create_jwt(github.load_private_key())
     # Check that the JWT contains the expected GitHub app ID.
     assert (
         jwt.decode(github_jwt, mock_data.PUBLIC_KEY, algorithms=["RS256"])["iss"]
@@ -58,61 +164,276 @@ def test_get_installation(mocker, response_mock):
 
 def test_get_access_token(mocker, response_mock):
     """Test that a valid GitHub access token is returned."""
-    mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.create_jwt")
-    mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.get_installation")
-    mocker.patch(
+    mock_post = mocker.patch(
         "requests.post", return_value=response_mock(mock_data.GITHUB_TOKEN_JSON)
     )
-    token, expiry = github.get_access_token()
+    token, expiry = github.get_access_token("jwt", mock_data.GITHUB_INSTALLATION_ID)
+    assert mock_post.call_args.args == (
+        f"https://api.github.com/app/installations/{mock_data.GITHUB_INSTALLATION_ID}/access_tokens",
+    )
     assert token == mock_data.GITHUB_TOKEN
     assert expiry == mock_data.GITHUB_EXPIRATION
 
 
-def test_get_new_commits(mocker, response_mock):
-    """Test that new GitHub commits are successfully returned."""
-    mocker.patch(
+def test_get_sync_state(mocker):
+    """Test that a repository's sync state is looked up by repository name."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one",
+        return_value=mock_data.GITHUB_SYNC_STATE,
+    )
+    sync_state = github.get_sync_state("semester", "repo")
+    mock_find_one.assert_called_once_with({"repo_name": "repo"})
+    assert sync_state == mock_data.GITHUB_SYNC_STATE
+
+
+def test_update_sync_state(mocker):
+    """Test that the sync cursor is advanced once the last page has been stored."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    datetime_mock = mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.datetime")
+    datetime_mock.now.return_value = datetime.fromisoformat("2021-04-20T00:00:00")
+    github.update_sync_state(
+        "semester",
+        "repo",
+        to_datetime("2020-01-01T00:00:00Z"),
+        validators=mock_data.HTTP_VALIDATORS,
+        pages=2,
+    )
+    mock_update_one.assert_called_once_with(
+        {"repo_name": "repo"},
+        {
+            "$set": {
+                "repo_name": "repo",
+                "fetched_at": datetime.fromisoformat("2021-04-20T00:00:00"),
+                "pages": 2,
+                "validators": mock_data.HTTP_VALIDATORS,
+            },
+            "$unset": {"next_url": "", "pending_commit_at": ""},
+            "$max": {"last_commit_at": to_datetime("2020-01-01T00:00:00Z")},
+        },
+        upsert=True,
+    )
+
+
+def test_update_sync_state_next_page(mocker):
+    """Test that the next page is recorded, without moving the cursor, while pages remain."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    datetime_mock = mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.datetime")
+    datetime_mock.now.return_value = datetime.fromisoformat("2021-04-20T00:00:00")
+    github.update_sync_state(
+        "semester",
+        "repo",
+        to_datetime("2020-01-01T00:00:00Z"),
+        "https://api.github.com/next",
+        mock_data.HTTP_VALIDATORS,
+        1,
+    )
+    mock_update_one.assert_called_once_with(
+        {"repo_name": "repo"},
+        {
+            "$set": {
+                "repo_name": "repo",
+                "fetched_at": datetime.fromisoformat("2021-04-20T00:00:00"),
+                "next_url": "https://api.github.com/next",
+            },
+            "$max": {"pending_commit_at": to_datetime("2020-01-01T00:00:00Z")},
+        },
+        upsert=True,
+    )
+
+
+def test_update_sync_state_no_commits(mocker):
+    """Test that the sync cursor and validators are left alone when no commits were fetched."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    github.update_sync_state("semester", "repo")
+    assert "$max" not in mock_update_one.call_args.args[1]
+    assert "validators" not in mock_update_one.call_args.args[1]["$set"]
+    assert mock_update_one.call_args.args[1]["$set"]["pages"] == 0
+
+
+def test_get_commits_params(mocker):
+    """Test that commits are fetched from the repository's own sync cursor."""
+    mock_find_one = mocker.patch("pymongo.collection.Collection.find_one")
+    params = github.get_commits_params("semester", "repo", mock_data.GITHUB_SYNC_STATE)
+    mock_find_one.assert_not_called()
+    assert params == {"per_page": 100, "since": "2020-01-01T00:00:00Z"}
+
+
+def test_get_commits_params_no_sync_state(mocker):
+    """Test that the newest stored commit of the repository is used for repositories synced
+    before sync states were recorded."""
+    mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one",
         return_value=mock_data.GITHUB_COMMITS[0],
     )
-    mocker.patch(
-        f"{mock_data.GITHUB_UTILS_PATH}.GitHubTokenAuth.__call__",
-        return_value=Request(),
+    params = github.get_commits_params("semester", "repo", None)
+    mock_find_one.assert_called_once_with(
+        {"repo_name": "repo"}, sort=[("timestamp", -1)]
     )
+    assert params == {"per_page": 100, "since": "2020-01-01T00:00:00Z"}
+
+
+def test_get_commits_params_no_last_commit(mocker):
+    """Test that all commits are fetched when a repository has never been synced."""
+    mocker.patch("pymongo.collection.Collection.find_one", return_value=None)
+    params = github.get_commits_params("semester", "repo", None)
+    assert params == {"per_page": 100}
+
+
+def test_get_commits_start(mocker):
+    """Test that a new sync starts from the first page of commits after the cursor."""
     mocker.patch(
-        "requests.get", return_value=response_mock(mock_data.GITHUB_COMMITS_JSON)
+        f"{mock_data.GITHUB_UTILS_PATH}.get_sync_state",
+        return_value=mock_data.GITHUB_SYNC_STATE,
     )
-    commits = github.get_new_commits("owner", "repo", "semester")
-    assert commits == mock_data.GITHUB_COMMITS_JSON
+    url, params, newest_commit_at, validators = github.get_commits_start(
+        "owner", "repo", "semester"
+    )
+    assert url == "https://api.github.com/repos/owner/repo/commits"
+    assert params == {"per_page": 100, "since": "2020-01-01T00:00:00Z"}
+    assert newest_commit_at is None
+    assert validators == mock_data.HTTP_VALIDATORS
 
 
-def test_get_new_commits_no_last_commit(mocker, response_mock):
-    """Test that new GitHub commits are successfully returned even when there is no previous commit
-    to indicate the most recent date of a commit in the database."""
+def test_get_commits_start_no_sync_state(mocker):
+    """Test that a repository that was never synced in the course has no validators, even if
+    another course has synced it."""
+    mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.get_sync_state", return_value=None)
     mocker.patch("pymongo.collection.Collection.find_one", return_value=None)
-    mocker.patch(
-        f"{mock_data.GITHUB_UTILS_PATH}.GitHubTokenAuth.__call__",
-        return_value=Request(),
+    assert github.get_commits_start("owner", "repo", "semester") == (
+        "https://api.github.com/repos/owner/repo/commits",
+        {"per_page": 100},
+        None,
+        None,
     )
+
+
+def test_get_commits_start_resume(mocker):
+    """Test that an interrupted sync resumes from the next page it had not stored."""
     mocker.patch(
-        "requests.get", return_value=response_mock(mock_data.GITHUB_COMMITS_JSON)
+        f"{mock_data.GITHUB_UTILS_PATH}.get_sync_state",
+        return_value={
+            **mock_data.GITHUB_SYNC_STATE,
+            "next_url": "https://api.github.com/next",
+            "pending_commit_at": "2021-01-01T00:00:00Z",
+        },
+    )
+    assert github.get_commits_start("owner", "repo", "semester") == (
+        "https://api.github.com/next",
+        None,
+        "2021-01-01T00:00:00Z",
+        None,
     )
-    commits = github.get_new_commits("owner", "repo", "semester")
-    assert commits == mock_data.GITHUB_COMMITS_JSON
 
 
-def test_get_new_commits_no_new_commits(mocker, response_mock):
-    """Test that no GitHub commits are returned when there are no new commits."""
+def test_get_commit_pages(mocker, response_mock):
+    """Test that each page of commits is yielded as it is fetched."""
+    first_page = response_mock(mock_data.GITHUB_COMMITS_JSON)
+    first_page.request = Request(url=mock_data.HTTP_VALIDATORS["url"])
+    first_page.headers["ETag"] = mock_data.HTTP_VALIDATORS["etag"]
+    first_page.headers["Last-Modified"] = mock_data.HTTP_VALIDATORS["last_modified"]
+    first_page.headers["Link"] = '<https://api.github.com/next>; rel="next"'
+    last_page = response_mock(mock_data.GITHUB_COMMITS_JSON)
+    last_page.request = Request(url="https://api.github.com/next")
+    mock_github_get = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.github_get",
+        side_effect=[first_page, last_page],
+    )
+    pages = github.get_commit_pages(
+        "https://api.github.com/repos/owner/repo/commits",
+        {"per_page": 100},
+        mock_data.HTTP_VALIDATORS,
+    )
+    assert next(pages) == (
+        mock_data.GITHUB_COMMITS_JSON,
+        "https://api.github.com/next",
+        mock_data.HTTP_VALIDATORS,
+    )
+    # The next page isn't fetched until the first page has been consumed.
+    assert mock_github_get.call_count == 1
+    # Later pages carry the validators of the first page.
+    assert next(pages) == (
+        mock_data.GITHUB_COMMITS_JSON,
+        None,
+        mock_data.HTTP_VALIDATORS,
+    )
+    assert not list(pages)
+    # Only the first page is requested conditionally, and the next page's URL already
+    # contains the query parameters.
+    first_call, next_call = mock_github_get.call_args_list
+    assert first_call.kwargs["auth"].validators == mock_data.HTTP_VALIDATORS
+    assert next_call.args == ("https://api.github.com/next",)
+    assert next_call.kwargs["params"] is None
+    assert next_call.kwargs["auth"].validators is None
+
+
+def test_get_commit_pages_resume(mocker, response_mock):
+    """Test that a resumed sync is not requested conditionally and has no validators."""
+    response = response_mock([])
+    response.request = Request(url="https://api.github.com/next")
+    mock_github_get = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.github_get", return_value=response
+    )
+    assert list(
+        github.get_commit_pages(
+            "https://api.github.com/next", None, mock_data.HTTP_VALIDATORS
+        )
+    ) == [([], None, None)]
+    assert mock_github_get.call_args.kwargs["auth"].validators is None
+
+
+def test_get_commit_pages_not_modified(mocker, response_mock):
+    """Test that nothing is yielded when the first page has not been modified."""
+    mocker.patch("requests.get", return_value=response_mock(None, status_code=304))
+    assert not list(
+        github.get_commit_pages(
+            "https://api.github.com/repos/owner/repo/commits",
+            {"per_page": 100},
+            mock_data.HTTP_VALIDATORS,
+        )
+    )
+
+
+def test_github_get(mocker, response_mock):
+    """Test that GitHub requests wait for the rate limit and are retried when limited."""
+    mock_acquire = mocker.patch(
+        "server.util.ratelimit.RateLimiter.acquire", return_value=0
+    )
     mocker.patch(
-        "pymongo.collection.Collection.find_one",
-        return_value=mock_data.GITHUB_COMMITS[0],
+        "server.util.ratelimit.RateLimiter.get_retry_delay", side_effect=[1, None]
     )
+    mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.time.sleep")
+    mocker.patch("server.util.requests.time.sleep")
+    mock_get = mocker.patch(
+        "requests.get",
+        side_effect=[response_mock(None, status_code=403), response_mock([])],
+    )
+    res = github.github_get("https://api.github.com")
+    mock_acquire.assert_called_once()
+    assert mock_get.call_count == 2
+    assert res.status_code == 200
+
+
+def test_github_send(mocker):
+    """Test that asynchronous GitHub requests are retried when rate limited."""
+    mocker.patch("server.util.ratelimit.RateLimiter.acquire", return_value=0)
     mocker.patch(
-        f"{mock_data.GITHUB_UTILS_PATH}.GitHubTokenAuth.__call__",
-        return_value=Request(),
+        "server.util.ratelimit.RateLimiter.get_retry_delay", side_effect=[0, None]
     )
-    mocker.patch("requests.get", return_value=response_mock([]))
-    commits = github.get_new_commits("owner", "repo", "semester")
-    assert not commits
+    request = httpx.Request("GET", "https://api.github.com")
+    mock_send = mocker.patch(
+        "httpx.AsyncClient.send",
+        side_effect=[
+            httpx.Response(429, request=request),
+            httpx.Response(200, request=request),
+        ],
+    )
+
+    async def send():
+        async with httpx.AsyncClient() as client:
+            return await github.github_send(client, request)
+
+    assert asyncio.run(send()).status_code == 200
+    assert mock_send.call_count == 2
 
 
 def test_store_commits(mocker):
@@ -120,41 +441,129 @@ def test_store_commits(mocker):
     mock_check_course_in_db = mocker.patch(
         f"{mock_data.GITHUB_UTILS_PATH}.check_course_in_db"
     )
-    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    mock_bulk_write = mocker.patch(
+        "pymongo.collection.Collection.bulk_write",
+        return_value=mocker.Mock(upserted_ids={0: "id"}),
+    )
+    mock_update_commit_rollups = mocker.patch(
+        "server.util.rollups.update_commit_rollups"
+    )
+    # The commit was made at the start of sprint 1.
+    mocker.patch(
+        "server.util.sprints.get_sprints",
+        return_value=[
+            {
+                "sprint_number": 1,
+                "start_date": to_datetime(mock_data.SPRINT_DATES["start_date"]),
+                "end_date": to_datetime(mock_data.SPRINT_DATES["end_date"]),
+            }
+        ],
+    )
     datetime_mock = mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.datetime")
     # Mock current datetime.
     datetime_mock.now.return_value = datetime.fromisoformat("2021-04-20T00:00:00")
     github.store_commits(mock_data.GITHUB_COMMITS_JSON, "repo", "semester")
     mock_check_course_in_db.assert_called_once_with("semester", [".github.commits"])
+    # The inserted commit is added to the rollups.
+    assert mock_update_commit_rollups.call_args.args[1][0]["sha"] == "f7c3b0c"
     mock_bulk_write.assert_called_once_with(
         [
             UpdateOne(
-                {"sha": "f7c3b0c"},
+                {"repo_name": "repo", "sha": "f7c3b0c"},
                 {
                     "$set": {
                         "sha": "f7c3b0c",
                         "author": "testuser",
-                        "timestamp": "2020-01-01T00:00:00Z",
+                        "timestamp": to_datetime("2020-01-01T00:00:00Z"),
                         "message": "Test commit",
                         "repo_name": "repo",
-                        "fetched_at": "2021-04-20T00:00:00",
+                        "fetched_at": datetime.fromisoformat("2021-04-20T00:00:00"),
+                        "sprint_number": 1,
                     },
                 },
                 upsert=True,
             )
-        ]
+        ],
+        ordered=False,
     )
 
 
+def test_store_commits_existing(mocker):
+    """Test that commits that were already stored are not added to the rollups again."""
+    mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.check_course_in_db")
+    mocker.patch(
+        "pymongo.collection.Collection.bulk_write",
+        return_value=mocker.Mock(upserted_ids={}),
+    )
+    mocker.patch("server.util.sprints.get_sprints", return_value=[])
+    mock_update_commit_rollups = mocker.patch(
+        "server.util.rollups.update_commit_rollups"
+    )
+    github.store_commits(mock_data.GITHUB_COMMITS_JSON, "repo", "semester")
+    mock_update_commit_rollups.assert_called_once_with("semester", [])
+
+
+def test_store_commits_duplicate(mocker):
+    """Test that a commit inserted by another sync at the same time is updated instead, and
+    isn't added to the rollups again."""
+    mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.check_course_in_db")
+    mocker.patch("server.util.sprints.get_sprints", return_value=[])
+    mock_bulk_write = mocker.patch(
+        "pymongo.collection.Collection.bulk_write",
+        side_effect=[
+            BulkWriteError(
+                {
+                    "writeErrors": [{"index": 0, "code": 11000}],
+                    "upserted": [{"index": 1, "_id": "id"}],
+                }
+            ),
+            BulkWriteResult({"upserted": [], "nUpserted": 0}, True),
+        ],
+    )
+    mock_update_commit_rollups = mocker.patch(
+        "server.util.rollups.update_commit_rollups"
+    )
+    commits = [
+        mock_data.GITHUB_COMMITS_JSON[0],
+        {**mock_data.GITHUB_COMMITS_JSON[0], "sha": "other_sha"},
+    ]
+    assert github.store_commits(commits, "repo", "semester") == 1
+    # Only the commit that failed is written again.
+    assert mock_bulk_write.call_args_list[1].args[0] == [
+        mock_bulk_write.call_args_list[0].args[0][0]
+    ]
+    new_commits = mock_update_commit_rollups.call_args.args[1]
+    assert [commit["sha"] for commit in new_commits] == ["other_sha"]
+
+
+def test_store_commits_write_error(mocker):
+    """Test that errors other than duplicate commits are raised."""
+    mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.check_course_in_db")
+    mocker.patch("server.util.sprints.get_sprints", return_value=[])
+    mocker.patch(
+        "pymongo.collection.Collection.bulk_write",
+        side_effect=BulkWriteError(
+            {"writeErrors": [{"index": 0, "code": 121}], "upserted": []}
+        ),
+    )
+    mock_update_commit_rollups = mocker.patch(
+        "server.util.rollups.update_commit_rollups"
+    )
+    with pytest.raises(BulkWriteError):
+        github.store_commits(mock_data.GITHUB_COMMITS_JSON, "repo", "semester")
+    mock_update_commit_rollups.assert_not_called()
+
+
 def test_store_commits_no_commits(mocker):
     """Test that no GitHub commits are stored in the database when an empty list is passed."""
     mock_check_course_in_db = mocker.patch(
         f"{mock_data.GITHUB_UTILS_PATH}.check_course_in_db"
     )
+    mocker.patch("server.util.sprints.get_sprints", return_value=[])
     mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
     github.store_commits([], "repo", "semester")
     mock_check_course_in_db.assert_called_once()
-    mock_bulk_write.assert_called_once_with([])
+    mock_bulk_write.assert_called_once_with([], ordered=False)
 
 
 def test_store_commits_invalid_course(mocker):
@@ -166,3 +575,365 @@ def test_store_commits_invalid_course(mocker):
     with pytest.raises(HTTPException):
         github.store_commits(mock_data.GITHUB_COMMITS_JSON, "repo", "semester")
     mock_check_course_in_db.assert_called_once()
+
+
+def test_get_newest_commit_at():
+    """Test that commit dates in different timezones are compared as instants."""
+    commits = [
+        {"commit": {"author": {"date": "2020-01-01T10:00:00+02:00"}}},
+        {"commit": {"author": {"date": "2020-01-01T09:00:00Z"}}},
+    ]
+    assert github.get_newest_commit_at(commits, None) == to_datetime(
+        "2020-01-01T09:00:00Z"
+    )
+    # The newest commit of an interrupted sync may still be stored as a string.
+    assert github.get_newest_commit_at(commits, "2020-01-02T00:00:00Z") == to_datetime(
+        "2020-01-02T00:00:00Z"
+    )
+    assert github.get_newest_commit_at([], None) is None
+
+
+def test_store_commit_page(mocker):
+    """Test that a page of commits is stored and the progress of the sync is recorded."""
+    mock_store_commits = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.store_commits",
+        return_value=1,
+    )
+    mock_update_sync_state = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.update_sync_state"
+    )
+    result = github.store_commit_page(
+        "semester",
+        "repo",
+        (mock_data.GITHUB_COMMITS_JSON, "https://api.github.com/next", None),
+        "2019-01-01T00:00:00Z",
+        1,
+    )
+    mock_store_commits.assert_called_once_with(
+        mock_data.GITHUB_COMMITS_JSON, "repo", "semester"
+    )
+    mock_update_sync_state.assert_called_once_with(
+        "semester",
+        "repo",
+        to_datetime("2020-01-01T00:00:00Z"),
+        "https://api.github.com/next",
+        None,
+        1,
+    )
+    assert result == (1, to_datetime("2020-01-01T00:00:00Z"))
+
+
+def test_store_commit_page_without_author(mocker):
+    """Test that commits without a GitHub author are left out, but still move the sync on."""
+    mock_store_commits = mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.store_commits")
+    mock_update_sync_state = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.update_sync_state"
+    )
+    commits = [{**mock_data.GITHUB_COMMITS_JSON[0], "author": None}]
+    result = github.store_commit_page(
+        "semester", "repo", (commits, None, None), None, 1
+    )
+    mock_store_commits.assert_not_called()
+    mock_update_sync_state.assert_called_once_with(
+        "semester", "repo", to_datetime("2020-01-01T00:00:00Z"), None, None, 1
+    )
+    assert result == (0, to_datetime("2020-01-01T00:00:00Z"))
+
+
+def test_store_commit_page_empty(mocker):
+    """Test that an empty page is not stored, but the sync state is still recorded."""
+    mock_store_commits = mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.store_commits")
+    mock_update_sync_state = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.update_sync_state"
+    )
+    result = github.store_commit_page(
+        "semester",
+        "repo",
+        ([], None, mock_data.HTTP_VALIDATORS),
+        "2021-01-01T00:00:00Z",
+        3,
+    )
+    mock_store_commits.assert_not_called()
+    mock_update_sync_state.assert_called_once_with(
+        "semester",
+        "repo",
+        to_datetime("2021-01-01T00:00:00Z"),
+        None,
+        mock_data.HTTP_VALIDATORS,
+        3,
+    )
+    assert result == (0, to_datetime("2021-01-01T00:00:00Z"))
+
+
+def test_sync_commits(mocker):
+    """Test that each page is stored as it is fetched."""
+    pages = [
+        (mock_data.GITHUB_COMMITS_JSON, "next_url", mock_data.HTTP_VALIDATORS),
+        (mock_data.GITHUB_COMMITS_JSON, None, mock_data.HTTP_VALIDATORS),
+    ]
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.get_commits_start",
+        return_value=("url", None, "2019-01-01T00:00:00Z", None),
+    )
+    mock_get_commit_pages = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.get_commit_pages", return_value=iter(pages)
+    )
+    mock_store_commit_page = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.store_commit_page",
+        side_effect=[(1, "2020-01-01T00:00:00Z"), (0, "2020-01-01T00:00:00Z")],
+    )
+    assert github.sync_commits("owner", "repo", "semester") == (1, 2)
+    mock_get_commit_pages.assert_called_once_with("url", None, None)
+    # The newest commit is carried over from the previous page.
+    assert mock_store_commit_page.call_args_list == [
+        mocker.call("semester", "repo", pages[0], "2019-01-01T00:00:00Z", 1),
+        mocker.call("semester", "repo", pages[1], "2020-01-01T00:00:00Z", 2),
+    ]
+
+
+def test_sync_commits_not_modified(mocker):
+    """Test that only the time of the check is recorded when nothing has changed."""
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.get_commits_start",
+        return_value=("url", {"per_page": 100}, None, None),
+    )
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.get_commit_pages", return_value=iter([])
+    )
+    mock_update_sync_state = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.update_sync_state"
+    )
+    assert github.sync_commits("owner", "repo", "semester") == (0, 0)
+    mock_update_sync_state.assert_called_once_with("semester", "repo")
+
+
+def test_fetch_commit_pages(mocker):
+    """Test that every page of new commits is fetched asynchronously."""
+    mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.get_auth_headers", return_value={})
+    request = httpx.Request("GET", "https://api.github.com")
+    mock_send = mocker.patch(
+        "httpx.AsyncClient.send",
+        side_effect=[
+            httpx.Response(
+                200,
+                json=mock_data.GITHUB_COMMITS_JSON,
+                headers={"link": '<https://api.github.com/next>; rel="next"'},
+                request=request,
+            ),
+            httpx.Response(200, json=mock_data.GITHUB_COMMITS_JSON, request=request),
+        ],
+    )
+
+    async def fetch():
+        async with httpx.AsyncClient() as client:
+            return [
+                page
+                async for page in github.fetch_commit_pages(
+                    client,
+                    "https://api.github.com/repos/owner/repo/commits",
+                    {"per_page": 100},
+                    mock_data.HTTP_VALIDATORS,
+                )
+            ]
+
+    pages = asyncio.run(fetch())
+    # Only the first page is requested conditionally.
+    first_request = mock_send.call_args_list[0].args[0]
+    assert first_request.headers["If-None-Match"] == 'W/"test_etag"'
+    # The next page's URL is followed without adding the parameters again.
+    next_request = mock_send.call_args_list[1].args[0]
+    assert str(next_request.url) == "https://api.github.com/next"
+    assert "If-None-Match" not in next_request.headers
+    # Later pages carry the validators of the first page.
+    validators = {"url": "https://api.github.com", "etag": None, "last_modified": None}
+    assert pages == [
+        (mock_data.GITHUB_COMMITS_JSON, "https://api.github.com/next", validators),
+        (mock_data.GITHUB_COMMITS_JSON, None, validators),
+    ]
+
+
+def test_fetch_commit_pages_not_modified(mocker):
+    """Test that nothing is yielded when the first page has not been modified."""
+    mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.get_auth_headers", return_value={})
+    mocker.patch(
+        "httpx.AsyncClient.send",
+        return_value=httpx.Response(
+            304, request=httpx.Request("GET", "https://api.github.com")
+        ),
+    )
+
+    async def fetch():
+        async with httpx.AsyncClient() as client:
+            return [
+                page
+                async for page in github.fetch_commit_pages(
+                    client, "https://api.github.com", {"per_page": 100}
+                )
+            ]
+
+    assert not asyncio.run(fetch())
+
+
+def mock_fetch_commit_pages(pages=(), error=None):
+    """Mock fetch_commit_pages to yield the given pages, then raise an error if given."""
+
+    async def _fetch_commit_pages(client, url, params, last_validators=None):
+        # pylint: disable=unused-argument
+        for page in pages:
+            yield page
+        if error:
+            raise error
+
+    return _fetch_commit_pages
+
+
+def test_sync_repo(mocker):
+    """Test that a repository's new commits are stored page by page."""
+    pages = [
+        (mock_data.GITHUB_COMMITS_JSON, "next_url", mock_data.HTTP_VALIDATORS),
+        (mock_data.GITHUB_COMMITS_JSON, None, mock_data.HTTP_VALIDATORS),
+    ]
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.get_commits_start",
+        return_value=("url", {"per_page": 100}, None, None),
+    )
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.fetch_commit_pages",
+        mock_fetch_commit_pages(pages),
+    )
+    mock_store_commit_page = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.store_commit_page",
+        side_effect=[(1, "2020-01-01T00:00:00Z"), (1, "2020-01-01T00:00:00Z")],
+    )
+    result = asyncio.run(
+        github.sync_repo(None, asyncio.Semaphore(1), "owner", "repo", "semester")
+    )
+    assert mock_store_commit_page.call_args_list == [
+        mocker.call("semester", "repo", pages[0], None, 1),
+        mocker.call("semester", "repo", pages[1], "2020-01-01T00:00:00Z", 2),
+    ]
+    assert result == RepoSyncResult(repo_name="repo", new_commits=2, pages_fetched=2)
+
+
+def test_sync_repo_not_modified(mocker):
+    """Test that nothing is stored when a repository has not been modified."""
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.get_commits_start",
+        return_value=("url", {"per_page": 100}, None, None),
+    )
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.fetch_commit_pages", mock_fetch_commit_pages()
+    )
+    mock_store_commit_page = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.store_commit_page"
+    )
+    mock_update_sync_state = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.update_sync_state"
+    )
+    result = asyncio.run(
+        github.sync_repo(None, asyncio.Semaphore(1), "owner", "repo", "semester")
+    )
+    mock_store_commit_page.assert_not_called()
+    mock_update_sync_state.assert_called_once_with("semester", "repo")
+    assert result == RepoSyncResult(repo_name="repo", new_commits=0, pages_fetched=0)
+
+
+def test_sync_repo_error(mocker):
+    """Test that a GitHub error is reported instead of being raised, keeping the pages that
+    were stored before it."""
+    request = httpx.Request("GET", "https://api.github.com")
+    response = httpx.Response(404, text="Not Found", request=request)
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.get_commits_start",
+        return_value=("url", {"per_page": 100}, None, None),
+    )
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.fetch_commit_pages",
+        mock_fetch_commit_pages(
+            [(mock_data.GITHUB_COMMITS_JSON, "next_url", None)],
+            httpx.HTTPStatusError("", request=request, response=response),
+        ),
+    )
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.store_commit_page",
+        return_value=(1, "2020-01-01T00:00:00Z"),
+    )
+    result = asyncio.run(
+        github.sync_repo(None, asyncio.Semaphore(1), "owner", "repo", "semester")
+    )
+    assert result == RepoSyncResult(
+        repo_name="repo",
+        new_commits=1,
+        pages_fetched=1,
+        error="GitHub returned 404: Not Found",
+    )
+
+
+def test_sync_repo_unexpected_error(mocker):
+    """Test that any other error is also reported instead of being raised."""
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.get_commits_start",
+        return_value=("url", {"per_page": 100}, None, None),
+    )
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.fetch_commit_pages",
+        mock_fetch_commit_pages([(mock_data.GITHUB_COMMITS_JSON, None, None)]),
+    )
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.store_commit_page",
+        side_effect=ValueError("Invalid isoformat string: 'yesterday'"),
+    )
+    result = asyncio.run(
+        github.sync_repo(None, asyncio.Semaphore(1), "owner", "repo", "semester")
+    )
+    assert result == RepoSyncResult(
+        repo_name="repo",
+        new_commits=0,
+        pages_fetched=1,
+        error="Invalid isoformat string: 'yesterday'",
+    )
+
+
+def test_sync_course(mocker):
+    """Test that every team repository in a course is synced."""
+    mocker.patch(
+        "pymongo.collection.Collection.distinct", return_value=["repo2", "", "repo1"]
+    )
+    mock_sync_repo = mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.sync_repo",
+        side_effect=lambda client, semaphore, owner, repo, course_name: RepoSyncResult(
+            repo_name=repo, new_commits=0, pages_fetched=1
+        ),
+    )
+    results = asyncio.run(github.sync_course("owner", "semester", 2))
+    assert mock_sync_repo.call_count == 2
+    assert [result.repo_name for result in results] == ["repo1", "repo2"]
+
+
+def test_sync_course_progress(mocker, sync_lease):
+    """Test that the progress is reported as each repository is synced."""
+    mocker.patch(
+        "pymongo.collection.Collection.distinct", return_value=["repo1", "repo2"]
+    )
+    mocker.patch(
+        f"{mock_data.GITHUB_UTILS_PATH}.sync_repo",
+        side_effect=lambda client, semaphore, owner, repo, course_name: RepoSyncResult(
+            repo_name=repo, new_commits=0, pages_fetched=1
+        ),
+    )
+    report_progress = mocker.Mock()
+    asyncio.run(github.sync_course("owner", "semester", 2, report_progress))
+    assert [call.args for call in report_progress.call_args_list] == [(1, 2), (2, 2)]
+    # The sync lease is renewed each time a repository is synced, and released at the end.
+    assert sync_lease["renew"].call_count == 2
+    sync_lease["release"].assert_called_once_with("github.sync:semester")
+
+
+def test_sync_course_syncing(mocker, sync_lease):
+    """Test 409 error when another sync of the course doesn't finish in time."""
+    sync_lease["wait_for"].return_value = False
+    mock_sync_repo = mocker.patch(f"{mock_data.GITHUB_UTILS_PATH}.sync_repo")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(github.sync_course("owner", "semester", 2))
+    assert exc_info.value.status_code == 409
+    mock_sync_repo.assert_not_called()
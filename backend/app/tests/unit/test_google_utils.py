@@ -0,0 +1,192 @@
+"""Test the verification of Google ID tokens."""
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import HTTPException
+from google.auth import crypt
+from google.auth import jwt as google_jwt
+from requests import exceptions
+
+from server.util import google
+from tests.unit import mock_data
+
+
+def make_key(key_id):
+    """Generate a signing key and its self-signed certificate."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test")])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    pem_key = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    signer = crypt.RSASigner.from_string(pem_key, key_id)
+    return signer, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+@pytest.fixture(name="signer", scope="module")
+def fixture_signer():
+    """A signing key, and Google's certificates with its certificate."""
+    signer, cert = make_key("test_key_id")
+    return signer, {"test_key_id": cert}
+
+
+def make_id_token(signer, **claims):
+    """Sign an ID token for the test user."""
+    now = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": mock_data.GOOGLE_CLIENT_ID,
+        "email": "test_email",
+        "email_verified": True,
+        "iat": now,
+        "exp": now + 3600,
+        **claims,
+    }
+    return google_jwt.encode(signer, payload).decode()
+
+
+@pytest.fixture(name="mock_certs")
+def fixture_mock_certs(mocker, signer, response_mock):
+    """Serve the certificates from a fresh cache."""
+    mocker.patch("server.config.settings.GOOGLE_CLIENT_ID", mock_data.GOOGLE_CLIENT_ID)
+    mocker.patch.object(google, "google_certs", google.GoogleCerts())
+    res = response_mock(signer[1])
+    res.headers["Cache-Control"] = "public, max-age=20000, must-revalidate"
+    return mocker.patch(f"{google.__name__}.requests.get", return_value=res)
+
+
+def test_get_max_age(response_mock):
+    """Test that the max age is read from Cache-Control, with a default."""
+    res = response_mock({})
+    res.headers["Cache-Control"] = "public, max-age=21010, must-revalidate"
+    assert google.get_max_age(res) == 21010
+    assert google.get_max_age(response_mock({})) == google.DEFAULT_MAX_AGE
+
+
+def test_verify_id_token(signer, mock_certs):
+    """Test that tokens are verified with the cached certificates."""
+    assert google.verify_id_token(make_id_token(signer[0])) == "test_email"
+    assert google.verify_id_token(make_id_token(signer[0])) == "test_email"
+    mock_certs.assert_called_once_with(google.CERTS_URL)
+
+
+def test_verify_id_token_expired_certs(mocker, signer, mock_certs):
+    """Test that the certificates are fetched again once they expire."""
+    google.verify_id_token(make_id_token(signer[0]))
+    mocker.patch("time.monotonic", return_value=time.monotonic() + 20001)
+    google.verify_id_token(make_id_token(signer[0]))
+    assert mock_certs.call_count == 2
+
+
+def test_verify_id_token_rotated_key(mocker, signer, mock_certs, response_mock):
+    """Test that the certificates are fetched again for a key that isn't cached, at most once a
+    minute."""
+    google.verify_id_token(make_id_token(signer[0]))
+    new_signer, new_cert = make_key("new_key_id")
+    mock_certs.return_value = response_mock({**signer[1], "new_key_id": new_cert})
+    with pytest.raises(ValueError):
+        google.verify_id_token(make_id_token(new_signer))
+    assert mock_certs.call_count == 1
+
+    mocker.patch("time.monotonic", return_value=time.monotonic() + 61)
+    assert google.verify_id_token(make_id_token(new_signer)) == "test_email"
+    assert mock_certs.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        HTTPException(500, "error"),
+        exceptions.ConnectionError("refused"),
+        exceptions.Timeout("timed out"),
+    ],
+)
+def test_verify_id_token_unavailable(signer, mock_certs, error):
+    """Test 503 error when Google's certificates can't be fetched and none are cached."""
+    mock_certs.side_effect = error
+    with pytest.raises(HTTPException) as exc:
+        google.verify_id_token(make_id_token(signer[0]))
+    assert exc.value.status_code == 503
+
+
+def test_verify_id_token_stale_certs(mocker, signer, mock_certs):
+    """Test that expired certificates are kept in use while Google can't be reached, and
+    fetched again at most once a minute."""
+    google.verify_id_token(make_id_token(signer[0]))
+    mock_certs.side_effect = exceptions.ConnectionError("refused")
+    now = time.monotonic()
+    mocker.patch("time.monotonic", return_value=now + 20001)
+    assert google.verify_id_token(make_id_token(signer[0])) == "test_email"
+    assert google.verify_id_token(make_id_token(signer[0])) == "test_email"
+    assert mock_certs.call_count == 2
+
+    mocker.patch("time.monotonic", return_value=now + 20001 + 61)
+    google.verify_id_token(make_id_token(signer[0]))
+    assert mock_certs.call_count == 3
+
+
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"aud": "other_client_id"},
+        {"iss": "https://example.com"},
+        {"exp": int(time.time()) - 3600},
+        {"email_verified": False},
+    ],
+)
+@pytest.mark.usefixtures("mock_certs")
+def test_verify_id_token_invalid(signer, claims):
+    """Test that tokens for another app, from another issuer, that have expired or without a
+    verified email are rejected."""
+    with pytest.raises(ValueError):
+        google.verify_id_token(make_id_token(signer[0], **claims))
+
+
+@pytest.mark.usefixtures("mock_certs")
+def test_verify_id_token_bad_signature(signer):
+    """Test that tokens signed by another key with the same key id are rejected."""
+    other_signer, _ = make_key("test_key_id")
+    with pytest.raises(ValueError):
+        google.verify_id_token(make_id_token(other_signer))
+    with pytest.raises(ValueError):
+        google.verify_id_token(make_id_token(signer[0])[:-4])
+
+
+@pytest.mark.usefixtures("mock_certs")
+def test_verify_id_token_malformed():
+    """Test that a token that isn't a JWT is rejected."""
+    with pytest.raises(ValueError):
+        google.verify_id_token("not a token")
+
+
+def test_verify_id_token_not_configured(mocker):
+    """Test that ID tokens are refused when there is no client ID."""
+    mocker.patch("server.config.settings.GOOGLE_CLIENT_ID", None)
+    with pytest.raises(HTTPException) as exc:
+        google.verify_id_token("test_token")
+    assert exc.value.status_code == 503
+
+
+def test_prefetch(mocker):
+    """Test that errors fetching the certificates ahead of time are logged."""
+    mocker.patch(
+        f"{google.__name__}.requests.get", side_effect=HTTPException(500, "error")
+    )
+    google.GoogleCerts().prefetch()
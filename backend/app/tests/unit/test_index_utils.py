@@ -0,0 +1,160 @@
+"""Test helper functions for managing database indexes."""
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import OperationFailure
+
+from server.models.courses import IndexReport
+from server.util import indexes
+
+
+@pytest.fixture(name="sync_lease", autouse=True)
+def fixture_sync_lease(mocker):
+    """Mock the sync lease held while duplicate commits are deleted."""
+    return {
+        "wait_for": mocker.patch("server.util.leases.wait_for", return_value=True),
+        "release": mocker.patch("server.util.leases.release"),
+    }
+
+
+def test_create_course_indexes(mocker):
+    """Test that the indexes for every course subcollection are created."""
+    mocker.patch(
+        "pymongo.collection.Collection.index_information",
+        return_value={"_id_": {"key": [("_id", 1)]}},
+    )
+    mock_create_indexes = mocker.patch("pymongo.collection.Collection.create_indexes")
+    mock_remove_duplicates = mocker.patch(
+        "server.util.indexes.remove_duplicate_commits", return_value=0
+    )
+    mock_rebuild = mocker.patch("server.util.rollups.rebuild_commit_rollups")
+    indexes.create_course_indexes("test_course")
+    mock_remove_duplicates.assert_called_once_with("test_course")
+    mock_rebuild.assert_not_called()
+    assert mock_create_indexes.call_count == len(indexes.COURSE_INDEXES)
+    for coll_indexes in indexes.COURSE_INDEXES.values():
+        mock_create_indexes.assert_any_call(coll_indexes)
+
+
+def test_create_course_indexes_duplicate_commits(mocker):
+    """Test that the rollups are rebuilt once duplicate commits, which they counted, are deleted."""
+    mocker.patch(
+        "pymongo.collection.Collection.index_information",
+        return_value={"_id_": {"key": [("_id", 1)]}},
+    )
+    mocker.patch("pymongo.collection.Collection.create_indexes")
+    mocker.patch("server.util.indexes.remove_duplicate_commits", return_value=2)
+    mock_rebuild = mocker.patch("server.util.rollups.rebuild_commit_rollups")
+    indexes.create_course_indexes("test_course")
+    mock_rebuild.assert_called_once_with("test_course")
+
+
+def test_create_course_indexes_syncing(mocker, sync_lease):
+    """Test 409 error when the course is being synced while duplicate commits are deleted."""
+    sync_lease["wait_for"].return_value = False
+    mocker.patch(
+        "pymongo.collection.Collection.index_information",
+        return_value={"_id_": {"key": [("_id", 1)]}},
+    )
+    mock_create_indexes = mocker.patch("pymongo.collection.Collection.create_indexes")
+    mock_remove_duplicates = mocker.patch(
+        "server.util.indexes.remove_duplicate_commits"
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        indexes.create_course_indexes("test_course")
+    assert exc_info.value.status_code == 409
+    mock_remove_duplicates.assert_not_called()
+    mock_create_indexes.assert_not_called()
+
+
+def test_create_course_indexes_unique_commits(mocker):
+    """Test that duplicate commits are only looked for until the unique index exists."""
+    mocker.patch(
+        "pymongo.collection.Collection.index_information",
+        return_value={
+            "_id_": {"key": [("_id", 1)]},
+            "repo_name_sha": {"key": [("repo_name", 1), ("sha", 1)], "unique": True},
+        },
+    )
+    mocker.patch("pymongo.collection.Collection.create_indexes")
+    mock_remove_duplicates = mocker.patch(
+        "server.util.indexes.remove_duplicate_commits"
+    )
+    indexes.create_course_indexes("test_course")
+    mock_remove_duplicates.assert_not_called()
+
+
+def test_remove_duplicate_commits(mocker):
+    """Test that every copy of a duplicate commit but the first is deleted."""
+    mocker.patch(
+        "pymongo.collection.Collection.aggregate",
+        return_value=[{"_id": {"repo_name": "repo", "sha": "sha"}, "ids": [3, 1, 2]}],
+    )
+    mock_delete_many = mocker.patch("pymongo.collection.Collection.delete_many")
+    assert indexes.remove_duplicate_commits("test_course") == 2
+    mock_delete_many.assert_called_once_with({"_id": {"$in": [2, 3]}})
+
+
+def test_remove_duplicate_commits_none(mocker):
+    """Test that nothing is deleted without duplicate commits."""
+    mocker.patch("pymongo.collection.Collection.aggregate", return_value=[])
+    mock_delete_many = mocker.patch("pymongo.collection.Collection.delete_many")
+    assert indexes.remove_duplicate_commits("test_course") == 0
+    mock_delete_many.assert_not_called()
+
+
+def test_reconcile_indexes(mocker):
+    """Test that indexes are created for the global collections and every course."""
+    mock_create_indexes = mocker.patch("pymongo.collection.Collection.create_indexes")
+    mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"name": "course1"}, {"name": "course2"}],
+    )
+    mock_create_course_indexes = mocker.patch(
+        "server.util.indexes.create_course_indexes"
+    )
+    indexes.reconcile_indexes()
+    assert mock_create_indexes.call_count == len(indexes.GLOBAL_INDEXES)
+    mock_create_course_indexes.assert_any_call("course1")
+    mock_create_course_indexes.assert_any_call("course2")
+
+
+def test_reconcile_indexes_course_failure(mocker):
+    """Test that a failure on one course does not stop the other courses from being reconciled."""
+    mocker.patch("pymongo.collection.Collection.create_indexes")
+    mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"name": "course1"}, {"name": "course2"}, {"name": "course3"}],
+    )
+    mock_create_course_indexes = mocker.patch(
+        "server.util.indexes.create_course_indexes",
+        side_effect=[OperationFailure("conflict"), HTTPException(409), None],
+    )
+    indexes.reconcile_indexes()
+    assert mock_create_course_indexes.call_count == 3
+
+
+def test_get_index_report(mocker):
+    """Test that missing and unused indexes are reported for each subcollection."""
+    mocker.patch(
+        "pymongo.collection.Collection.index_information",
+        return_value={
+            "_id_": {"key": [("_id", 1)]},
+            "sprint_number": {"key": [("sprint_number", 1)]},
+        },
+    )
+    mocker.patch(
+        "pymongo.collection.Collection.aggregate",
+        side_effect=lambda pipeline: iter(
+            [
+                {"name": "_id_", "accesses": {"ops": 0}},
+                {"name": "sprint_number", "accesses": {"ops": 0}},
+            ]
+        ),
+    )
+    report = indexes.get_index_report("test_course")
+    assert len(report) == len(indexes.COURSE_INDEXES)
+    assert report[0] == IndexReport(
+        collection="test_course.sprints", missing=[], unused=["sprint_number"]
+    )
+    assert report[1].collection == "test_course.students"
+    assert report[1].missing == ["email", "repo_name_source_control_username"]
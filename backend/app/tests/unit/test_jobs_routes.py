@@ -0,0 +1,98 @@
+"""Test API functions for background jobs."""
+import asyncio
+
+import pytest
+from bson import Binary, ObjectId
+from fastapi import HTTPException
+
+from server.routes import jobs
+from tests.unit import mock_data
+
+JOB = {
+    "_id": ObjectId("63a1f0c2e4b0a1b2c3d4e5f6"),
+    "type": "export.all",
+    "course_name": "course_name",
+    "params": {"course_name": "course_name"},
+    "status": "succeeded",
+    "attempts": 1,
+    "created_at": "2022-01-01T00:00:00Z",
+}
+
+
+def test_get_job(mocker):
+    """Test getting a job without its files."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value=JOB
+    )
+    job = asyncio.run(jobs.get_job(str(JOB["_id"]), mock_data.USER_JSON))
+    mock_find_one.assert_called_once_with(
+        {"_id": JOB["_id"]}, {"input_file": 0, "file.content": 0}
+    )
+    assert job.id == str(JOB["_id"])
+    assert job.course_name == "course_name"
+    assert job.status == "succeeded"
+
+
+def test_get_job_user_unassigned(mocker):
+    """Test 401 error when getting a job of a course the user is not assigned to."""
+    mocker.patch(
+        "pymongo.collection.Collection.find_one",
+        return_value={**JOB, "course_name": "other_course"},
+    )
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(jobs.get_job(str(JOB["_id"]), mock_data.USER_JSON))
+    assert exc.value.status_code == 401
+
+
+def test_get_job_file(mocker):
+    """Test downloading the file produced by a job."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one",
+        return_value={
+            "_id": JOB["_id"],
+            "course_name": "course_name",
+            "file": {
+                "name": "course_name_all.xlsx",
+                "media_type": "application/octet-stream",
+                "content": Binary(b"data"),
+            },
+        },
+    )
+    response = asyncio.run(jobs.get_job_file(str(JOB["_id"]), mock_data.USER_JSON))
+    mock_find_one.assert_called_once_with(
+        {"_id": JOB["_id"]}, {"file": 1, "course_name": 1}
+    )
+    assert response.body == b"data"
+    assert response.media_type == "application/octet-stream"
+    assert (
+        response.headers["Content-Disposition"]
+        == "attachment; filename=course_name_all.xlsx"
+    )
+
+
+def test_get_job_file_user_unassigned(mocker):
+    """Test 401 error when downloading the file of a job of a course the user is not
+    assigned to."""
+    mocker.patch(
+        "pymongo.collection.Collection.find_one",
+        return_value={
+            "_id": JOB["_id"],
+            "course_name": "other_course",
+            "file": {
+                "name": "other_course_all.xlsx",
+                "media_type": "application/octet-stream",
+                "content": Binary(b"data"),
+            },
+        },
+    )
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(jobs.get_job_file(str(JOB["_id"]), mock_data.USER_JSON))
+    assert exc.value.status_code == 401
+
+
+def test_get_job_file_missing(mocker):
+    """Test that a job without a file has nothing to download."""
+    mocker.patch("pymongo.collection.Collection.find_one", return_value=JOB)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(jobs.get_job_file(str(JOB["_id"]), mock_data.USER_JSON))
+    assert exc.value.status_code == 404
@@ -0,0 +1,238 @@
+"""Test the background job queue and its workers."""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from bson import Binary, ObjectId
+from fastapi import HTTPException
+
+from server.config import settings
+from server.models.jobs import Job
+from server.util import jobs
+
+JOB_ID = ObjectId("63a1f0c2e4b0a1b2c3d4e5f6")
+CREATED_AT = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(name="handlers")
+def fixture_handlers(mocker):
+    """Register job handlers for a single test."""
+    return mocker.patch.dict(f"{jobs.__name__}._handlers", clear=True)
+
+
+def make_job(**fields) -> dict:
+    """Make a job document leased to a worker."""
+    return {
+        "_id": JOB_ID,
+        "type": "test.job",
+        "course_name": "test_course",
+        "params": {"course_name": "test_course"},
+        "status": jobs.RUNNING,
+        "attempts": 1,
+        "created_at": CREATED_AT,
+        "started_at": CREATED_AT,
+        **fields,
+    }
+
+
+def test_submit(mocker):
+    """Test that a submitted job is queued and a worker is woken up."""
+    mock_insert_one = mocker.patch("pymongo.collection.Collection.insert_one")
+    mock_insert_one.return_value.inserted_id = JOB_ID
+    mock_notify = mocker.patch.object(jobs.worker_pool, "notify")
+    job = jobs.submit(
+        "test.job", "test_course", {"course_name": "test_course"}, input_file=b"a,b"
+    )
+    document = mock_insert_one.call_args.args[0]
+    assert document["course_name"] == "test_course"
+    assert document["status"] == jobs.QUEUED
+    assert document["attempts"] == 0
+    assert document["input_file"] == Binary(b"a,b")
+    assert job.id == str(JOB_ID)
+    assert job.status == jobs.QUEUED
+    assert job.course_name == "test_course"
+    assert job.params == {"course_name": "test_course"}
+    mock_notify.assert_called_once()
+
+
+def test_submit_file_too_large(mocker):
+    """Test that files that don't fit in a job document are rejected."""
+    mock_insert_one = mocker.patch("pymongo.collection.Collection.insert_one")
+    mocker.patch(f"{jobs.__name__}.MAX_FILE_SIZE", 2)
+    with pytest.raises(HTTPException) as exc:
+        jobs.submit("test.job", "test_course", {}, input_file=b"abc")
+    assert exc.value.status_code == 413
+    mock_insert_one.assert_not_called()
+
+
+def test_claim_job(mocker):
+    """Test that the oldest queued job, or a job with an expired lease, is leased."""
+    mock_find_one_and_update = mocker.patch(
+        "pymongo.collection.Collection.find_one_and_update"
+    )
+    jobs.claim_job()
+    query, update = mock_find_one_and_update.call_args.args
+    assert query["$or"][0] == {"status": jobs.QUEUED}
+    assert query["$or"][1]["status"] == jobs.RUNNING
+    assert "$lt" in query["$or"][1]["lease_expires_at"]
+    assert update["$set"]["status"] == jobs.RUNNING
+    assert update["$inc"] == {"attempts": 1}
+    assert mock_find_one_and_update.call_args.kwargs["sort"] == [("created_at", 1)]
+
+
+def test_run_job(mocker, handlers):
+    """Test that a job's progress and result are stored under its lease."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+
+    def run(job, report_progress):
+        report_progress({"done": 1})
+        return {"course": job["params"]["course_name"]}
+
+    jobs.handler("test.job")(run)
+    assert handlers["test.job"] is run
+    jobs.run_job(make_job())
+
+    lease = {"_id": JOB_ID, "status": jobs.RUNNING, "attempts": 1}
+    progress, outcome = mock_update_one.call_args_list
+    assert progress.args == (lease, {"$set": {"progress": {"done": 1}}})
+    assert outcome.args[0] == lease
+    assert outcome.args[1]["$set"]["status"] == jobs.SUCCEEDED
+    assert outcome.args[1]["$set"]["result"] == {"course": "test_course"}
+    assert (
+        outcome.args[1]["$set"]["expires_at"] - outcome.args[1]["$set"]["finished_at"]
+    ).total_seconds() == settings.JOB_TTL
+    assert outcome.args[1]["$unset"] == {"lease_expires_at": "", "input_file": ""}
+
+
+def test_run_job_file(mocker, handlers):
+    """Test that a file produced by a job is stored with it."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    handlers["test.job"] = lambda job, report_progress: jobs.JobFile(
+        "export.xlsx", "application/octet-stream", b"data"
+    )
+    jobs.run_job(make_job())
+    outcome = mock_update_one.call_args.args[1]["$set"]
+    assert outcome["status"] == jobs.SUCCEEDED
+    assert outcome["file"] == {
+        "name": "export.xlsx",
+        "media_type": "application/octet-stream",
+        "content": Binary(b"data"),
+    }
+    assert "result" not in outcome
+
+
+@pytest.mark.parametrize(
+    "error, message",
+    [
+        (HTTPException(status_code=404, detail="Course not found"), "Course not found"),
+        (ValueError("bad value"), "bad value"),
+    ],
+)
+def test_run_job_failed(mocker, handlers, error, message):
+    """Test that the error of a failed job is stored."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+
+    def run(job, report_progress):
+        raise error
+
+    handlers["test.job"] = run
+    jobs.run_job(make_job())
+    outcome = mock_update_one.call_args.args[1]["$set"]
+    assert outcome["status"] == jobs.FAILED
+    assert outcome["error"] == message
+
+
+def test_run_job_unknown_type(mocker, handlers):
+    """Test that a job without a handler fails."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    jobs.run_job(make_job(type="missing.job"))
+    outcome = mock_update_one.call_args.args[1]["$set"]
+    assert outcome["status"] == jobs.FAILED
+    assert outcome["error"] == "Unknown job type missing.job"
+    assert not handlers
+
+
+def test_run_job_interrupted_too_often(mocker, handlers):
+    """Test that a job interrupted too many times fails instead of being run again."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    handlers["test.job"] = mocker.Mock()
+    jobs.run_job(make_job(attempts=jobs.MAX_ATTEMPTS + 1))
+    handlers["test.job"].assert_not_called()
+    assert mock_update_one.call_args.args[1]["$set"]["status"] == jobs.FAILED
+
+
+def test_get_job_invalid_id():
+    """Test that a job id that isn't an object id is not found."""
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(jobs.get_job("not-an-id"))
+    assert exc.value.status_code == 404
+
+
+def test_get_job_missing(mocker):
+    """Test that a job that doesn't exist, or has expired, is not found."""
+    mocker.patch("pymongo.collection.Collection.find_one", return_value=None)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(jobs.get_job(str(JOB_ID)))
+    assert exc.value.status_code == 404
+
+
+def test_get_job_response():
+    """Test that a job document is converted into the response model."""
+    job = make_job(
+        status=jobs.SUCCEEDED,
+        progress={"done": 1},
+        finished_at=CREATED_AT,
+        file={"name": "export.xlsx", "media_type": "text/csv"},
+    )
+    assert jobs.get_job_response(job) == Job(
+        id=str(JOB_ID),
+        type="test.job",
+        course_name="test_course",
+        status=jobs.SUCCEEDED,
+        params={"course_name": "test_course"},
+        progress={"done": 1},
+        result=None,
+        error=None,
+        file_name="export.xlsx",
+        attempts=1,
+        created_at="2022-01-01T00:00:00Z",
+        started_at="2022-01-01T00:00:00Z",
+        finished_at="2022-01-01T00:00:00Z",
+    )
+
+
+def test_run_next(mocker):
+    """Test that a worker runs the job it claims, and reports when there is none."""
+    mocker.patch(f"{jobs.__name__}.claim_job", side_effect=[make_job(), None])
+    mock_run_job = mocker.patch(f"{jobs.__name__}.run_job")
+    workers = jobs.JobWorkers()
+    assert workers.run_next()
+    assert not workers.run_next()
+    mock_run_job.assert_called_once_with(make_job())
+
+
+def test_renew_leases(mocker):
+    """Test that the leases of the jobs being run are extended."""
+    mock_update_many = mocker.patch("pymongo.collection.Collection.update_many")
+    workers = jobs.JobWorkers()
+
+    def run_job(job):
+        workers.renew_leases()
+
+    mocker.patch(f"{jobs.__name__}.claim_job", return_value=make_job())
+    mocker.patch(f"{jobs.__name__}.run_job", side_effect=run_job)
+    workers.run_next()
+    query = mock_update_many.call_args.args[0]
+    assert query == {"_id": {"$in": [JOB_ID]}, "status": jobs.RUNNING}
+    # Nothing to renew once the job has finished.
+    workers.renew_leases()
+    mock_update_many.assert_called_once()
+
+
+def test_start_and_stop(mocker):
+    """Test that the worker threads check for jobs and stop when asked to."""
+    mock_claim_job = mocker.patch(f"{jobs.__name__}.claim_job", return_value=None)
+    workers = jobs.JobWorkers()
+    workers.start(2)
+    workers.stop(timeout=5)
+    assert mock_claim_job.called
@@ -1,5 +1,7 @@
 """Test helper functions for managing authorization."""
-from datetime import timedelta
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
 
 import jwt as pyjwt
 import pytest
@@ -44,6 +46,16 @@ def test_create_access_token():
     )
 
 
+def test_create_access_token_jti():
+    """Test that each token has a unique id."""
+    tokens = [jwt.create_access_token(data={"sub": "test_email"}) for _ in range(2)]
+    jtis = {
+        pyjwt.decode(token, mock_data.API_SECRET_KEY, algorithms=["HS256"])["jti"]
+        for token in tokens
+    }
+    assert len(jtis) == 2
+
+
 def test_create_access_token_no_api_key(mocker):
     """Test unsuccessful creation of a JWT access token due to missing API key."""
     mocker.patch("server.config.settings.API_SECRET_KEY", None)
@@ -69,7 +81,7 @@ def test_valid_email_from_db(mocker):
     mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one", return_value={"authorized": True}
     )
-    valid_email = jwt.valid_email_from_db("test_email")
+    valid_email = asyncio.run(jwt.valid_email_from_db("test_email"))
     mock_find_one.assert_called_once_with({"email": "test_email"})
     assert valid_email == "test_email"
 
@@ -80,118 +92,219 @@ def test_valid_email_from_db_not_authorized(mocker):
         "pymongo.collection.Collection.find_one", return_value={"authorized": False}
     )
     with pytest.raises(HTTPException) as excinfo:
-        jwt.valid_email_from_db("test_email")
+        asyncio.run(jwt.valid_email_from_db("test_email"))
     mock_find_one.assert_called_once_with({"email": "test_email"})
     assert excinfo.value.status_code == 401
     assert excinfo.value.detail == "Could not validate credentials"
     assert excinfo.value.headers["WWW-Authenticate"] == "Bearer"
 
 
-def test_get_current_user_email(mocker):
-    """Test successful retrieval of the current user's email."""
-    mock_is_token_blacklisted = mocker.patch(
-        "server.util.jwt.is_token_blacklisted", return_value=False
-    )
+def test_get_current_user(mocker):
+    """Test successful retrieval of the current user."""
     mock_decode_token = mocker.patch(
         "server.util.jwt.decode_token", return_value={"sub": "test_email"}
     )
-    mock_valid_email_from_db = mocker.patch(
-        "server.util.jwt.valid_email_from_db", return_value=True
+    mock_is_token_blacklisted = mocker.patch(
+        "server.util.jwt.is_token_blacklisted", return_value=False
+    )
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value=mock_data.USER_JSON
     )
 
-    current_user_email = jwt.get_current_user_email("test_access_token")
-    mock_is_token_blacklisted.assert_called_once_with("test_access_token")
+    user = asyncio.run(jwt.get_current_user("test_access_token"))
     mock_decode_token.assert_called_once_with("test_access_token")
-    mock_valid_email_from_db.assert_called_once_with("test_email")
-    assert current_user_email == "test_email"
+    mock_is_token_blacklisted.assert_called_once_with(
+        "test_access_token", {"sub": "test_email"}
+    )
+    mock_find_one.assert_called_once_with({"email": "test_email"})
+    assert user == mock_data.USER_JSON
 
 
-def test_get_current_user_email_blacklisted(mocker):
-    """Test unsuccessful retrieval of the current user's email due to the token being blacklisted."""
+def test_get_current_user_cached(mocker):
+    """Test that the user is only loaded from the database once while it is cached."""
+    mocker.patch("server.util.jwt.decode_token", return_value={"sub": "test_email"})
+    mocker.patch("server.util.jwt.is_token_blacklisted", return_value=False)
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value=mock_data.USER_JSON
+    )
+    asyncio.run(jwt.get_current_user("test_access_token"))
+    asyncio.run(jwt.get_current_user("test_access_token"))
+    mock_find_one.assert_called_once()
+
+
+def test_get_current_user_blacklisted(mocker):
+    """Test unsuccessful retrieval of the current user due to the token being blacklisted."""
+    mocker.patch("server.util.jwt.decode_token", return_value={"sub": "test_email"})
     mock_is_token_blacklisted = mocker.patch(
         "server.util.jwt.is_token_blacklisted", return_value=True
     )
+    mock_find_one = mocker.patch("pymongo.collection.Collection.find_one")
     with pytest.raises(HTTPException) as excinfo:
-        jwt.get_current_user_email("test_access_token")
-    mock_is_token_blacklisted.assert_called_once_with("test_access_token")
+        asyncio.run(jwt.get_current_user("test_access_token"))
+    mock_is_token_blacklisted.assert_called_once()
+    mock_find_one.assert_not_called()
     assert excinfo.value.status_code == 401
     assert excinfo.value.detail == "Could not validate credentials"
     assert excinfo.value.headers["WWW-Authenticate"] == "Bearer"
 
 
-def test_get_current_user_email_invalid_token(mocker):
-    """Test unsuccessful retrieval of the current user's email due to no email being provided."""
-    mock_is_token_blacklisted = mocker.patch(
-        "server.util.jwt.is_token_blacklisted", return_value=False
-    )
+def test_get_current_user_invalid_token(mocker):
+    """Test unsuccessful retrieval of the current user due to no email being provided."""
     mock_decode_token = mocker.patch("server.util.jwt.decode_token", return_value={})
+    mock_is_token_blacklisted = mocker.patch("server.util.jwt.is_token_blacklisted")
 
     with pytest.raises(HTTPException) as excinfo:
-        jwt.get_current_user_email("test_access_token")
-    mock_is_token_blacklisted.assert_called_once_with("test_access_token")
+        asyncio.run(jwt.get_current_user("test_access_token"))
     mock_decode_token.assert_called_once_with("test_access_token")
+    mock_is_token_blacklisted.assert_not_called()
     assert excinfo.value.status_code == 401
     assert excinfo.value.detail == "Could not validate credentials"
     assert excinfo.value.headers["WWW-Authenticate"] == "Bearer"
 
 
-def test_get_current_user_email_invalid_email(mocker):
-    """Test unsuccessful retrieval of the current user's email due to the email not being in the database."""
-    mock_is_token_blacklisted = mocker.patch(
-        "server.util.jwt.is_token_blacklisted", return_value=False
-    )
-    mock_decode_token = mocker.patch(
-        "server.util.jwt.decode_token", return_value={"sub": "test_email"}
-    )
-    mock_valid_email_from_db = mocker.patch(
-        "server.util.jwt.valid_email_from_db", return_value=False
-    )
+@pytest.mark.parametrize("user", [None, {**mock_data.USER_JSON, "authorized": False}])
+def test_get_current_user_not_authorized(mocker, user):
+    """Test unsuccessful retrieval of the current user due to the user not existing or not
+    being authorized."""
+    mocker.patch("server.util.jwt.decode_token", return_value={"sub": "test_email"})
+    mocker.patch("server.util.jwt.is_token_blacklisted", return_value=False)
+    mocker.patch("pymongo.collection.Collection.find_one", return_value=user)
 
     with pytest.raises(HTTPException) as excinfo:
-        jwt.get_current_user_email("test_access_token")
-    mock_is_token_blacklisted.assert_called_once_with("test_access_token")
-    mock_decode_token.assert_called_once_with("test_access_token")
-    mock_valid_email_from_db.assert_called_once_with("test_email")
+        asyncio.run(jwt.get_current_user("test_access_token"))
     assert excinfo.value.status_code == 401
     assert excinfo.value.detail == "Could not validate credentials"
     assert excinfo.value.headers["WWW-Authenticate"] == "Bearer"
 
 
-def test_get_current_user_token(mocker):
+def test_get_current_user_email():
+    """Test that the email is taken from the current user."""
+    assert asyncio.run(jwt.get_current_user_email(mock_data.USER_JSON)) == "test_email"
+
+
+def test_get_current_user_token():
     """Test successful retrieval of the current user's token."""
-    mock_get_current_user_email = mocker.patch("server.util.jwt.get_current_user_email")
-    token = jwt.get_current_user_token("test_access_token")
-    mock_get_current_user_email.assert_called_once_with("test_access_token")
+    token = asyncio.run(
+        jwt.get_current_user_token("test_access_token", mock_data.USER_JSON)
+    )
     assert token == "test_access_token"
 
 
+def test_get_token_id():
+    """Test that tokens are identified by their jti, or by their hash if they have none."""
+    assert jwt.get_token_id("test_access_token", {"jti": "test_jti"}) == "test_jti"
+    assert jwt.get_token_id("test_access_token", {}) == (
+        hashlib.sha256(b"test_access_token").hexdigest()
+    )
+
+
 def test_add_blacklist_token(mocker):
-    """Test successful addition of a token to the blacklist."""
-    mock_insert_one = mocker.patch("pymongo.collection.Collection.insert_one")
+    """Test successful addition of a token to the blacklist until it expires."""
+    mocker.patch(
+        "server.util.jwt.decode_token",
+        return_value={"sub": "test_email", "jti": "test_jti", "exp": 1700000000},
+    )
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    mock_add = mocker.patch.object(jwt.revoked_tokens, "add")
     add_token = jwt.add_blacklist_token("test_access_token")
-    mock_insert_one.assert_called_once_with({"token": "test_access_token"})
+    expires_at = datetime.fromtimestamp(1700000000, timezone.utc)
+    assert mock_update_one.call_args.args[0] == {"_id": "test_jti"}
+    assert mock_update_one.call_args.args[1]["$setOnInsert"]["expires_at"] == (
+        expires_at
+    )
+    assert mock_update_one.call_args.kwargs == {"upsert": True}
+    mock_add.assert_called_once_with("test_jti", expires_at)
     assert add_token
 
 
 def test_is_token_blacklisted(mocker):
-    """Test successful check if a token is blacklisted."""
-    mock_find_one = mocker.patch(
-        "pymongo.collection.Collection.find_one",
-        return_value={"token": "test_access_token"},
+    """Test that the revoked tokens are checked by id."""
+    mock_contains = mocker.patch.object(
+        jwt.revoked_tokens, "contains_async", return_value=True
     )
-    is_blacklisted = jwt.is_token_blacklisted("test_access_token")
-    mock_find_one.assert_called_once_with({"token": "test_access_token"})
-    assert is_blacklisted
-
-
-def test_is_token_blacklisted_not_blacklisted(mocker):
-    """Test unsuccessful check if a token is blacklisted."""
-    mock_find_one = mocker.patch(
-        "pymongo.collection.Collection.find_one", return_value=None
+    assert asyncio.run(
+        jwt.is_token_blacklisted("test_access_token", {"jti": "test_jti"})
+    )
+    mock_contains.assert_called_once_with("test_jti")
+
+
+def test_revoked_tokens(mocker):
+    """Test that the revoked tokens are loaded once, and then only the new ones."""
+    now = datetime.now(timezone.utc)
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find",
+        side_effect=[
+            [{"_id": "revoked", "expires_at": now + timedelta(hours=1)}],
+            [{"_id": "new", "expires_at": now + timedelta(hours=1)}],
+            [],
+        ],
+    )
+    revoked_tokens = jwt.RevokedTokens()
+    assert revoked_tokens.contains("revoked")
+    assert not revoked_tokens.contains("new")
+    assert mock_find.call_count == 1
+    assert "revoked_at" not in mock_find.call_args.args[0]
+
+    mocker.patch("server.config.settings.TOKEN_REVOCATION_REFRESH", -1)
+    assert revoked_tokens.contains("new")
+    assert revoked_tokens.contains("revoked")
+    assert "$gte" in mock_find.call_args.args[0]["revoked_at"]
+
+
+def test_revoked_tokens_contains_async(mocker):
+    """Test that the revoked tokens are only refreshed when they are stale."""
+    now = datetime.now(timezone.utc)
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"_id": "revoked", "expires_at": now + timedelta(hours=1)}],
+    )
+    revoked_tokens = jwt.RevokedTokens()
+    assert asyncio.run(revoked_tokens.contains_async("revoked"))
+    assert not asyncio.run(revoked_tokens.contains_async("new"))
+    mock_find.assert_called_once()
+
+
+def test_revoked_tokens_expired(mocker):
+    """Test that tokens that have expired are forgotten."""
+    now = datetime.now(timezone.utc)
+    mocker.patch("pymongo.collection.Collection.find", return_value=[])
+    revoked_tokens = jwt.RevokedTokens()
+    revoked_tokens.add("expired", now - timedelta(seconds=1))
+    revoked_tokens.add("revoked", now + timedelta(hours=1))
+    assert revoked_tokens.contains("revoked")
+    assert not revoked_tokens.contains("expired")
+
+
+def test_migrate_blacklist(mocker):
+    """Test that blacklisted tokens are kept by id until they expire."""
+    now = datetime.now(timezone.utc)
+    valid = pyjwt.encode(
+        {"jti": "valid", "exp": now + timedelta(minutes=5)},
+        mock_data.API_SECRET_KEY,
+    )
+    expired = pyjwt.encode(
+        {"jti": "expired", "exp": now - timedelta(minutes=5)},
+        mock_data.API_SECRET_KEY,
+    )
+    mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"_id": 1, "token": valid}, {"_id": 2, "token": expired}],
     )
-    is_blacklisted = jwt.is_token_blacklisted("test_access_token")
-    mock_find_one.assert_called_once_with({"token": "test_access_token"})
-    assert not is_blacklisted
+    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    mock_delete_many = mocker.patch("pymongo.collection.Collection.delete_many")
+    jwt.migrate_blacklist()
+    updates = mock_bulk_write.call_args.args[0]
+    # pylint: disable=protected-access
+    assert [update._filter for update in updates] == [{"_id": "valid"}]
+    mock_delete_many.assert_called_once_with({"_id": {"$in": [1, 2]}})
+
+
+def test_migrate_blacklist_nothing_to_migrate(mocker):
+    """Test that nothing is written once the blacklist was converted."""
+    mocker.patch("pymongo.collection.Collection.find", return_value=[])
+    mock_delete_many = mocker.patch("pymongo.collection.Collection.delete_many")
+    jwt.migrate_blacklist()
+    mock_delete_many.assert_not_called()
 
 
 def test_create_refresh_token(mocker):
@@ -0,0 +1,86 @@
+"""Test the leases that let a single replica do a piece of work at a time."""
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from server.util import leases
+
+
+def test_acquire(mocker):
+    """Test that a lease that isn't held and matches the conditions is taken."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    assert leases.acquire("work", 60, {"next_run_at": {"$lte": 1}})
+    query, update = mock_update_one.call_args.args
+    assert query["_id"] == "work"
+    assert "$gt" in query["expires_at"]["$not"]
+    assert query["next_run_at"] == {"$lte": 1}
+    assert update["$set"]["holder"] == leases.HOLDER
+    assert mock_update_one.call_args.kwargs == {"upsert": True}
+
+
+def test_acquire_held(mocker):
+    """Test that a lease held by another replica isn't taken."""
+    mocker.patch(
+        "pymongo.collection.Collection.update_one",
+        side_effect=DuplicateKeyError("duplicate key"),
+    )
+    assert not leases.acquire("work", 60)
+
+
+def test_wait_for(mocker):
+    """Test that a held lease is taken once it is released."""
+    mock_acquire = mocker.patch(
+        f"{leases.__name__}.acquire", side_effect=[False, False, True]
+    )
+    mock_sleep = mocker.patch(f"{leases.__name__}.time.sleep")
+    assert leases.wait_for("work", 60, 10)
+    assert mock_acquire.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+def test_wait_for_timeout(mocker):
+    """Test that waiting for a lease is given up on after the timeout."""
+    mocker.patch(f"{leases.__name__}.acquire", return_value=False)
+    mocker.patch(f"{leases.__name__}.time.sleep")
+    mocker.patch(f"{leases.__name__}.time.monotonic", side_effect=[0, 5, 10])
+    assert not leases.wait_for("work", 60, 10)
+
+
+def test_renew(mocker):
+    """Test that only a lease held by this process is renewed."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    mock_update_one.return_value.matched_count = 0
+    assert not leases.renew("work", 60)
+    assert mock_update_one.call_args.args[0] == {"_id": "work", "holder": leases.HOLDER}
+
+
+def test_release(mocker):
+    """Test that a released lease expires and keeps the fields given."""
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    leases.release("work", {"next_run_at": 1})
+    query, update = mock_update_one.call_args.args
+    assert query == {"_id": "work", "holder": leases.HOLDER}
+    assert update["$set"]["next_run_at"] == 1
+    assert "expires_at" in update["$set"]
+
+
+def test_hold_sync_lease(mocker):
+    """Test that the sync lease is released even if the work done while holding it fails."""
+    mocker.patch(f"{leases.__name__}.wait_for", return_value=True)
+    mock_release = mocker.patch(f"{leases.__name__}.release")
+    with pytest.raises(ValueError):
+        with leases.hold_sync_lease("semester"):
+            raise ValueError
+    mock_release.assert_called_once_with("github.sync:semester")
+
+
+def test_hold_sync_lease_syncing(mocker):
+    """Test 409 error when a sync of the course doesn't finish in time."""
+    mock_wait_for = mocker.patch(f"{leases.__name__}.wait_for", return_value=False)
+    with pytest.raises(HTTPException) as exc_info:
+        with leases.hold_sync_lease("semester"):
+            pass
+    mock_wait_for.assert_called_once_with(
+        "github.sync:semester", leases.SYNC_LEASE, leases.SYNC_LEASE_WAIT
+    )
+    assert exc_info.value.status_code == 409
@@ -0,0 +1,81 @@
+"""Test the migrations of the data stored for each course."""
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from server.util import migrations
+from server.util.dates import to_datetime
+from tests.unit import mock_data
+
+
+def test_migrate_collection_dates(mocker):
+    """Test that the string fields are converted batch by batch."""
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find",
+        side_effect=[
+            [
+                {"_id": 1, "timestamp": "2020-01-01T00:00:00Z", "fetched_at": None},
+                # Already converted, but selected because of the other field.
+                {
+                    "_id": 2,
+                    "timestamp": datetime(2020, 1, 2),
+                    "fetched_at": "2020-01-03T00:00:00+00:00",
+                },
+            ],
+            [{"_id": 3, "timestamp": "2020-01-04T00:00:00"}],
+            [],
+        ],
+    )
+    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    collection = mock_data.DATABASE["semester.github.commits"]
+    migrated = migrations.migrate_collection_dates(
+        collection, ["timestamp", "fetched_at"], batch_size=2
+    )
+    assert migrated == 3
+    # Each batch resumes after the last document of the previous batch.
+    assert mock_find.call_args_list[1].args[0]["_id"] == {"$gt": 2}
+    assert mock_find.call_args_list[1].kwargs["limit"] == 2
+    mock_bulk_write.assert_any_call(
+        [
+            UpdateOne(
+                {"_id": 1}, {"$set": {"timestamp": to_datetime("2020-01-01T00:00:00Z")}}
+            ),
+            UpdateOne(
+                {"_id": 2},
+                {"$set": {"fetched_at": to_datetime("2020-01-03T00:00:00Z")}},
+            ),
+        ],
+        ordered=False,
+    )
+    assert mock_bulk_write.call_count == 2
+
+
+def test_migrate_collection_dates_unparsable(mocker):
+    """Test that strings that can't be parsed are left as they are."""
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find",
+        side_effect=[[{"_id": 1, "timestamp": "yesterday"}], []],
+    )
+    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    collection = mock_data.DATABASE["semester.minutes"]
+    assert migrations.migrate_collection_dates(collection, ["timestamp"]) == 0
+    mock_bulk_write.assert_not_called()
+    # The unparsable document is not read again.
+    assert mock_find.call_args_list[1].args[0]["_id"] == {"$gt": 1}
+
+
+def test_migrate_course_dates(mocker):
+    """Test that every subcollection is migrated before the sprint numbers are restamped."""
+    mock_migrate = mocker.patch(
+        f"{migrations.__name__}.migrate_collection_dates", return_value=5
+    )
+    mock_stamp = mocker.patch("server.util.sprints.stamp_sprint_numbers")
+    mock_hold = mocker.patch("server.util.leases.hold_sync_lease")
+    migrated = migrations.migrate_course_dates("semester", batch_size=10)
+    assert migrated == {coll: 5 for coll in migrations.DATE_FIELDS}
+    assert mock_migrate.call_count == len(migrations.DATE_FIELDS)
+    mock_migrate.assert_any_call(
+        mock_data.DATABASE["semester.sprints"], ["start_date", "end_date"], 10
+    )
+    mock_stamp.assert_called_once_with("semester")
+    mock_hold.assert_called_once_with("semester")
@@ -1,28 +1,37 @@
 """Unit tests for the team meeting minutes."""
+import asyncio
 
 import pytest
 from fastapi import HTTPException
 
+from server.repositories.minutes import MINUTE_FIELDS
 from server.routes import minutes
+from server.util.dates import to_datetime
 from tests.unit import mock_data
 
 
 def test_get_meeting_minutes(mocker):
     """Test successfully getting all meeting minutes for a team from the database."""
-    mock_check_course_in_db = mocker.patch("server.routes.minutes.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.minutes.check_course_in_db_async"
+    )
     mock_find = mocker.patch(
         "pymongo.collection.Collection.find",
         return_value=[mock_data.MEETING_MINUTES_JSON],
     )
-    meeting_minutes = minutes.get_meeting_minutes("course_name", "team_name", 0)
+    meeting_minutes = asyncio.run(
+        minutes.get_meeting_minutes("course_name", "team_name", 0)
+    )
     mock_check_course_in_db.assert_called_once()
-    mock_find.assert_called_once_with({"team": "team_name"})
+    mock_find.assert_called_once_with({"team": "team_name"}, MINUTE_FIELDS)
     assert meeting_minutes == [mock_data.MEETING_MINUTES]
 
 
 def test_get_meeting_minutes_sprint(mocker):
     """Test successfully getting meeting minutes for a team for a sprint from the database."""
-    mock_check_course_in_db = mocker.patch("server.routes.minutes.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.minutes.check_course_in_db_async"
+    )
     mock_find = mocker.patch(
         "pymongo.collection.Collection.find",
         return_value=[mock_data.MEETING_MINUTES_JSON],
@@ -31,52 +40,55 @@ def test_get_meeting_minutes_sprint(mocker):
         "pymongo.collection.Collection.find_one",
         return_value=mock_data.SPRINT_DATES,
     )
-    meeting_minutes = minutes.get_meeting_minutes("course_name", "team_name", 1)
+    meeting_minutes = asyncio.run(
+        minutes.get_meeting_minutes("course_name", "team_name", 1)
+    )
     mock_check_course_in_db.assert_called_once()
-    mock_find_one.assert_called_once_with({"sprint_number": 1})
+    mock_find_one.assert_called_once_with({"sprint_number": 1}, {"_id": 1})
+    # Minutes are looked up by the sprint they were stamped with.
     mock_find.assert_called_once_with(
-        {
-            "$and": [
-                {"timestamp": {"$lt": "2020-01-02T00:00:00Z"}},
-                {"timestamp": {"$gt": "2020-01-01T00:00:00Z"}},
-                {"team": "team_name"},
-            ]
-        }
+        {"team": "team_name", "sprint_number": 1}, MINUTE_FIELDS
     )
     assert meeting_minutes == [mock_data.MEETING_MINUTES]
 
 
 def test_get_meeting_minutes_no_meeting_minutes(mocker):
     """Test getting meeting minutes for a team from the database when there are none."""
-    mock_check_course_in_db = mocker.patch("server.routes.minutes.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.minutes.check_course_in_db_async"
+    )
     mock_find = mocker.patch("pymongo.collection.Collection.find", return_value=[])
-    meeting_minutes = minutes.get_meeting_minutes("course_name", "team_name", 0)
+    meeting_minutes = asyncio.run(
+        minutes.get_meeting_minutes("course_name", "team_name", 0)
+    )
     mock_check_course_in_db.assert_called_once()
-    mock_find.assert_called_once_with({"team": "team_name"})
+    mock_find.assert_called_once_with({"team": "team_name"}, MINUTE_FIELDS)
     assert not meeting_minutes
 
 
 def test_get_meeting_minutes_course_not_found(mocker):
     """Test getting meeting minutes for a team from the database when the course is not found."""
     mock_check_course_in_db = mocker.patch(
-        "server.routes.minutes.check_course_in_db", side_effect=HTTPException(404)
+        "server.routes.minutes.check_course_in_db_async", side_effect=HTTPException(404)
     )
     with pytest.raises(HTTPException) as exc:
-        minutes.get_meeting_minutes("course_name", "team_name", 0)
+        asyncio.run(minutes.get_meeting_minutes("course_name", "team_name", 0))
     mock_check_course_in_db.assert_called_once()
     assert exc.value.status_code == 404
 
 
 def test_get_meeting_minutes_invalid_sprint(mocker):
     """Test getting meeting minutes for a team from the database when the sprint is invalid."""
-    mock_check_course_in_db = mocker.patch("server.routes.minutes.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.minutes.check_course_in_db_async"
+    )
     mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one", return_value=None
     )
     with pytest.raises(HTTPException) as exc:
-        minutes.get_meeting_minutes("course_name", "team_name", 562)
+        asyncio.run(minutes.get_meeting_minutes("course_name", "team_name", 562))
     mock_check_course_in_db.assert_called_once()
-    mock_find_one.assert_called_once_with({"sprint_number": 562})
+    mock_find_one.assert_called_once_with({"sprint_number": 562}, {"_id": 1})
     assert exc.value.status_code == 404
 
 
@@ -89,8 +101,23 @@ def test_fetch_and_store_meeting_minutes(mocker, response_mock):
     mock_check_course_in_db = mocker.patch("server.routes.minutes.check_course_in_db")
     mock_delete_many = mocker.patch("pymongo.collection.Collection.delete_many")
     mock_insert_many = mocker.patch("pymongo.collection.Collection.insert_many")
+    # The second meeting is on the first day of sprint 1.
+    mocker.patch(
+        "server.util.sprints.get_sprints",
+        return_value=[
+            {
+                "sprint_number": 1,
+                "start_date": to_datetime("1988-10-25T00:00:00"),
+                "end_date": to_datetime("1988-11-08T00:00:00"),
+            }
+        ],
+    )
 
-    minutes.fetch_and_store_meeting_minutes("course_name", "owner_name", "team_name")
+    asyncio.run(
+        minutes.fetch_and_store_meeting_minutes(
+            "course_name", "owner_name", "team_name"
+        )
+    )
     mock_get.assert_called_once_with(
         "https://owner_name.github.io/team_name/meeting_minutes/", timeout=60
     )
@@ -102,13 +129,15 @@ def test_fetch_and_store_meeting_minutes(mocker, response_mock):
                 "title": "October 24, 1988",
                 "body": "Meeting minutes text 1",
                 "team": "team_name",
-                "timestamp": "1988-10-24T00:00:00",
+                "timestamp": to_datetime("1988-10-24T00:00:00"),
+                "sprint_number": 0,
             },
             {
                 "title": "October 25, 1988",
                 "body": "Meeting minutes text 2",
                 "team": "team_name",
-                "timestamp": "1988-10-25T00:00:00",
+                "timestamp": to_datetime("1988-10-25T00:00:00"),
+                "sprint_number": 1,
             },
         ]
     )
@@ -125,8 +154,10 @@ def test_fetch_and_store_meeting_minutes_invalid_course(mocker, response_mock):
     )
 
     with pytest.raises(HTTPException) as exc:
-        minutes.fetch_and_store_meeting_minutes(
-            "course_name", "owner_name", "team_name"
+        asyncio.run(
+            minutes.fetch_and_store_meeting_minutes(
+                "course_name", "owner_name", "team_name"
+            )
         )
     mock_get.assert_called_once_with(
         "https://owner_name.github.io/team_name/meeting_minutes/", timeout=60
@@ -142,8 +173,10 @@ def test_fetch_and_store_meeting_minutes_invalid_url(mocker, response_mock):
     )
 
     with pytest.raises(HTTPException) as exc:
-        minutes.fetch_and_store_meeting_minutes(
-            "course_name", "owner_name", "team_name"
+        asyncio.run(
+            minutes.fetch_and_store_meeting_minutes(
+                "course_name", "owner_name", "team_name"
+            )
         )
     mock_get.assert_called_once_with(
         "https://owner_name.github.io/team_name/meeting_minutes/", timeout=60
@@ -159,8 +192,10 @@ def test_fetch_and_store_meeting_minutes_parsing_error(mocker, response_mock):
     )
 
     with pytest.raises(HTTPException) as exc:
-        minutes.fetch_and_store_meeting_minutes(
-            "course_name", "owner_name", "team_name"
+        asyncio.run(
+            minutes.fetch_and_store_meeting_minutes(
+                "course_name", "owner_name", "team_name"
+            )
         )
     mock_get.assert_called_once_with(
         "https://owner_name.github.io/team_name/meeting_minutes/", timeout=60
@@ -180,10 +215,13 @@ def test_fetch_and_store_meeting_minutes_date_format_error(mocker, response_mock
         ),
     )
     mock_check_course_in_db = mocker.patch("server.routes.minutes.check_course_in_db")
+    mocker.patch("server.util.sprints.get_sprints", return_value=[])
 
     with pytest.raises(HTTPException) as exc:
-        minutes.fetch_and_store_meeting_minutes(
-            "course_name", "owner_name", "team_name"
+        asyncio.run(
+            minutes.fetch_and_store_meeting_minutes(
+                "course_name", "owner_name", "team_name"
+            )
         )
     mock_get.assert_called_once_with(
         "https://owner_name.github.io/team_name/meeting_minutes/", timeout=60
@@ -191,3 +229,28 @@ def test_fetch_and_store_meeting_minutes_date_format_error(mocker, response_mock
     mock_check_course_in_db.assert_called_once()
     assert exc.value.status_code == 400
     assert exc.value.detail == "Unable to parse date October 24th/25th, 1988, 2pm/11am"
+
+
+def test_submit_meeting_minutes_fetch(mocker):
+    """Test that a job is queued to fetch a team's meeting minutes."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.minutes.check_course_in_db_async"
+    )
+    mock_submit = mocker.patch("server.util.jobs.submit")
+    asyncio.run(
+        minutes.submit_meeting_minutes_fetch("test_course", "test_owner", "test_team")
+    )
+    mock_check_course_in_db.assert_called_once_with("test_course", [".minutes"])
+    mock_submit.assert_called_once_with(
+        "minutes.fetch",
+        "test_course",
+        {"course": "test_course", "owner": "test_owner", "team": "test_team"},
+    )
+
+
+def test_run_meeting_minutes_fetch(mocker):
+    """Test that a fetch job fetches and stores the team's meeting minutes."""
+    mock_fetch = mocker.patch("server.routes.minutes.store_meeting_minutes")
+    params = {"course": "test_course", "owner": "test_owner", "team": "test_team"}
+    minutes.run_meeting_minutes_fetch({"params": params}, mocker.Mock())
+    mock_fetch.assert_called_once_with(**params)
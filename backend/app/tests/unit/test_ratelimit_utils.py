@@ -0,0 +1,172 @@
+"""Test the rate limit accounting for the GitHub API."""
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from server.models.github import RateLimitStatus
+from server.util import ratelimit
+from server.util.ratelimit import RateLimiter
+
+RATE_LIMIT_PATH = "server.util.ratelimit"
+
+
+def rate_limit_headers(remaining, reset=1000):
+    """Get the rate limit headers that GitHub sends with every response."""
+    return {
+        "X-RateLimit-Limit": "5000",
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(reset),
+    }
+
+
+@pytest.fixture(name="time_mock")
+def fixture_time_mock(mocker):
+    """Mock the current time."""
+    time_mock = mocker.patch(f"{RATE_LIMIT_PATH}.time")
+    time_mock.time.return_value = 900
+    return time_mock
+
+
+def test_update():
+    """Test that the budget is read from the response headers."""
+    rate_limiter = RateLimiter()
+    rate_limiter.update(rate_limit_headers(4200))
+    assert rate_limiter.limit == 5000
+    assert rate_limiter.remaining == 4200
+    assert rate_limiter.reset == 1000
+
+
+def test_update_partial_headers():
+    """Test that the limit and reset are kept when a response leaves them out."""
+    rate_limiter = RateLimiter()
+    rate_limiter.update(rate_limit_headers(4200))
+    rate_limiter.update({"X-RateLimit-Remaining": "4100"})
+    assert rate_limiter.limit == 5000
+    assert rate_limiter.remaining == 4100
+    assert rate_limiter.reset == 1000
+
+
+def test_update_no_headers():
+    """Test that responses without rate limit headers are ignored."""
+    rate_limiter = RateLimiter()
+    rate_limiter.update({})
+    assert rate_limiter.remaining is None
+
+
+def test_acquire_unknown_budget(time_mock):
+    """Test that requests are not delayed before the budget is known."""
+    # pylint: disable=unused-argument
+    assert RateLimiter().acquire() == 0
+
+
+def test_acquire(time_mock):
+    """Test that a request is counted against the budget."""
+    # pylint: disable=unused-argument
+    rate_limiter = RateLimiter()
+    rate_limiter.update(rate_limit_headers(4200))
+    assert rate_limiter.acquire() == 0
+    assert rate_limiter.remaining == 4199
+
+
+def test_acquire_reserve(mocker, time_mock):
+    """Test that requests are delayed until the window resets once the reserve is reached."""
+    # pylint: disable=unused-argument
+    mocker.patch(f"{RATE_LIMIT_PATH}.settings.GITHUB_MAX_WAIT", 300)
+    rate_limiter = RateLimiter()
+    rate_limiter.update(rate_limit_headers(50, reset=960))
+    assert rate_limiter.acquire() == 60
+    assert rate_limiter.remaining == 50
+
+
+def test_acquire_reset(time_mock):
+    """Test that the budget is restored once the window has reset."""
+    rate_limiter = RateLimiter()
+    rate_limiter.update(rate_limit_headers(0, reset=800))
+    assert rate_limiter.acquire() == 0
+    assert rate_limiter.remaining == 4999
+    time_mock.time.assert_called()
+    # The budget is only restored once per window.
+    assert rate_limiter.reset == 900 + ratelimit.WINDOW
+    assert rate_limiter.acquire() == 0
+    assert rate_limiter.remaining == 4998
+
+
+def test_acquire_too_long(time_mock):
+    """Test that 429 is raised instead of waiting longer than the maximum wait."""
+    # pylint: disable=unused-argument
+    rate_limiter = RateLimiter()
+    rate_limiter.update(rate_limit_headers(0, reset=3600))
+    with pytest.raises(HTTPException) as exc_info:
+        rate_limiter.acquire()
+    assert exc_info.value.status_code == 429
+
+
+def test_acquire_retry_at(time_mock):
+    """Test that requests wait for a secondary rate limit to pass."""
+    # pylint: disable=unused-argument
+    rate_limiter = RateLimiter()
+    rate_limiter.retry_at = 930
+    assert rate_limiter.acquire() == 30
+
+
+@pytest.mark.parametrize(
+    "status_code,headers,text,delay",
+    [
+        # Retry-After is always respected.
+        (429, {"Retry-After": "30"}, "", 30),
+        (403, {"Retry-After": "30"}, "", 30),
+        # The primary rate limit waits for the window to reset.
+        (403, rate_limit_headers(0, reset=945), "", 45),
+        # Secondary rate limits without Retry-After back off exponentially.
+        (403, {}, "You have exceeded a secondary rate limit.", 1),
+        (429, {}, "", 1),
+    ],
+)
+def test_get_retry_delay(time_mock, status_code, headers, text, delay):
+    """Test that rate limited responses are retried after the right delay."""
+    # pylint: disable=unused-argument
+    rate_limiter = RateLimiter()
+    res = httpx.Response(status_code, headers=headers, text=text)
+    assert rate_limiter.get_retry_delay(res, 0) == delay
+    assert rate_limiter.retry_at == 900 + delay
+
+
+def test_get_retry_delay_backoff(time_mock):
+    """Test that the backoff doubles with every attempt."""
+    # pylint: disable=unused-argument
+    res = httpx.Response(429)
+    assert RateLimiter().get_retry_delay(res, 2) == 4
+
+
+@pytest.mark.parametrize(
+    "status_code,headers,attempt",
+    [
+        # Successful responses.
+        (200, rate_limit_headers(4200), 0),
+        # Forbidden for reasons other than rate limits.
+        (403, rate_limit_headers(4200), 0),
+        # Out of retries.
+        (429, {"Retry-After": "30"}, 3),
+        # Waiting longer than the maximum wait.
+        (403, rate_limit_headers(0, reset=3600), 0),
+    ],
+)
+def test_get_retry_delay_no_retry(time_mock, status_code, headers, attempt):
+    """Test that responses are not retried when they can't or shouldn't be."""
+    # pylint: disable=unused-argument
+    rate_limiter = RateLimiter()
+    res = httpx.Response(status_code, headers=headers)
+    assert rate_limiter.get_retry_delay(res, attempt) is None
+    assert rate_limiter.retry_at is None
+
+
+def test_get_status():
+    """Test that the current budget is returned."""
+    rate_limiter = RateLimiter()
+    rate_limiter.update(rate_limit_headers(4200, reset=1640998800))
+    assert rate_limiter.get_status() == RateLimitStatus(
+        limit=5000,
+        remaining=4200,
+        reset="2022-01-01T01:00:00+00:00",
+        retry_at=None,
+    )
@@ -0,0 +1,68 @@
+"""Test the wrapper for Python requests."""
+
+import pytest
+from fastapi import HTTPException
+from requests import Request
+
+from server.util import requests
+from tests.unit import mock_data
+
+
+def test_get_conditional_headers():
+    """Test that the validators of a URL are returned as conditional request headers."""
+    headers = requests.get_conditional_headers(
+        mock_data.HTTP_VALIDATORS, mock_data.HTTP_VALIDATORS["url"]
+    )
+    assert headers == {
+        "If-None-Match": mock_data.HTTP_VALIDATORS["etag"],
+        "If-Modified-Since": mock_data.HTTP_VALIDATORS["last_modified"],
+    }
+
+
+def test_get_conditional_headers_other_url():
+    """Test that no headers are returned for validators of another URL, or without any."""
+    assert not requests.get_conditional_headers(
+        mock_data.HTTP_VALIDATORS, "https://api.github.com/repos/owner/repo/commits"
+    )
+    assert not requests.get_conditional_headers(None, mock_data.HTTP_VALIDATORS["url"])
+
+
+def test_get_validators(response_mock):
+    """Test that the validators of a response are returned with the requested URL."""
+    response = response_mock(None)
+    response.request = Request(url=mock_data.HTTP_VALIDATORS["url"])
+    response.headers["ETag"] = mock_data.HTTP_VALIDATORS["etag"]
+    response.headers["Last-Modified"] = mock_data.HTTP_VALIDATORS["last_modified"]
+    assert requests.get_validators(response) == mock_data.HTTP_VALIDATORS
+
+
+def test_get_not_modified(mocker, response_mock):
+    """Test that a 304 Not Modified response is not treated as an error."""
+    mocker.patch("requests.get", return_value=response_mock(None, status_code=304))
+    assert requests.get("https://api.github.com").status_code == 304
+
+
+def test_get_retry(mocker, response_mock):
+    """Test that a request is retried for as long as the retry function returns a delay."""
+    mock_get = mocker.patch(
+        "requests.get",
+        side_effect=[response_mock(None, status_code=429), response_mock([])],
+    )
+    mock_sleep = mocker.patch("server.util.requests.time.sleep")
+    retry = mocker.Mock(side_effect=[5, None])
+    res = requests.get("https://api.github.com", retry=retry)
+    assert res.status_code == 200
+    assert mock_get.call_count == 2
+    assert retry.call_args_list[1].args[1] == 1
+    mock_sleep.assert_called_once_with(5)
+
+
+def test_get_error(mocker, response_mock):
+    """Test that an error response is raised as an HTTPException."""
+    mocker.patch(
+        "requests.get",
+        return_value=response_mock(None, status_code=404, content=b'{"message": ""}'),
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        requests.get("https://api.github.com")
+    assert exc_info.value.status_code == 404
@@ -0,0 +1,145 @@
+"""Test the daily rollups of commit counts."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from pymongo import UpdateOne
+
+from server.util import dates, rollups
+from tests.unit import mock_data
+
+
+@pytest.fixture(name="sync_lease", autouse=True)
+def fixture_sync_lease(mocker):
+    """Mock the sync lease held while the rollups of a course are rebuilt."""
+    return {
+        "wait_for": mocker.patch("server.util.leases.wait_for", return_value=True),
+        "release": mocker.patch("server.util.leases.release"),
+    }
+
+
+def test_get_day():
+    """Test that the UTC day is taken from the timestamp."""
+    assert rollups.get_day("2022-09-30T23:59:59Z") == "2022-09-30"
+    assert rollups.get_day("2022-09-30T20:00:00-06:00") == "2022-10-01"
+    assert rollups.get_day(datetime(2022, 9, 30, 12)) == "2022-09-30"
+
+
+def test_update_commit_rollups(mocker):
+    """Test that new commits are counted by repository, author, day and sprint."""
+    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    commit = mock_data.GITHUB_COMMITS[0]
+    rollups.update_commit_rollups(
+        "semester",
+        [
+            commit,
+            commit,
+            {**commit, "timestamp": "2020-01-01T12:00:00Z", "sprint_number": 1},
+        ],
+    )
+    mock_bulk_write.assert_called_once_with(
+        [
+            UpdateOne(
+                {
+                    "repo_name": "test_repo",
+                    "author": "testuser",
+                    "day": "2020-01-01",
+                    "sprint_number": 0,
+                },
+                {"$inc": {"count": 2}},
+                upsert=True,
+            ),
+            UpdateOne(
+                {
+                    "repo_name": "test_repo",
+                    "author": "testuser",
+                    "day": "2020-01-01",
+                    "sprint_number": 1,
+                },
+                {"$inc": {"count": 1}},
+                upsert=True,
+            ),
+        ],
+        ordered=False,
+    )
+
+
+def test_update_commit_rollups_no_commits(mocker):
+    """Test that nothing is written when there are no new commits."""
+    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    assert rollups.update_commit_rollups("semester", []) is None
+    mock_bulk_write.assert_not_called()
+
+
+def test_rebuild_commit_rollups(mocker):
+    """Test that the rollups are replaced with the counts of the stored commits."""
+    mock_aggregate = mocker.patch("pymongo.collection.Collection.aggregate")
+    rollups.rebuild_commit_rollups("semester")
+    pipeline = mock_aggregate.call_args.args[0]
+    # Commits whose timestamp can't be parsed are skipped.
+    assert pipeline[0] == {"$addFields": {"date": dates.TIMESTAMP_DATE}}
+    assert pipeline[1] == {"$match": {"date": {"$ne": None}}}
+    assert pipeline[2]["$group"]["_id"]["day"] == {
+        "$dateToString": {"format": "%Y-%m-%d", "date": "$date"}
+    }
+    assert pipeline[2]["$group"]["_id"]["sprint_number"] == "$sprint_number"
+    assert pipeline[-1] == {"$out": "semester.github.rollups"}
+
+
+def test_backfill_commit_rollups(mocker):
+    """Test that rollups are only built for courses with commits but no rollups."""
+    mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"name": "new_course"}, {"name": "old_course"}],
+    )
+    # new_course already has rollups, old_course has commits but no rollups.
+    mocker.patch(
+        "pymongo.collection.Collection.estimated_document_count",
+        side_effect=[10, 0, 10],
+    )
+    mock_rebuild = mocker.patch(f"{rollups.__name__}.rebuild_commit_rollups")
+    rollups.backfill_commit_rollups()
+    mock_rebuild.assert_called_once_with("old_course")
+
+
+def test_backfill_commit_rollups_syncing(mocker, sync_lease):
+    """Test that a course being synced is left to be built on the next startup."""
+    sync_lease["wait_for"].return_value = False
+    mocker.patch(
+        "pymongo.collection.Collection.find", return_value=[{"name": "old_course"}]
+    )
+    mocker.patch(
+        "pymongo.collection.Collection.estimated_document_count", side_effect=[0, 10]
+    )
+    mock_rebuild = mocker.patch(f"{rollups.__name__}.rebuild_commit_rollups")
+    rollups.backfill_commit_rollups()
+    mock_rebuild.assert_not_called()
+
+
+def test_count_commits(mocker):
+    """Test that the rollups are summed by group and sprint number."""
+    mock_aggregate = mocker.patch(
+        "pymongo.collection.Collection.aggregate",
+        return_value=iter(
+            [
+                {"_id": {"group": "test_team", "sprint": 1}, "count": 30},
+                {"_id": {"group": "test_team", "sprint": 0}, "count": 5},
+                {"_id": {"group": "other_team", "sprint": 2}, "count": 2},
+            ]
+        ),
+    )
+    counts = asyncio.run(
+        rollups.count_commits("semester", "repo_name", {"sprint_number": 1})
+    )
+    mock_aggregate.assert_called_once_with(
+        [
+            {"$match": {"sprint_number": 1}},
+            {
+                "$group": {
+                    "_id": {"group": "$repo_name", "sprint": "$sprint_number"},
+                    "count": {"$sum": "$count"},
+                }
+            },
+        ]
+    )
+    assert counts == {"test_team": {1: 30, 0: 5}, "other_team": {2: 2}}
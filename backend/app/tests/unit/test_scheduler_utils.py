@@ -0,0 +1,129 @@
+"""Test the scheduled syncs of the GitHub commits of every course."""
+import time
+
+import pytest
+
+from server.config import settings
+from server.models.github import RepoSyncResult
+from server.util import scheduler
+from server.util.ratelimit import rate_limiter
+
+SCHEDULER_PATH = "server.util.scheduler"
+
+
+@pytest.fixture(name="lease")
+def fixture_lease(mocker):
+    """Mock the leases of the scheduled syncs."""
+    return {
+        "acquire": mocker.patch(f"{SCHEDULER_PATH}.leases.acquire", return_value=True),
+        "renew": mocker.patch(f"{SCHEDULER_PATH}.leases.renew"),
+        "release": mocker.patch(f"{SCHEDULER_PATH}.leases.release"),
+    }
+
+
+def test_sync_course_if_due(mocker, lease):
+    """Test that a due course is synced under its lease, which is renewed and released."""
+    mocker.patch.object(settings, "GITHUB_OWNER", "test_owner")
+
+    async def sync_course(owner, course_name, concurrency, report_progress):
+        report_progress(1, 1)
+        return [RepoSyncResult(repo_name="repo", new_commits=3, pages_fetched=1)]
+
+    mock_sync_course = mocker.patch(
+        f"{SCHEDULER_PATH}.github.sync_course_repos", side_effect=sync_course
+    )
+    assert scheduler.sync_course_if_due("test_course")
+    assert lease["acquire"].call_args.args[0] == "github.sync:test_course"
+    assert "next_run_at" in lease["acquire"].call_args.args[2]
+    assert mock_sync_course.call_args.args[:3] == ("test_owner", "test_course", 1)
+    lease["renew"].assert_called_once_with(
+        "github.sync:test_course", scheduler.leases.SYNC_LEASE
+    )
+    fields = lease["release"].call_args.args[1]
+    delay = (fields["next_run_at"] - fields["last_run_at"]).total_seconds()
+    assert (
+        settings.GITHUB_SYNC_INTERVAL
+        <= delay
+        <= settings.GITHUB_SYNC_INTERVAL + settings.GITHUB_SYNC_JITTER + 60
+    )
+
+
+def test_sync_course_if_due_not_due(mocker, lease):
+    """Test that a course that isn't due, or is synced by another replica, is skipped."""
+    lease["acquire"].return_value = False
+    mock_sync_course = mocker.patch(f"{SCHEDULER_PATH}.github.sync_course_repos")
+    assert not scheduler.sync_course_if_due("test_course")
+    mock_sync_course.assert_not_called()
+    lease["release"].assert_not_called()
+
+
+def test_sync_course_if_due_error(mocker, lease):
+    """Test that the lease is released when a sync fails."""
+    mocker.patch(
+        f"{SCHEDULER_PATH}.github.sync_course_repos", side_effect=RuntimeError("failed")
+    )
+    with pytest.raises(RuntimeError):
+        scheduler.sync_course_if_due("test_course")
+    lease["release"].assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "remaining, reset, expected",
+    [
+        (None, None, True),
+        (5000, time.time() + 60, True),
+        (10, time.time() + 60, False),
+        (10, time.time() - 60, True),
+    ],
+)
+def test_has_budget(mocker, remaining, reset, expected):
+    """Test that scheduled syncs wait for the rate limit to reset when little remains."""
+    mocker.patch.object(rate_limiter, "remaining", remaining)
+    mocker.patch.object(rate_limiter, "reset", reset)
+    assert scheduler.has_budget() == expected
+
+
+def test_run_due_syncs(mocker):
+    """Test that every course that uses GitHub is checked, and errors don't stop the others."""
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"name": "course1"}, {"name": "course2"}, {"name": "course3"}],
+    )
+    mocker.patch(f"{SCHEDULER_PATH}.has_budget", return_value=True)
+    mocker.patch(
+        f"{SCHEDULER_PATH}.sync_course_if_due",
+        side_effect=[True, RuntimeError("failed"), False],
+    )
+    assert scheduler.SyncScheduler().run_due_syncs() == ["course1"]
+    assert mock_find.call_args.args[0] == {"use_github": True}
+
+
+def test_run_due_syncs_no_budget(mocker):
+    """Test that scheduled syncs are put off when the rate limit is low."""
+    mocker.patch(
+        "pymongo.collection.Collection.find", return_value=[{"name": "course1"}]
+    )
+    mocker.patch(f"{SCHEDULER_PATH}.has_budget", return_value=False)
+    mock_sync = mocker.patch(f"{SCHEDULER_PATH}.sync_course_if_due")
+    assert not scheduler.SyncScheduler().run_due_syncs()
+    mock_sync.assert_not_called()
+
+
+def test_start_disabled(mocker):
+    """Test that the scheduler doesn't start without an owner for the repositories."""
+    mocker.patch.object(settings, "GITHUB_OWNER", None)
+    mock_thread = mocker.patch(f"{SCHEDULER_PATH}.threading.Thread")
+    sync_scheduler = scheduler.SyncScheduler()
+    sync_scheduler.start()
+    mock_thread.assert_not_called()
+    sync_scheduler.stop()
+
+
+def test_start_and_stop(mocker):
+    """Test that a started scheduler stops when asked to."""
+    mocker.patch.object(settings, "GITHUB_OWNER", "test_owner")
+    mock_run_due_syncs = mocker.patch.object(scheduler.SyncScheduler, "run_due_syncs")
+    sync_scheduler = scheduler.SyncScheduler()
+    sync_scheduler.start()
+    sync_scheduler.stop(timeout=5)
+    mock_run_due_syncs.assert_not_called()
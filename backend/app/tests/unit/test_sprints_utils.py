@@ -0,0 +1,181 @@
+"""Test the sprint numbers of commits and meeting minutes."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from pymongo import UpdateMany
+
+from server.models.courses import Sprint
+from server.util import dates, sprints
+from server.util.dates import to_datetime
+
+SPRINTS = [
+    {
+        "sprint_number": 1,
+        "start_date": to_datetime("2022-09-05T19:05:45Z"),
+        "end_date": to_datetime("2022-09-24T19:05:45Z"),
+    },
+    {
+        "sprint_number": 2,
+        "start_date": to_datetime("2022-09-24T19:05:45Z"),
+        "end_date": to_datetime("2022-10-08T19:05:45Z"),
+    },
+]
+
+
+@pytest.mark.parametrize(
+    "timestamp,sprint_number",
+    [
+        ("2022-09-01T00:00:00Z", 0),
+        # A sprint includes its start date.
+        ("2022-09-05T19:05:45Z", 1),
+        ("2022-09-24T19:05:44Z", 1),
+        # A sprint ends just before its end date, where the next sprint starts.
+        ("2022-09-24T19:05:45Z", 2),
+        ("2022-10-08T19:05:45Z", 0),
+        # Timestamps in other timezones are compared as instants.
+        ("2022-09-24T13:05:44-06:00", 1),
+    ],
+)
+def test_get_sprint_number(timestamp, sprint_number):
+    """Test that a timestamp is stamped with the sprint it falls in."""
+    assert sprints.get_sprint_number(SPRINTS, timestamp) == sprint_number
+
+
+def test_get_sprint_number_overlap():
+    """Test that the lowest sprint number wins where sprints overlap."""
+    overlapping = [
+        SPRINTS[0],
+        {**SPRINTS[1], "start_date": to_datetime("2022-09-20T00:00:00Z")},
+    ]
+    assert sprints.get_sprint_number(overlapping, "2022-09-21T00:00:00Z") == 1
+
+
+def test_get_sprint_document():
+    """Test that the dates of a sprint are stored as dates."""
+    document = sprints.get_sprint_document(
+        Sprint(
+            sprint_number=1,
+            start_date="2022-09-05T13:05:45-06:00",
+            end_date="2022-09-24T19:05:45Z",
+            sprint_file_name="sprint1.csv",
+            forms_url="https://example.com",
+        )
+    )
+    assert document["start_date"] == SPRINTS[0]["start_date"]
+    assert document["end_date"] == SPRINTS[0]["end_date"]
+    assert document["sprint_file_name"] == "sprint1.csv"
+
+
+def test_get_sprints(mocker):
+    """Test that sprints stored before dates were migrated are read as dates."""
+    mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[
+            {
+                "sprint_number": 1,
+                "start_date": "2022-09-05T19:05:45Z",
+                "end_date": datetime(2022, 9, 24, 19, 5, 45),
+            }
+        ],
+    )
+    assert sprints.get_sprints("semester") == SPRINTS[:1]
+
+
+def test_get_sprint_match(mocker):
+    """Test that documents are matched by sprint number once the sprint is found."""
+    mock_find_one = mocker.patch(
+        "pymongo.collection.Collection.find_one", return_value=SPRINTS[0]
+    )
+    assert asyncio.run(sprints.get_sprint_match("semester", 1)) == {"sprint_number": 1}
+    mock_find_one.assert_called_once_with({"sprint_number": 1}, {"_id": 1})
+
+
+def test_get_sprint_match_all_sprints(mocker):
+    """Test that every document is matched for sprint 0."""
+    mock_find_one = mocker.patch("pymongo.collection.Collection.find_one")
+    assert not asyncio.run(sprints.get_sprint_match("semester", 0))
+    mock_find_one.assert_not_called()
+
+
+def test_get_sprint_match_invalid_sprint(mocker):
+    """Test 404 error when the sprint does not exist."""
+    mocker.patch("pymongo.collection.Collection.find_one", return_value=None)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(sprints.get_sprint_match("semester", 562))
+    assert exc_info.value.status_code == 404
+
+
+def test_stamp_sprint_numbers(mocker):
+    """Test that the commits and minutes are restamped and the rollups rebuilt."""
+    mocker.patch(f"{sprints.__name__}.get_sprints", return_value=SPRINTS)
+    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    mock_rebuild = mocker.patch("server.util.rollups.rebuild_commit_rollups")
+    sprints.stamp_sprint_numbers("semester")
+    sprint_1, sprint_2 = (
+        {
+            "$expr": {
+                "$and": [
+                    {"$gte": [dates.TIMESTAMP_DATE, sprint["start_date"]]},
+                    {"$lt": [dates.TIMESTAMP_DATE, sprint["end_date"]]},
+                ]
+            }
+        }
+        for sprint in SPRINTS
+    )
+    updates = [
+        UpdateMany({"$nor": [sprint_1, sprint_2]}, {"$set": {"sprint_number": 0}}),
+        # The lowest sprint is stamped last, so that it wins where sprints overlap.
+        UpdateMany(sprint_2, {"$set": {"sprint_number": 2}}),
+        UpdateMany(sprint_1, {"$set": {"sprint_number": 1}}),
+    ]
+    assert mock_bulk_write.call_count == len(sprints.STAMPED_COLLECTIONS)
+    mock_bulk_write.assert_called_with(updates, ordered=True)
+    mock_rebuild.assert_called_once_with("semester")
+
+
+def test_stamp_sprint_numbers_no_sprints(mocker):
+    """Test that everything is put in sprint 0 when a course has no sprints."""
+    mocker.patch(f"{sprints.__name__}.get_sprints", return_value=[])
+    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    mocker.patch("server.util.rollups.rebuild_commit_rollups")
+    sprints.stamp_sprint_numbers("semester")
+    mock_bulk_write.assert_called_with(
+        [UpdateMany({}, {"$set": {"sprint_number": 0}})], ordered=True
+    )
+
+
+def test_backfill_sprint_numbers(mocker):
+    """Test that only courses with unstamped documents are stamped."""
+    mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"name": "new_course"}, {"name": "old_course"}],
+    )
+    # new_course has no unstamped commits or minutes, old_course has unstamped commits.
+    mocker.patch(
+        "pymongo.collection.Collection.find_one",
+        side_effect=[None, None, {"_id": "id"}],
+    )
+    mock_wait_for = mocker.patch(
+        f"{sprints.__name__}.leases.wait_for", return_value=True
+    )
+    mock_release = mocker.patch(f"{sprints.__name__}.leases.release")
+    mock_stamp = mocker.patch(f"{sprints.__name__}.stamp_sprint_numbers")
+    sprints.backfill_sprint_numbers()
+    mock_stamp.assert_called_once_with("old_course")
+    # The course is restamped while holding its sync lease.
+    assert mock_wait_for.call_args.args[0] == "github.sync:old_course"
+    mock_release.assert_called_once_with("github.sync:old_course")
+
+
+def test_backfill_sprint_numbers_syncing(mocker):
+    """Test that a course being synced is left for the next startup."""
+    mocker.patch(
+        "pymongo.collection.Collection.find", return_value=[{"name": "old_course"}]
+    )
+    mocker.patch("pymongo.collection.Collection.find_one", return_value={"_id": "id"})
+    mocker.patch(f"{sprints.__name__}.leases.wait_for", return_value=False)
+    mock_stamp = mocker.patch(f"{sprints.__name__}.stamp_sprint_numbers")
+    sprints.backfill_sprint_numbers()
+    mock_stamp.assert_not_called()
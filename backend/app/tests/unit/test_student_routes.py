@@ -1,24 +1,42 @@
 """Test API functions for handling students."""
+import asyncio
 import os
 
+import pytest
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+
+from server.models.students import UploadProgress
+from server.repositories.sprint_data import SPRINT_DATA_FIELDS
+from server.repositories.students import STUDENT_FIELDS
 from server.routes import students
 from tests.unit import mock_data
 
 
 def test_get_students_in_course_sprint(mocker):
     """Test successfully getting all students' details for a specified sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.students.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.students.check_course_in_db_async"
+    )
     mock_find = mocker.patch("pymongo.collection.Collection.find")
-    mock_find.side_effect = [[mock_data.STUDENT_JSON], [mock_data.STUDENT_SPRINT_JSON]]
-    students_response = students.get_students_in_course_sprint("test_course", 1)
+    mock_find.side_effect = [[mock_data.STUDENT_SPRINT_JSON], [mock_data.STUDENT_JSON]]
+    students_response = asyncio.run(
+        students.get_students_in_course_sprint("test_course", 1)
+    )
     mock_check_course_in_db.assert_called_once()
-    assert mock_find.call_count == 2
+    # Only the students with sprint data are fetched.
+    assert mock_find.call_args_list == [
+        mocker.call({"sprint": 1}, SPRINT_DATA_FIELDS),
+        mocker.call({"email": {"$in": ["test_email"]}}, STUDENT_FIELDS),
+    ]
     assert students_response == mock_data.STUDENTS_RESPONSE
 
 
 def test_get_student_in_course_sprint(mocker):
     """Test successfully getting a student's details for a specified sprint."""
-    mock_check_course_in_db = mocker.patch("server.routes.students.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.students.check_course_in_db_async"
+    )
     mock_find_one = mocker.patch(
         "pymongo.collection.Collection.find_one", return_value=mock_data.STUDENT_JSON
     )
@@ -26,8 +44,8 @@ def test_get_student_in_course_sprint(mocker):
         "pymongo.collection.Collection.find",
         return_value=[mock_data.STUDENT_SPRINT_JSON],
     )
-    students_response = students.get_student_in_course_sprint(
-        "test_course", 1, "test_email"
+    students_response = asyncio.run(
+        students.get_student_in_course_sprint("test_course", 1, "test_email")
     )
     mock_check_course_in_db.assert_called_once()
     mock_find_one.assert_called_once()
@@ -37,7 +55,9 @@ def test_get_student_in_course_sprint(mocker):
 
 def test_post_student_data_roster(mocker, datadir):
     """Test successfully uploading student course data to the database."""
-    mock_check_course_in_db = mocker.patch("server.routes.students.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.students.check_course_in_db_async"
+    )
     mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
     mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
     # mock_parse_roster_data = mocker.patch(
@@ -47,7 +67,7 @@ def test_post_student_data_roster(mocker, datadir):
         roster_data = mock_data.MockFileWrapper(
             os.path.join(datadir, "test_roster.csv"), file
         )
-        students.post_student_data("test_course", 0, roster_data)
+        asyncio.run(students.post_student_data("test_course", 0, roster_data))
     mock_check_course_in_db.assert_called_once()
     # mock_parse_roster_data.assert_called_once_with(roster_data.file, "test_course")
     mock_bulk_write.assert_called_once_with(mock_data.STUDENT_ROSTER_POST)
@@ -56,7 +76,9 @@ def test_post_student_data_roster(mocker, datadir):
 
 def test_post_student_data_sprint(mocker, datadir):
     """Test successfully uploading student sprint data to the database."""
-    mock_check_course_in_db = mocker.patch("server.routes.students.check_course_in_db")
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.students.check_course_in_db_async"
+    )
     mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
     mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
     # mock_parse_sprint_data = mocker.patch(
@@ -66,8 +88,99 @@ def test_post_student_data_sprint(mocker, datadir):
         sprint_data = mock_data.MockFileWrapper(
             os.path.join(datadir, "test_sprint1.csv"), file
         )
-        students.post_student_data("test_course", 1, sprint_data)
+        asyncio.run(students.post_student_data("test_course", 1, sprint_data))
     mock_check_course_in_db.assert_called_once()
     # assert mock_parse_sprint_data.call_count == 1
     mock_bulk_write.assert_called_once_with(mock_data.STUDENT_SPRINT_POST)
     mock_update_one.assert_called_once()
+
+
+def test_post_student_data_stream(mocker, datadir):
+    """Test that a streamed upload reports the progress of each chunk as a line of JSON."""
+    mock_write_student_data = mocker.patch(
+        "server.util.uploads.write_student_data",
+        return_value=iter(
+            [
+                UploadProgress(chunk=1, documents=1, total=1),
+                UploadProgress(chunk=2, documents=1, total=2),
+            ]
+        ),
+    )
+    with open(os.path.join(datadir, "test_roster.csv"), "r", encoding="utf-8") as file:
+        roster_data = mock_data.MockFileWrapper(
+            os.path.join(datadir, "test_roster.csv"), file
+        )
+        response = asyncio.run(
+            students.post_student_data(
+                "test_course", 0, roster_data, stream=True, chunk_size=1
+            )
+        )
+    mock_write_student_data.assert_called_once_with(
+        "test_course", 0, roster_data.file, roster_data.filename, 1
+    )
+    assert isinstance(response, StreamingResponse)
+    assert response.media_type == "application/x-ndjson"
+
+
+def test_post_student_data_stream_chunk_size():
+    """Test that a streamed upload needs a positive chunk size."""
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(
+            students.post_student_data(
+                "test_course", 0, None, stream=True, chunk_size=0
+            )
+        )
+    assert exc.value.status_code == 400
+
+
+def test_submit_student_data(mocker, datadir):
+    """Test that an upload job is queued with the uploaded file."""
+    mock_check_course_in_db = mocker.patch(
+        "server.routes.students.check_course_in_db_async"
+    )
+    mock_submit = mocker.patch("server.util.jobs.submit")
+    with open(os.path.join(datadir, "test_sprint1.csv"), "rb") as file:
+        sprint_data = UploadFile("sprint1.csv", file)
+        asyncio.run(students.submit_student_data("test_course", 1, sprint_data, 100))
+        file.seek(0)
+        content = file.read()
+    mock_check_course_in_db.assert_called_once_with(
+        "test_course", [".students.sprints"]
+    )
+    mock_submit.assert_called_once_with(
+        "students.upload",
+        "test_course",
+        {
+            "course_name": "test_course",
+            "sprint": 1,
+            "file_name": "sprint1.csv",
+            "chunk_size": 100,
+        },
+        input_file=content,
+    )
+
+
+def test_run_student_data_upload(mocker):
+    """Test that an upload job reports the progress of each chunk."""
+    mock_write_student_data = mocker.patch(
+        "server.util.uploads.write_student_data",
+        return_value=iter(
+            [
+                UploadProgress(chunk=1, documents=2, total=2),
+                UploadProgress(chunk=2, documents=1, total=3),
+            ]
+        ),
+    )
+    report_progress = mocker.Mock()
+    job = {
+        "params": {
+            "course_name": "test_course",
+            "sprint": 0,
+            "file_name": "roster.csv",
+            "chunk_size": 2,
+        },
+        "input_file": b"csv",
+    }
+    assert students.run_student_data_upload(job, report_progress) == {"documents": 3}
+    assert mock_write_student_data.call_args.args[3:] == ("roster.csv", 2)
+    report_progress.assert_called_with({"chunk": 2, "documents": 1, "total": 3})
@@ -1,6 +1,13 @@
 """Unit tests for student util functions"""
+import io
 import os
 
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from server.models.students import Student
 from server.util import students
 from tests.unit import mock_data
 
@@ -9,7 +16,7 @@ def test_parse_roster_data(mocker, datadir):
     """Test successfully parsing student roster data from a CSV file."""
     with open(os.path.join(datadir, "test_roster.csv"), "r", encoding="utf-8") as file:
         return_val = students.parse_roster_data(file, "course1")
-    assert return_val[0].dict() == mock_data.STUDENT_ROSTER_RETURN[0].dict()
+    assert return_val == [jsonable_encoder(mock_data.STUDENT_ROSTER_RETURN[0])]
 
 
 def test_parse_roster_data_empty_fields(mocker, datadir):
@@ -18,7 +25,65 @@ def test_parse_roster_data_empty_fields(mocker, datadir):
         os.path.join(datadir, "test_roster_empty_survey.csv"), "r", encoding="utf-8"
     ) as file:
         return_val = students.parse_roster_data(file, "course1")
-    assert return_val[0].dict() == mock_data.STUDENT_ROSTER_EMPTY_FIELDS.dict()
+    assert return_val == [jsonable_encoder(mock_data.STUDENT_ROSTER_EMPTY_FIELDS)]
+
+
+def test_parse_roster_data_numeric_fields():
+    """Test that numeric roster values are stored as strings, as the Student model would."""
+    roster_df = pd.DataFrame(mock_data.ROSTER_DF_DICT)
+    roster_df["Github Account"] = [12345]
+    roster_df["TA"] = [None]
+    return_val = students.parse_roster_data(
+        io.StringIO(roster_df.to_csv(index=False)), "course1"
+    )
+    assert return_val[0]["source_control_username"] == "12345"
+    assert return_val[0]["ta"] == ""
+    assert Student(**return_val[0]).dict() == return_val[0]
+
+
+def test_parse_roster_data_missing_columns():
+    """Test that a roster without every column is rejected."""
+    roster_df = pd.DataFrame(mock_data.ROSTER_DF_DICT).drop(columns=["Github repo"])
+    with pytest.raises(HTTPException) as exc:
+        students.parse_roster_data(
+            io.StringIO(roster_df.to_csv(index=False)), "course1"
+        )
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "Roster is missing columns: Github repo"
+
+
+def test_parse_roster_chunks():
+    """Test that a roster parsed in chunks has the same documents as parsed at once."""
+    roster_df = pd.DataFrame(mock_data.ROSTER_DF_DICT)
+    roster_df = pd.concat(
+        [
+            roster_df.assign(**{"Email Address": f"student{i}@ualberta.ca"})
+            for i in range(3)
+        ]
+    )
+    csv = roster_df.to_csv(index=False)
+    chunks = list(students.parse_roster_chunks(io.StringIO(csv), "course1", 2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[0] + chunks[1] == students.parse_roster_data(
+        io.StringIO(csv), "course1"
+    )
+
+
+def test_parse_roster_chunks_missing_columns():
+    """Test that a roster without every column is rejected before any chunk is returned."""
+    roster_df = pd.DataFrame(mock_data.ROSTER_DF_DICT).drop(columns=["TA"])
+    with pytest.raises(HTTPException) as exc:
+        students.parse_roster_chunks(
+            io.StringIO(roster_df.to_csv(index=False)), "course1", 1
+        )
+    assert exc.value.status_code == 400
+
+
+def test_parse_roster_chunks_empty():
+    """Test that a roster without any students has no documents."""
+    csv = pd.DataFrame(columns=list(mock_data.ROSTER_DF_DICT)).to_csv(index=False)
+    chunks = students.parse_roster_chunks(io.StringIO(csv), "course1", 1)
+    assert all(chunk == [] for chunk in chunks)
 
 
 def test_parse_sprint_data(mocker, datadir):
@@ -52,3 +117,66 @@ def test_parse_sprint_data_unsubmitted_peer_review(mocker, datadir):
     ) as file:
         return_val = students.parse_sprint_data(file, 1)
     assert return_val[1].dict() == mock_data.STUDENT_SPRINT_RETURN_UNSUBMITTED[1].dict()
+
+
+@pytest.mark.parametrize(
+    "file_name", ["test_sprint1.csv", "test_sprint1_unsubmitted_peer_review.csv"]
+)
+def test_parse_sprint_chunks(datadir, file_name):
+    """Test that sprint data parsed in chunks amounts to the sprint data parsed at once."""
+    with open(os.path.join(datadir, file_name), "r", encoding="utf-8") as file:
+        csv = file.read()
+    documents = {}
+    for chunk in students.parse_sprint_chunks(io.StringIO(csv), 1, 1):
+        for document in chunk:
+            documents.setdefault(document["email"], {}).update(document)
+    expected = students.parse_sprint_data(io.StringIO(csv), 1)
+    assert documents == {
+        sprint_data.email: jsonable_encoder(sprint_data) for sprint_data in expected
+    }
+
+
+def test_parse_sprint_chunks_not_reviewed(datadir):
+    """Test that a student who submitted a peer review but wasn't reviewed has no ratings."""
+    with open(os.path.join(datadir, "test_sprint1.csv"), "r", encoding="utf-8") as file:
+        sprint_df = pd.read_csv(file)
+    sprint_df.iloc[:, students.PEER_REVIEW_START :] = ""
+    chunks = list(
+        students.parse_sprint_chunks(io.StringIO(sprint_df.to_csv(index=False)), 1, 1)
+    )
+    email = sprint_df.iloc[0, 1]
+    assert chunks[-1] == [
+        {
+            "email": email,
+            "sprint": 1,
+            "received_peer_revs": {},
+            "avg_rating": 0,
+            "stddev_rating": 0,
+        }
+    ]
+
+
+def test_parse_sprint_data_not_reviewed(datadir):
+    """Test that a student who submitted a peer review but wasn't reviewed has no ratings
+    when the sprint data is parsed at once, as when it is parsed in chunks."""
+    with open(os.path.join(datadir, "test_sprint1.csv"), "r", encoding="utf-8") as file:
+        sprint_df = pd.read_csv(file)
+    sprint_df.iloc[:, students.PEER_REVIEW_START :] = ""
+    return_val = students.parse_sprint_data(
+        io.StringIO(sprint_df.to_csv(index=False)), 1
+    )
+    assert return_val[0].email == sprint_df.iloc[0, 1]
+    assert return_val[0].received_peer_revs == {}
+    assert return_val[0].avg_rating == 0
+    assert return_val[0].stddev_rating == 0
+
+
+def test_get_reviewee_emails():
+    """Test that emails are extracted from team members in either format."""
+    reviewees = pd.Series(
+        ["cat@ualberta.ca - Cat Caterson", "Monkey - monkey@ualberta.ca"]
+    )
+    assert students.get_reviewee_emails(reviewees).tolist() == [
+        "cat@ualberta.ca",
+        "monkey@ualberta.ca",
+    ]
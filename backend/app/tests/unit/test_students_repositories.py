@@ -0,0 +1,52 @@
+"""Test the queries of the students and their sprint data."""
+import asyncio
+
+from server.repositories import sprint_data, students
+from tests.unit import mock_data
+
+
+def test_find_students(mocker):
+    """Test that students are found with only the fields of a student."""
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find", return_value=[mock_data.STUDENT_JSON]
+    )
+    assert asyncio.run(students.find_students("course_name")) == [
+        mock_data.STUDENT_JSON
+    ]
+    mock_find.assert_called_once_with({}, students.STUDENT_FIELDS)
+    assert students.STUDENT_FIELDS["_id"] == 0
+    assert students.STUDENT_FIELDS["experience_survey"] == 1
+
+
+def test_find_students_by_email(mocker):
+    """Test that only the students with the given emails are found."""
+    mock_find = mocker.patch("pymongo.collection.Collection.find", return_value=[])
+    asyncio.run(students.find_students("course_name", ["test_email"]))
+    mock_find.assert_called_once_with(
+        {"email": {"$in": ["test_email"]}}, students.STUDENT_FIELDS
+    )
+
+
+def test_get_team_map(mocker):
+    """Test that only the email and team of each student are fetched."""
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"email": "test_email", "project": "test_project"}],
+    )
+    assert asyncio.run(students.get_team_map("course_name")) == {
+        "test_email": "test_project"
+    }
+    mock_find.assert_called_once_with({}, {"_id": 0, "email": 1, "project": 1})
+
+
+def test_find_sprint_data(mocker):
+    """Test that sprint data is filtered by sprint and student, if given."""
+    mock_find = mocker.patch("pymongo.collection.Collection.find", return_value=[])
+    asyncio.run(sprint_data.find_sprint_data("course_name"))
+    mock_find.assert_called_with({}, sprint_data.SPRINT_DATA_FIELDS)
+    asyncio.run(sprint_data.find_sprint_data("course_name", 1))
+    mock_find.assert_called_with({"sprint": 1}, sprint_data.SPRINT_DATA_FIELDS)
+    asyncio.run(sprint_data.find_sprint_data("course_name", 0, "test_email"))
+    mock_find.assert_called_with(
+        {"email": "test_email"}, sprint_data.SPRINT_DATA_FIELDS
+    )
@@ -0,0 +1,84 @@
+"""Test the pipelined writes of uploaded student data."""
+import os
+
+from pymongo import UpdateOne
+
+from server.models.students import UploadProgress
+from server.util import uploads
+from tests.unit import mock_data
+
+
+def test_write_chunks(mocker):
+    """Test that each chunk is upserted in order and its progress reported."""
+    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    chunks = [[{"email": "a", "x": 1}, {"email": "b", "x": 2}], [], [{"email": "c"}]]
+    progress = list(
+        uploads.write_chunks(
+            mock_data.DATABASE.students,
+            iter(chunks),
+            lambda student: {"email": student["email"]},
+        )
+    )
+    assert progress == [
+        UploadProgress(chunk=1, documents=2, total=2),
+        UploadProgress(chunk=2, documents=0, total=2),
+        UploadProgress(chunk=3, documents=1, total=3),
+    ]
+    assert [call.args[0] for call in mock_bulk_write.call_args_list] == [
+        [
+            UpdateOne({"email": "a"}, {"$set": {"email": "a", "x": 1}}, upsert=True),
+            UpdateOne({"email": "b"}, {"$set": {"email": "b", "x": 2}}, upsert=True),
+        ],
+        [UpdateOne({"email": "c"}, {"$set": {"email": "c"}}, upsert=True)],
+    ]
+
+
+def test_write_chunks_overlaps_parsing(mocker):
+    """Test that the next chunk is parsed before the previous chunk's progress is reported."""
+    mocker.patch("pymongo.collection.Collection.bulk_write")
+    parsed = []
+
+    def chunks():
+        for number in range(1, 4):
+            parsed.append(number)
+            yield [{"email": str(number)}]
+
+    progress = uploads.write_chunks(
+        mock_data.DATABASE.students, chunks(), lambda student: student
+    )
+    assert next(progress).chunk == 1
+    assert parsed == [1, 2]
+    assert [chunk.chunk for chunk in progress] == [2, 3]
+
+
+def test_write_chunks_error(mocker):
+    """Test that a failed write is raised when its chunk is reported."""
+    mocker.patch(
+        "pymongo.collection.Collection.bulk_write", side_effect=RuntimeError("failed")
+    )
+    progress = uploads.write_chunks(
+        mock_data.DATABASE.students, iter([[{"email": "a"}]]), lambda student: student
+    )
+    try:
+        next(progress)
+    except RuntimeError as exc:
+        assert str(exc) == "failed"
+    else:
+        raise AssertionError("The write error was not raised")
+
+
+def test_write_student_data_roster(mocker, datadir):
+    """Test that a streamed roster is written by email and its file name recorded."""
+    mock_check_course_in_db = mocker.patch(f"{uploads.__name__}.check_course_in_db")
+    mock_update_one = mocker.patch("pymongo.collection.Collection.update_one")
+    mock_bulk_write = mocker.patch("pymongo.collection.Collection.bulk_write")
+    with open(os.path.join(datadir, "test_roster.csv"), "r", encoding="utf-8") as file:
+        progress = list(
+            uploads.write_student_data("test_course", 0, file, "roster.csv", 10)
+        )
+    mock_check_course_in_db.assert_called_once_with("test_course", [".students"])
+    mock_update_one.assert_called_once_with(
+        {"name": "test_course"}, {"$set": {"roster_file_name": "roster.csv"}}
+    )
+    assert progress == [UploadProgress(chunk=1, documents=1, total=1)]
+    mock_bulk_write.assert_called_once_with(mock_data.STUDENT_ROSTER_POST)
@@ -0,0 +1,178 @@
+"""Test the GitHub webhook deliveries."""
+import hashlib
+import hmac
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from server.config import settings
+from server.util import webhooks
+
+
+@pytest.fixture(name="sync_lease", autouse=True)
+def fixture_sync_lease(mocker):
+    """Mock the sync lease held while the commits of a push are stored."""
+    return {
+        "wait_for": mocker.patch("server.util.leases.wait_for", return_value=True),
+        "release": mocker.patch("server.util.leases.release"),
+    }
+
+
+SECRET = "webhook_secret"
+
+PUSH = {
+    "ref": "refs/heads/main",
+    "repository": {"name": "test_repo", "default_branch": "main"},
+    "commits": [
+        {
+            "id": "abc123",
+            "message": "Add a feature",
+            "timestamp": "2022-10-01T12:00:00-06:00",
+            "author": {"name": "Test User", "username": "testuser"},
+        },
+        {
+            "id": "def456",
+            "message": "Commit from an unlinked email",
+            "timestamp": "2022-10-01T12:05:00-06:00",
+            "author": {"name": "Someone Else", "email": "someone@example.com"},
+        },
+    ],
+}
+
+
+@pytest.fixture(name="secret")
+def fixture_secret(mocker):
+    """Configure the webhook secret."""
+    mocker.patch.object(settings, "GITHUB_WEBHOOK_SECRET", SECRET)
+
+
+def sign(body: bytes) -> str:
+    """Sign a delivery the way GitHub does."""
+    return "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+@pytest.mark.usefixtures("secret")
+def test_verify_signature():
+    """Test that a delivery signed with the secret is accepted."""
+    webhooks.verify_signature(
+        b'{"zen": "Keep it simple."}', sign(b'{"zen": "Keep it simple."}')
+    )
+
+
+@pytest.mark.usefixtures("secret")
+@pytest.mark.parametrize("signature", [None, "sha256=0000", sign(b"other body")])
+def test_verify_signature_invalid(signature):
+    """Test that unsigned and wrongly signed deliveries are rejected."""
+    with pytest.raises(HTTPException) as exc:
+        webhooks.verify_signature(b"body", signature)
+    assert exc.value.status_code == 401
+
+
+def test_verify_signature_not_configured(mocker):
+    """Test that deliveries are rejected when there is no secret to check them with."""
+    mocker.patch.object(settings, "GITHUB_WEBHOOK_SECRET", None)
+    with pytest.raises(HTTPException) as exc:
+        webhooks.verify_signature(b"body", sign(b"body"))
+    assert exc.value.status_code == 503
+
+
+def test_get_push_commits():
+    """Test that pushed commits are converted into the form returned by the commits API."""
+    assert webhooks.get_push_commits(PUSH) == [
+        {
+            "sha": "abc123",
+            "author": {"login": "testuser"},
+            "commit": {
+                "author": {"date": "2022-10-01T12:00:00-06:00"},
+                "message": "Add a feature",
+            },
+        }
+    ]
+
+
+def test_get_repo_courses(mocker):
+    """Test that only courses with a team using the repository are found."""
+    mock_find = mocker.patch(
+        "pymongo.collection.Collection.find",
+        return_value=[{"name": "course1"}, {"name": "course2"}],
+    )
+    mocker.patch(
+        "pymongo.collection.Collection.find_one", side_effect=[None, {"_id": 1}]
+    )
+    assert webhooks.get_repo_courses("test_repo") == ["course2"]
+    assert mock_find.call_args.args[0] == {"use_github": True}
+
+
+def test_handle_delivery(mocker):
+    """Test that the commits of a push to the default branch are stored in each course."""
+    mock_insert_one = mocker.patch("pymongo.collection.Collection.insert_one")
+    mocker.patch(
+        f"{webhooks.__name__}.get_repo_courses", return_value=["course1", "course2"]
+    )
+    mock_store_commits = mocker.patch(f"{webhooks.__name__}.github.store_commits")
+    result = webhooks.handle_delivery("delivery1", "push", PUSH)
+    assert result.status == "stored"
+    assert result.courses == ["course1", "course2"]
+    assert result.commits == 1
+    assert mock_insert_one.call_args.args[0]["_id"] == "delivery1"
+    commits = webhooks.get_push_commits(PUSH)
+    assert [call.args for call in mock_store_commits.call_args_list] == [
+        (commits, "test_repo", "course1"),
+        (commits, "test_repo", "course2"),
+    ]
+
+
+def test_handle_delivery_duplicate(mocker):
+    """Test that a redelivered delivery isn't processed again."""
+    mocker.patch(
+        "pymongo.collection.Collection.insert_one",
+        side_effect=DuplicateKeyError("duplicate key"),
+    )
+    mock_store_commits = mocker.patch(f"{webhooks.__name__}.github.store_commits")
+    result = webhooks.handle_delivery("delivery1", "push", PUSH)
+    assert result.status == "duplicate"
+    mock_store_commits.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "event, payload",
+    [
+        ("ping", {"zen": "Keep it simple."}),
+        ("push", {**PUSH, "ref": "refs/heads/feature"}),
+    ],
+)
+def test_handle_delivery_ignored(mocker, event, payload):
+    """Test that other events, and pushes to other branches, are ignored."""
+    mock_insert_one = mocker.patch("pymongo.collection.Collection.insert_one")
+    result = webhooks.handle_delivery("delivery1", event, payload)
+    assert result.status == "ignored"
+    mock_insert_one.assert_not_called()
+
+
+def test_handle_delivery_error(mocker):
+    """Test that a delivery that fails is forgotten, so that it can be redelivered."""
+    mocker.patch("pymongo.collection.Collection.insert_one")
+    mock_delete_one = mocker.patch("pymongo.collection.Collection.delete_one")
+    mocker.patch(f"{webhooks.__name__}.get_repo_courses", return_value=["course1"])
+    mocker.patch(
+        f"{webhooks.__name__}.github.store_commits",
+        side_effect=HTTPException(status_code=404),
+    )
+    with pytest.raises(HTTPException):
+        webhooks.handle_delivery("delivery1", "push", PUSH)
+    mock_delete_one.assert_called_once_with({"_id": "delivery1"})
+
+
+def test_handle_delivery_syncing(mocker, sync_lease):
+    """Test that a delivery for a course that is being synced is forgotten and redelivered."""
+    sync_lease["wait_for"].return_value = False
+    mocker.patch("pymongo.collection.Collection.insert_one")
+    mock_delete_one = mocker.patch("pymongo.collection.Collection.delete_one")
+    mocker.patch(f"{webhooks.__name__}.get_repo_courses", return_value=["course1"])
+    mock_store_commits = mocker.patch(f"{webhooks.__name__}.github.store_commits")
+    with pytest.raises(HTTPException) as exc_info:
+        webhooks.handle_delivery("delivery1", "push", PUSH)
+    assert exc_info.value.status_code == 409
+    mock_store_commits.assert_not_called()
+    mock_delete_one.assert_called_once_with({"_id": "delivery1"})